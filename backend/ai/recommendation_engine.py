@@ -1,15 +1,50 @@
 # Sistema de Recomendações com IA - Alça Hub
 import asyncio
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass
-from collections import defaultdict
+from dataclasses import asdict, dataclass
+from collections import OrderedDict, defaultdict
 import logging
 import json
 
+from ai.recommendation_store import RecommendationStore
+from repositories.profile_snapshots import ProfileSnapshots
+from geo.distance import haversine_km, haversine_many
+
 logger = logging.getLogger(__name__)
 
+# Peso de cada feature do serviço no score de conteúdo
+FEATURE_WEIGHTS = {
+    'rating': 0.3,
+    'price_range': 0.2,
+    'availability': 0.2,
+    'experience_years': 0.1,
+    'certifications': 0.1,
+    'response_time': 0.1
+}
+DEFAULT_FEATURE_WEIGHT = 0.1
+
+# Thresholds mínimos de similaridade entre usuários e de score final
+MIN_SIMILARITY = 0.1
+MIN_SCORE = 0.1
+
+
+def top_k(values: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    """Os `k` candidatos de maior valor, em ordem decrescente.
+
+    Seleção com argpartition (O(n)); empates no corte e na ordenação ficam
+    com o candidato de menor índice, como no sort estável.
+    """
+    if k <= 0:
+        return candidates[:0]
+    if candidates.size > k:
+        kth = np.partition(values[candidates], candidates.size - k)[candidates.size - k]
+        above = candidates[values[candidates] > kth]
+        ties = candidates[values[candidates] == kth]
+        candidates = np.concatenate([above, ties[:k - above.size]])
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
 
 @dataclass
 class UserProfile:
@@ -32,6 +67,13 @@ class ServiceProfile:
     popularity: float = 0.0
 
 
+def _user_profile_from_doc(doc: Dict[str, Any]) -> UserProfile:
+    patterns = doc.get('behavior_patterns') or {}
+    # BSON devolve tuplas como listas
+    patterns['preferred_categories'] = [tuple(item) for item in patterns.get('preferred_categories', [])]
+    return UserProfile(**{**doc, 'behavior_patterns': patterns})
+
+
 @dataclass
 class Recommendation:
     """Recomendação gerada."""
@@ -41,19 +83,258 @@ class Recommendation:
     confidence: float
 
 
-class RecommendationEngine:
-    """Motor de recomendações baseado em IA."""
-    
+class InteractionMatrix:
+    """Matriz esparsa usuário × serviço em formato CSR (NumPy).
+
+    Escritas vão para um buffer e são incorporadas à CSR na próxima leitura
+    (última nota de cada par vale). Aceita o mesmo acesso por
+    `(user_id, service_id)` do dict usado antes.
+    """
+
     def __init__(self):
-        self.user_profiles: Dict[str, UserProfile] = {}
-        self.service_profiles: Dict[str, ServiceProfile] = {}
-        self.interaction_matrix: Dict[Tuple[str, str], float] = {}
+        self.users: Dict[str, int] = {}
+        self.services: Dict[str, int] = {}
+        self._pending: Dict[Tuple[int, int], float] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.data = np.empty(0, dtype=np.float64)
+
+    def __setitem__(self, key: Tuple[str, str], rating: float):
+        user_id, service_id = key
+        row = self.users.setdefault(user_id, len(self.users))
+        col = self.services.setdefault(service_id, len(self.services))
+        self._pending[(row, col)] = float(rating)
+
+    def __getitem__(self, key: Tuple[str, str]) -> float:
+        value = self.get(*key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return self.get(*key) is not None
+
+    def __len__(self) -> int:
+        self._compact()
+        return int(self.data.size)
+
+    def get(self, user_id: str, service_id: str) -> Optional[float]:
+        row = self.users.get(user_id)
+        col = self.services.get(service_id)
+        if row is None or col is None:
+            return None
+        self._compact()
+        if row + 1 >= self.indptr.size:
+            return None
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        pos = lo + np.searchsorted(self.indices[lo:hi], col)
+        if pos < hi and self.indices[pos] == col:
+            return float(self.data[pos])
+        return None
+
+    def _compact(self):
+        """Incorporar escritas pendentes à CSR."""
+        if not self._pending:
+            return
+        n_rows, n_cols = len(self.users), len(self.services)
+        old_rows = np.repeat(np.arange(self.indptr.size - 1, dtype=np.int64), np.diff(self.indptr))
+        new_rows = np.fromiter((row for row, _ in self._pending), dtype=np.int64, count=len(self._pending))
+        new_cols = np.fromiter((col for _, col in self._pending), dtype=np.int64, count=len(self._pending))
+        new_data = np.fromiter(self._pending.values(), dtype=np.float64, count=len(self._pending))
+        self._pending = {}
+
+        keys = np.concatenate([old_rows * n_cols + self.indices, new_rows * n_cols + new_cols])
+        data = np.concatenate([self.data, new_data])
+        # np.unique fica com a primeira ocorrência: invertido, as pendentes vencem
+        keys, first = np.unique(keys[::-1], return_index=True)
+        data = data[::-1][first]
+
+        rows = keys // n_cols
+        self.indices = keys % n_cols
+        self.data = data
+        self.indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=self.indptr[1:])
+
+    def to_coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(linhas, colunas, notas) de todas as interações, ordenadas por linha."""
+        self._compact()
+        rows = np.repeat(np.arange(self.indptr.size - 1, dtype=np.int64), np.diff(self.indptr))
+        return rows, self.indices, self.data
+
+    def weighted_columns(self, rows: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Soma de nota × peso e soma dos pesos por coluna, sobre as linhas dadas.
+
+        Returns:
+            (numerador, pesos) com uma posição por serviço da matriz
+        """
+        self._compact()
+        n_cols = len(self.services)
+        rows = np.asarray(rows, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        valid = rows + 1 < self.indptr.size
+        rows, weights = rows[valid], weights[valid]
+        if rows.size == 0:
+            return np.zeros(n_cols), np.zeros(n_cols)
+
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        # Posições na CSR de todas as entradas das linhas, sem loop em Python
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        cols = self.indices[positions]
+        row_weights = np.repeat(weights, lengths)
+        numerator = np.bincount(cols, weights=self.data[positions] * row_weights, minlength=n_cols)
+        totals = np.bincount(cols, weights=row_weights, minlength=n_cols)
+        return numerator, totals
+
+
+class CompiledRows:
+    """Arrays NumPy com uma linha por perfil, atualizados no lugar.
+
+    Perfil novo ganha a próxima linha (a capacidade dobra quando enche),
+    perfil alterado reescreve só a sua linha e perfil removido vira lápide:
+    a linha volta aos valores vazios, sai de `alive` e o id vira None até a
+    próxima compactação (o dono reconstrói quando `needs_compaction`).
+    Arrays em `wide` têm uma coluna por categoria, que também crescem.
+    """
+
+    def __init__(self, fields: Dict[str, Tuple[Any, Any]], wide: Iterable[str] = (), capacity: int = 64):
+        # nome -> (dtype, valor vazio)
+        self.fields = fields
+        self.wide = frozenset(wide)
+        self.ids: List[Optional[str]] = []
+        self.positions: Dict[str, int] = {}
+        self.dead = 0
+        self.width = 0
+        self.capacity = capacity
+        self._width_capacity = 8 if self.wide else 0
+        self.buffers = {name: self._allocate(name, capacity, self._width_capacity) for name in fields}
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def _allocate(self, name: str, rows: int, columns: int) -> np.ndarray:
+        dtype, empty = self.fields[name]
+        shape = (rows, columns) if name in self.wide else (rows,)
+        return np.full(shape, empty, dtype=dtype)
+
+    def _resize(self, rows: int, columns: int):
+        for name, old in self.buffers.items():
+            new = self._allocate(name, rows, columns)
+            if name in self.wide:
+                new[:old.shape[0], :old.shape[1]] = old
+            else:
+                new[:old.shape[0]] = old
+            self.buffers[name] = new
+        alive = np.zeros(rows, dtype=bool)
+        alive[:self.alive.size] = self.alive
+        self.alive = alive
+        self.capacity, self._width_capacity = rows, columns
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.buffers[name]
+
+    def ensure_width(self, width: int):
+        """Garantir colunas para `width` categorias nos arrays largos."""
+        if width > self._width_capacity:
+            self._resize(self.capacity, max(width, self._width_capacity * 2))
+        self.width = max(self.width, width)
+
+    def row_for(self, key: str) -> int:
+        """Linha do perfil, limpa para ser reescrita (nova se a chave não existir)."""
+        row = self.positions.get(key)
+        if row is None:
+            row = len(self.ids)
+            if row >= self.capacity:
+                self._resize(self.capacity * 2, self._width_capacity)
+            self.ids.append(key)
+            self.positions[key] = row
+            self.alive[row] = True
+        else:
+            self._clear(row)
+        return row
+
+    def remove(self, key: str) -> Optional[int]:
+        """Transformar a linha do perfil em lápide."""
+        row = self.positions.pop(key, None)
+        if row is not None:
+            self._clear(row)
+            self.ids[row] = None
+            self.alive[row] = False
+            self.dead += 1
+        return row
+
+    def _clear(self, row: int):
+        for name, buffer in self.buffers.items():
+            buffer[row] = self.fields[name][1]
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.dead > 64 and self.dead * 2 > len(self.ids)
+
+    def view(self) -> Dict[str, Any]:
+        """Arrays só com as linhas (e colunas) em uso."""
+        n = len(self.ids)
+        arrays: Dict[str, Any] = {'ids': self.ids, 'positions': self.positions, 'alive': self.alive[:n]}
+        for name, buffer in self.buffers.items():
+            arrays[name] = buffer[:n, :self.width] if name in self.wide else buffer[:n]
+        return arrays
+
+
+class RecommendationEngine:
+    """Motor de recomendações baseado em IA.
+
+    Perfis são compilados sob demanda em arrays: preferências dos usuários
+    numa matriz densa usuário × categoria e atributos dos serviços em
+    vetores. `generate_recommendations` acha os usuários similares uma vez e
+    pontua todos os serviços candidatos numa única passada vetorizada.
+
+    Com um `store`, a lista gravada pelo job offline
+    (ai.recommendation_index) é lida primeiro; só usuários sem lista ou com
+    lista vencida são recalculados na requisição.
+
+    Perfis ficam em memória com limite LRU; depois de `start` são gravados
+    em snapshots no MongoDB e lidos sob demanda, então um deploy não
+    recomeça do zero.
+    """
+
+    def __init__(
+        self,
+        store: Optional[RecommendationStore] = None,
+        max_user_profiles: int = 50000,
+        max_service_profiles: int = 100000
+    ):
+        self.store = store
+        # Última interação por usuário (listas materializadas antes dela estão
+        # vencidas), em ordem de atualização e limitada a `max_touched`
+        self._touched: "OrderedDict[str, datetime]" = OrderedDict()
+        self.max_touched = max_user_profiles
+        self.user_profiles = ProfileSnapshots(
+            "recommendation_user", asdict, _user_profile_from_doc, max_size=max_user_profiles
+        )
+        self.service_profiles = ProfileSnapshots(
+            "recommendation_service", asdict, lambda doc: ServiceProfile(**doc), max_size=max_service_profiles
+        )
+        self.interaction_matrix = InteractionMatrix()
+        self.categories: Dict[str, int] = {}
+        # Arrays compilados dos perfis e chaves alteradas desde a última compilação
+        self._user_rows: Optional[CompiledRows] = None
+        self._service_rows: Optional[CompiledRows] = None
+        self._user_arrays: Optional[Dict[str, Any]] = None
+        self._service_arrays: Optional[Dict[str, Any]] = None
+        self._changed_users: Set[str] = set()
+        self._changed_services: Set[str] = set()
+        self.user_profiles.on_change(self._changed_users.add)
+        self.service_profiles.on_change(self._changed_services.add)
         self.model_weights = {
             'collaborative': 0.4,
             'content_based': 0.3,
             'location': 0.2,
             'popularity': 0.1
         }
+        # Distância (km) a partir da qual o score de localização zera
+        self.location_max_distance_km = 11.0
     
     async def build_user_profile(self, user_id: str, interactions: List[Dict[str, Any]]) -> UserProfile:
         """Construir perfil do usuário baseado em interações."""
@@ -132,6 +413,19 @@ class RecommendationEngine:
         self.service_profiles[service_id] = profile
         return profile
     
+    async def start(self, database, warm: bool = True):
+        """Persistir perfis no MongoDB e carregar os mais recentes (warm start)."""
+        for profiles in (self.user_profiles, self.service_profiles):
+            await profiles.ensure_indexes(database)
+            profiles.start(database)
+            if warm:
+                await profiles.warm()
+    
+    async def stop(self):
+        """Gravar perfis pendentes."""
+        await self.user_profiles.stop()
+        await self.service_profiles.stop()
+    
     def calculate_collaborative_score(self, user_id: str, service_id: str) -> float:
         """Calcular score baseado em filtragem colaborativa."""
         if user_id not in self.user_profiles:
@@ -190,15 +484,45 @@ class RecommendationEngine:
         if not user_location or not service_location:
             return 0.5  # Score neutro se não há localização
         
-        # Calcular distância (simplificado)
-        distance = np.sqrt(
-            (user_location['lat'] - service_location['lat'])**2 +
-            (user_location['lng'] - service_location['lng'])**2
+        distance = haversine_km(
+            user_location['lat'], user_location['lng'],
+            service_location['lat'], service_location['lng']
         )
         
         # Score inversamente proporcional à distância
-        max_distance = 0.1  # Ajustar conforme necessário
-        return max(0, 1 - (distance / max_distance))
+        return max(0.0, 1 - (distance / self.location_max_distance_km))
+    
+    def calculate_location_scores(self, user_id: str, service_ids: List[str]) -> Dict[str, float]:
+        """Calcular score de localização para vários serviços em uma passada vetorizada."""
+        if user_id not in self.user_profiles:
+            return {service_id: 0.0 for service_id in service_ids}
+        
+        user_location = self.user_profiles[user_id].location
+        scores = {}
+        located_ids = []
+        lats = []
+        lngs = []
+        
+        for service_id in service_ids:
+            profile = self.service_profiles.get(service_id)
+            if profile is None:
+                scores[service_id] = 0.0
+            elif not user_location or not profile.location:
+                scores[service_id] = 0.5  # Score neutro se não há localização
+            else:
+                located_ids.append(service_id)
+                lats.append(profile.location['lat'])
+                lngs.append(profile.location['lng'])
+        
+        if located_ids:
+            distances = haversine_many(
+                user_location['lat'], user_location['lng'],
+                np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)
+            )
+            location_scores = np.maximum(0.0, 1 - distances / self.location_max_distance_km)
+            scores.update(zip(located_ids, location_scores.tolist()))
+        
+        return scores
     
     def calculate_popularity_score(self, service_id: str) -> float:
         """Calcular score baseado em popularidade."""
@@ -208,25 +532,154 @@ class RecommendationEngine:
         service_profile = self.service_profiles[service_id]
         return (service_profile.rating * 0.6) + (service_profile.popularity * 0.4)
     
-    def _find_similar_users(self, user_id: str, limit: int = 10) -> List[Tuple[str, float]]:
-        """Encontrar usuários similares."""
+    def _compile_users(self) -> Dict[str, Any]:
+        """Matriz densa usuário × categoria das preferências.
+        
+        Só as linhas dos perfis incluídos, alterados ou removidos desde a
+        última chamada são reescritas; a matriz inteira só é refeita na
+        primeira compilação e quando as lápides passam da metade.
+        """
+        changed = self._changed_users
+        if self._user_arrays is not None and not changed:
+            return self._user_arrays
+        
+        rows = self._user_rows
+        if rows is None or rows.needs_compaction:
+            rows = self._user_rows = CompiledRows(
+                {'preferences': (np.float64, 0.0), 'present': (bool, False)},
+                wide=('preferences', 'present'),
+                capacity=max(64, len(self.user_profiles)),
+            )
+            keys: Iterable[str] = list(self.user_profiles)
+        else:
+            keys = changed
+        
+        for user_id in keys:
+            profile = self.user_profiles.peek(user_id)
+            if profile is None:
+                rows.remove(user_id)
+                continue
+            for category in profile.preferences:
+                self.categories.setdefault(category, len(self.categories))
+            rows.ensure_width(len(self.categories))
+            row = rows.row_for(user_id)
+            columns = [self.categories[category] for category in profile.preferences]
+            rows['preferences'][row, columns] = list(profile.preferences.values())
+            rows['present'][row, columns] = True
+        changed.clear()
+        
+        self._user_arrays = rows.view()
+        return self._user_arrays
+    
+    def _compile_services(self) -> Dict[str, Any]:
+        """Vetores de categoria, features, popularidade e localização dos serviços.
+        
+        Atualizados por linha como em `_compile_users`; serviços removidos
+        ficam fora de `alive` e da coluna da matriz de interações.
+        """
+        changed = self._changed_services
+        if self._service_arrays is not None and not changed:
+            return self._service_arrays
+        
+        rows = self._service_rows
+        columns = self._service_arrays['columns'] if self._service_arrays is not None else None
+        if rows is None or rows.needs_compaction:
+            rows = self._service_rows = CompiledRows(
+                {
+                    'category': (np.int64, 0),
+                    # Features sem price_range já ponderadas; price_range depende do usuário
+                    'weighted_features': (np.float64, 0.0),
+                    'price_range': (np.float64, 0.0),
+                    'feature_count': (np.float64, 1.0),
+                    'popularity': (np.float64, 0.0),
+                    'lats': (np.float64, np.nan),
+                    'lngs': (np.float64, np.nan),
+                },
+                capacity=max(64, len(self.service_profiles)),
+            )
+            keys: Iterable[str] = list(self.service_profiles)
+            columns = None
+        else:
+            keys = changed
+        
+        matrix_columns = self.interaction_matrix.services
+        for service_id in keys:
+            profile = self.service_profiles.peek(service_id)
+            if profile is None:
+                row, position = rows.remove(service_id), -1
+            else:
+                row = position = rows.row_for(service_id)
+                rows['category'][row] = self.categories.setdefault(profile.category, len(self.categories))
+                features = profile.features
+                rows['weighted_features'][row] = sum(
+                    value * FEATURE_WEIGHTS.get(feature, DEFAULT_FEATURE_WEIGHT)
+                    for feature, value in features.items()
+                    if feature != 'price_range'
+                )
+                rows['price_range'][row] = features.get('price_range', 0.0)
+                rows['feature_count'][row] = max(len(features), 1)
+                rows['popularity'][row] = (profile.rating * 0.6) + (profile.popularity * 0.4)
+                if profile.location:
+                    rows['lats'][row] = profile.location['lat']
+                    rows['lngs'][row] = profile.location['lng']
+            # Colunas já mapeadas da matriz de interações acompanham a linha
+            column = matrix_columns.get(service_id)
+            if columns is not None and row is not None and column is not None and column < columns.size:
+                columns[column] = position
+        changed.clear()
+        
+        arrays = rows.view()
+        # Coluna da matriz de interações -> posição do serviço (-1 sem perfil)
+        arrays['columns'] = columns if columns is not None else np.empty(0, dtype=np.int64)
+        self._service_arrays = arrays
+        return arrays
+    
+    def _service_columns(self, arrays: Dict[str, Any]) -> np.ndarray:
+        """Mapa coluna da matriz de interações -> posição nos vetores de serviço."""
+        services = self.interaction_matrix.services
+        columns = arrays['columns']
+        if columns.size < len(services):
+            positions = arrays['positions']
+            new_ids = list(services)[columns.size:]
+            columns = np.concatenate([
+                columns,
+                np.fromiter((positions.get(service_id, -1) for service_id in new_ids), dtype=np.int64, count=len(new_ids))
+            ])
+            arrays['columns'] = columns
+        return columns
+    
+    def _find_similar_users(
+        self,
+        user_id: str,
+        limit: int = 10,
+        candidates: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """Encontrar usuários similares (uma passada sobre a matriz de preferências).
+        
+        Args:
+            candidates: linhas de `_compile_users()` a comparar (busca aproximada);
+                todos os usuários quando omitido
+        """
         if user_id not in self.user_profiles:
             return []
         
-        target_profile = self.user_profiles[user_id]
-        similarities = []
-        
-        for other_user_id, other_profile in self.user_profiles.items():
-            if other_user_id == user_id:
-                continue
-            
-            similarity = self._calculate_user_similarity(target_profile, other_profile)
-            if similarity > 0.1:  # Threshold mínimo
-                similarities.append((other_user_id, similarity))
+        arrays = self._compile_users()
+        row = arrays['positions'][user_id]
+        if candidates is None:
+            candidates = np.arange(len(arrays['ids']))
+        candidates = candidates[candidates != row]
+        preferences = arrays['preferences'][candidates]
+        
+        # Mesma métrica de _calculate_user_similarity: média do mínimo nas categorias em comum
+        common = arrays['present'][candidates] & arrays['present'][row]
+        common_count = common.sum(axis=1)
+        overlap = np.where(common, np.minimum(preferences, arrays['preferences'][row]), 0.0).sum(axis=1)
+        similarity = np.divide(
+            overlap, common_count, out=np.zeros(len(common_count)), where=common_count > 0
+        )
         
-        # Ordenar por similaridade
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:limit]
+        best = top_k(similarity, np.flatnonzero(similarity > MIN_SIMILARITY), limit)
+        return [(arrays['ids'][candidates[i]], float(similarity[i])) for i in best]
     
     def _calculate_user_similarity(self, profile1: UserProfile, profile2: UserProfile) -> float:
         """Calcular similaridade entre usuários."""
@@ -244,72 +697,154 @@ class RecommendationEngine:
     
     def _get_feature_weight(self, user_profile: UserProfile, feature: str) -> float:
         """Obter peso da feature para o usuário."""
-        # Pesos baseados no comportamento do usuário
-        weights = {
-            'rating': 0.3,
-            'price_range': 0.2,
-            'availability': 0.2,
-            'experience_years': 0.1,
-            'certifications': 0.1,
-            'response_time': 0.1
-        }
+        weight = FEATURE_WEIGHTS.get(feature, DEFAULT_FEATURE_WEIGHT)
         
         # Ajustar baseado na sensibilidade a preço
         if feature == 'price_range':
-            weights[feature] *= (1 - user_profile.behavior_patterns.get('price_sensitivity', 0.5))
+            weight *= (1 - user_profile.behavior_patterns.get('price_sensitivity', 0.5))
         
-        return weights.get(feature, 0.1)
+        return weight
+    
+    def score_services(
+        self,
+        user_id: str,
+        similar: Optional[List[Tuple[str, float]]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Scores de todos os serviços para o usuário, um vetor por componente.
+        
+        Args:
+            similar: usuários similares já calculados (job offline)
+        
+        Returns:
+            Dict com 'collaborative', 'content_based', 'location', 'popularity'
+            e 'final', alinhados com `_compile_services()['ids']`
+        """
+        services = self._compile_services()
+        profile = self.user_profiles[user_id]
+        n = len(services['ids'])
+        
+        # Colaborativo: média das notas dos similares ponderada pela similaridade
+        collaborative = np.zeros(n, dtype=np.float64)
+        if similar is None:
+            similar = self._find_similar_users(user_id)
+        matrix_rows = self.interaction_matrix.users
+        rows = [(matrix_rows[other_id], similarity) for other_id, similarity in similar if other_id in matrix_rows]
+        if rows:
+            numerator, totals = self.interaction_matrix.weighted_columns(
+                np.array([row for row, _ in rows]), np.array([weight for _, weight in rows])
+            )
+            columns = self._service_columns(services)
+            mapped = columns >= 0
+            collaborative[columns[mapped]] = numerator[mapped] / np.maximum(totals[mapped], 1.0)
+        
+        # Conteúdo: preferência pela categoria e features ponderadas
+        user_preferences = np.zeros(len(self.categories), dtype=np.float64)
+        for category, weight in profile.preferences.items():
+            column = self.categories.get(category)
+            if column is not None:
+                user_preferences[column] = weight
+        price_weight = self._get_feature_weight(profile, 'price_range')
+        feature_score = (
+            services['weighted_features'] + services['price_range'] * price_weight
+        ) / services['feature_count']
+        content = user_preferences[services['category']] * 0.7 + feature_score * 0.3
+        
+        # Localização: score neutro para quem não tem coordenadas
+        location = np.full(n, 0.5)
+        if profile.location:
+            located = ~np.isnan(services['lats'])
+            distances = haversine_many(
+                profile.location['lat'], profile.location['lng'],
+                services['lats'][located], services['lngs'][located]
+            )
+            location[located] = np.maximum(0.0, 1 - distances / self.location_max_distance_km)
+        
+        popularity = services['popularity']
+        final = (
+            collaborative * self.model_weights['collaborative'] +
+            content * self.model_weights['content_based'] +
+            location * self.model_weights['location'] +
+            popularity * self.model_weights['popularity']
+        )
+        return {
+            'collaborative': collaborative,
+            'content_based': content,
+            'location': location,
+            'popularity': popularity,
+            'final': final,
+        }
     
     async def generate_recommendations(
         self, 
         user_id: str, 
         limit: int = 10,
-        exclude_services: List[str] = None
+        exclude_services: List[str] = None,
+        database=None
     ) -> List[Recommendation]:
-        """Gerar recomendações para um usuário."""
-        if user_id not in self.user_profiles:
+        """Gerar recomendações para um usuário.
+        
+        Com `database` e `store`, usa a lista materializada quando válida; se
+        não houver, recalcula e grava a lista para as próximas requisições.
+        """
+        if limit <= 0:
+            return []
+        exclude = set(exclude_services or [])
+        if self.store is None or database is None:
+            if await self.user_profiles.load(user_id) is None:
+                await self.build_user_profile(user_id, [])
+            return self.rank(user_id, limit, exclude)
+        
+        doc = await self.store.get(database, user_id)
+        if self.store.is_fresh(doc, self._touched.get(user_id)):
+            items = doc.get('items') or []
+            recommendations = [Recommendation(**item) for item in items if item['service_id'] not in exclude]
+            # Lista curta é a lista completa; senão as exclusões podem ter esvaziado o topo
+            if len(recommendations) >= limit or len(items) < self.store.list_size:
+                return recommendations[:limit]
+        
+        if await self.user_profiles.load(user_id) is None:
             await self.build_user_profile(user_id, [])
+        ranked = self.rank(user_id, self.store.list_size)
+        await self.store.save(database, user_id, [asdict(r) for r in ranked])
+        return [r for r in ranked if r.service_id not in exclude][:limit]
+    
+    def rank(
+        self,
+        user_id: str,
+        limit: int,
+        exclude_services: Optional[Iterable[str]] = None,
+        similar: Optional[List[Tuple[str, float]]] = None
+    ) -> List[Recommendation]:
+        """Melhores serviços para um usuário com perfil já construído."""
+        services = self._compile_services()
+        if not services['ids'] or limit <= 0:
+            return []
         
-        exclude_services = exclude_services or []
-        recommendations = []
+        scores = self.score_services(user_id, similar)
+        final = scores['final']
         
-        for service_id, service_profile in self.service_profiles.items():
-            if service_id in exclude_services:
-                continue
-            
-            # Calcular scores
-            collaborative_score = self.calculate_collaborative_score(user_id, service_id)
-            content_score = self.calculate_content_based_score(user_id, service_id)
-            location_score = self.calculate_location_score(user_id, service_id)
-            popularity_score = self.calculate_popularity_score(service_id)
-            
-            # Score final ponderado
-            final_score = (
-                collaborative_score * self.model_weights['collaborative'] +
-                content_score * self.model_weights['content_based'] +
-                location_score * self.model_weights['location'] +
-                popularity_score * self.model_weights['popularity']
+        eligible = (final > MIN_SCORE) & services['alive']  # Threshold mínimo
+        excluded = [services['positions'][s] for s in exclude_services or [] if s in services['positions']]
+        eligible[excluded] = False
+        
+        # Top-k em O(n); só os k escolhidos são ordenados
+        candidates = top_k(final, np.flatnonzero(eligible), limit)
+        
+        recommendations = []
+        for i in candidates.tolist():
+            # Gerar razão da recomendação
+            reason = self._generate_recommendation_reason(
+                scores['collaborative'][i], scores['content_based'][i],
+                scores['location'][i], scores['popularity'][i]
             )
-            
-            if final_score > 0.1:  # Threshold mínimo
-                # Gerar razão da recomendação
-                reason = self._generate_recommendation_reason(
-                    collaborative_score, content_score, location_score, popularity_score
-                )
-                
-                # Calcular confiança
-                confidence = min(1.0, final_score * 1.5)
-                
-                recommendations.append(Recommendation(
-                    service_id=service_id,
-                    score=final_score,
-                    reason=reason,
-                    confidence=confidence
-                ))
-        
-        # Ordenar por score
-        recommendations.sort(key=lambda x: x.score, reverse=True)
-        return recommendations[:limit]
+            recommendations.append(Recommendation(
+                service_id=services['ids'][i],
+                score=float(final[i]),
+                reason=reason,
+                confidence=min(1.0, float(final[i]) * 1.5)  # Calcular confiança
+            ))
+        
+        return recommendations
     
     def _generate_recommendation_reason(
         self, 
@@ -338,15 +873,43 @@ class RecommendationEngine:
         
         return f"recomendado porque {', '.join(reasons)}"
     
-    async def update_interaction(self, user_id: str, service_id: str, rating: float):
-        """Atualizar interação do usuário."""
+    async def update_interaction(
+        self,
+        user_id: str,
+        service_id: str,
+        rating: float,
+        at: Optional[datetime] = None
+    ):
+        """Atualizar interação do usuário.
+        
+        Args:
+            at: quando a interação aconteceu (carga de histórico); agora quando omitido
+        """
         self.interaction_matrix[(user_id, service_id)] = rating
+        if self.store is not None:
+            at = at or datetime.utcnow()
+            if at > self._touched.get(user_id, datetime.min):
+                self._touched[user_id] = at
+                self._touched.move_to_end(user_id)
+            self._prune_touched()
         
         # Reconstruir perfil do usuário se necessário
         if user_id in self.user_profiles:
             # Simular atualização do perfil
             pass
     
+    def _prune_touched(self, now: Optional[datetime] = None):
+        """Esquecer interações que não vencem mais nenhuma lista.
+
+        Lista gerada antes de uma interação mais antiga que `store.max_age`
+        já está vencida pela idade. Acima de `max_touched` saem as menos
+        recentes; a lista desses usuários vale até vencer pela idade.
+        """
+        touched = self._touched
+        cutoff = (now or datetime.utcnow()) - self.store.max_age
+        while touched and (len(touched) > self.max_touched or next(iter(touched.values())) < cutoff):
+            touched.popitem(last=False)
+    
     def get_recommendation_insights(self, user_id: str) -> Dict[str, Any]:
         """Obter insights sobre as recomendações."""
         if user_id not in self.user_profiles:
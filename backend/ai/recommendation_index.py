@@ -0,0 +1,293 @@
+# Índice de Vizinhos e Materialização de Recomendações - Alça Hub
+import math
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from ai.recommendation_engine import InteractionMatrix, RecommendationEngine
+from ai.recommendation_store import (
+    SIMILAR_SERVICES,
+    SIMILAR_USERS,
+    USER_RECOMMENDATIONS,
+    RecommendationStore,
+    recommendation_store,
+)
+from core.enums import BookingStatus, ServiceStatus
+from scheduling.interval_index import naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Nota implícita de um agendamento sem avaliação (avaliações valem rating / 5)
+BOOKING_RATING = 0.6
+
+# Interações por usuário consideradas na similaridade entre serviços
+MAX_ITEMS_PER_USER = 100
+
+
+class PreferenceLSH:
+    """Busca aproximada de vizinhos por projeções aleatórias (SimHash).
+
+    Cada tabela projeta os vetores de preferência (centrados na média) em
+    `n_bits` hiperplanos aleatórios; usuários com a mesma assinatura caem no
+    mesmo balde. Os candidatos de um usuário são a união dos seus baldes nas
+    `n_tables` tabelas, e a similaridade exata só é calculada para eles.
+    """
+
+    def __init__(self, n_tables: int = 4, n_bits: int = 10, seed: int = 0):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = seed
+        self._codes: List[np.ndarray] = []
+        self._order: List[np.ndarray] = []
+        self._sorted: List[np.ndarray] = []
+
+    def fit(self, vectors: np.ndarray) -> "PreferenceLSH":
+        rng = np.random.default_rng(self.seed)
+        centered = vectors - vectors.mean(axis=0) if len(vectors) else vectors
+        weights = 1 << np.arange(self.n_bits, dtype=np.int64)
+        self._codes, self._order, self._sorted = [], [], []
+        for _ in range(self.n_tables):
+            planes = rng.standard_normal((vectors.shape[1], self.n_bits))
+            codes = (centered @ planes > 0) @ weights
+            order = np.argsort(codes, kind="stable")
+            self._codes.append(codes)
+            self._order.append(order)
+            self._sorted.append(codes[order])
+        return self
+
+    def candidates(self, row: int) -> np.ndarray:
+        """Linhas que dividem algum balde com `row`, em ordem crescente."""
+        found = []
+        for codes, order, sorted_codes in zip(self._codes, self._order, self._sorted):
+            code = codes[row]
+            lo = np.searchsorted(sorted_codes, code, side="left")
+            hi = np.searchsorted(sorted_codes, code, side="right")
+            found.append(order[lo:hi])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+
+def service_neighbors(matrix: InteractionMatrix, k: int = 10) -> Dict[str, List[Tuple[str, float]]]:
+    """Serviços mais similares a cada serviço (cosseno entre colunas de notas).
+
+    Os pares são gerados por usuário, agrupando usuários com o mesmo número
+    de interações para montar todos os pares de uma vez.
+    """
+    rows, cols, data = matrix.to_coo()
+    n_services = len(matrix.services)
+    if cols.size == 0:
+        return {}
+    norms = np.sqrt(np.bincount(cols, weights=data * data, minlength=n_services))
+
+    # Usuários com histórico enorme: só as interações de maior nota
+    order = np.lexsort((-data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    lengths = np.diff(np.r_[starts, rows.size])
+    lengths = np.minimum(lengths, MAX_ITEMS_PER_USER)
+
+    pair_keys, pair_values = [], []
+    for length in np.unique(lengths[lengths > 1]).tolist():
+        group = starts[lengths == length]
+        positions = group[:, None] + np.arange(length)
+        first, second = np.nonzero(~np.eye(length, dtype=bool))
+        a, b = cols[positions][:, first], cols[positions][:, second]
+        pair_keys.append((a * n_services + b).ravel())
+        pair_values.append((data[positions][:, first] * data[positions][:, second]).ravel())
+    if not pair_keys:
+        return {}
+
+    keys, inverse = np.unique(np.concatenate(pair_keys), return_inverse=True)
+    dots = np.bincount(inverse, weights=np.concatenate(pair_values))
+    source, target = keys // n_services, keys % n_services
+    similarity = dots / (norms[source] * norms[target])
+
+    # Agrupar por serviço de origem, maior similaridade primeiro
+    order = np.lexsort((target, -similarity, source))
+    source, target, similarity = source[order], target[order], similarity[order]
+    group_starts = np.flatnonzero(np.r_[True, source[1:] != source[:-1]])
+    group_ends = np.r_[group_starts[1:], source.size]
+
+    ids = list(matrix.services)
+    return {
+        ids[source[lo]]: [(ids[t], float(s)) for t, s in zip(target[lo:min(hi, lo + k)], similarity[lo:min(hi, lo + k)])]
+        for lo, hi in zip(group_starts.tolist(), group_ends.tolist())
+    }
+
+
+class EngineLoader:
+    """Monta um RecommendationEngine a partir de documentos do banco.
+
+    Usado pelo job (documentos lidos do MongoDB) e pela avaliação offline
+    (documentos de um log histórico), para que os dois vejam o mesmo motor.
+    Agendamentos devem vir antes das avaliações: a avaliação do mesmo par
+    substitui a nota implícita.
+    """
+
+    def __init__(self, store: Optional[RecommendationStore] = None):
+        # O job precisa de todos os perfis em memória: sem limite LRU
+        self.engine = RecommendationEngine(store, max_user_profiles=sys.maxsize, max_service_profiles=sys.maxsize)
+        self.categories: Dict[str, str] = {}
+        self.history: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    async def add_services(self, services: List[Dict[str, Any]], locations: Dict[str, Dict[str, float]]):
+        """Perfis de serviço; `locations` traz lat/lng por prestador."""
+        prices = np.array([float(service.get("preco_por_hora") or 0.0) for service in services])
+        low, high = np.quantile(prices, [1 / 3, 2 / 3]) if prices.size else (0.0, 0.0)
+        max_reviews = max([int(service.get("total_avaliacoes") or 0) for service in services] or [0])
+        for service, price in zip(services, prices.tolist()):
+            reviews = int(service.get("total_avaliacoes") or 0)
+            profile = await self.engine.build_service_profile(service["id"], {
+                "category": service.get("categoria", "unknown"),
+                "rating": float(service.get("media_avaliacoes") or 0.0) / 5,
+                "price_range": "low" if price <= low else "high" if price > high else "medium",
+                "popularity": math.log1p(reviews) / math.log1p(max_reviews) if max_reviews else 0.0,
+            })
+            profile.location = locations.get(service.get("prestador_id"))
+            self.categories[service["id"]] = profile.category
+
+    async def add_booking(self, booking: Dict[str, Any]):
+        user_id, service_id = booking.get("morador_id"), booking.get("service_id")
+        if not user_id or service_id not in self.categories:
+            return
+        await self.engine.update_interaction(
+            user_id, service_id, BOOKING_RATING, naive_utc(booking.get("created_at"))
+        )
+        self.history[user_id].append({"category": self.categories[service_id], "type": "booking"})
+
+    async def add_review(self, review: Dict[str, Any]):
+        user_id = review.get("morador_id") or review.get("reviewer_id")
+        if not user_id or review.get("rating") is None or review.get("service_id") not in self.categories:
+            return
+        await self.engine.update_interaction(
+            user_id, review["service_id"], float(review["rating"]) / 5, naive_utc(review.get("created_at"))
+        )
+
+    async def finish(self, residents: Dict[str, Dict[str, Any]]) -> RecommendationEngine:
+        """Perfis de usuário a partir do histórico; `residents` traz lat/lng por usuário."""
+        for user_id, interactions in self.history.items():
+            profile = await self.engine.build_user_profile(user_id, interactions)
+            user = residents.get(user_id) or {}
+            if user.get("latitude") is not None and user.get("longitude") is not None:
+                profile.location = {"lat": user["latitude"], "lng": user["longitude"]}
+        return self.engine
+
+
+async def load_engine(database, store: Optional[RecommendationStore] = None) -> RecommendationEngine:
+    """Montar o motor a partir de serviços, usuários, agendamentos e avaliações."""
+    loader = EngineLoader(store)
+
+    services = await database.services.find(
+        {"status": ServiceStatus.DISPONIVEL.value},
+        {"_id": 0, "id": 1, "prestador_id": 1, "categoria": 1, "preco_por_hora": 1,
+         "media_avaliacoes": 1, "total_avaliacoes": 1},
+    ).to_list(length=None)
+    provider_ids = list({service.get("prestador_id") for service in services if service.get("prestador_id")})
+    locations = {
+        user["id"]: {"lat": user["latitude"], "lng": user["longitude"]}
+        async for user in database.users.find(
+            {"id": {"$in": provider_ids}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+            {"_id": 0, "id": 1, "latitude": 1, "longitude": 1},
+        )
+    }
+    await loader.add_services(services, locations)
+
+    async for booking in database.bookings.find(
+        {"status": {"$ne": BookingStatus.CANCELADO.value}},
+        {"_id": 0, "morador_id": 1, "service_id": 1, "created_at": 1},
+    ):
+        await loader.add_booking(booking)
+
+    async for review in database.reviews.find(
+        {"rating": {"$ne": None}, "service_id": {"$in": list(loader.categories)}},
+        {"_id": 0, "morador_id": 1, "reviewer_id": 1, "service_id": 1, "rating": 1, "created_at": 1},
+    ):
+        await loader.add_review(review)
+
+    residents = {
+        user["id"]: user
+        async for user in database.users.find(
+            {"id": {"$in": list(loader.history)}}, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
+        )
+    }
+    return await loader.finish(residents)
+
+
+class RecommendationIndexJob:
+    """Job offline que materializa vizinhos e listas de recomendação.
+
+    Grava, com o mesmo `run_id`:
+        - similar_users: top-k usuários similares por usuário
+        - similar_services: top-k serviços similares por serviço
+        - user_recommendations: lista de `store.list_size` recomendações por usuário
+
+    Com `approximate=True` os similares de cada usuário são procurados só
+    entre os candidatos do PreferenceLSH, em vez de todos os usuários.
+    """
+
+    def __init__(self, store: RecommendationStore, neighbors: int = 10):
+        self.store = store
+        self.neighbors = neighbors
+
+    async def run(
+        self,
+        database,
+        approximate: bool = False,
+        batch_size: int = 500,
+        engine: Optional[RecommendationEngine] = None,
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        await self.store.ensure_indexes(database)
+        engine = engine or await load_engine(database, self.store)
+        users = engine._compile_users()
+        lsh = PreferenceLSH().fit(users['preferences']) if approximate and users['ids'] else None
+
+        written = {SIMILAR_USERS: 0, USER_RECOMMENDATIONS: 0, SIMILAR_SERVICES: 0}
+        neighbor_rows: List[Tuple[str, List[Dict[str, Any]]]] = []
+        recommendation_rows: List[Tuple[str, List[Dict[str, Any]]]] = []
+
+        async def flush():
+            written[SIMILAR_USERS] += await self.store.save_many(
+                database, SIMILAR_USERS, neighbor_rows, run_id, key="neighbors"
+            )
+            written[USER_RECOMMENDATIONS] += await self.store.save_many(
+                database, USER_RECOMMENDATIONS, recommendation_rows, run_id
+            )
+            neighbor_rows.clear()
+            recommendation_rows.clear()
+
+        for row, user_id in enumerate(list(users['ids'])):
+            if user_id is None:  # Lápide de perfil removido
+                continue
+            candidates = lsh.candidates(row) if lsh is not None else None
+            similar = engine._find_similar_users(user_id, self.neighbors, candidates)
+            ranked = engine.rank(user_id, self.store.list_size, similar=similar)
+            neighbor_rows.append((user_id, [{"user_id": other, "score": score} for other, score in similar]))
+            recommendation_rows.append((user_id, [asdict(r) for r in ranked]))
+            if len(recommendation_rows) >= batch_size:
+                await flush()
+        await flush()
+
+        service_rows = [
+            (service_id, [{"service_id": other, "score": score} for other, score in neighbors])
+            for service_id, neighbors in service_neighbors(engine.interaction_matrix, self.neighbors).items()
+        ]
+        for lo in range(0, len(service_rows), batch_size):
+            written[SIMILAR_SERVICES] += await self.store.save_many(
+                database, SIMILAR_SERVICES, service_rows[lo:lo + batch_size], run_id, key="neighbors"
+            )
+        removed = await self.store.prune(database, run_id)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Recomendações materializadas ({run_id}): {written}, {removed} vizinhos antigos removidos em {elapsed:.1f}s")
+        return {"run_id": run_id, "written": written, "removed": removed, "seconds": round(elapsed, 2)}
+
+
+# Instância global
+recommendation_index_job = RecommendationIndexJob(recommendation_store)
@@ -0,0 +1,104 @@
+# Recomendações Materializadas - Alça Hub
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+USER_RECOMMENDATIONS = "user_recommendations"
+SIMILAR_USERS = "similar_users"
+SIMILAR_SERVICES = "similar_services"
+
+# Versão do cálculo: incrementar quando a pontuação mudar invalida todas as listas
+MODEL_VERSION = 1
+
+
+class RecommendationStore:
+    """Listas de recomendação e tabelas de vizinhos gravadas pelo job offline.
+
+    Cada documento leva `version` (versão do cálculo), `run_id` (execução do
+    job que o gerou) e `generated_at`. Uma lista é usada enquanto tiver a
+    versão atual, não passar de `max_age` e for mais nova que a última
+    interação conhecida do usuário; fora disso o motor recalcula.
+    """
+
+    def __init__(self, list_size: int = 50, max_age: timedelta = timedelta(hours=24)):
+        self.list_size = list_size
+        self.max_age = max_age
+        self.version = MODEL_VERSION
+
+    async def ensure_indexes(self, database):
+        for collection in (USER_RECOMMENDATIONS, SIMILAR_USERS, SIMILAR_SERVICES):
+            await database[collection].create_index([("run_id", ASCENDING)])
+
+    def is_fresh(self, doc: Optional[Dict[str, Any]], touched_at: Optional[datetime] = None,
+                 now: Optional[datetime] = None) -> bool:
+        """A lista materializada ainda vale?"""
+        if not doc or doc.get("version") != self.version:
+            return False
+        generated_at = doc.get("generated_at")
+        if generated_at is None:
+            return False
+        now = now or datetime.utcnow()
+        if now - generated_at > self.max_age:
+            return False
+        return touched_at is None or generated_at >= touched_at
+
+    async def get(self, database, user_id: str) -> Optional[Dict[str, Any]]:
+        return await database[USER_RECOMMENDATIONS].find_one({"_id": user_id})
+
+    def _doc(self, items: List[Dict[str, Any]], run_id: str, key: str, generated_at: datetime) -> Dict[str, Any]:
+        return {key: items, "version": self.version, "run_id": run_id, "generated_at": generated_at}
+
+    async def save(self, database, user_id: str, items: List[Dict[str, Any]], run_id: str = "online"):
+        """Gravar a lista de um usuário (recalculada na requisição)."""
+        await database[USER_RECOMMENDATIONS].replace_one(
+            {"_id": user_id},
+            self._doc(items[:self.list_size], run_id, "items", datetime.utcnow()),
+            upsert=True,
+        )
+
+    async def save_many(
+        self,
+        database,
+        collection: str,
+        rows: Iterable[Tuple[str, List[Dict[str, Any]]]],
+        run_id: str,
+        key: str = "items",
+    ) -> int:
+        """Gravar um lote de documentos (lista de recomendações ou de vizinhos)."""
+        generated_at = datetime.utcnow()
+        operations = [
+            UpdateOne({"_id": doc_id}, {"$set": self._doc(items, run_id, key, generated_at)}, upsert=True)
+            for doc_id, items in rows
+        ]
+        if not operations:
+            return 0
+        await database[collection].bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def prune(self, database, run_id: str) -> int:
+        """Apagar vizinhos de execuções anteriores (usuários e serviços que sumiram).
+
+        As listas de recomendação não são apagadas: as gravadas na
+        requisição não têm `run_id` do job e expiram por idade.
+        """
+        removed = 0
+        for collection in (SIMILAR_USERS, SIMILAR_SERVICES):
+            result = await database[collection].delete_many({"run_id": {"$ne": run_id}})
+            removed += result.deleted_count
+        return removed
+
+    async def similar_services(self, database, service_id: str) -> List[Dict[str, Any]]:
+        doc = await database[SIMILAR_SERVICES].find_one({"_id": service_id})
+        return (doc or {}).get("neighbors") or []
+
+
+# Instância global
+recommendation_store = RecommendationStore(
+    list_size=int(os.environ.get("RECOMMENDATION_LIST_SIZE", "50")),
+    max_age=timedelta(hours=float(os.environ.get("RECOMMENDATION_MAX_AGE_HOURS", "24"))),
+)
@@ -1,6 +1,11 @@
 # Análise de Sentimentos - Alça Hub
 import re
 import asyncio
+import multiprocessing
+import os
+from collections import deque
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
@@ -8,6 +13,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Palavras com acentos (\w é Unicode); pontuação e espaços são separadores
+TOKEN_RE = re.compile(r"\w+")
+
 
 @dataclass
 class SentimentResult:
@@ -20,10 +28,90 @@ class SentimentResult:
     timestamp: datetime
 
 
+class LexiconEntry:
+    """Expressão do léxico com polaridade e emoção."""
+
+    __slots__ = ("tokens", "polarity", "emotion")
+
+    def __init__(self, tokens: Tuple[str, ...]):
+        self.tokens = tokens
+        self.polarity = 0.0
+        self.emotion: Optional[str] = None
+
+
+class LexiconAutomaton:
+    """Autômato Aho-Corasick sobre palavras.
+
+    Cada expressão do léxico (uma ou mais palavras, como "não recomendo") é
+    um caminho na trie; os links de falha permitem achar todas as
+    ocorrências em uma única passada pelo texto, sem voltar. Entre
+    ocorrências sobrepostas vale a mais à esquerda e, dela, a mais longa.
+    """
+
+    def __init__(self, entries):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, LexiconEntry]]] = [[]]
+
+        for entry in entries:
+            state = 0
+            for token in entry.tokens:
+                if token not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][token] = len(self._goto) - 1
+                state = self._goto[state][token]
+            self._output[state].append((len(entry.tokens), entry))
+
+        # Links de falha em largura; saídas herdam as do estado de falha
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, tokens: List[str]) -> List[Tuple[int, LexiconEntry]]:
+        """Ocorrências (posição inicial, expressão) sem sobreposição."""
+        matches: List[Tuple[int, int, LexiconEntry]] = []
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, token in enumerate(tokens, 1):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length, entry in output[state]:
+                matches.append((end - length, -length, entry))
+
+        if len(matches) > 1:
+            matches.sort(key=itemgetter(0, 1))
+        selected: List[Tuple[int, LexiconEntry]] = []
+        covered = 0
+        for start, negative_length, entry in matches:
+            if start >= covered:
+                selected.append((start, entry))
+                covered = start - negative_length
+        return selected
+
+
 class SentimentAnalyzer:
-    """Analisador de sentimentos baseado em regras."""
+    """Analisador de sentimentos baseado em regras.
+
+    O léxico é compilado uma vez em um autômato de palavras; cada texto é
+    tokenizado com uma expressão regular e percorrido uma única vez.
+    """
     
-    def __init__(self):
+    def __init__(self, processes: int = 0, chunk_size: int = 1000):
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+
         # Dicionários de palavras para análise
         self.positive_words = {
             'excelente', 'ótimo', 'bom', 'perfeito', 'maravilhoso', 'fantástico',
@@ -59,8 +147,39 @@ class SentimentAnalyzer:
             'nojo': {'enojado', 'repugnado', 'envergonhado', 'constrangido'}
         }
     
-    async def analyze_text(self, text: str) -> SentimentResult:
-        """Analisar sentimento de um texto."""
+        self._compile()
+
+    def _compile(self):
+        """Compilar o léxico em um único autômato e no conjunto de palavras neutras."""
+        entries: Dict[Tuple[str, ...], LexiconEntry] = {}
+
+        def entry(phrase: str) -> LexiconEntry:
+            tokens = tuple(TOKEN_RE.findall(phrase.lower()))
+            return entries.setdefault(tokens, LexiconEntry(tokens))
+
+        for phrase in self.positive_words:
+            entry(phrase).polarity = 1.0
+        for phrase in self.negative_words:
+            entry(phrase).polarity = -1.0
+        for emotion, words in self.emotion_words.items():
+            for phrase in words:
+                entry(phrase).emotion = emotion
+
+        self.automaton = LexiconAutomaton(entries.values())
+        # Palavras que nunca viram palavra-chave
+        self._lexicon_words = frozenset(
+            word for word in self.positive_words | self.negative_words
+            | set(self.intensifiers) | self.negation_words
+            if " " not in word
+        )
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        """Minúsculas e palavras (letras acentuadas incluídas) em uma passada."""
+        return TOKEN_RE.findall(text.lower())
+
+    def analyze(self, text: str) -> SentimentResult:
+        """Analisar sentimento de um texto (síncrono, sem I/O)."""
         if not text or not text.strip():
             return SentimentResult(
                 text=text,
@@ -70,98 +189,43 @@ class SentimentAnalyzer:
                 keywords=[],
                 timestamp=datetime.utcnow()
             )
-        
-        # Limpar e normalizar texto
-        cleaned_text = self._clean_text(text)
-        
-        # Calcular scores
-        positive_score = self._calculate_positive_score(cleaned_text)
-        negative_score = self._calculate_negative_score(cleaned_text)
-        
-        # Determinar sentimento
-        sentiment, confidence = self._determine_sentiment(positive_score, negative_score)
-        
-        # Extrair emoções
-        emotions = self._extract_emotions(cleaned_text)
-        
-        # Extrair palavras-chave
-        keywords = self._extract_keywords(cleaned_text)
-        
+
+        tokens = self._tokenize(text)
+
+        # Polaridade acumulada: positiva soma no score positivo, negativa no negativo
+        polarity = 0.0
+        emotions = {emotion: 0.0 for emotion in self.emotion_words.keys()}
+        for start, match in self.automaton.find(tokens):
+            score = match.polarity
+            if start > 0 and score:
+                previous = tokens[start - 1]
+                # Intensificador ou negação na palavra anterior à expressão
+                score *= self.intensifiers.get(previous, 1.0)
+                if previous in self.negation_words:
+                    score = -score
+            polarity += score
+            if match.emotion:
+                emotions[match.emotion] += 1.0
+
+        sentiment, confidence = self._determine_sentiment(max(0.0, polarity), max(0.0, -polarity))
+
+        total_emotions = sum(emotions.values())
+        if total_emotions > 0:
+            for emotion in emotions:
+                emotions[emotion] /= total_emotions
+
         return SentimentResult(
             text=text,
             sentiment=sentiment,
             confidence=confidence,
             emotions=emotions,
-            keywords=keywords,
+            keywords=self._extract_keywords(tokens),
             timestamp=datetime.utcnow()
         )
-    
-    def _clean_text(self, text: str) -> str:
-        """Limpar e normalizar texto."""
-        # Converter para minúsculas
-        text = text.lower()
-        
-        # Remover caracteres especiais, mas manter acentos
-        text = re.sub(r'[^\w\sáàâãéèêíìîóòôõúùûç]', ' ', text)
-        
-        # Remover espaços extras
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text.strip()
-    
-    def _calculate_positive_score(self, text: str) -> float:
-        """Calcular score positivo."""
-        words = text.split()
-        score = 0.0
-        
-        for i, word in enumerate(words):
-            word_score = 0.0
-            
-            # Verificar se é palavra positiva
-            if word in self.positive_words:
-                word_score = 1.0
-            elif word in self.negative_words:
-                word_score = -1.0
-            
-            # Verificar intensificadores
-            if i > 0 and words[i-1] in self.intensifiers:
-                intensity = self.intensifiers[words[i-1]]
-                word_score *= intensity
-            
-            # Verificar negação
-            if i > 0 and words[i-1] in self.negation_words:
-                word_score *= -1.0
-            
-            score += word_score
-        
-        return max(0, score)
-    
-    def _calculate_negative_score(self, text: str) -> float:
-        """Calcular score negativo."""
-        words = text.split()
-        score = 0.0
-        
-        for i, word in enumerate(words):
-            word_score = 0.0
-            
-            # Verificar se é palavra negativa
-            if word in self.negative_words:
-                word_score = 1.0
-            elif word in self.positive_words:
-                word_score = -1.0
-            
-            # Verificar intensificadores
-            if i > 0 and words[i-1] in self.intensifiers:
-                intensity = self.intensifiers[words[i-1]]
-                word_score *= intensity
-            
-            # Verificar negação
-            if i > 0 and words[i-1] in self.negation_words:
-                word_score *= -1.0
-            
-            score += word_score
-        
-        return max(0, score)
+
+    async def analyze_text(self, text: str) -> SentimentResult:
+        """Analisar sentimento de um texto."""
+        return self.analyze(text)
     
     def _determine_sentiment(self, positive_score: float, negative_score: float) -> Tuple[str, float]:
         """Determinar sentimento e confiança."""
@@ -182,53 +246,53 @@ class SentimentAnalyzer:
         
         return sentiment, confidence
     
-    def _extract_emotions(self, text: str) -> Dict[str, float]:
-        """Extrair emoções do texto."""
-        words = text.split()
-        emotions = {emotion: 0.0 for emotion in self.emotion_words.keys()}
-        
-        for word in words:
-            for emotion, emotion_words in self.emotion_words.items():
-                if word in emotion_words:
-                    emotions[emotion] += 1.0
-        
-        # Normalizar
-        total_emotions = sum(emotions.values())
-        if total_emotions > 0:
-            for emotion in emotions:
-                emotions[emotion] /= total_emotions
-        
-        return emotions
-    
-    def _extract_keywords(self, text: str) -> List[str]:
-        """Extrair palavras-chave do texto."""
-        words = text.split()
-        
-        # Filtrar palavras importantes
-        keywords = []
-        for word in words:
-            if (len(word) > 3 and 
-                word not in self.positive_words and 
-                word not in self.negative_words and
-                word not in self.intensifiers and
-                word not in self.negation_words):
-                keywords.append(word)
-        
-        # Retornar as mais frequentes
-        word_count = {}
-        for word in keywords:
-            word_count[word] = word_count.get(word, 0) + 1
-        
-        sorted_keywords = sorted(word_count.items(), key=lambda x: x[1], reverse=True)
-        return [word for word, count in sorted_keywords[:5]]
+    def _extract_keywords(self, tokens: List[str]) -> List[str]:
+        """Extrair palavras-chave (as 5 mais frequentes fora do léxico)."""
+        word_count: Dict[str, int] = {}
+        lexicon = self._lexicon_words
+        for word in tokens:
+            if len(word) > 3 and word not in lexicon:
+                word_count[word] = word_count.get(word, 0) + 1
+        # Ordenação estável: empates ficam na ordem de aparição
+        return sorted(word_count, key=word_count.__getitem__, reverse=True)[:5]
+
+    def analyze_many(self, texts: List[str]) -> List[SentimentResult]:
+        """Analisar vários textos no processo atual."""
+        return [self.analyze(text) for text in texts]
     
     async def analyze_batch(self, texts: List[str]) -> List[SentimentResult]:
-        """Analisar múltiplos textos."""
-        results = []
-        for text in texts:
-            result = await self.analyze_text(text)
-            results.append(result)
-        return results
+        """Analisar múltiplos textos.
+
+        O lote é dividido em blocos de `chunk_size` analisados no pool de
+        processos, sem ocupar o loop de eventos. Com `processes=0` roda no
+        processo atual.
+        """
+        texts = list(texts)
+        if self.processes <= 0 or not texts:
+            return self.analyze_many(texts)
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, analyze_in_worker, chunk) for chunk in chunks)
+        )
+        return [result for chunk_results in results for result in chunk_results]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Pool de processos criado no primeiro lote grande."""
+        if self._pool is None:
+            # spawn: filhos não herdam threads nem conexões do servidor
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def shutdown(self):
+        """Encerrar o pool de processos."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
     
     async def get_sentiment_summary(self, results: List[SentimentResult]) -> Dict[str, Any]:
         """Obter resumo dos sentimentos."""
@@ -272,3 +336,21 @@ class SentimentAnalyzer:
             'top_emotions': [{'emotion': emotion, 'score': score} for emotion, score in top_emotions],
             'top_keywords': [{'keyword': keyword, 'count': count} for keyword, count in top_keywords]
         }
+
+
+# Analisador de cada processo do pool (criado no primeiro bloco recebido)
+_worker_analyzer: Optional[SentimentAnalyzer] = None
+
+
+def analyze_in_worker(texts: List[str]) -> List[SentimentResult]:
+    """Analisar um bloco de textos dentro de um processo do pool."""
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        _worker_analyzer = SentimentAnalyzer()
+    return _worker_analyzer.analyze_many(texts)
+
+
+# Instância global
+sentiment_analyzer = SentimentAnalyzer(
+    processes=int(os.environ.get("SENTIMENT_PROCESSES", str(min(4, os.cpu_count() or 1)))),
+)
@@ -0,0 +1,225 @@
+# Consolidação de Sentimento por Prestador e Serviço - Alça Hub
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "sentiment_rollups"
+
+SENTIMENTS = ("positive", "negative", "neutral")
+
+# Tentativas de gravação otimista antes de desistir de um lote
+MAX_RETRIES = 5
+
+# (tipo, id) de um documento consolidado: ("provider", id) ou ("service", id)
+RollupKey = Tuple[str, str]
+
+
+class SpaceSaving:
+    """Heavy hitters com memória limitada (algoritmo Space-Saving).
+
+    Guarda no máximo `capacity` itens com contagem e erro. Item novo com o
+    esboço cheio substitui o de menor contagem e herda essa contagem como
+    erro, então a contagem real de cada item fica entre `count - error` e
+    `count`, e todo item com frequência acima de total/capacity está no
+    esboço.
+    """
+
+    def __init__(self, capacity: int, counts: Optional[Dict[str, List[float]]] = None):
+        self.capacity = capacity
+        self.counts: Dict[str, List[float]] = counts if counts is not None else {}
+
+    def add(self, item: str, weight: float = 1.0):
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = [weight, 0.0]
+        else:
+            victim = min(self.counts, key=lambda key: self.counts[key][0])
+            floor = self.counts.pop(victim)[0]
+            self.counts[item] = [floor + weight, floor]
+
+    def remove(self, item: str, weight: float = 1.0):
+        """Descontar ocorrência (avaliação reanalisada ou apagada), se rastreada."""
+        entry = self.counts.get(item)
+        if entry is None:
+            return
+        entry[0] -= weight
+        entry[1] = min(entry[1], entry[0])
+        if entry[0] <= 0:
+            del self.counts[item]
+
+    def top(self, n: int) -> List[Tuple[str, float, float]]:
+        """(item, contagem, erro) dos `n` mais frequentes."""
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, count, error) for item, (count, error) in ranked[:n]]
+
+    def to_doc(self) -> List[Dict[str, Any]]:
+        # Lista em vez de objeto: palavras não viram nomes de campo no MongoDB
+        return [{"k": item, "c": count, "e": error} for item, (count, error) in self.counts.items()]
+
+    @classmethod
+    def from_doc(cls, capacity: int, doc: Optional[List[Dict[str, Any]]]) -> "SpaceSaving":
+        return cls(capacity, {row["k"]: [row["c"], row["e"]] for row in doc or []})
+
+
+class RollupDelta:
+    """Variação acumulada de um lote para um prestador ou serviço."""
+
+    __slots__ = ("counts", "emotions", "keywords")
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.emotions: Dict[str, float] = {}
+        self.keywords: List[Tuple[str, int]] = []
+
+    def add(self, sentiment: Dict[str, Any], sign: int):
+        label = sentiment.get("label")
+        if label in SENTIMENTS:
+            self.counts[label] = self.counts.get(label, 0) + sign
+        for emotion, score in (sentiment.get("emotions") or {}).items():
+            self.emotions[emotion] = self.emotions.get(emotion, 0.0) + sign * score
+        self.keywords.extend((keyword, sign) for keyword in sentiment.get("keywords") or [])
+
+
+def rollup_keys(review: Dict[str, Any]) -> List[RollupKey]:
+    """Prestador e serviço avaliados (avaliações de cliente não entram)."""
+    keys: List[RollupKey] = []
+    provider_id = review.get("prestador_id")
+    if not provider_id and review.get("type") != "customer":
+        provider_id = review.get("reviewee_id")
+    if provider_id:
+        keys.append(("provider", provider_id))
+    if review.get("service_id"):
+        keys.append(("service", review["service_id"]))
+    return keys
+
+
+class SentimentRollups:
+    """Sentimento consolidado por prestador e por serviço.
+
+    Cada documento guarda contagem por sentimento, soma das emoções e um
+    esboço Space-Saving das palavras-chave, atualizados a cada avaliação
+    analisada (e descontados quando ela é reanalisada ou apagada). A leitura
+    é um find_one pelo `_id`, sem passar pelas avaliações.
+
+    Contadores usam `$inc`; o esboço exige ler-alterar-gravar, então a
+    gravação é condicionada à versão lida e repetida em caso de corrida
+    entre processos.
+    """
+
+    def __init__(self, keyword_capacity: int = 64, collection: str = COLLECTION):
+        self.keyword_capacity = keyword_capacity
+        self.collection = collection
+
+    def _rollups(self, database):
+        return database[self.collection]
+
+    @staticmethod
+    def doc_id(key: RollupKey) -> str:
+        return f"{key[0]}:{key[1]}"
+
+    async def ensure_indexes(self, database):
+        await self._rollups(database).create_index([("kind", ASCENDING), ("total", ASCENDING)])
+
+    @staticmethod
+    def deltas(
+        changes: Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]
+    ) -> Dict[RollupKey, RollupDelta]:
+        """Variações por prestador/serviço.
+
+        Args:
+            changes: (avaliação, sentimento anterior, sentimento novo) por avaliação
+        """
+        result: Dict[RollupKey, RollupDelta] = {}
+        for review, before, after in changes:
+            for key in rollup_keys(review):
+                for sentiment, sign in ((before, -1), (after, 1)):
+                    if sentiment:
+                        result.setdefault(key, RollupDelta()).add(sentiment, sign)
+        return result
+
+    async def apply(self, database, deltas: Dict[RollupKey, RollupDelta]) -> int:
+        """Gravar variações; retorna quantos documentos foram atualizados."""
+        updated = 0
+        for key, delta in deltas.items():
+            if await self._apply_one(database, key, delta):
+                updated += 1
+            else:
+                logger.warning(f"Consolidação de sentimento de {self.doc_id(key)} não gravada após {MAX_RETRIES} tentativas")
+        return updated
+
+    async def _apply_one(self, database, key: RollupKey, delta: RollupDelta) -> bool:
+        rollups = self._rollups(database)
+        doc_id = self.doc_id(key)
+        increments: Dict[str, Any] = {f"counts.{label}": n for label, n in delta.counts.items() if n}
+        total = sum(delta.counts.values())
+        if total:
+            increments["total"] = total
+        for emotion, score in delta.emotions.items():
+            if score:
+                increments[f"emotions.{emotion}"] = score
+        increments["version"] = 1
+
+        for _ in range(MAX_RETRIES):
+            current = await rollups.find_one({"_id": doc_id}, {"keywords": 1, "version": 1})
+            sketch = SpaceSaving.from_doc(self.keyword_capacity, (current or {}).get("keywords"))
+            for keyword, sign in delta.keywords:
+                if sign > 0:
+                    sketch.add(keyword)
+                else:
+                    sketch.remove(keyword)
+
+            update = {
+                "$inc": increments,
+                "$set": {"keywords": sketch.to_doc(), "updated_at": datetime.utcnow()},
+            }
+            try:
+                if current is None:
+                    await rollups.insert_one(
+                        {"_id": doc_id, "kind": key[0], "target_id": key[1], "version": 0}
+                    )
+                    current = {"version": 0}
+            except DuplicateKeyError:
+                continue
+            result = await rollups.update_one({"_id": doc_id, "version": current.get("version", 0)}, update)
+            if result.matched_count:
+                return True
+        return False
+
+    async def get(self, database, kind: str, target_id: str) -> Optional[Dict[str, Any]]:
+        return await self._rollups(database).find_one({"_id": self.doc_id((kind, target_id))})
+
+    def summary(self, doc: Optional[Dict[str, Any]], top_keywords: int = 10) -> Dict[str, Any]:
+        """Resumo no formato de SentimentAnalyzer.get_sentiment_summary."""
+        doc = doc or {}
+        total = int(doc.get("total") or 0)
+        counts = doc.get("counts") or {}
+        emotions = sorted((doc.get("emotions") or {}).items(), key=lambda kv: kv[1], reverse=True)
+        sketch = SpaceSaving.from_doc(self.keyword_capacity, doc.get("keywords"))
+        return {
+            "total_analyses": total,
+            "sentiment_distribution": {
+                label: (counts.get(label, 0) / total if total else 0.0) for label in SENTIMENTS
+            },
+            "top_emotions": [
+                {"emotion": emotion, "score": score} for emotion, score in emotions[:3] if score > 0
+            ],
+            "top_keywords": [
+                {"keyword": keyword, "count": int(count), "error": int(error)}
+                for keyword, count, error in sketch.top(top_keywords)
+            ],
+            "updated_at": doc.get("updated_at"),
+        }
+
+
+# Instância global
+sentiment_rollups = SentimentRollups(
+    keyword_capacity=int(os.environ.get("SENTIMENT_KEYWORD_CAPACITY", "64")),
+)
@@ -0,0 +1,204 @@
+# Worker de Sentimento de Avaliações - Alça Hub
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from pymongo import UpdateOne
+
+from ai.sentiment_analysis import SentimentAnalyzer, SentimentResult, sentiment_analyzer
+from ai.sentiment_rollups import SentimentRollups, sentiment_rollups
+
+logger = logging.getLogger(__name__)
+
+# Marcador de parada colocado no fim da fila
+_STOP = object()
+
+# Campos lidos para descontar o sentimento anterior e achar prestador/serviço
+REVIEW_PROJECTION = {
+    "_id": 1, "sentiment": 1, "prestador_id": 1, "reviewee_id": 1, "service_id": 1, "type": 1,
+}
+
+
+def review_text(review: Dict[str, Any]) -> str:
+    """Texto analisado de uma avaliação (/reviews ou rotas legadas)."""
+    parts = [review.get("title"), review.get("comment"), review.get("comentario")]
+    return " ".join(part for part in parts if part)
+
+
+def sentiment_fields(result: SentimentResult) -> Dict[str, Any]:
+    """Campos gravados na avaliação."""
+    return {
+        "label": result.sentiment,
+        "confidence": round(result.confidence, 4),
+        "emotions": {emotion: score for emotion, score in result.emotions.items() if score},
+        "keywords": result.keywords,
+        "analyzed_at": result.timestamp,
+    }
+
+
+class SentimentWorker:
+    """Calcula o sentimento de avaliações fora do caminho da requisição.
+
+    As rotas só enfileiram (`submit`, sem await); uma tarefa em segundo
+    plano junta até `batch_size` avaliações ou espera `flush_interval`
+    segundos, analisa o lote (no pool de processos quando grande), grava o
+    resultado em `reviews.sentiment` com um bulk_write e atualiza as
+    consolidações por prestador e serviço. Com a fila cheia a
+    avaliação é descartada e recuperada pelo `backfill` do próximo startup.
+    """
+
+    def __init__(
+        self,
+        analyzer: SentimentAnalyzer,
+        rollups: Optional[SentimentRollups] = None,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+    ):
+        self.analyzer = analyzer
+        self.rollups = rollups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        self.processed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, database):
+        """Iniciar a tarefa de segundo plano no loop atual."""
+        if self.running:
+            return
+        self._db = database
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Processar o que está na fila e encerrar."""
+        if self._task is None:
+            return
+        if self.running:
+            # Marcador no fim da fila: o que já foi enfileirado é processado antes
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+        self.analyzer.shutdown()
+
+    def submit(self, review_id: Any, review: Dict[str, Any]) -> bool:
+        """Enfileirar avaliação para análise; nunca bloqueia."""
+        if not self.running:
+            return False
+        text = review_text(review)
+        if not text:
+            return False
+        try:
+            self._queue.put_nowait((review_id, text))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def backfill(self, limit: int = 5000) -> int:
+        """Enfileirar avaliações com texto ainda sem sentimento."""
+        if not self.running:
+            return 0
+        cursor = self._db.reviews.find(
+            {
+                "sentiment": {"$exists": False},
+                "$or": [{"comment": {"$nin": [None, ""]}}, {"comentario": {"$nin": [None, ""]}}],
+            },
+            {"_id": 1, "title": 1, "comment": 1, "comentario": 1},
+        ).limit(limit)
+        queued = 0
+        async for review in cursor:
+            if not self.submit(review["_id"], review):
+                break
+            queued += 1
+        return queued
+
+    async def _next(self, timeout: float) -> Any:
+        """Próximo item da fila, sem esperar se já houver um."""
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await self._next(remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"Erro ao analisar sentimento de avaliações: {e}")
+
+    async def _process(self, batch: List[Tuple[Any, str]]) -> int:
+        """Analisar lote, gravar nas avaliações e atualizar as consolidações."""
+        # Avaliação editada várias vezes no mesmo lote: vale o último texto
+        latest = dict(batch)
+        ids = list(latest)
+        results = await self.analyzer.analyze_batch([latest[review_id] for review_id in ids])
+        fields = [sentiment_fields(result) for result in results]
+
+        reviews = {}
+        if self.rollups is not None:
+            async for review in self._db.reviews.find({"_id": {"$in": ids}}, REVIEW_PROJECTION):
+                reviews[review["_id"]] = review
+
+        updates = [
+            UpdateOne({"_id": review_id}, {"$set": {"sentiment": sentiment}})
+            for review_id, sentiment in zip(ids, fields)
+        ]
+        await self._db.reviews.bulk_write(updates, ordered=False)
+        self.processed += len(updates)
+
+        if self.rollups is not None:
+            # O sentimento anterior (reanálise) é descontado antes de somar o novo
+            changes = [
+                (reviews[review_id], reviews[review_id].get("sentiment"), sentiment)
+                for review_id, sentiment in zip(ids, fields)
+                if review_id in reviews
+            ]
+            await self.rollups.apply(self._db, self.rollups.deltas(changes))
+        return len(updates)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do worker."""
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "processes": self.analyzer.processes,
+        }
+
+
+# Instância global
+sentiment_worker = SentimentWorker(
+    sentiment_analyzer,
+    sentiment_rollups,
+    batch_size=int(os.environ.get("SENTIMENT_BATCH_SIZE", "256")),
+    flush_interval=float(os.environ.get("SENTIMENT_FLUSH_INTERVAL", "1.0")),
+)
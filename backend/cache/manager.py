@@ -1,14 +1,20 @@
 # Gerenciador de Cache - Alça Hub
 import asyncio
+import heapq
 import json
 import hashlib
-from typing import Any, Optional, Dict, List, Callable
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Optional, Dict, List, Callable, Set, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Contadores mantidos por família de chave
+FAMILY_COUNTERS = ("hits", "misses", "l2_hits", "evictions", "expirations")
+
 
 @dataclass
 class CacheEntry:
@@ -21,14 +27,88 @@ class CacheEntry:
     last_accessed: datetime = None
 
 
+class FrequencySketch:
+    """Frequência aproximada de acesso por chave (Count-Min com envelhecimento).
+
+    Usado na admissão TinyLFU: contadores de 4 linhas limitados a 15 e
+    divididos por dois a cada `sample_size` registros, para que chaves
+    populares no passado percam peso.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+    SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, capacity: int):
+        width = 64
+        while width < 4 * capacity:
+            width <<= 1
+        self.shift = 32 - width.bit_length() + 1
+        self.table = [bytearray(width) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * max(capacity, 16)
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        # Hash estável entre processos; cada linha usa os bits altos de h * semente
+        h = zlib.crc32(key.encode())
+        return [((h * seed) & 0xFFFFFFFF) >> self.shift for seed in self.SEEDS]
+
+    def increment(self, key: str):
+        for row, index in zip(self.table, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def frequency(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self.table, self._indexes(key)))
+
+    def _age(self):
+        for row in self.table:
+            row[:] = bytes(count >> 1 for count in row)
+        self.additions //= 2
+
+
 class CacheManager:
-    """Gerenciador de cache inteligente."""
+    """Gerenciador de cache inteligente.
+    
+    LRU em um OrderedDict (acesso move a chave para o fim, remoção pega o
+    início, ambos O(1)) e expiração por um heap de vencimentos: o que
+    venceu sai no próximo `set` e na limpeza periódica, que dorme até o
+    próximo vencimento em vez de varrer o cache. Com `admission=True`,
+    uma chave nova só entra no cache cheio se for acessada com mais
+    frequência que a candidata à remoção (TinyLFU), o que protege as
+    chaves populares de varreduras de chaves usadas uma vez.
+    
+    Acertos, erros, remoções por LRU e expirações são contados por família
+    de chave (prefixo antes do primeiro ":").
+    
+    Com um segundo nível (`attach_l2`, Redis), erros do L1 são buscados no
+    L2, gravações vão para os dois e remoções são publicadas para que o L1
+    dos outros workers descarte as mesmas chaves. Gravações não são
+    publicadas: quem altera um valor deve invalidá-lo (como as rotas já
+    fazem) para os outros workers relerem do L2. Sem L2, só o L1.
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
-        self.cache: Dict[str, CacheEntry] = {}
+    Famílias marcadas com `keep_local` nunca vão para o L2 nem publicam
+    remoções: servem para valores calculados a partir de estado do próprio
+    worker, que cada worker invalida ao aplicar a mudança.
+    """
+    
+    def __init__(self, max_size: int = 1000, default_ttl: int = 300, admission: bool = False):
+        self.cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
         self.max_size = max_size
         self.default_ttl = default_ttl
         self.cleanup_task = None
+        # Vencimentos (expires_at, chave); itens de chaves regravadas ou removidas são ignorados
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self.sketch = FrequencySketch(max_size) if admission else None
+        self.family_stats: Dict[str, Dict[str, int]] = {}
+        self.rejections = 0
+        self.l2 = None
+        self.local_families: Set[str] = set()
+        # Tratadores de mensagens próprias das famílias (op -> handler)
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {}
         self._start_cleanup_task()
     
     def _start_cleanup_task(self):
@@ -42,26 +122,46 @@ class CacheManager:
                 pass
     
     async def _cleanup_expired(self):
-        """Limpar entradas expiradas."""
+        """Limpar entradas expiradas (dorme até o próximo vencimento, no máximo 60s)."""
         while True:
             try:
-                await asyncio.sleep(60)  # Limpar a cada minuto
-                current_time = datetime.utcnow()
-                expired_keys = []
-                
-                for key, entry in self.cache.items():
-                    if entry.expires_at and entry.expires_at <= current_time:
-                        expired_keys.append(key)
+                delay = 60.0
+                if self._expiry_heap:
+                    delay = (self._expiry_heap[0][0] - datetime.utcnow()).total_seconds()
+                    delay = min(max(delay, 1.0), 60.0)
+                await asyncio.sleep(delay)
                 
-                for key in expired_keys:
-                    del self.cache[key]
-                
-                if expired_keys:
-                    logger.info(f"Removidas {len(expired_keys)} entradas expiradas do cache")
+                removed = self._expire(datetime.utcnow())
+                if removed:
+                    logger.info(f"Removidas {removed} entradas expiradas do cache")
                 
             except Exception as e:
                 logger.error(f"Erro na limpeza do cache: {e}")
     
+    def _expire(self, now: datetime) -> int:
+        """Remover as entradas vencidas a partir do topo do heap."""
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                del self.cache[key]
+                self._count(key, "expirations")
+                removed += 1
+        return removed
+    
+    def _schedule(self, entry: CacheEntry):
+        """Registrar vencimento; reconstruir o heap quando acumular itens obsoletos."""
+        if entry.expires_at is None:
+            return
+        heapq.heappush(self._expiry_heap, (entry.expires_at, entry.key))
+        if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+            self._expiry_heap = [
+                (item.expires_at, key) for key, item in self.cache.items() if item.expires_at is not None
+            ]
+            heapq.heapify(self._expiry_heap)
+    
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Gerar chave de cache."""
         key_data = f"{prefix}:{':'.join(map(str, args))}"
@@ -71,64 +171,156 @@ class CacheManager:
         
         return f"{prefix}:{hashlib.md5(key_data.encode()).hexdigest()}"
     
+    @staticmethod
+    def key_family(key: str) -> str:
+        """Família da chave (prefixo antes do primeiro ":")."""
+        return key.split(":", 1)[0]
+    
+    def _count(self, key: str, counter: str):
+        """Incrementar contador (hits, misses, evictions, expirations) da família da chave."""
+        stats = self.family_stats.get(self.key_family(key))
+        if stats is None:
+            stats = self.family_stats[self.key_family(key)] = dict.fromkeys(FAMILY_COUNTERS, 0)
+        stats[counter] += 1
+    
+    def _record_access(self, key: str, hit: bool):
+        """Contabilizar acerto/erro na família da chave."""
+        self._count(key, "hits" if hit else "misses")
+        if self.sketch is not None:
+            self.sketch.increment(key)
+    
     async def get(self, key: str) -> Optional[Any]:
         """Obter valor do cache."""
-        if key not in self.cache:
-            return None
-        
-        entry = self.cache[key]
+        entry = self.cache.get(key)
+        now = datetime.utcnow()
         
         # Verificar se expirou
-        if entry.expires_at and entry.expires_at <= datetime.utcnow():
+        if entry is not None and entry.expires_at and entry.expires_at <= now:
             del self.cache[key]
-            return None
+            self._count(key, "expirations")
+            entry = None
         
-        # Atualizar estatísticas de acesso
+        if entry is None:
+            return await self._get_l2(key)
+        
+        # Atualizar estatísticas de acesso e a posição no LRU
         entry.access_count += 1
-        entry.last_accessed = datetime.utcnow()
+        entry.last_accessed = now
+        self.cache.move_to_end(key)
+        self._record_access(key, True)
         
         return entry.value
     
+    def keep_local(self, family: str):
+        """Manter a família só no L1 deste worker."""
+        self.local_families.add(family)
+    
+    def _shared(self, key: str) -> bool:
+        """A chave passa pelo L2?"""
+        return self.l2 is not None and self.key_family(key) not in self.local_families
+    
+    async def _get_l2(self, key: str) -> Optional[Any]:
+        """Erro no L1: buscar no L2 e trazer para o L1 com o tempo restante."""
+        found = await self.l2.get(key) if self._shared(key) else None
+        if found is None:
+            self._record_access(key, False)
+            return None
+        value, remaining = found
+        self._record_access(key, True)
+        self._count(key, "l2_hits")
+        self._store(key, value, min(remaining, self.default_ttl))
+        return value
+    
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Definir valor no cache."""
         ttl = ttl or self.default_ttl
-        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        self._store(key, value, ttl)
+        if self._shared(key):
+            await self.l2.set(key, value, ttl)
+    
+    def _store(self, key: str, value: Any, ttl: float):
+        """Gravar no L1."""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
         
-        # Verificar limite de tamanho
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            await self._evict_lru()
+        if key not in self.cache:
+            # Vencidas saem antes de remover uma entrada válida
+            self._expire(now)
+            if len(self.cache) >= self.max_size:
+                if not self._admit(key):
+                    self.rejections += 1
+                    return
+                self._evict_lru()
         
-        self.cache[key] = CacheEntry(
+        entry = CacheEntry(
             key=key,
             value=value,
-            created_at=datetime.utcnow(),
+            created_at=now,
             expires_at=expires_at,
-            last_accessed=datetime.utcnow()
+            last_accessed=now
         )
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        self._schedule(entry)
     
-    async def _evict_lru(self):
+    def _admit(self, key: str) -> bool:
+        """Admissão TinyLFU: a chave nova precisa ser mais frequente que a vítima do LRU.
+
+        A frequência só é contada nos acessos (`_record_access`); a leitura
+        que errou antes deste `set` já contou a chave.
+        """
+        if self.sketch is None or not self.cache:
+            return True
+        victim = next(iter(self.cache))
+        return self.sketch.frequency(key) > self.sketch.frequency(victim)
+    
+    def _evict_lru(self):
         """Remover entrada menos recentemente usada."""
         if not self.cache:
             return
         
-        # Encontrar entrada com menor last_accessed
-        lru_key = min(
-            self.cache.keys(),
-            key=lambda k: self.cache[k].last_accessed or self.cache[k].created_at
-        )
-        
-        del self.cache[lru_key]
+        lru_key, _ = self.cache.popitem(last=False)
+        self._count(lru_key, "evictions")
     
     async def delete(self, key: str) -> bool:
         """Deletar entrada do cache."""
-        if key in self.cache:
-            del self.cache[key]
-            return True
-        return False
+        return await self.delete_many([key]) > 0
     
     async def clear(self) -> None:
         """Limpar todo o cache."""
+        self._clear_local()
+        if self.l2 is not None:
+            await self.l2.delete_matching()
+            await self.l2.publish({"op": "clear"})
+    
+    async def delete_many(self, keys) -> int:
+        """Deletar várias chaves e retornar quantas existiam."""
+        keys = list(keys)
+        removed = self.delete_local(keys)
+        shared = [key for key in keys if self._shared(key)]
+        if shared:
+            removed = max(removed, await self.l2.delete_many(shared))
+            await self.l2.publish({"op": "delete", "keys": shared})
+        return removed
+    
+    def delete_local(self, keys) -> int:
+        """Deletar chaves só do L1 deste worker, sem tocar o L2 nem publicar."""
+        removed = 0
+        for key in keys:
+            if self.cache.pop(key, None) is not None:
+                removed += 1
+        return removed
+    
+    def invalidate_local(self, pattern: str) -> int:
+        """Invalidar por padrão só no L1 deste worker."""
+        keys_to_delete = [key for key in self.cache.keys() if pattern in key]
+        for key in keys_to_delete:
+            del self.cache[key]
+        return len(keys_to_delete)
+    
+    def _clear_local(self):
         self.cache.clear()
+        self._expiry_heap.clear()
     
     async def get_or_set(self, key: str, factory: Callable, ttl: Optional[int] = None) -> Any:
         """Obter valor ou definir usando factory."""
@@ -150,36 +342,87 @@ class CacheManager:
         key = self._generate_key(prefix, *args, **kwargs)
         return await self.get_or_set(key, factory, ttl)
     
+    async def shared_keys(self, prefix: str) -> List[str]:
+        """Chaves do L2 que começam com `prefix` (vazio sem L2)."""
+        if self.l2 is None or self.key_family(prefix) in self.local_families:
+            return []
+        return await self.l2.keys_matching(prefix)
+    
     async def invalidate_pattern(self, pattern: str) -> int:
         """Invalidar entradas que correspondem ao padrão."""
-        keys_to_delete = [key for key in self.cache.keys() if pattern in key]
-        
-        for key in keys_to_delete:
-            del self.cache[key]
-        
-        return len(keys_to_delete)
+        removed = self.invalidate_local(pattern)
+        if self.l2 is not None:
+            removed = max(removed, await self.l2.delete_matching(pattern))
+            await self.l2.publish({"op": "pattern", "pattern": pattern})
+        return removed
+    
+    async def attach_l2(self, tier):
+        """Usar `tier` (RedisTier) como segundo nível e assinar as invalidações."""
+        self.l2 = tier
+        tier.start(self._on_invalidate)
+    
+    async def detach_l2(self):
+        if self.l2 is None:
+            return
+        tier, self.l2 = self.l2, None
+        await tier.stop()
+    
+    def subscribe(self, op: str, handler: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """Registrar `handler(mensagem)` para mensagens `op` de outros workers."""
+        self._handlers[op] = handler
+    
+    async def broadcast(self, message: Dict[str, Any]):
+        """Publicar mensagem para os outros workers (sem L2, nada a fazer)."""
+        if self.l2 is not None:
+            await self.l2.publish(message)
+    
+    async def _on_invalidate(self, message: Dict[str, Any]):
+        """Remoção feita por outro worker: descartar só do L1."""
+        op = message.get("op")
+        if op == "delete":
+            self.delete_local(message.get("keys") or [])
+        elif op == "pattern" and message.get("pattern"):
+            self.invalidate_local(message["pattern"])
+        elif op == "clear":
+            self._clear_local()
+        elif op in self._handlers:
+            await self._handlers[op](message)
+    
+    def get_family_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Obter acertos, erros, remoções, expirações e taxa de acerto por família de chave."""
+        families = {}
+        for family, stats in self.family_stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            families[family] = {
+                **stats,
+                "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+        return families
     
     def get_stats(self) -> Dict[str, Any]:
         """Obter estatísticas do cache."""
-        if not self.cache:
-            return {
-                "size": 0,
-                "max_size": self.max_size,
-                "hit_rate": 0,
-                "total_entries": 0
-            }
-        
-        total_accesses = sum(entry.access_count for entry in self.cache.values())
-        total_entries = len(self.cache)
+        totals = dict.fromkeys(FAMILY_COUNTERS, 0)
+        for stats in self.family_stats.values():
+            for counter, value in stats.items():
+                totals[counter] += value
+        lookups = totals["hits"] + totals["misses"]
         
-        return {
-            "size": total_entries,
+        stats = {
+            "size": len(self.cache),
             "max_size": self.max_size,
-            "hit_rate": total_accesses / max(total_entries, 1),
-            "total_entries": total_entries,
-            "oldest_entry": min(entry.created_at for entry in self.cache.values()).isoformat(),
-            "newest_entry": max(entry.created_at for entry in self.cache.values()).isoformat()
+            "hit_rate": round(totals["hits"] / lookups, 4) if lookups else 0.0,
+            **totals,
+            "rejections": self.rejections,
+            "admission": "tinylfu" if self.sketch is not None else None,
+            "total_entries": len(self.cache),
+            "families": self.get_family_stats()
         }
+        if self.l2 is not None:
+            stats["l2"] = self.l2.get_stats()
+        if self.cache:
+            stats["oldest_entry"] = min(entry.created_at for entry in self.cache.values()).isoformat()
+            stats["newest_entry"] = max(entry.created_at for entry in self.cache.values()).isoformat()
+        return stats
 
 
 class CacheDecorator:
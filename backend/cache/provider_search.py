@@ -0,0 +1,257 @@
+# Cache de Busca de Prestadores por Tile - Alça Hub
+import math
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+from cache.manager import CacheManager, cache_manager
+from geo.distance import KM_PER_DEGREE, haversine_many
+
+logger = logging.getLogger(__name__)
+
+CandidateLoader = Callable[[float, float, float], Awaitable[List[Dict[str, Any]]]]
+
+
+class ProviderSearchCache:
+    """Cache dos candidatos de /api/providers quantizado em tiles.
+
+    As coordenadas da busca são arredondadas para o centro de um tile e o
+    cache guarda os prestadores num raio ampliado por meia diagonal do tile.
+    Assim clientes a poucas centenas de metros compartilham a mesma entrada,
+    e a distância exata até cada prestador continua sendo calculada por
+    requisição sobre o conjunto em cache.
+
+    A ordenação não entra na chave: o conjunto de candidatos é o mesmo para
+    distance/rating/name, e separar por ordenação só dividiria os acertos.
+
+    Para invalidar com precisão, cada entrada registra os prestadores que
+    contém e o círculo que cobre. Uma mudança de prestador remove as
+    entradas que o contêm e as que cobrem sua posição atual.
+
+    Esses índices são do worker: entradas lidas do L2 também são registradas
+    e a mudança de prestador é publicada no canal do cache, para que cada
+    worker remova do próprio L1 as entradas que conhece. Só o worker que fez
+    a mudança remove do L2: além das entradas que conhece, as chaves do L2
+    cujo círculo (deduzido da chave) cobre a posição antiga ou a atual do
+    prestador.
+    """
+
+    FAMILY = "providers_search"
+
+    def __init__(self, manager: CacheManager, tile_deg: float = 0.01, ttl: int = 60):
+        self.manager = manager
+        self.tile_deg = tile_deg
+        self.ttl = ttl
+        # Maior distância entre um ponto do tile e o seu centro
+        self.margin_km = tile_deg * KM_PER_DEGREE * math.sqrt(2) / 2
+
+        # Índices reversos para invalidação precisa
+        self._keys_by_provider: Dict[str, Set[str]] = {}
+        self._entries: Dict[str, Tuple[float, float, float, Tuple[str, ...]]] = {}
+        # Chamados com o id do prestador alterado em outro worker
+        self._remote_listeners: List[Callable[[str], Awaitable[None]]] = []
+        manager.subscribe(self.FAMILY, self._on_message)
+
+    def tile_for(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Tile (linha, coluna) de uma coordenada."""
+        return int(math.floor(lat / self.tile_deg)), int(math.floor(lon / self.tile_deg))
+
+    def tile_center(self, tile: Tuple[int, int]) -> Tuple[float, float]:
+        """Centro do tile em graus."""
+        row, col = tile
+        return (row + 0.5) * self.tile_deg, (col + 0.5) * self.tile_deg
+
+    def key_for(self, tile: Tuple[int, int], radius_km: float, categoria: Optional[str]) -> str:
+        """Chave da entrada: tile, raio e categoria."""
+        return f"{self.FAMILY}:{tile[0]}:{tile[1]}:{radius_km:g}:{categoria or '*'}"
+
+    async def get_candidates(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        categoria: Optional[str],
+        loader: CandidateLoader,
+    ) -> List[Dict[str, Any]]:
+        """Prestadores que podem estar no raio de (lat, lon).
+
+        Em caso de erro no cache, chama `loader(lat_centro, lon_centro, raio_ampliado)`
+        e guarda o resultado. Os documentos retornados são compartilhados entre
+        requisições e não devem ser alterados.
+        """
+        tile = self.tile_for(lat, lon)
+        key = self.key_for(tile, radius_km, categoria)
+
+        center_lat, center_lon = self.tile_center(tile)
+        search_radius = radius_km + self.margin_km
+
+        cached = await self.manager.get(key)
+        if cached is not None:
+            # Entrada gravada por outro worker (L2) entra nos índices deste
+            if key not in self._entries:
+                self._register(key, center_lat, center_lon, search_radius, cached)
+            return cached
+
+        docs = await loader(center_lat, center_lon, search_radius)
+
+        await self.manager.set(key, docs, self.ttl)
+        self._register(key, center_lat, center_lon, search_radius, docs)
+        return docs
+
+    def _register(self, key: str, lat: float, lon: float, radius_km: float, docs: List[Dict[str, Any]]):
+        """Registrar entrada nos índices reversos."""
+        self._forget(key)
+        provider_ids = tuple(doc.get("id") for doc in docs if doc.get("id"))
+        self._entries[key] = (lat, lon, radius_km, provider_ids)
+        for provider_id in provider_ids:
+            self._keys_by_provider.setdefault(provider_id, set()).add(key)
+
+        # Entradas expiradas ou removidas pelo LRU saem dos índices aos poucos
+        if len(self._entries) > 2 * self.manager.max_size:
+            for stale in [k for k in self._entries if k not in self.manager.cache]:
+                self._forget(stale)
+
+    def _forget(self, key: str):
+        """Remover entrada dos índices reversos."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for provider_id in entry[3]:
+            keys = self._keys_by_provider.get(provider_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_provider[provider_id]
+
+    def circle_of(self, key: str) -> Optional[Tuple[float, float, float]]:
+        """Centro e raio ampliado de uma chave (None se não for desta família)."""
+        parts = key.split(":", 4)
+        if len(parts) != 5 or parts[0] != self.FAMILY:
+            return None
+        try:
+            tile = (int(parts[1]), int(parts[2]))
+            radius_km = float(parts[3])
+        except ValueError:
+            return None
+        return (*self.tile_center(tile), radius_km + self.margin_km)
+
+    @staticmethod
+    def _covering(keys: List[str], circles: List[Tuple[float, float, float]], lat: float, lon: float) -> List[str]:
+        if not keys:
+            return []
+        meta = np.array(circles, dtype=np.float64)
+        # Distância do ponto a cada centro (simétrica, então vale para N centros)
+        distances = haversine_many(lat, lon, meta[:, 0], meta[:, 1])
+        return [keys[i] for i in np.nonzero(distances <= meta[:, 2])[0].tolist()]
+
+    def keys_covering(self, lat: float, lon: float) -> List[str]:
+        """Entradas cujo círculo cobre a coordenada."""
+        keys = list(self._entries)
+        return self._covering(keys, [self._entries[k][:3] for k in keys], lat, lon)
+
+    async def _shared_keys_covering(self, positions: List[Tuple[float, float]]) -> Set[str]:
+        """Chaves do L2 (de qualquer worker) que cobrem alguma das posições."""
+        if not positions:
+            return set()
+        keys, circles = [], []
+        for key in await self.manager.shared_keys(f"{self.FAMILY}:"):
+            circle = self.circle_of(key)
+            if circle is not None:
+                keys.append(key)
+                circles.append(circle)
+        covering: Set[str] = set()
+        for lat, lon in positions:
+            covering.update(self._covering(keys, circles, lat, lon))
+        return covering
+
+    async def invalidate_provider(
+        self,
+        provider_id: str,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        previous: Optional[Tuple[float, float]] = None,
+    ) -> int:
+        """Invalidar entradas afetadas por mudança no prestador.
+
+        Remove as entradas que contêm o prestador (posição antiga, dados,
+        disponibilidade) e, se a posição atual for informada, as que a cobrem
+        (prestador que entrou no raio ou passou a ter a categoria). No L2
+        também saem as chaves que cobrem `previous` (posição antes da
+        mudança) ou a posição atual. Os outros workers recebem a mudança
+        pelo canal do cache e removem só do próprio L1.
+        """
+        # Publicada antes das remoções: cada worker relê o prestador antes de
+        # receber o `delete` das chaves e recalcular a entrada
+        await self.manager.broadcast({"op": self.FAMILY, "provider_id": provider_id, "lat": lat, "lon": lon})
+        positions = [tuple(map(float, p)) for p in (previous, (lat, lon)) if p and None not in p]
+        extra = await self._shared_keys_covering(positions)
+        return await self._invalidate_local(provider_id, lat, lon, extra=extra)
+
+    def on_remote_change(self, callback: Callable[[str], Awaitable[None]]):
+        """Registrar `callback(prestador)` para mudanças feitas em outros workers.
+
+        Os callbacks rodam antes da invalidação local, para que estruturas do
+        worker (índice espacial) já estejam atualizadas quando a próxima busca
+        recalcular a entrada.
+        """
+        self._remote_listeners.append(callback)
+
+    async def _on_message(self, message: Dict[str, Any]):
+        """Mudança de prestador publicada por outro worker."""
+        provider_id = message.get("provider_id")
+        if not provider_id:
+            return
+        for callback in self._remote_listeners:
+            try:
+                await callback(provider_id)
+            except Exception as e:
+                logger.error(f"Erro ao aplicar mudança remota do prestador {provider_id}: {e}")
+        # O L2 fica com quem publicou (ele remove e publica as chaves): aqui só o L1
+        await self._invalidate_local(provider_id, message.get("lat"), message.get("lon"), shared=False)
+
+    async def _invalidate_local(
+        self,
+        provider_id: str,
+        lat: Optional[float],
+        lon: Optional[float],
+        shared: bool = True,
+        extra: Iterable[str] = (),
+    ) -> int:
+        """Remover as entradas conhecidas por este worker e `extra` (e do L2 se `shared`)."""
+        keys = set(self._keys_by_provider.get(provider_id, ()))
+        keys.update(extra)
+        if lat is not None and lon is not None:
+            keys.update(self.keys_covering(float(lat), float(lon)))
+
+        for key in keys:
+            self._forget(key)
+        removed = await self.manager.delete_many(keys) if shared else self.manager.delete_local(keys)
+        if removed:
+            logger.debug(f"Cache de busca: {removed} entradas invalidadas pelo prestador {provider_id}")
+        return removed
+
+    async def clear(self) -> int:
+        """Remover todas as entradas de busca, em todos os workers."""
+        self._entries.clear()
+        self._keys_by_provider.clear()
+        return await self.manager.invalidate_pattern(f"{self.FAMILY}:")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do cache de busca."""
+        return {
+            "entries": len(self._entries),
+            "tracked_providers": len(self._keys_by_provider),
+            "tile_deg": self.tile_deg,
+            "ttl": self.ttl,
+            **self.manager.get_family_stats().get(self.FAMILY, {"hits": 0, "misses": 0, "hit_ratio": 0.0}),
+        }
+
+
+# Instância global
+provider_search_cache = ProviderSearchCache(
+    cache_manager,
+    tile_deg=float(os.environ.get("PROVIDER_SEARCH_TILE_DEG", "0.01")),
+    ttl=int(os.environ.get("PROVIDER_SEARCH_CACHE_TTL", "60")),
+)
@@ -0,0 +1,219 @@
+# Segundo Nível do Cache no Redis - Alça Hub
+import asyncio
+import json
+import struct
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from cache.serialization import get_serializer
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho do valor gravado: vencimento (segundos desde a época) em 8 bytes
+_HEADER = struct.Struct(">d")
+
+# Chaves por comando DEL
+_DELETE_BATCH = 500
+
+
+def _glob_escape(text: str) -> str:
+    return "".join(f"\\{char}" if char in "*?[]\\" else char for char in text)
+
+
+class RedisTier:
+    """Cache compartilhado entre workers (L2) e canal de invalidação.
+
+    Cada valor é gravado com o vencimento no cabeçalho e TTL no próprio
+    Redis, então um GET traz valor e tempo restante. Remoções são
+    publicadas no canal `channel`; cada worker assina o canal e aplica a
+    remoção no seu L1, ignorando as mensagens que ele mesmo publicou.
+
+    Falhas do Redis nunca chegam à requisição: são registradas e contadas,
+    e o cache segue só com o L1.
+    """
+
+    def __init__(
+        self,
+        client,
+        serializer: str = "msgpack",
+        prefix: str = "alca:cache:",
+        channel: str = "alca:cache:invalidate",
+    ):
+        self.client = client
+        self.serializer = get_serializer(serializer)
+        self.prefix = prefix
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.published = 0
+        self.received = 0
+
+    @classmethod
+    def from_url(cls, url: str, socket_timeout: float = 0.5, **kwargs) -> "RedisTier":
+        """Cliente redis.asyncio a partir da URL (pacote `redis` opcional)."""
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("Pacote redis não instalado")
+        client = redis_asyncio.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+        return cls(client, **kwargs)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    # Valores
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Valor e segundos restantes, ou None."""
+        try:
+            data = await self.client.get(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao ler cache L2: {e}")
+            return None
+        if data is None:
+            self.misses += 1
+            return None
+        (expires_at,) = _HEADER.unpack_from(data)
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            self.misses += 1
+            return None
+        try:
+            value = self.serializer.loads(data[_HEADER.size:])
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao decodificar cache L2 {key}: {e}")
+            return None
+        self.hits += 1
+        return value, remaining
+
+    async def set(self, key: str, value: Any, ttl: float):
+        try:
+            data = _HEADER.pack(time.time() + ttl) + self.serializer.dumps(value)
+            await self.client.set(self._key(key), data, px=max(int(ttl * 1000), 1))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao gravar cache L2: {e}")
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        keys = [self._key(key) for key in keys]
+        removed = 0
+        try:
+            for start in range(0, len(keys), _DELETE_BATCH):
+                removed += await self.client.delete(*keys[start:start + _DELETE_BATCH])
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao remover do cache L2: {e}")
+        return removed
+
+    async def keys_matching(self, prefix: str) -> List[str]:
+        """Chaves (sem o prefixo do tier) que começam com `prefix`."""
+        match = f"{_glob_escape(self.prefix)}{_glob_escape(prefix)}*"
+        keys: List[str] = []
+        try:
+            async for key in self.client.scan_iter(match=match, count=1000):
+                key = key.decode() if isinstance(key, bytes) else key
+                keys.append(key[len(self.prefix):])
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao listar chaves do cache L2: {e}")
+        return keys
+
+    async def delete_matching(self, pattern: Optional[str] = None) -> int:
+        """Remover chaves que contêm `pattern` (todas do prefixo se None)."""
+        match = f"{_glob_escape(self.prefix)}*{_glob_escape(pattern)}*" if pattern else f"{_glob_escape(self.prefix)}*"
+        removed = 0
+        batch: List[Any] = []
+        try:
+            async for key in self.client.scan_iter(match=match, count=1000):
+                batch.append(key)
+                if len(batch) >= _DELETE_BATCH:
+                    removed += await self.client.delete(*batch)
+                    batch = []
+            if batch:
+                removed += await self.client.delete(*batch)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao remover do cache L2: {e}")
+        return removed
+
+    # Invalidação entre workers
+
+    async def publish(self, message: Dict[str, Any]):
+        try:
+            await self.client.publish(self.channel, json.dumps({**message, "origin": self.origin}))
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Erro ao publicar invalidação do cache: {e}")
+
+    def start(self, on_invalidate: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """Assinar o canal de invalidação no loop atual."""
+        if self._task is not None and not self._task.done():
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._listen(on_invalidate))
+
+    async def _listen(self, on_invalidate: Callable[[Dict[str, Any]], Awaitable[None]]):
+        while not self._stop.is_set():
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self.origin:
+                        continue
+                    self.received += 1
+                    await on_invalidate(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Erro no canal de invalidação do cache: {e}")
+                # Reconectar sem girar em falso enquanto o Redis estiver fora
+                try:
+                    await asyncio.wait_for(self._stop.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                try:
+                    await pubsub.unsubscribe(self.channel)
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.client.close()
+        except Exception as e:
+            logger.error(f"Erro ao fechar conexão do cache L2: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do L2."""
+        return {
+            "serializer": self.serializer.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "invalidations_published": self.published,
+            "invalidations_received": self.received,
+        }
@@ -0,0 +1,90 @@
+# Serialização de Valores do Cache - Alça Hub
+import json
+from datetime import datetime
+from typing import Any, Dict, Type
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependência opcional
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+# Código da extensão msgpack para datetime (ISO 8601)
+_DATETIME_EXT = 1
+
+
+class JsonSerializer:
+    """JSON da biblioteca padrão; datetimes e ObjectIds viram texto."""
+
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """orjson: mais rápido que o json padrão, com as mesmas perdas de tipo."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("Pacote orjson não instalado")
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer:
+    """msgpack binário; datetimes voltam como datetime (tuplas voltam como listas)."""
+
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("Pacote msgpack não instalado")
+
+    @staticmethod
+    def _default(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return msgpack.ExtType(_DATETIME_EXT, value.isoformat().encode())
+        return str(value)
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes) -> Any:
+        if code == _DATETIME_EXT:
+            return datetime.fromisoformat(data.decode())
+        return msgpack.ExtType(code, data)
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+
+SERIALIZERS: Dict[str, Type] = {
+    "json": JsonSerializer,
+    "orjson": OrjsonSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(name: str = "msgpack"):
+    """Serializador pelo nome; sem o pacote opcional, cai para JSON."""
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Serializador desconhecido: {name}")
+    except RuntimeError:
+        return JsonSerializer()
@@ -0,0 +1 @@
+# Módulo de Geolocalização - Alça Hub
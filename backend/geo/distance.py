@@ -0,0 +1,166 @@
+# Cálculo Vetorizado de Distâncias - Alça Hub
+import math
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calcula distância entre 2 pontos (km)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distâncias (km) de um ponto para N coordenadas em uma única passada."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons) - math.radians(lon)
+    a = np.sin(dphi * 0.5) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda * 0.5) ** 2
+    np.clip(a, 0.0, 1.0, out=a)
+    return (2 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(a))
+
+
+def radius_mask(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    radius_km: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Calcular máscara de pontos dentro do raio.
+
+    Returns:
+        Tupla (mascara_booleana, distancias_km)
+    """
+    distances = haversine_many(lat, lon, lats, lons)
+    return distances <= radius_km, distances
+
+
+def top_k_nearest(distances: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k menores valores, em ordem crescente.
+
+    Usa argpartition (O(n)) e ordena apenas os k selecionados.
+    """
+    n = distances.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(distances[candidates], kind="stable")]
+
+
+class CoordinateArray:
+    """Coordenadas mantidas em arrays float64 contíguos e redimensionáveis."""
+
+    def __init__(self, capacity: int = 1024):
+        capacity = max(1, capacity)
+        self._lats = np.zeros(capacity, dtype=np.float64)
+        self._lons = np.zeros(capacity, dtype=np.float64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def lats(self) -> np.ndarray:
+        """Latitudes válidas (view, sem cópia)."""
+        return self._lats[: self._size]
+
+    @property
+    def lons(self) -> np.ndarray:
+        """Longitudes válidas (view, sem cópia)."""
+        return self._lons[: self._size]
+
+    @property
+    def capacity(self) -> int:
+        return self._lats.shape[0]
+
+    def _grow(self, minimum: int):
+        """Dobrar a capacidade até comportar `minimum` posições."""
+        capacity = self.capacity
+        while capacity < minimum:
+            capacity *= 2
+        for name in ("_lats", "_lons"):
+            grown = np.zeros(capacity, dtype=np.float64)
+            grown[: self._size] = getattr(self, name)[: self._size]
+            setattr(self, name, grown)
+
+    def append(self, lat: float, lon: float) -> int:
+        """Adicionar coordenada e retornar sua posição."""
+        if self._size >= self.capacity:
+            self._grow(self._size + 1)
+        position = self._size
+        self._lats[position] = lat
+        self._lons[position] = lon
+        self._size += 1
+        return position
+
+    def set(self, position: int, lat: float, lon: float):
+        """Sobrescrever coordenada existente."""
+        self._lats[position] = lat
+        self._lons[position] = lon
+
+    def distances_from(self, lat: float, lon: float, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Distâncias de um ponto para todas (ou algumas) posições."""
+        if positions is None:
+            return haversine_many(lat, lon, self.lats, self.lons)
+        return haversine_many(lat, lon, self._lats[positions], self._lons[positions])
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        positions: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Posições dentro do raio e respectivas distâncias."""
+        distances = self.distances_from(lat, lon, positions)
+        mask = distances <= radius_km
+        if positions is None:
+            positions = np.arange(self._size)
+        return positions[mask], distances[mask]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        radius_km: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Os k pontos mais próximos (opcionalmente limitados ao raio)."""
+        if radius_km is None:
+            positions = np.arange(self._size)
+            distances = self.distances_from(lat, lon)
+        else:
+            positions, distances = self.within_radius(lat, lon, radius_km)
+        order = top_k_nearest(distances, k)
+        return positions[order], distances[order]
+
+    @classmethod
+    def from_documents(
+        cls,
+        docs: Iterable[Dict[str, Any]],
+        lat_key: str = "latitude",
+        lon_key: str = "longitude",
+    ) -> "CoordinateArray":
+        """Construir a partir de documentos com latitude/longitude."""
+        docs = list(docs)
+        coords = cls(capacity=len(docs))
+        coords._lats[: len(docs)] = [float(d.get(lat_key)) for d in docs]
+        coords._lons[: len(docs)] = [float(d.get(lon_key)) for d in docs]
+        coords._size = len(docs)
+        return coords
@@ -0,0 +1,78 @@
+# Consultas GeoJSON no MongoDB - Alça Hub
+from typing import Any, Dict, List, Optional, Tuple
+
+LOCATION_FIELD = "location"
+DISTANCE_FIELD = "distance_km"
+
+
+def geo_point(lat: Any, lon: Any) -> Optional[Dict[str, Any]]:
+    """Montar ponto GeoJSON a partir de latitude/longitude.
+
+    Retorna None se as coordenadas estiverem ausentes ou fora da faixa válida.
+    Atenção: GeoJSON usa a ordem [longitude, latitude].
+    """
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def location_update(lat: Any, lon: Any) -> Dict[str, Any]:
+    """Campos para $set ao gravar coordenadas (escalares + ponto GeoJSON)."""
+    return {"latitude": lat, "longitude": lon, LOCATION_FIELD: geo_point(lat, lon)}
+
+
+def geo_near_stage(
+    lat: float,
+    lon: float,
+    radius_km: float,
+    query: Optional[Dict[str, Any]] = None,
+    distance_field: str = DISTANCE_FIELD,
+) -> Dict[str, Any]:
+    """Estágio $geoNear com distância em km calculada pelo servidor.
+
+    Precisa ser o primeiro estágio do pipeline e usa o índice 2dsphere do
+    campo `location`.
+    """
+    return {
+        "$geoNear": {
+            "near": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+            "key": LOCATION_FIELD,
+            "distanceField": distance_field,
+            "maxDistance": float(radius_km) * 1000.0,
+            "distanceMultiplier": 0.001,
+            "spherical": True,
+            "query": dict(query or {}),
+        }
+    }
+
+
+def page_facet_stage(
+    skip: int,
+    limit: int,
+    items_prefix: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Estágio $facet que devolve a página e o total em uma única ida ao banco.
+
+    `items_prefix` roda só no ramo da página (ex.: filtro de cursor), sem
+    afetar o total.
+    """
+    return {
+        "$facet": {
+            "items": [*(items_prefix or []), {"$skip": max(0, skip)}, {"$limit": max(1, limit)}],
+            "total": [{"$count": "count"}],
+        }
+    }
+
+
+def unpack_page_facet(result: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """Extrair (itens, total) do resultado de page_facet_stage."""
+    if not result:
+        return [], 0
+    facet = result[0]
+    total = facet.get("total") or []
+    return facet.get("items", []), (total[0]["count"] if total else 0)
@@ -0,0 +1,265 @@
+# Índice Espacial de Prestadores - Alça Hub
+import math
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from core.enums import UserType
+from geo.distance import KM_PER_DEGREE, CoordinateArray
+
+logger = logging.getLogger(__name__)
+
+# Mesmo critério usado pelas rotas de busca de prestadores
+ACTIVE_PROVIDERS_QUERY = {
+    "tipo": UserType.PRESTADOR.value,
+    "ativo": True,
+    "latitude": {"$ne": None, "$exists": True},
+    "longitude": {"$ne": None, "$exists": True},
+}
+
+
+class ProviderSpatialIndex:
+    """Índice em grade uniforme dos prestadores ativos.
+
+    As coordenadas ficam em arrays float64 contíguos (um slot por prestador) e
+    cada célula da grade guarda apenas os índices dos slots que contém. Uma
+    busca por raio visita somente as células que cobrem o círculo e calcula as
+    distâncias dos candidatos em uma única passada vetorizada, então o custo
+    acompanha o tamanho do resultado e não o total de prestadores.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.05):
+        self.cell_size_deg = cell_size_deg
+        self._columns = int(round(360.0 / cell_size_deg))
+
+        # Armazenamento por slot
+        self._coords = CoordinateArray()
+        self._available = np.zeros(self._coords.capacity, dtype=np.bool_)
+        self._ids: List[Optional[str]] = []
+        self._cell_of_slot: List[Optional[Tuple[int, int]]] = []
+        self._pos_in_cell = array("q")
+        self._free_slots: List[int] = []
+        self._slot_by_id: Dict[str, int] = {}
+
+        # Célula -> slots (array compacto de inteiros)
+        self._cells: Dict[Tuple[int, int], array] = {}
+
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    def __contains__(self, provider_id: str) -> bool:
+        return provider_id in self._slot_by_id
+
+    def _cell_for(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Obter célula da grade para uma coordenada."""
+        row = int(math.floor(lat / self.cell_size_deg))
+        col = int(math.floor(lon / self.cell_size_deg)) % self._columns
+        return row, col
+
+    def _attach(self, slot: int, cell: Tuple[int, int]):
+        """Adicionar slot ao final da célula."""
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            bucket = self._cells[cell] = array("q")
+        self._pos_in_cell[slot] = len(bucket)
+        self._cell_of_slot[slot] = cell
+        bucket.append(slot)
+
+    def _detach(self, slot: int):
+        """Remover slot da célula em O(1) (troca com o último)."""
+        cell = self._cell_of_slot[slot]
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        pos = self._pos_in_cell[slot]
+        last = bucket[-1]
+        bucket[pos] = last
+        self._pos_in_cell[last] = pos
+        bucket.pop()
+        if not bucket:
+            del self._cells[cell]
+        self._cell_of_slot[slot] = None
+
+    def upsert(self, provider_id: str, lat: float, lon: float, disponivel: bool = True):
+        """Inserir ou mover prestador no índice."""
+        lat = float(lat)
+        lon = float(lon)
+        cell = self._cell_for(lat, lon)
+        slot = self._slot_by_id.get(provider_id)
+
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._ids[slot] = provider_id
+            else:
+                slot = self._coords.append(lat, lon)
+                if slot >= self._available.shape[0]:
+                    grown = np.zeros(self._coords.capacity, dtype=np.bool_)
+                    grown[: self._available.shape[0]] = self._available
+                    self._available = grown
+                self._ids.append(provider_id)
+                self._cell_of_slot.append(None)
+                self._pos_in_cell.append(-1)
+            self._slot_by_id[provider_id] = slot
+        elif self._cell_of_slot[slot] != cell:
+            self._detach(slot)
+
+        self._coords.set(slot, lat, lon)
+        self._available[slot] = bool(disponivel)
+        if self._cell_of_slot[slot] is None:
+            self._attach(slot, cell)
+
+    def remove(self, provider_id: str) -> bool:
+        """Remover prestador do índice."""
+        slot = self._slot_by_id.pop(provider_id, None)
+        if slot is None:
+            return False
+        self._detach(slot)
+        self._ids[slot] = None
+        self._free_slots.append(slot)
+        return True
+
+    def set_availability(self, provider_id: str, disponivel: bool) -> bool:
+        """Atualizar flag de disponibilidade sem mover o prestador."""
+        slot = self._slot_by_id.get(provider_id)
+        if slot is None:
+            return False
+        self._available[slot] = bool(disponivel)
+        return True
+
+    def position(self, provider_id: str) -> Optional[Tuple[float, float]]:
+        """Coordenadas indexadas do prestador (ou None se não estiver no índice)."""
+        slot = self._slot_by_id.get(provider_id)
+        if slot is None:
+            return None
+        return float(self._coords.lats[slot]), float(self._coords.lons[slot])
+
+    def clear(self):
+        """Esvaziar o índice."""
+        self.__init__(self.cell_size_deg)
+
+    def _covering_cells(self, lat: float, lon: float, radius_km: float):
+        """Gerar células que cobrem o círculo de busca."""
+        size = self.cell_size_deg
+        dlat = radius_km / KM_PER_DEGREE
+        min_lat = max(-90.0, lat - dlat)
+        max_lat = min(90.0, lat + dlat)
+        min_row = int(math.floor(min_lat / size))
+        max_row = int(math.floor(max_lat / size))
+
+        # A largura em longitude cresce com a latitude mais próxima do polo
+        cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        if cos_lat <= 1e-9 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180.0:
+            columns = None
+        else:
+            dlon = radius_km / (KM_PER_DEGREE * cos_lat)
+            first = int(math.floor((lon - dlon) / size))
+            last = int(math.floor((lon + dlon) / size))
+            columns = {c % self._columns for c in range(first, last + 1)}
+
+        rows = max_row - min_row + 1
+        total = rows * (len(columns) if columns is not None else self._columns)
+
+        # Se o retângulo tem mais células que a grade ocupada, filtrar as ocupadas
+        if total > len(self._cells):
+            for (row, col), bucket in self._cells.items():
+                if min_row <= row <= max_row and (columns is None or col in columns):
+                    yield bucket
+            return
+
+        for row in range(min_row, max_row + 1):
+            for col in (columns if columns is not None else range(self._columns)):
+                bucket = self._cells.get((row, col))
+                if bucket is not None:
+                    yield bucket
+
+    def _candidate_slots(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Slots das células que cobrem o círculo, em um único array."""
+        buckets = [
+            np.frombuffer(bucket, dtype=np.int64)
+            for bucket in self._covering_cells(lat, lon, radius_km)
+        ]
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(buckets)
+
+    def query_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        only_available: bool = False,
+    ) -> List[Tuple[str, float]]:
+        """Buscar prestadores dentro do raio.
+
+        Returns:
+            Lista (não ordenada) de tuplas (provider_id, distancia_km)
+        """
+        slots = self._candidate_slots(lat, lon, radius_km)
+        if only_available and slots.size:
+            slots = slots[self._available[slots]]
+        if not slots.size:
+            return []
+
+        slots, distances = self._coords.within_radius(lat, lon, radius_km, slots)
+        ids = self._ids
+        return [(ids[slot], distance) for slot, distance in zip(slots.tolist(), distances.tolist())]
+
+    async def build(self, database) -> int:
+        """Construir índice a partir da collection de usuários."""
+        self.clear()
+        cursor = database.users.find(
+            ACTIVE_PROVIDERS_QUERY,
+            {"_id": 0, "id": 1, "latitude": 1, "longitude": 1, "disponivel": 1},
+        )
+        async for doc in cursor:
+            self._load_document(doc)
+
+        self.ready = True
+        logger.info(f"Índice espacial construído com {len(self)} prestadores")
+        return len(self)
+
+    async def sync_provider(self, database, provider_id: str):
+        """Reler prestador do banco e refletir o estado atual no índice."""
+        doc = await database.users.find_one(
+            {"id": provider_id, **ACTIVE_PROVIDERS_QUERY},
+            {"_id": 0, "id": 1, "latitude": 1, "longitude": 1, "disponivel": 1},
+        )
+        if doc is None:
+            self.remove(provider_id)
+            return
+        self._load_document(doc)
+
+    def _load_document(self, doc: Dict[str, Any]):
+        """Carregar documento de prestador no índice."""
+        provider_id = doc.get("id")
+        if not provider_id:
+            return
+        try:
+            lat = float(doc["latitude"])
+            lon = float(doc["longitude"])
+        except (KeyError, TypeError, ValueError):
+            self.remove(provider_id)
+            return
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            self.remove(provider_id)
+            return
+        self.upsert(provider_id, lat, lon, doc.get("disponivel", True))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do índice."""
+        return {
+            "ready": self.ready,
+            "providers": len(self),
+            "cells": len(self._cells),
+            "cell_size_deg": self.cell_size_deg,
+            "free_slots": len(self._free_slots),
+        }
+
+
+# Instância global
+provider_index = ProviderSpatialIndex()
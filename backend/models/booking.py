@@ -8,6 +8,7 @@ from pydantic import Field, validator
 from typing import Optional
 from datetime import datetime, timedelta
 from core.enums import BookingStatus
+from scheduling.sync import booking_changed
 
 
 class Booking(Document):
@@ -150,6 +151,7 @@ class Booking(Document):
 
         self.updated_at = datetime.utcnow()
         await self.save()
+        await self._schedule_changed()
 
     async def start(self):
         """Inicia execução do serviço"""
@@ -169,6 +171,7 @@ class Booking(Document):
         self.concluido_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
         await self.save()
+        await self._schedule_changed()
 
     async def cancel(self, by: str, motivo: Optional[str] = None):
         """
@@ -187,6 +190,11 @@ class Booking(Document):
         self.data_cancelamento = datetime.utcnow()
         self.updated_at = datetime.utcnow()
         await self.save()
+        await self._schedule_changed()
+
+    async def _schedule_changed(self):
+        """Atualiza índice de intervalos, slots reservados e horários livres do prestador"""
+        await booking_changed(self.get_motor_collection().database, self.to_dict())
 
     async def rate(
         self,
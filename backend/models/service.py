@@ -3,11 +3,14 @@ Modelo de serviço com Beanie ODM
 
 Define a estrutura de serviços oferecidos por prestadores no Alça Hub.
 """
-from beanie import Document, Indexed, Link
+from beanie import Document, Indexed, Link, Insert, Replace, Save, SaveChanges, before_event
 from pydantic import Field, validator
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+from pymongo import ReturnDocument
 from core.enums import ServiceStatus
+from geo.geojson import geo_point
+from reviews.aggregates import MEAN_FIELDS, RatingDelta, rating_update
 
 
 class Service(Document):
@@ -44,6 +47,7 @@ class Service(Document):
     # Localização (herdada do prestador, mas pode ser específica)
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    location: Optional[Dict[str, Any]] = None  # Ponto GeoJSON derivado de latitude/longitude
     raio_atendimento_km: float = Field(default=10.0, ge=0, le=100)  # Raio de atendimento
 
     # Informações adicionais
@@ -70,7 +74,7 @@ class Service(Document):
             "status",
             [("categoria", 1), ("ativo", 1)],  # Índice composto
             [("prestador_id", 1), ("ativo", 1)],
-            [("latitude", "2dsphere"), ("longitude", "2dsphere")],  # Índice geoespacial
+            [("location", "2dsphere")],  # Índice geoespacial ($geoNear)
             [("avaliacao_media", -1)],  # Para ordenação por melhor avaliado
         ]
 
@@ -83,6 +87,11 @@ class Service(Document):
                 raise ValueError("Preço não pode ser negativo")
         return v
 
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sync_location(self):
+        """Mantém o ponto GeoJSON alinhado com latitude/longitude"""
+        self.location = geo_point(self.latitude, self.longitude)
+
     # Métodos do modelo
     def is_disponivel(self) -> bool:
         """Verifica se serviço está disponível"""
@@ -117,12 +126,18 @@ class Service(Document):
         if not 0 <= new_rating <= 5:
             raise ValueError("Avaliação deve estar entre 0 e 5")
 
-        # Calcula nova média ponderada
-        total = self.avaliacao_media * self.total_avaliacoes
-        self.total_avaliacoes += 1
-        self.avaliacao_media = (total + new_rating) / self.total_avaliacoes
-        self.updated_at = datetime.utcnow()
-        await self.save()
+        # Mesma atualização atômica dos agregados usada pelas rotas de avaliação
+        delta = RatingDelta()
+        delta.add(new_rating)
+        doc = await self.get_motor_collection().find_one_and_update(
+            {"_id": self.id},
+            rating_update(delta, MEAN_FIELDS["services"]),
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            self.avaliacao_media = doc["avaliacao_media"]
+            self.total_avaliacoes = doc["total_avaliacoes"]
+            self.updated_at = doc["updated_at"]
 
     def calculate_price_range(self) -> dict:
         """Calcula range de preço do serviço"""
@@ -3,11 +3,14 @@ Modelo de usuário com Beanie ODM
 
 Define a estrutura de usuários (moradores, prestadores e admins) no Alça Hub.
 """
-from beanie import Document, Indexed
+from beanie import Document, Indexed, Insert, Replace, Save, SaveChanges, before_event
 from pydantic import Field, EmailStr, validator
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+from pymongo import ReturnDocument
 from core.enums import UserType
+from geo.geojson import geo_point
+from reviews.aggregates import MEAN_FIELDS, RatingDelta, rating_update
 
 
 class User(Document):
@@ -38,6 +41,7 @@ class User(Document):
     # Geolocalização (para prestadores)
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    location: Optional[Dict[str, Any]] = None  # Ponto GeoJSON derivado de latitude/longitude
 
     # Tipos de usuário (pode ser mais de um)
     tipos: List[UserType] = Field(default_factory=lambda: [UserType.MORADOR])
@@ -95,7 +99,7 @@ class User(Document):
             [("email", 1), ("ativo", 1)],  # Índice composto
             [("cpf", 1), ("ativo", 1)],
             [("tipos", 1), ("ativo", 1)],
-            [("latitude", "2dsphere"), ("longitude", "2dsphere")],  # Geoespacial
+            [("location", "2dsphere")],  # Geoespacial ($geoNear)
         ]
 
     @validator("cpf")
@@ -123,6 +127,11 @@ class User(Document):
             raise ValueError("tipo_ativo deve estar presente em tipos")
         return v
 
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sync_location(self):
+        """Mantém o ponto GeoJSON alinhado com latitude/longitude"""
+        self.location = geo_point(self.latitude, self.longitude)
+
     # Métodos do modelo
     def is_prestador(self) -> bool:
         """Verifica se usuário é prestador"""
@@ -223,12 +232,18 @@ class User(Document):
         if not 0 <= nova_avaliacao <= 5:
             raise ValueError("Avaliação deve estar entre 0 e 5")
 
-        # Calcula nova média ponderada
-        total = self.avaliacao_media * self.total_avaliacoes
-        self.total_avaliacoes += 1
-        self.avaliacao_media = (total + nova_avaliacao) / self.total_avaliacoes
-        self.updated_at = datetime.utcnow()
-        await self.save()
+        # Mesma atualização atômica dos agregados usada pelas rotas de avaliação
+        delta = RatingDelta()
+        delta.add(nova_avaliacao)
+        doc = await self.get_motor_collection().find_one_and_update(
+            {"_id": self.id},
+            rating_update(delta, MEAN_FIELDS["users"]),
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            self.avaliacao_media = doc["avaliacao_media"]
+            self.total_avaliacoes = doc["total_avaliacoes"]
+            self.updated_at = doc["updated_at"]
 
     async def trocar_tipo_ativo(self, novo_tipo: UserType):
         """
@@ -5,6 +5,7 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 from models.booking import Booking
 from core.enums import BookingStatus
+from scheduling.interval_index import LOOKBACK, booking_interval, naive_utc
 
 
 class BookingRepository:
@@ -268,22 +269,32 @@ class BookingRepository:
             prestador_id: ID do prestador
             data_agendamento: Data/hora do novo agendamento
             duracao_minutos: Duração em minutos
+
+        Returns:
+            Agendamentos ativos cujo intervalo se sobrepõe ao novo
         """
-        start_time = data_agendamento
-        end_time = data_agendamento + timedelta(minutes=duracao_minutos)
+        start_time = naive_utc(data_agendamento)
+        end_time = start_time + timedelta(minutes=duracao_minutos)
 
-        # Busca agendamentos ativos no mesmo período
-        return await Booking.find(
+        # Busca agendamentos ativos que podem alcançar o período
+        candidates = await Booking.find(
             Booking.prestador_id == prestador_id,
             Booking.status.in_([
                 BookingStatus.PENDENTE,
                 BookingStatus.CONFIRMADO,
                 BookingStatus.EM_ANDAMENTO
             ]),
-            Booking.data_agendamento >= start_time - timedelta(hours=24),
-            Booking.data_agendamento <= end_time
+            Booking.data_agendamento >= start_time - LOOKBACK,
+            Booking.data_agendamento < end_time
         ).to_list()
 
+        conflicts = []
+        for booking in candidates:
+            interval = booking_interval(booking.model_dump())
+            if interval and interval[0] < end_time and interval[1] > start_time:
+                conflicts.append(booking)
+        return conflicts
+
     @staticmethod
     async def get_statistics(
         prestador_id: Optional[str] = None,
@@ -0,0 +1,333 @@
+# Snapshots de Perfis no MongoDB - Alça Hub
+import asyncio
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+import logging
+
+import bson
+from bson.binary import Binary
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "profile_snapshots"
+
+
+def encode_snapshot(doc: Dict[str, Any]) -> bytes:
+    """Documento em BSON comprimido (zlib)."""
+    return zlib.compress(bson.encode(doc), 6)
+
+
+def decode_snapshot(data: bytes) -> Dict[str, Any]:
+    return bson.decode(zlib.decompress(data))
+
+
+class ProfileSnapshots(MutableMapping):
+    """Perfis por chave em memória, limitados por LRU e persistidos no MongoDB.
+
+    Funciona como um dict: o código existente continua usando `in`, `[]` e
+    `items()`. Com um banco associado (`start`), `load` traz do snapshot o
+    perfil que não está em memória, escritas e `touch` marcam o perfil como
+    sujo e `flush` (periódico e no `stop`) grava os sujos em lote. Perfil
+    sujo removido pelo LRU fica pendente até o próximo flush, sem perder
+    dados. Perfis limpos são relidos após `ttl` segundos, para ver o que
+    outros workers gravaram. Com `idle_ttl`, perfis sem acesso há mais que
+    isso também saem da memória (a cada inclusão e a cada flush), mesmo
+    abaixo de `max_size`.
+
+    Sem banco associado é só um dict com limite LRU.
+
+    Limitação: o flush grava o documento inteiro do perfil (ReplaceOne), sem
+    mesclar com o que está no banco. Dois workers que alteram o mesmo perfil
+    entre leituras gravam cada um a sua cópia e a última gravação vence; o
+    que só o outro worker viu (transações de fraude, interações) se perde.
+    Quem precisa de todas as alterações deve encaminhar as escritas de uma
+    mesma chave para um único worker.
+
+    Quem mantém estruturas derivadas dos perfis (arrays compilados) assina
+    `on_change` e recebe a chave de cada inclusão, substituição ou remoção,
+    para atualizar só a linha afetada.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        to_doc: Callable[[Any], Dict[str, Any]],
+        from_doc: Callable[[Dict[str, Any]], Any],
+        max_size: int = 10000,
+        ttl: float = 300.0,
+        flush_interval: float = 30.0,
+        collection: str = COLLECTION,
+        idle_ttl: Optional[float] = None,
+    ):
+        self.kind = kind
+        self.to_doc = to_doc
+        self.from_doc = from_doc
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.collection = collection
+        self.idle_ttl = idle_ttl
+        self.database = None
+        # Muda a cada inclusão/remoção de chave
+        self.version = 0
+        self._listeners: List[Callable[[str], None]] = []
+        # Perfis em ordem de inclusão; a ordem de uso (LRU), com o horário
+        # do último acesso, fica à parte
+        self._entries: Dict[str, Any] = {}
+        self._recency: "OrderedDict[str, float]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._pending: Dict[str, Any] = {}
+        self._deleted: Set[str] = set()
+        self._stop: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.flushed = 0
+
+    def _doc_id(self, key: str) -> str:
+        return f"{self.kind}:{key}"
+
+    # Interface de dict
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._entries[key]
+        self._recency.move_to_end(key)
+        self._recency[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._store(key, value)
+        self._pending.pop(key, None)
+        self._deleted.discard(key)
+        self._dirty.add(key)
+        self._evict()
+
+    def __delitem__(self, key: str):
+        del self._entries[key]
+        del self._recency[key]
+        self.version += 1
+        self._notify(key)
+        self._loaded_at.pop(key, None)
+        self._dirty.discard(key)
+        self._pending.pop(key, None)
+        if self.database is not None:
+            self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Varreduras não contam como acesso no LRU
+    def items(self):
+        return self._entries.items()
+
+    def values(self):
+        return self._entries.values()
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Perfil em memória sem contar como acesso no LRU."""
+        return self._entries.get(key)
+
+    def on_change(self, callback: Callable[[str], None]):
+        """Registrar `callback(chave)` para inclusões, substituições e remoções."""
+        self._listeners.append(callback)
+
+    def _notify(self, key: str):
+        for callback in self._listeners:
+            callback(key)
+
+    def touch(self, key: str):
+        """Marcar perfil alterado no lugar (mutação de atributos)."""
+        if key in self._entries:
+            self._dirty.add(key)
+
+    def _store(self, key: str, value: Any):
+        now = time.monotonic()
+        if key not in self._entries:
+            self.evict_idle(now)
+            self.version += 1
+        self._entries[key] = value
+        self._recency[key] = now
+        self._recency.move_to_end(key)
+        self._loaded_at[key] = now
+        self._notify(key)
+
+    def _insert_clean(self, key: str, value: Any):
+        self._store(key, value)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._evict_oldest()
+            self.evictions += 1
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Remover perfis sem acesso há mais de `idle_ttl` segundos.
+
+        Os mais antigos ficam no início da ordem de uso, então só os que
+        saem são visitados.
+        """
+        if self.idle_ttl is None:
+            return 0
+        limit = (now if now is not None else time.monotonic()) - self.idle_ttl
+        evicted = 0
+        while self._recency and next(iter(self._recency.values())) < limit:
+            self._evict_oldest()
+            evicted += 1
+        self.idle_evictions += evicted
+        return evicted
+
+    def _evict_oldest(self):
+        key, _ = self._recency.popitem(last=False)
+        value = self._entries.pop(key)
+        self.version += 1
+        self._loaded_at.pop(key, None)
+        self._notify(key)
+        if key in self._dirty:
+            self._dirty.discard(key)
+            if self.database is not None:
+                self._pending[key] = value
+
+    # Persistência
+
+    async def ensure_indexes(self, database):
+        await database[self.collection].create_index([("kind", ASCENDING), ("updated_at", DESCENDING)])
+
+    async def load(self, key: str) -> Optional[Any]:
+        """Perfil da chave, lido do snapshot se não estiver em memória (ou vencido)."""
+        if key in self._entries:
+            fresh = key in self._dirty or time.monotonic() - self._loaded_at.get(key, 0.0) < self.ttl
+            if fresh or self.database is None:
+                return self[key]
+        if key in self._pending:
+            self[key] = self._pending.pop(key)
+            return self._entries[key]
+        if self.database is None:
+            return None
+
+        try:
+            doc = await self.database[self.collection].find_one({"_id": self._doc_id(key)}, {"data": 1})
+        except Exception as e:
+            logger.error(f"Erro ao ler snapshot {self._doc_id(key)}: {e}")
+            return self._entries.get(key)
+        if doc is None:
+            self.misses += 1
+            if key in self._entries:
+                self._loaded_at[key] = time.monotonic()
+            return self._entries.get(key)
+        # Escrita concorrente durante a leitura tem precedência
+        if key in self._dirty:
+            return self[key]
+        self.loads += 1
+        self._insert_clean(key, self.from_doc(decode_snapshot(doc["data"])))
+        return self._entries[key]
+
+    async def warm(self, limit: Optional[int] = None) -> int:
+        """Carregar os perfis atualizados mais recentemente (warm start)."""
+        if self.database is None:
+            return 0
+        limit = min(limit or self.max_size, self.max_size)
+        loaded = 0
+        cursor = self.database[self.collection].find(
+            {"kind": self.kind}, {"key": 1, "data": 1}
+        ).sort("updated_at", DESCENDING).limit(limit)
+        async for doc in cursor:
+            if doc["key"] not in self._entries:
+                self._insert_clean(doc["key"], self.from_doc(decode_snapshot(doc["data"])))
+                loaded += 1
+        return loaded
+
+    async def flush(self) -> int:
+        """Gravar perfis sujos, pendentes e remoções em um bulk_write."""
+        if self.database is None:
+            return 0
+        changed = {key: self._entries[key] for key in self._dirty if key in self._entries}
+        changed.update(self._pending)
+        deleted = set(self._deleted)
+        if not changed and not deleted:
+            return 0
+        self._dirty.clear()
+        self._pending.clear()
+        self._deleted.clear()
+
+        now = datetime.utcnow()
+        operations = [
+            ReplaceOne(
+                {"_id": self._doc_id(key)},
+                {"kind": self.kind, "key": key, "data": Binary(encode_snapshot(self.to_doc(value))), "updated_at": now},
+                upsert=True,
+            )
+            for key, value in changed.items()
+        ]
+        operations.extend(DeleteOne({"_id": self._doc_id(key)}) for key in deleted)
+        try:
+            await self.database[self.collection].bulk_write(operations, ordered=False)
+        except Exception:
+            # Devolver para a próxima tentativa sem sobrescrever alterações mais novas
+            for key, value in changed.items():
+                if key in self._entries:
+                    self._dirty.add(key)
+                else:
+                    self._pending.setdefault(key, value)
+            self._deleted |= deleted - set(self._entries)
+            raise
+        self.flushed += len(changed)
+        return len(operations)
+
+    def start(self, database):
+        """Associar o banco e iniciar o flush periódico no loop atual."""
+        self.database = database
+        if self._task is not None and not self._task.done():
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.evict_idle()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Erro ao gravar snapshots de {self.kind}: {e}")
+            if self._stop.is_set():
+                return
+
+    async def stop(self):
+        """Gravar o que falta e encerrar o flush periódico."""
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas dos snapshots."""
+        return {
+            "kind": self.kind,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "dirty": len(self._dirty),
+            "pending": len(self._pending),
+            "loads": self.loads,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "idle_evictions": self.idle_evictions,
+            "flushed": self.flushed,
+        }
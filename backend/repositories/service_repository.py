@@ -5,6 +5,7 @@ from typing import Optional, List
 from datetime import datetime
 from models.service import Service
 from core.enums import ServiceStatus
+from geo.geojson import geo_near_stage
 
 
 class ServiceRepository:
@@ -86,7 +87,7 @@ class ServiceRepository:
         limit: int = 100
     ) -> List[Service]:
         """
-        Busca serviços próximos usando geolocalização
+        Busca serviços próximos usando geolocalização ($geoNear)
 
         Args:
             lat: Latitude
@@ -99,32 +100,18 @@ class ServiceRepository:
         query = {
             "ativo": True,
             "status": ServiceStatus.DISPONIVEL.value,
-            "latitude": {"$ne": None},
-            "longitude": {"$ne": None},
-            "$or": [
-                {
-                    "$and": [
-                        {
-                            "latitude": {
-                                "$gte": lat - (radius_km / 111.0),
-                                "$lte": lat + (radius_km / 111.0)
-                            }
-                        },
-                        {
-                            "longitude": {
-                                "$gte": lon - (radius_km / (111.0 * abs(lat / 90))),
-                                "$lte": lon + (radius_km / (111.0 * abs(lat / 90)))
-                            }
-                        }
-                    ]
-                }
-            ]
         }
 
         if categoria:
             query["categoria"] = categoria
 
-        return await Service.find(query).skip(skip).limit(limit).to_list()
+        # $geoNear usa o índice 2dsphere de `location` e já ordena por distância
+        pipeline = [
+            geo_near_stage(lat, lon, radius_km, query),
+            {"$skip": skip},
+            {"$limit": limit},
+        ]
+        return await Service.aggregate(pipeline, projection_model=Service).to_list()
 
     @staticmethod
     async def find_top_rated(
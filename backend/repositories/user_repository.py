@@ -4,6 +4,7 @@ User Repository - Acesso a dados de usuários com Beanie ODM
 from typing import Optional, List
 from models.user import User
 from core.enums import UserType
+from geo.geojson import geo_near_stage
 
 
 class UserRepository:
@@ -135,24 +136,26 @@ class UserRepository:
             limit: Limite de prestadores
 
         Returns:
-            Lista de prestadores próximos
+            Lista de prestadores próximos, do mais perto para o mais longe
         """
-        # Query base
+        # Query base (aplicada pelo próprio $geoNear)
         query = {
             "tipos": UserType.PRESTADOR.value,
             "ativo": True,
             "prestador_aprovado": True,
-            "latitude": {"$ne": None, "$exists": True},
-            "longitude": {"$ne": None, "$exists": True},
         }
 
         # Adicionar filtro de categoria se fornecido
         if categoria:
             query["prestador_info.categorias"] = categoria
 
-        # Busca com geolocalização (aproximação simples)
-        # Para produção, usar $geoNear ou $near do MongoDB
-        return await User.find(query).skip(skip).limit(limit).to_list()
+        # $geoNear usa o índice 2dsphere de `location` e já ordena por distância
+        pipeline = [
+            geo_near_stage(latitude, longitude, radius_km, query),
+            {"$skip": skip},
+            {"$limit": limit},
+        ]
+        return await User.aggregate(pipeline, projection_model=User).to_list()
 
     @staticmethod
     async def email_exists(email: str) -> bool:
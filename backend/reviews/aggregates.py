@@ -0,0 +1,262 @@
+# Agregados de Avaliações - Alça Hub
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from pymongo import UpdateOne
+
+from reviews.models import ReviewStatus
+
+logger = logging.getLogger(__name__)
+
+RATING_BUCKETS = ("1", "2", "3", "4", "5")
+
+# Só entram na média as avaliações que as listagens mostram: aprovadas em
+# /reviews e as de server.py, gravadas sem status (None)
+COUNTED_STATUSES = (ReviewStatus.APPROVED.value, None)
+
+# Campos de média usados por cada collection (modelos legados e Beanie)
+MEAN_FIELDS = {
+    "services": ("media_avaliacoes", "avaliacao_media"),
+    "users": ("avaliacao_media",),
+}
+
+# (collection, id) de um documento avaliado
+Target = Tuple[str, str]
+
+
+def rating_bucket(rating: Any) -> str:
+    """Faixa do histograma (1 a 5) de uma nota."""
+    return str(min(5, max(1, int(round(float(rating))))))
+
+
+def is_counted(review: Dict[str, Any]) -> bool:
+    """A avaliação entra nos agregados?"""
+    status = getattr(review.get("status"), "value", review.get("status"))
+    return review.get("rating") is not None and status in COUNTED_STATUSES
+
+
+def review_targets(review: Dict[str, Any]) -> List[Target]:
+    """Serviço e usuário avaliados.
+
+    Avaliações de server.py guardam `prestador_id`; as de /reviews guardam
+    `reviewee_id`.
+    """
+    targets: List[Target] = []
+    if review.get("service_id"):
+        targets.append(("services", review["service_id"]))
+    user_id = review.get("prestador_id") or review.get("reviewee_id")
+    if user_id:
+        targets.append(("users", user_id))
+    return targets
+
+
+class RatingDelta:
+    """Variação de soma, contagem e histograma de um documento avaliado."""
+
+    __slots__ = ("sum", "count", "hist")
+
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+        self.hist: Dict[str, int] = {}
+
+    def add(self, rating: Any, sign: int = 1):
+        bucket = rating_bucket(rating)
+        self.sum += sign * float(rating)
+        self.count += sign
+        self.hist[bucket] = self.hist.get(bucket, 0) + sign
+
+    def __bool__(self) -> bool:
+        return bool(self.count or self.sum or any(self.hist.values()))
+
+
+def legacy_counters(mean_fields: Iterable[str]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Soma e contagem iniciais de documentos gravados antes dos contadores.
+
+    Sem `rating_sum`/`rating_count`, parte da média e do total já gravados
+    (média × total), para que a primeira avaliação não apague o histórico.
+    O histograma não pode ser deduzido; `rebuild` o recalcula.
+    """
+    mean: Any = 0
+    for field in reversed(list(mean_fields)):
+        mean = {"$ifNull": [f"${field}", mean]}
+    count = {"$ifNull": ["$total_avaliacoes", 0]}
+    return {"$multiply": [mean, count]}, count
+
+
+def rating_update(delta: RatingDelta, mean_fields: Iterable[str]) -> List[Dict[str, Any]]:
+    """Update em pipeline que aplica a variação e recalcula a média.
+
+    Equivale a um `$inc` em rating_sum/rating_count/rating_hist, mas escrito
+    como pipeline para que média e total derivados sejam gravados na mesma
+    operação atômica, a partir dos contadores já atualizados. Documentos
+    anteriores aos contadores partem de `legacy_counters`.
+    """
+    base_sum, base_count = legacy_counters(mean_fields)
+    increments: Dict[str, Any] = {
+        "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", base_sum]}, delta.sum]},
+        "rating_count": {"$add": [{"$ifNull": ["$rating_count", base_count]}, delta.count]},
+    }
+    for bucket, change in delta.hist.items():
+        if change:
+            increments[f"rating_hist.{bucket}"] = {
+                "$add": [{"$ifNull": [f"$rating_hist.{bucket}", 0]}, change]
+            }
+
+    mean = {
+        "$cond": [
+            {"$gt": ["$rating_count", 0]},
+            {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 2]},
+            0.0,
+        ]
+    }
+    derived: Dict[str, Any] = {field: mean for field in mean_fields}
+    derived["total_avaliacoes"] = "$rating_count"
+    derived["updated_at"] = datetime.utcnow()
+    return [{"$set": increments}, {"$set": derived}]
+
+
+def aggregate_fields(total: float, count: int, hist: Dict[str, int], mean_fields: Iterable[str]) -> Dict[str, Any]:
+    """Valores absolutos dos agregados (usados na reconstrução)."""
+    mean = round(total / count, 2) if count else 0.0
+    return {
+        "rating_sum": total,
+        "rating_count": count,
+        "rating_hist": {bucket: int(hist.get(bucket, 0)) for bucket in RATING_BUCKETS},
+        **{field: mean for field in mean_fields},
+        "total_avaliacoes": count,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+class RatingAggregates:
+    """Soma, contagem e histograma de notas mantidos nos documentos avaliados.
+
+    Criar, editar ou apagar uma avaliação aplica só a diferença nos serviços
+    e usuários avaliados, sem reler as avaliações. `rebuild` recalcula tudo
+    com uma agregação, para reparar documentos alterados fora da API.
+    """
+
+    @staticmethod
+    def deltas(
+        before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]
+    ) -> Dict[Target, RatingDelta]:
+        """Variação por documento avaliado entre dois estados da avaliação."""
+        changes: Dict[Target, RatingDelta] = {}
+        for review, sign in ((before, -1), (after, 1)):
+            if review is None or not is_counted(review):
+                continue
+            for target in review_targets(review):
+                changes.setdefault(target, RatingDelta()).add(review["rating"], sign)
+        return {target: delta for target, delta in changes.items() if delta}
+
+    async def apply(
+        self,
+        database,
+        before: Optional[Dict[str, Any]] = None,
+        after: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Refletir criação (só after), edição (ambos) ou remoção (só before).
+
+        Returns:
+            Quantidade de documentos atualizados
+        """
+        updated = 0
+        for (collection, target_id), delta in self.deltas(before, after).items():
+            result = await database[collection].update_one(
+                {"id": target_id}, rating_update(delta, MEAN_FIELDS[collection])
+            )
+            updated += result.modified_count
+        return updated
+
+    @staticmethod
+    def rebuild_pipeline() -> List[Dict[str, Any]]:
+        """Agregação que calcula soma, contagem e histograma por documento avaliado."""
+        return [
+            # `$in` com None também casa documentos sem o campo status
+            {"$match": {"rating": {"$ne": None}, "status": {"$in": list(COUNTED_STATUSES)}}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "rating": 1,
+                    "bucket": {
+                        "$toString": {"$toInt": {"$min": [5, {"$max": [1, {"$round": ["$rating", 0]}]}]}}
+                    },
+                    "targets": [
+                        {"collection": "services", "id": "$service_id"},
+                        {"collection": "users", "id": {"$ifNull": ["$prestador_id", "$reviewee_id"]}},
+                    ],
+                }
+            },
+            {"$unwind": "$targets"},
+            {"$match": {"targets.id": {"$nin": [None, ""]}}},
+            {
+                "$group": {
+                    "_id": {"collection": "$targets.collection", "id": "$targets.id", "bucket": "$bucket"},
+                    "sum": {"$sum": "$rating"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {
+                "$group": {
+                    "_id": {"collection": "$_id.collection", "id": "$_id.id"},
+                    "sum": {"$sum": "$sum"},
+                    "count": {"$sum": "$count"},
+                    "hist": {"$push": {"k": "$_id.bucket", "v": "$count"}},
+                }
+            },
+        ]
+
+    async def rebuild(self, database, batch_size: int = 500) -> Dict[str, int]:
+        """Recalcular os agregados de todos os serviços e usuários.
+
+        Documentos que tinham avaliações e não têm mais voltam a zero.
+
+        Returns:
+            Documentos gravados por collection
+        """
+        written = {collection: 0 for collection in MEAN_FIELDS}
+        seen: Dict[str, set] = {collection: set() for collection in MEAN_FIELDS}
+        batches: Dict[str, List[UpdateOne]] = {collection: [] for collection in MEAN_FIELDS}
+
+        async def flush(collection: str):
+            if batches[collection]:
+                await database[collection].bulk_write(batches[collection], ordered=False)
+                written[collection] += len(batches[collection])
+                batches[collection] = []
+
+        async for row in database.reviews.aggregate(self.rebuild_pipeline(), allowDiskUse=True):
+            collection, target_id = row["_id"]["collection"], row["_id"]["id"]
+            hist = {item["k"]: item["v"] for item in row["hist"]}
+            seen[collection].add(target_id)
+            batches[collection].append(
+                UpdateOne(
+                    {"id": target_id},
+                    {"$set": aggregate_fields(float(row["sum"]), int(row["count"]), hist, MEAN_FIELDS[collection])},
+                )
+            )
+            if len(batches[collection]) >= batch_size:
+                await flush(collection)
+
+        for collection, mean_fields in MEAN_FIELDS.items():
+            await flush(collection)
+            stale = [
+                doc["id"]
+                async for doc in database[collection].find(
+                    {"rating_count": {"$gt": 0}}, {"_id": 0, "id": 1}
+                )
+                if doc.get("id") not in seen[collection]
+            ]
+            if stale:
+                result = await database[collection].update_many(
+                    {"id": {"$in": stale}}, {"$set": aggregate_fields(0.0, 0, {}, mean_fields)}
+                )
+                written[collection] += result.modified_count
+
+        logger.info(f"Agregados de avaliações reconstruídos: {written}")
+        return written
+
+
+# Instância global
+rating_aggregates = RatingAggregates()
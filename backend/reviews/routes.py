@@ -1,9 +1,16 @@
 # Rotas de Avaliações - Alça Hub
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pymongo import ReturnDocument
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 import logging
 
 from auth.dependencies import get_db, get_current_user_payload
+from services.provider_cards import on_provider_changed
+from ai.sentiment_rollups import sentiment_rollups
+from ai.sentiment_worker import sentiment_worker
+from reviews.aggregates import rating_aggregates
+from reviews.stats import parse_review_stats, review_stats_cache, review_stats_pipeline
 from reviews.models import (
     ReviewCreate,
     ReviewResponse,
@@ -26,6 +33,27 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
     return get_current_user_payload(request)
 
 
+def _review_response(review: Dict[str, Any]) -> ReviewResponse:
+    """Converter documento de avaliação em resposta."""
+    return ReviewResponse(
+        id=review["_id"],
+        reviewer_id=review["reviewer_id"],
+        reviewee_id=review["reviewee_id"],
+        service_id=review.get("service_id"),
+        booking_id=review.get("booking_id"),
+        rating=review["rating"],
+        title=review.get("title"),
+        comment=review.get("comment"),
+        type=review["type"],
+        status=review["status"],
+        anonymous=review["anonymous"],
+        tags=review.get("tags", []),
+        created_at=review["created_at"],
+        updated_at=review["updated_at"],
+        approved_at=review.get("approved_at")
+    )
+
+
 @review_router.post("/", response_model=dict)
 async def create_review(
     request: Request,
@@ -55,6 +83,10 @@ async def create_review(
         }
         
         result = await db.reviews.insert_one(review_doc)
+        await rating_aggregates.apply(db, after=review_doc)
+        await review_stats_cache.invalidate(review_data.reviewee_id)
+        sentiment_worker.submit(result.inserted_id, review_doc)
+        await on_provider_changed(db, review_data.reviewee_id, resync_index=False)
         
         return {
             "message": "Avaliação criada com sucesso",
@@ -95,26 +127,7 @@ async def get_reviews(
         cursor = db.reviews.find(query).sort("created_at", -1).skip(offset).limit(limit)
         reviews = await cursor.to_list(length=None)
         
-        return [
-            ReviewResponse(
-                id=review["_id"],
-                reviewer_id=review["reviewer_id"],
-                reviewee_id=review["reviewee_id"],
-                service_id=review.get("service_id"),
-                booking_id=review.get("booking_id"),
-                rating=review["rating"],
-                title=review.get("title"),
-                comment=review.get("comment"),
-                type=review["type"],
-                status=review["status"],
-                anonymous=review["anonymous"],
-                tags=review.get("tags", []),
-                created_at=review["created_at"],
-                updated_at=review["updated_at"],
-                approved_at=review.get("approved_at")
-            )
-            for review in reviews
-        ]
+        return [_review_response(review) for review in reviews]
     except Exception as e:
         logger.error(f"Erro ao obter avaliações: {e}")
         raise HTTPException(
@@ -130,73 +143,18 @@ async def get_review_stats(
 ):
     """Obter estatísticas de avaliações do usuário."""
     try:
+        cached = await review_stats_cache.get(user_id)
+        if cached is not None:
+            return cached
+
         db = get_db(request)
-        # Total de avaliações
-        total_reviews = await db.reviews.count_documents({
-            "reviewee_id": user_id,
-            "status": "approved"
-        })
-        
-        # Média de avaliações
-        pipeline = [
-            {"$match": {"reviewee_id": user_id, "status": "approved"}},
-            {"$group": {"_id": None, "avg_rating": {"$avg": "$rating"}}}
-        ]
-        avg_result = await db.reviews.aggregate(pipeline).to_list(1)
-        average_rating = avg_result[0]["avg_rating"] if avg_result else 0
-        
-        # Distribuição de notas
-        rating_dist = {}
-        for rating in range(1, 6):
-            count = await db.reviews.count_documents({
-                "reviewee_id": user_id,
-                "rating": rating,
-                "status": "approved"
-            })
-            rating_dist[str(rating)] = count
-        
-        # Avaliações recentes
-        recent_reviews = await db.reviews.find({
-            "reviewee_id": user_id,
-            "status": "approved"
-        }).sort("created_at", -1).limit(5).to_list(5)
-        
-        # Tags mais comuns
-        tag_pipeline = [
-            {"$match": {"reviewee_id": user_id, "status": "approved"}},
-            {"$unwind": "$tags"},
-            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ]
-        top_tags = await db.reviews.aggregate(tag_pipeline).to_list(10)
-        
-        return ReviewStats(
-            total_reviews=total_reviews,
-            average_rating=round(average_rating, 2),
-            rating_distribution=rating_dist,
-            recent_reviews=[
-                ReviewResponse(
-                    id=review["_id"],
-                    reviewer_id=review["reviewer_id"],
-                    reviewee_id=review["reviewee_id"],
-                    service_id=review.get("service_id"),
-                    booking_id=review.get("booking_id"),
-                    rating=review["rating"],
-                    title=review.get("title"),
-                    comment=review.get("comment"),
-                    type=review["type"],
-                    status=review["status"],
-                    anonymous=review["anonymous"],
-                    tags=review.get("tags", []),
-                    created_at=review["created_at"],
-                    updated_at=review["updated_at"],
-                    approved_at=review.get("approved_at")
-                )
-                for review in recent_reviews
-            ],
-            top_tags=[{"tag": tag["_id"], "count": tag["count"]} for tag in top_tags]
-        )
+        result = await db.reviews.aggregate(review_stats_pipeline(user_id)).to_list(1)
+        stats = parse_review_stats(result[0] if result else None)
+        stats["recent_reviews"] = [_review_response(review) for review in stats["recent_reviews"]]
+
+        response = ReviewStats(**stats)
+        await review_stats_cache.set(user_id, response)
+        return response
     except Exception as e:
         logger.error(f"Erro ao obter estatísticas: {e}")
         raise HTTPException(
@@ -205,6 +163,30 @@ async def get_review_stats(
         )
 
 
+@review_router.get("/sentiment/{kind}/{target_id}")
+async def get_sentiment_rollup(
+    kind: str,
+    target_id: str,
+    request: Request,
+):
+    """Obter sentimento consolidado de um prestador ou serviço."""
+    if kind not in ("provider", "service"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tipo deve ser 'provider' ou 'service'"
+        )
+    try:
+        db = get_db(request)
+        doc = await sentiment_rollups.get(db, kind, target_id)
+        return {"kind": kind, "target_id": target_id, **sentiment_rollups.summary(doc)}
+    except Exception as e:
+        logger.error(f"Erro ao obter sentimento consolidado: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno do servidor"
+        )
+
+
 @review_router.patch("/{review_id}", response_model=dict)
 async def update_review(
     review_id: str,
@@ -240,10 +222,18 @@ async def update_review(
         
         update_fields["updated_at"] = datetime.utcnow()
         
-        await db.reviews.update_one(
+        # Estado anterior lido na mesma operação, para aplicar só a diferença
+        before = await db.reviews.find_one_and_update(
             {"_id": review_id},
-            {"$set": update_fields}
+            {"$set": update_fields},
+            return_document=ReturnDocument.BEFORE,
         )
+        if before is not None:
+            await rating_aggregates.apply(db, before=before, after={**before, **update_fields})
+            if update_data.title is not None or update_data.comment is not None:
+                sentiment_worker.submit(review_id, {**before, **update_fields})
+        await review_stats_cache.invalidate(review["reviewee_id"])
+        await on_provider_changed(db, review["reviewee_id"], resync_index=False)
         
         return {"message": "Avaliação atualizada com sucesso"}
     except HTTPException:
@@ -277,7 +267,15 @@ async def delete_review(
                 detail="Avaliação não encontrada"
             )
         
-        await db.reviews.delete_one({"_id": review_id})
+        deleted = await db.reviews.find_one_and_delete({"_id": review_id})
+        if deleted is not None:
+            await rating_aggregates.apply(db, before=deleted)
+            if deleted.get("sentiment"):
+                await sentiment_rollups.apply(
+                    db, sentiment_rollups.deltas([(deleted, deleted["sentiment"], None)])
+                )
+        await review_stats_cache.invalidate(review["reviewee_id"])
+        await on_provider_changed(db, review["reviewee_id"], resync_index=False)
         return {"message": "Avaliação deletada com sucesso"}
     except HTTPException:
         raise
@@ -0,0 +1,103 @@
+# Estatísticas de Avaliações - Alça Hub
+import os
+from typing import Any, Dict, List, Optional
+import logging
+
+from cache.manager import CacheManager, cache_manager
+from reviews.models import ReviewStats, ReviewStatus
+
+logger = logging.getLogger(__name__)
+
+RECENT_REVIEWS = 5
+TOP_TAGS = 10
+
+
+def review_stats_pipeline(user_id: str) -> List[Dict[str, Any]]:
+    """Agregação única com total, média, distribuição, recentes e tags.
+
+    O `$match` inicial usa o índice (reviewee_id, status, created_at); cada
+    ramo do `$facet` trabalha sobre as mesmas avaliações aprovadas.
+    """
+    return [
+        {"$match": {"reviewee_id": user_id, "status": ReviewStatus.APPROVED.value}},
+        {
+            "$facet": {
+                "summary": [
+                    {"$group": {"_id": None, "total": {"$sum": 1}, "avg_rating": {"$avg": "$rating"}}}
+                ],
+                "distribution": [{"$group": {"_id": "$rating", "count": {"$sum": 1}}}],
+                "recent": [{"$sort": {"created_at": -1}}, {"$limit": RECENT_REVIEWS}],
+                "tags": [
+                    {"$unwind": "$tags"},
+                    {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": TOP_TAGS},
+                ],
+            }
+        },
+    ]
+
+
+def parse_review_stats(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Converter o documento do `$facet` nos campos de ReviewStats."""
+    result = result or {}
+    summary = (result.get("summary") or [{}])[0]
+    distribution = {str(rating): 0 for rating in range(1, 6)}
+    for row in result.get("distribution") or []:
+        key = str(row["_id"])
+        if key in distribution:
+            distribution[key] = row["count"]
+
+    return {
+        "total_reviews": summary.get("total", 0),
+        "average_rating": round(summary.get("avg_rating") or 0, 2),
+        "rating_distribution": distribution,
+        "recent_reviews": result.get("recent") or [],
+        "top_tags": [{"tag": tag["_id"], "count": tag["count"]} for tag in result.get("tags") or []],
+    }
+
+
+class ReviewStatsCache:
+    """Cache das estatísticas de avaliações por avaliado.
+
+    Toda escrita em /reviews invalida a entrada do avaliado; o TTL cobre
+    mudanças de status feitas fora dessas rotas. O cache guarda o
+    `model_dump` em modo JSON, que passa por qualquer serializador do L2,
+    e a leitura reconstrói o ReviewStats.
+    """
+
+    FAMILY = "review_stats"
+
+    def __init__(self, manager: CacheManager, ttl: int = 300):
+        self.manager = manager
+        self.ttl = ttl
+
+    def key_for(self, user_id: str) -> str:
+        return f"{self.FAMILY}:{user_id}"
+
+    async def get(self, user_id: str) -> Optional[ReviewStats]:
+        cached = await self.manager.get(self.key_for(user_id))
+        return ReviewStats.model_validate(cached) if cached is not None else None
+
+    async def set(self, user_id: str, stats: ReviewStats):
+        await self.manager.set(self.key_for(user_id), stats.model_dump(mode="json"), self.ttl)
+
+    async def invalidate(self, user_id: Optional[str]) -> bool:
+        """Invalidar estatísticas do avaliado."""
+        if not user_id:
+            return False
+        return await self.manager.delete(self.key_for(user_id))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do cache."""
+        return {
+            "ttl": self.ttl,
+            **self.manager.get_family_stats().get(self.FAMILY, {"hits": 0, "misses": 0, "hit_ratio": 0.0}),
+        }
+
+
+# Instância global
+review_stats_cache = ReviewStatsCache(
+    cache_manager,
+    ttl=int(os.environ.get("REVIEW_STATS_CACHE_TTL", "300")),
+)
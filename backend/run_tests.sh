@@ -109,6 +109,16 @@ run_specific_test() {
     print_success "Teste específico executado"
 }
 
+# Função para executar benchmarks (resultados em JSON)
+run_benchmarks() {
+    local results_dir="tests/performance/results"
+    local output="$results_dir/benchmark_$(date +%Y%m%d_%H%M%S).json"
+    mkdir -p "$results_dir"
+    print_message "Executando benchmarks (escalas: ${BENCH_SCALES:-10000,100000})..."
+    pytest tests/performance -m perf --no-cov --benchmark-only --benchmark-json="$output"
+    print_success "Benchmarks executados: $output"
+}
+
 # Função para limpar cache de testes
 clean_test_cache() {
     print_message "Limpando cache de testes..."
@@ -166,6 +176,7 @@ show_help() {
     echo "  user         - Executar apenas testes de usuários"
     echo "  coverage     - Executar testes com cobertura"
     echo "  verbose      - Executar testes em modo verbose"
+    echo "  benchmark    - Executar benchmarks contra mongod local (JSON em tests/performance/results)"
     echo "  specific     - Executar teste específico (ex: ./run_tests.sh specific tests/unit/test_auth.py)"
     echo "  clean        - Limpar cache de testes"
     echo "  lint         - Executar linting"
@@ -219,6 +230,10 @@ main() {
             install_dependencies
             run_verbose_tests
             ;;
+        "benchmark")
+            install_dependencies
+            run_benchmarks
+            ;;
         "specific")
             if [ -z "$2" ]; then
                 print_error "Especifique o arquivo de teste. Ex: ./run_tests.sh specific tests/unit/test_auth.py"
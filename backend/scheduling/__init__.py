@@ -0,0 +1 @@
+# Módulo de Agendamento - Alça Hub
@@ -0,0 +1,280 @@
+# Agenda de Horários Livres - Alça Hub
+import os
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+from cache.manager import CacheManager, cache_manager
+from core.enums import ServiceStatus
+from scheduling.interval_index import (
+    BookingIntervalIndex,
+    Interval,
+    booking_index,
+    booking_interval,
+    window_for,
+)
+
+logger = logging.getLogger(__name__)
+
+# Dias da semana como gravados em `Service.disponibilidade` (ordem de weekday())
+WEEKDAYS = ("segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo")
+
+# Maior intervalo de datas aceito por consulta
+MAX_RANGE_DAYS = 31
+
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+
+SERVICE_HOURS_PROJECTION = {"_id": 0, "disponibilidade": 1, "horario_inicio": 1, "horario_fim": 1}
+
+
+def _weekday_name(value: Any) -> str:
+    """Normalizar dia da semana ("Terça-feira" -> "terca")."""
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode()
+    return text.strip().lower().split("-")[0]
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def to_minutes(values: Iterable[datetime]) -> np.ndarray:
+    """Datetimes sem fuso em minutos desde a época."""
+    return np.array([(value - EPOCH) // MINUTE for value in values], dtype=np.int64)
+
+
+def from_minutes(minutes: int) -> datetime:
+    return EPOCH + timedelta(minutes=int(minutes))
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unir intervalos [início, fim) sobrepostos ou encostados.
+
+    Ordena pelo início e abre um grupo novo sempre que o início passa do maior
+    fim visto até ali (máximo acumulado). Devolve arrays ordenados e disjuntos.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    valid = ends > starts
+    starts, ends = starts[valid], ends[valid]
+    if starts.size == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+
+    first = np.ones(starts.size, dtype=bool)
+    first[1:] = starts[1:] > reach[:-1]
+    last = np.ones(starts.size, dtype=bool)
+    last[:-1] = first[1:]
+    return starts[first], reach[last]
+
+
+def _covered(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Quais pontos caem em algum intervalo (arrays ordenados e disjuntos)."""
+    idx = np.searchsorted(starts, points, side="right") - 1
+    return (idx >= 0) & (ends[np.maximum(idx, 0)] > points)
+
+
+def subtract_intervals(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    busy_starts: np.ndarray,
+    busy_ends: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Intervalos livres: [starts, ends) menos [busy_starts, busy_ends).
+
+    As duas listas devem vir de `merge_intervals`. Todas as bordas viram pontos
+    de corte; cada segmento entre cortes consecutivos fica se o seu ponto médio
+    estiver no expediente e fora dos ocupados.
+    """
+    if starts.size == 0 or busy_starts.size == 0:
+        return starts, ends
+
+    points = np.union1d(np.concatenate([starts, ends]), np.concatenate([busy_starts, busy_ends]))
+    mids = (points[:-1] + points[1:]) / 2
+    keep = _covered(starts, ends, mids) & ~_covered(busy_starts, busy_ends, mids)
+    return merge_intervals(points[:-1][keep], points[1:][keep])
+
+
+class FreeSlotCalendar:
+    """Horários livres de um prestador por dia.
+
+    O expediente vem dos serviços disponíveis do prestador (`disponibilidade`,
+    `horario_inicio`/`horario_fim`); dele são subtraídos os agendamentos
+    pendentes, confirmados e em andamento do índice de intervalos.
+
+    O resultado de cada prestador/dia fica em cache como pares de minutos
+    desde a época. O cache é só do L1: os ocupados vêm do índice de
+    intervalos deste worker, e um worker com o índice atrasado não pode
+    espalhar horários errados pelo L2. Mudanças de agendamento invalidam os
+    dias que o agendamento ocupa (nos outros workers, ao aplicar a mudança
+    no índice) e mudanças de serviço invalidam todos os dias do prestador
+    (por prefixo da chave, em todos os workers); o TTL cobre escritas feitas
+    fora da API. O corte pelo horário atual é aplicado na leitura, fora do
+    cache.
+    """
+
+    FAMILY = "free_slots"
+
+    def __init__(self, manager: CacheManager, index: BookingIntervalIndex, ttl: int = 300):
+        self.manager = manager
+        self.index = index
+        self.ttl = ttl
+        # Dias calculados por este worker, por prestador (estatísticas)
+        self._days_by_provider: Dict[str, Set[date]] = {}
+        manager.keep_local(self.FAMILY)
+
+    def key_for(self, provider_id: str, day: date) -> str:
+        return f"{self.FAMILY}:{provider_id}:{day.isoformat()}"
+
+    @staticmethod
+    def working_hours(services: List[Dict[str, Any]], day: date) -> Tuple[np.ndarray, np.ndarray]:
+        """Expediente do dia, unido entre os serviços, em minutos desde a época.
+
+        Horários que atravessam a meia-noite são cortados no fim do dia.
+        """
+        weekday = WEEKDAYS[day.weekday()]
+        midnight = _midnight(day)
+        day_end = midnight + timedelta(days=1)
+
+        starts, ends = [], []
+        for service in services:
+            if weekday not in {_weekday_name(d) for d in service.get("disponibilidade") or []}:
+                continue
+            try:
+                start, end = window_for(midnight, service.get("horario_inicio"), service.get("horario_fim"))
+            except ValueError:
+                continue
+            starts.append(start)
+            ends.append(min(end, day_end))
+        return merge_intervals(to_minutes(starts), to_minutes(ends))
+
+    async def _compute(self, database, provider_id: str, days: List[date]) -> Dict[date, List[List[int]]]:
+        """Calcular horários livres dos dias com uma leitura de serviços e de agendamentos."""
+        services = await database.services.find(
+            {"prestador_id": provider_id, "status": ServiceStatus.DISPONIVEL.value},
+            SERVICE_HOURS_PROJECTION,
+        ).to_list(length=None)
+
+        busy = await self.index.busy_intervals(
+            database, provider_id, _midnight(days[0]), _midnight(days[-1]) + timedelta(days=1)
+        )
+        busy_starts, busy_ends = merge_intervals(
+            to_minutes(start for start, _ in busy), to_minutes(end for _, end in busy)
+        )
+
+        free: Dict[date, List[List[int]]] = {}
+        for day in days:
+            day_start = (_midnight(day) - EPOCH) // MINUTE
+            day_end = day_start + 24 * 60
+            # Só os ocupados que tocam o dia (listas unidas têm fins ordenados)
+            lo = np.searchsorted(busy_ends, day_start, side="right")
+            hi = np.searchsorted(busy_starts, day_end, side="left")
+            starts, ends = subtract_intervals(
+                *self.working_hours(services, day), busy_starts[lo:hi], busy_ends[lo:hi]
+            )
+            free[day] = [[start, end] for start, end in zip(starts.tolist(), ends.tolist())]
+        return free
+
+    async def free_intervals(
+        self, database, provider_id: str, first_day: date, last_day: date
+    ) -> Dict[date, List[Interval]]:
+        """Horários livres por dia em [first_day, last_day], usando o cache."""
+        days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+        result: Dict[date, List[List[int]]] = {}
+        missing: List[date] = []
+        for day in days:
+            cached = await self.manager.get(self.key_for(provider_id, day))
+            if cached is None:
+                missing.append(day)
+            else:
+                result[day] = cached
+
+        if missing:
+            computed = await self._compute(database, provider_id, missing)
+            cached_days = self._days_by_provider.setdefault(provider_id, set())
+            for day, intervals in computed.items():
+                await self.manager.set(self.key_for(provider_id, day), intervals, self.ttl)
+                cached_days.add(day)
+                result[day] = intervals
+
+        return {
+            day: [(from_minutes(start), from_minutes(end)) for start, end in result[day]]
+            for day in days
+        }
+
+    async def free_slots(
+        self,
+        database,
+        provider_id: str,
+        first_day: date,
+        last_day: date,
+        min_minutes: int = 0,
+        now: Optional[datetime] = None,
+    ) -> Dict[date, List[Interval]]:
+        """Horários livres a partir de agora com pelo menos `min_minutes`."""
+        now = now or datetime.utcnow()
+        min_length = timedelta(minutes=max(min_minutes, 1))
+        free = await self.free_intervals(database, provider_id, first_day, last_day)
+        return {
+            day: [
+                (max(start, now), end)
+                for start, end in intervals
+                if end - max(start, now) >= min_length
+            ]
+            for day, intervals in free.items()
+        }
+
+    async def invalidate_days(self, provider_id: str, days: Iterable[date]) -> int:
+        """Invalidar dias do prestador."""
+        days = list(days)
+        cached_days = self._days_by_provider.get(provider_id)
+        if cached_days is not None:
+            cached_days.difference_update(days)
+            if not cached_days:
+                del self._days_by_provider[provider_id]
+        return await self.manager.delete_many(self.key_for(provider_id, day) for day in days)
+
+    async def invalidate_booking(self, doc: Dict[str, Any]) -> int:
+        """Invalidar os dias ocupados por um agendamento."""
+        provider_id = doc.get("prestador_id")
+        interval = booking_interval(doc)
+        if not provider_id or interval is None:
+            return 0
+        start, end = interval
+        first, last = start.date(), (end - MINUTE).date()
+        return await self.invalidate_days(
+            provider_id, (first + timedelta(days=n) for n in range((last - first).days + 1))
+        )
+
+    async def invalidate_provider(self, provider_id: str) -> int:
+        """Invalidar todos os dias do prestador (expediente mudou)."""
+        self._days_by_provider.pop(provider_id, None)
+        return await self.manager.invalidate_pattern(f"{self.FAMILY}:{provider_id}:")
+
+    def invalidate_provider_local(self, provider_id: str) -> int:
+        """Invalidar os dias do prestador só neste worker (agendamento mudou em outro)."""
+        self._days_by_provider.pop(provider_id, None)
+        return self.manager.invalidate_local(f"{self.FAMILY}:{provider_id}:")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do cache de horários livres."""
+        return {
+            "providers": len(self._days_by_provider),
+            "days": sum(len(days) for days in self._days_by_provider.values()),
+            "ttl": self.ttl,
+            **self.manager.get_family_stats().get(self.FAMILY, {"hits": 0, "misses": 0, "hit_ratio": 0.0}),
+        }
+
+
+# Instância global
+free_slot_calendar = FreeSlotCalendar(
+    cache_manager,
+    booking_index,
+    ttl=int(os.environ.get("FREE_SLOTS_CACHE_TTL", "300")),
+)
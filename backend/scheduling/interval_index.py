@@ -0,0 +1,315 @@
+# Índice de Intervalos de Agendamentos - Alça Hub
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from core.enums import BookingStatus
+
+logger = logging.getLogger(__name__)
+
+# Agendamentos que ocupam a agenda do prestador
+ACTIVE_BOOKING_STATUSES = (
+    BookingStatus.PENDENTE.value,
+    BookingStatus.CONFIRMADO.value,
+    BookingStatus.EM_ANDAMENTO.value,
+)
+
+# Duração assumida quando o agendamento não informa horário de fim
+DEFAULT_DURATION = timedelta(minutes=60)
+
+# `data_agendamento` pode guardar só o dia: agendamentos que atravessam a
+# meia-noite começam até um dia antes da janela consultada
+LOOKBACK = timedelta(days=2)
+
+BOOKING_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "prestador_id": 1,
+    "status": 1,
+    "data_agendamento": 1,
+    "horario_inicio": 1,
+    "horario_fim": 1,
+    "duracao_minutos": 1,
+}
+
+Interval = Tuple[datetime, datetime]
+
+
+def naive_utc(value: Any) -> Optional[datetime]:
+    """Datetime sem fuso em UTC (como o MongoDB devolve)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _at(day: datetime, hhmm: Optional[str]) -> Optional[datetime]:
+    """Combinar a data do agendamento com um horário HH:MM."""
+    try:
+        hour, minute = map(int, str(hhmm).split(":"))
+        return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    except (TypeError, ValueError):
+        return None
+
+
+def booking_interval(doc: Dict[str, Any]) -> Optional[Interval]:
+    """Intervalo [início, fim) ocupado por um agendamento.
+
+    Usa a data de `data_agendamento` com `horario_inicio`/`horario_fim`.
+    Fim antes do início atravessa a meia-noite. Sem horários, usa o instante
+    de `data_agendamento` e `duracao_minutos` (ou 60 minutos).
+    """
+    day = naive_utc(doc.get("data_agendamento"))
+    if day is None:
+        return None
+
+    start = _at(day, doc.get("horario_inicio")) or day
+    end = _at(day, doc.get("horario_fim"))
+    if end is None:
+        minutes = doc.get("duracao_minutos")
+        end = start + (timedelta(minutes=minutes) if minutes else DEFAULT_DURATION)
+    elif end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def window_for(day: datetime, horario_inicio: str, horario_fim: str) -> Interval:
+    """Janela desejada em uma data, no mesmo formato dos agendamentos.
+
+    Raises:
+        ValueError: se algum horário não estiver no formato HH:MM
+    """
+    day = naive_utc(day)
+    start = _at(day, horario_inicio) if day is not None else None
+    end = _at(day, horario_fim) if day is not None else None
+    if start is None or end is None:
+        raise ValueError("Horário deve estar no formato HH:MM (24h)")
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+class ProviderIntervals:
+    """Agendamentos ativos de um prestador, ordenados pelo início.
+
+    Guarda o maior fim de cada prefixo da lista: existe sobreposição com
+    [inicio, fim) se algum agendamento que começa antes de `fim` termina
+    depois de `inicio`, o que vira um bisect e uma leitura (O(log n)) mesmo
+    com agendamentos sobrepostos entre si.
+    """
+
+    def __init__(self):
+        self._items: List[Tuple[datetime, datetime, str]] = []
+        self._starts: List[datetime] = []
+        self._max_end: List[datetime] = []
+        self._longest = timedelta(0)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _reindex(self):
+        """Recalcular arrays auxiliares após inserção ou remoção."""
+        self._starts = [item[0] for item in self._items]
+        self._max_end = []
+        running: Optional[datetime] = None
+        for _, end, _ in self._items:
+            running = end if running is None or end > running else running
+            self._max_end.append(running)
+        self._longest = max((end - start for start, end, _ in self._items), default=timedelta(0))
+
+    def add(self, booking_id: str, start: datetime, end: datetime):
+        insort(self._items, (start, end, booking_id))
+        self._reindex()
+
+    def remove(self, booking_id: str):
+        self._items = [item for item in self._items if item[2] != booking_id]
+        self._reindex()
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """Há agendamento ativo que se sobrepõe a [start, end)?"""
+        count = bisect_left(self._starts, end)
+        return count > 0 and self._max_end[count - 1] > start
+
+    def conflicts(self, start: datetime, end: datetime) -> List[str]:
+        """IDs dos agendamentos que se sobrepõem a [start, end)."""
+        lo = bisect_left(self._starts, start - self._longest)
+        hi = bisect_left(self._starts, end)
+        return [booking_id for _, item_end, booking_id in self._items[lo:hi] if item_end > start]
+
+    def between(self, start: datetime, end: datetime) -> List[Interval]:
+        """Intervalos dos agendamentos que se sobrepõem a [start, end)."""
+        lo = bisect_left(self._starts, start - self._longest)
+        hi = bisect_left(self._starts, end)
+        return [(item_start, item_end) for item_start, item_end, _ in self._items[lo:hi] if item_end > start]
+
+
+class BookingIntervalIndex:
+    """Índice em memória dos agendamentos ativos por prestador.
+
+    Responde "o prestador está livre nesta janela?" sem consultar o banco, o
+    que permite filtrar todos os candidatos de uma busca de uma vez. É
+    construído no startup (agendamentos recentes e futuros) e atualizado pelas
+    rotas que escrevem em `bookings`. Enquanto não estiver pronto, a
+    verificação cai para uma única consulta agregada no banco.
+    """
+
+    def __init__(self):
+        self._by_provider: Dict[str, ProviderIntervals] = {}
+        self._provider_of_booking: Dict[str, str] = {}
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._provider_of_booking)
+
+    def clear(self):
+        self._by_provider.clear()
+        self._provider_of_booking.clear()
+        self.ready = False
+
+    def provider_of(self, booking_id: str) -> Optional[str]:
+        """Prestador de um agendamento ativo no índice."""
+        return self._provider_of_booking.get(booking_id)
+
+    def remove_booking(self, booking_id: str):
+        """Remover agendamento do índice."""
+        provider_id = self._provider_of_booking.pop(booking_id, None)
+        if provider_id is None:
+            return
+        intervals = self._by_provider.get(provider_id)
+        if intervals is not None:
+            intervals.remove(booking_id)
+            if not intervals:
+                del self._by_provider[provider_id]
+
+    def upsert_booking(self, doc: Dict[str, Any]):
+        """Refletir o estado atual de um agendamento (status, data ou horário)."""
+        booking_id = doc.get("id")
+        if not booking_id:
+            return
+        self.remove_booking(booking_id)
+
+        status = getattr(doc.get("status"), "value", doc.get("status"))
+        provider_id = doc.get("prestador_id")
+        interval = booking_interval(doc)
+        if status not in ACTIVE_BOOKING_STATUSES or not provider_id or interval is None:
+            return
+
+        self._by_provider.setdefault(provider_id, ProviderIntervals()).add(booking_id, *interval)
+        self._provider_of_booking[booking_id] = provider_id
+
+    async def sync_booking(self, database, booking_id: str):
+        """Reler agendamento do banco e refletir no índice."""
+        doc = await database.bookings.find_one({"id": booking_id}, BOOKING_PROJECTION)
+        if doc is None:
+            self.remove_booking(booking_id)
+            return
+        self.upsert_booking(doc)
+
+    async def build(self, database) -> int:
+        """Construir índice com os agendamentos ativos recentes e futuros."""
+        self.clear()
+        cursor = database.bookings.find(
+            {
+                "status": {"$in": list(ACTIVE_BOOKING_STATUSES)},
+                "data_agendamento": {"$gte": datetime.utcnow() - LOOKBACK},
+            },
+            BOOKING_PROJECTION,
+        )
+        async for doc in cursor:
+            self.upsert_booking(doc)
+
+        self.ready = True
+        logger.info(
+            f"Índice de agendamentos construído com {len(self)} agendamentos "
+            f"de {len(self._by_provider)} prestadores"
+        )
+        return len(self)
+
+    def is_free(self, provider_id: str, start: datetime, end: datetime) -> bool:
+        """Prestador sem agendamento ativo em [start, end)?"""
+        intervals = self._by_provider.get(provider_id)
+        return intervals is None or not intervals.overlaps(start, end)
+
+    def conflicts(self, provider_id: str, start: datetime, end: datetime) -> List[str]:
+        """Agendamentos ativos do prestador que se sobrepõem a [start, end)."""
+        intervals = self._by_provider.get(provider_id)
+        return intervals.conflicts(start, end) if intervals is not None else []
+
+    def intervals(self, provider_id: str, start: datetime, end: datetime) -> List[Interval]:
+        """Intervalos ocupados do prestador que se sobrepõem a [start, end)."""
+        intervals = self._by_provider.get(provider_id)
+        return intervals.between(start, end) if intervals is not None else []
+
+    async def busy_intervals(
+        self, database, provider_id: str, start: datetime, end: datetime
+    ) -> List[Interval]:
+        """Intervalos ocupados do prestador em [start, end), do banco se o índice não estiver pronto."""
+        start, end = naive_utc(start), naive_utc(end)
+        if self.ready:
+            return self.intervals(provider_id, start, end)
+
+        query = {
+            "prestador_id": provider_id,
+            "status": {"$in": list(ACTIVE_BOOKING_STATUSES)},
+            "data_agendamento": {"$gte": start - LOOKBACK, "$lt": end},
+        }
+        busy: List[Interval] = []
+        async for doc in database.bookings.find(query, BOOKING_PROJECTION):
+            interval = booking_interval(doc)
+            if interval is not None and interval[0] < end and interval[1] > start:
+                busy.append(interval)
+        return sorted(busy)
+
+    async def busy_providers(
+        self,
+        database,
+        start: datetime,
+        end: datetime,
+        provider_ids: Optional[Iterable[str]] = None,
+    ) -> Set[str]:
+        """Prestadores ocupados em [start, end).
+
+        Args:
+            database: Banco usado enquanto o índice não está pronto
+            start: Início da janela
+            end: Fim da janela
+            provider_ids: Restringir aos candidatos informados (todos se None)
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        if self.ready:
+            ids = self._by_provider if provider_ids is None else provider_ids
+            return {pid for pid in ids if not self.is_free(pid, start, end)}
+
+        # Uma consulta para todos os candidatos; a sobreposição exata é calculada aqui
+        query: Dict[str, Any] = {
+            "status": {"$in": list(ACTIVE_BOOKING_STATUSES)},
+            "data_agendamento": {"$gte": start - LOOKBACK, "$lt": end},
+        }
+        if provider_ids is not None:
+            query["prestador_id"] = {"$in": list(provider_ids)}
+
+        busy: Set[str] = set()
+        async for doc in database.bookings.find(query, BOOKING_PROJECTION):
+            interval = booking_interval(doc)
+            if interval is not None and interval[0] < end and interval[1] > start:
+                busy.add(doc.get("prestador_id"))
+        return busy
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas do índice."""
+        return {
+            "ready": self.ready,
+            "bookings": len(self),
+            "providers": len(self._by_provider),
+        }
+
+
+# Instância global
+booking_index = BookingIntervalIndex()
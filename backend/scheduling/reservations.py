@@ -0,0 +1,150 @@
+# Reserva Atômica de Horários - Alça Hub
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import logging
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "booking_slots"
+
+# Slots de reserva são mantidos até um dia depois do fim
+SLOT_RETENTION = timedelta(days=1)
+
+
+class SlotConflictError(Exception):
+    """Horário já reservado para o prestador."""
+
+    def __init__(self, provider_id: str, slot: Optional[datetime] = None):
+        self.provider_id = provider_id
+        self.slot = slot
+        when = f" em {slot.isoformat()}" if slot else ""
+        super().__init__(f"Horário indisponível para o prestador{when}")
+
+
+class SlotReservations:
+    """Reserva de horários por prestador com chave única por slot.
+
+    A agenda de cada prestador é dividida em slots de `slot_minutes`. Reservar
+    [início, fim) grava um documento por slot com `_id = prestador|slot`; o
+    índice único do `_id` garante que dois agendamentos não ocupem o mesmo
+    slot, mesmo com vários processos gravando ao mesmo tempo.
+
+    Os slots são gravados em ordem crescente com insert ordenado. Em duas
+    reservas sobrepostas, a primeira a gravar o slot mais cedo da interseção
+    vence; a outra para nesse slot (sem ter gravado nada depois dele) e
+    desfaz os slots que já tinha, então exatamente uma das duas é aceita.
+    """
+
+    def __init__(self, slot_minutes: int = 15, collection: str = COLLECTION):
+        self.slot = timedelta(minutes=slot_minutes)
+        self.collection = collection
+
+    def _slots(self, database):
+        return database[self.collection]
+
+    def slot_starts(self, start: datetime, end: datetime) -> List[datetime]:
+        """Inícios dos slots que cobrem [start, end), arredondando para fora."""
+        epoch = datetime(1970, 1, 1)
+        first = epoch + ((start - epoch) // self.slot) * self.slot
+        slots = []
+        current = first
+        while current < end:
+            slots.append(current)
+            current += self.slot
+        return slots
+
+    def on_grid(self, start: datetime, end: datetime) -> bool:
+        """[start, end) começa e termina em limites de slot?
+
+        Só janelas na grade podem ser reservadas sem sobra: fora dela o slot
+        arredondado para fora seria disputado por agendamentos encostados.
+        """
+        epoch = datetime(1970, 1, 1)
+        return not (start - epoch) % self.slot and not (end - epoch) % self.slot
+
+    @property
+    def slot_minutes(self) -> int:
+        return self.slot // timedelta(minutes=1)
+
+    @staticmethod
+    def slot_key(provider_id: str, slot: datetime) -> str:
+        return f"{provider_id}|{slot.isoformat()}"
+
+    async def ensure_indexes(self, database):
+        """Criar índices de liberação por agendamento e expiração."""
+        slots = self._slots(database)
+        await slots.create_index([("booking_id", ASCENDING)])
+        await slots.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    async def reserve(
+        self,
+        database,
+        booking_id: str,
+        provider_id: str,
+        start: datetime,
+        end: datetime,
+    ) -> int:
+        """
+        Reservar [start, end) para o agendamento.
+
+        Returns:
+            Quantidade de slots reservados
+
+        Raises:
+            SlotConflictError: se algum slot já estiver ocupado
+        """
+        now = datetime.utcnow()
+        docs: List[Dict[str, Any]] = [
+            {
+                "_id": self.slot_key(provider_id, slot),
+                "prestador_id": provider_id,
+                "booking_id": booking_id,
+                "slot": slot,
+                "created_at": now,
+                "expires_at": slot + self.slot + SLOT_RETENTION,
+            }
+            for slot in self.slot_starts(start, end)
+        ]
+        if not docs:
+            return 0
+
+        try:
+            await self._slots(database).insert_many(docs, ordered=True)
+        except (BulkWriteError, DuplicateKeyError) as e:
+            conflict = self._conflicting_slot(e, docs)
+            await self.release(database, booking_id)
+            raise SlotConflictError(provider_id, conflict) from e
+        return len(docs)
+
+    @staticmethod
+    def _conflicting_slot(error: Exception, docs: List[Dict[str, Any]]) -> Optional[datetime]:
+        """Slot que causou a falha do insert ordenado."""
+        details = getattr(error, "details", None) or {}
+        write_errors = details.get("writeErrors") or []
+        if write_errors:
+            index = write_errors[0].get("index", 0)
+            if 0 <= index < len(docs):
+                return docs[index]["slot"]
+        return None
+
+    async def release(self, database, booking_id: str) -> int:
+        """Liberar os slots de um agendamento."""
+        result = await self._slots(database).delete_many({"booking_id": booking_id})
+        return result.deleted_count
+
+    async def reserved_by(self, database, provider_id: str, start: datetime, end: datetime) -> List[str]:
+        """Agendamentos que ocupam algum slot de [start, end)."""
+        keys = [self.slot_key(provider_id, slot) for slot in self.slot_starts(start, end)]
+        if not keys:
+            return []
+        return await self._slots(database).distinct("booking_id", {"_id": {"$in": keys}})
+
+
+# Instância global
+slot_reservations = SlotReservations(
+    slot_minutes=int(os.environ.get("BOOKING_SLOT_MINUTES", "15")),
+)
@@ -0,0 +1,68 @@
+# Sincronização da Agenda com os Agendamentos - Alça Hub
+from typing import Any, Dict
+import logging
+
+from cache.manager import CacheManager, cache_manager
+from scheduling.free_slots import FreeSlotCalendar, free_slot_calendar
+from scheduling.interval_index import (
+    ACTIVE_BOOKING_STATUSES,
+    BOOKING_PROJECTION,
+    BookingIntervalIndex,
+    booking_index,
+)
+from scheduling.reservations import slot_reservations
+
+logger = logging.getLogger(__name__)
+
+# Mensagem publicada no canal do cache a cada mudança de agendamento
+BOOKING_CHANGED_OP = "booking_changed"
+
+
+async def booking_changed(database, booking: Dict[str, Any]):
+    """Refletir o agendamento no índice de intervalos, nos slots reservados e nos horários livres.
+
+    Chamado depois de qualquer escrita em `bookings`, pelas rotas ou pelo
+    modelo. O índice é atualizado antes de invalidar os horários livres,
+    para que o próximo cálculo já veja o estado novo; agendamentos que
+    deixaram de ocupar a agenda liberam os seus slots. Com L2, a mudança é
+    publicada para os outros workers (`follow_remote_booking_changes`).
+    """
+    booking_index.upsert_booking(booking)
+    await free_slot_calendar.invalidate_booking(booking)
+    status_value = getattr(booking.get("status"), "value", booking.get("status"))
+    if status_value not in ACTIVE_BOOKING_STATUSES:
+        await slot_reservations.release(database, booking["id"])
+    await cache_manager.broadcast({"op": BOOKING_CHANGED_OP, "booking_id": booking["id"]})
+
+
+def follow_remote_booking_changes(
+    database,
+    manager: CacheManager = cache_manager,
+    index: BookingIntervalIndex = booking_index,
+    calendar: FreeSlotCalendar = free_slot_calendar,
+):
+    """Reler no índice deste worker os agendamentos alterados em outros workers.
+
+    Sem isso o índice de cada worker continuaria vendo agendamentos
+    cancelados ou remarcados em outro processo e respondendo 409 falso.
+    Depois do índice, os horários livres do prestador saem do L1 deste
+    worker (cobre o dia antigo e o novo de uma remarcação).
+    """
+    async def apply(message: Dict[str, Any]):
+        booking_id = message.get("booking_id")
+        if not booking_id:
+            return
+        try:
+            doc = await database.bookings.find_one({"id": booking_id}, BOOKING_PROJECTION)
+        except Exception as e:
+            logger.error(f"Erro ao reler agendamento {booking_id}: {e}")
+            return
+        provider_id = doc.get("prestador_id") if doc else index.provider_of(booking_id)
+        if doc is None:
+            index.remove_booking(booking_id)
+        else:
+            index.upsert_booking(doc)
+        if provider_id:
+            calendar.invalidate_provider_local(provider_id)
+
+    manager.subscribe(BOOKING_CHANGED_OP, apply)
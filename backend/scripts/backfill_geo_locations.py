@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Backfill do campo GeoJSON `location` em usuários e serviços
+
+Preenche `location` ({"type": "Point", "coordinates": [lon, lat]}) a partir de
+latitude/longitude e cria os índices 2dsphere usados pelo $geoNear.
+Serviços sem coordenadas próprias herdam o ponto do prestador.
+
+Pode ser executado várias vezes: só grava documentos cujo ponto mudou.
+
+Execute com:
+    cd backend && python -m scripts.backfill_geo_locations
+    cd backend && python -m scripts.backfill_geo_locations --dry-run
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import GEOSPHERE, UpdateOne
+
+from geo.geojson import LOCATION_FIELD, geo_point
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT_DIR / ".env")
+
+
+async def _flush(collection, operations, dry_run):
+    """Enviar lote de atualizações."""
+    if operations and not dry_run:
+        await collection.bulk_write(operations, ordered=False)
+    operations.clear()
+
+
+async def backfill_users(db, batch_size, dry_run):
+    """Preencher `location` dos usuários a partir de latitude/longitude."""
+    updated = 0
+    operations = []
+    cursor = db.users.find(
+        {"$or": [{"latitude": {"$ne": None}}, {LOCATION_FIELD: {"$ne": None}}]},
+        {"_id": 1, "latitude": 1, "longitude": 1, LOCATION_FIELD: 1},
+    )
+    async for doc in cursor:
+        point = geo_point(doc.get("latitude"), doc.get("longitude"))
+        if doc.get(LOCATION_FIELD) == point:
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LOCATION_FIELD: point}}))
+        updated += 1
+        if len(operations) >= batch_size:
+            await _flush(db.users, operations, dry_run)
+    await _flush(db.users, operations, dry_run)
+    return updated
+
+
+async def backfill_services(db, batch_size, dry_run):
+    """Preencher `location` dos serviços (coordenadas próprias ou do prestador)."""
+    locations = {}
+    async for doc in db.users.find(
+        {"id": {"$exists": True}, LOCATION_FIELD: {"$ne": None}},
+        {"_id": 0, "id": 1, LOCATION_FIELD: 1},
+    ):
+        locations[doc["id"]] = doc[LOCATION_FIELD]
+
+    updated = 0
+    operations = []
+    cursor = db.services.find(
+        {},
+        {"_id": 1, "prestador_id": 1, "latitude": 1, "longitude": 1, LOCATION_FIELD: 1},
+    )
+    async for doc in cursor:
+        point = geo_point(doc.get("latitude"), doc.get("longitude"))
+        if point is None:
+            point = locations.get(doc.get("prestador_id"))
+        if doc.get(LOCATION_FIELD) == point:
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LOCATION_FIELD: point}}))
+        updated += 1
+        if len(operations) >= batch_size:
+            await _flush(db.services, operations, dry_run)
+    await _flush(db.services, operations, dry_run)
+    return updated
+
+
+async def main(batch_size: int, dry_run: bool):
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "alca_hub")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    print(f"🚀 Backfill de localização em {db_name}{' (dry-run)' if dry_run else ''}")
+    try:
+        users = await backfill_users(db, batch_size, dry_run)
+        print(f"✅ Usuários atualizados: {users}")
+
+        services = await backfill_services(db, batch_size, dry_run)
+        print(f"✅ Serviços atualizados: {services}")
+
+        if not dry_run:
+            await db.users.create_index([(LOCATION_FIELD, GEOSPHERE)])
+            await db.services.create_index([(LOCATION_FIELD, GEOSPHERE)])
+            print("✅ Índices 2dsphere garantidos")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill do campo GeoJSON location")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Apenas contar documentos")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.dry_run))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Backtest das regras de fraude
+
+Reproduz a coleção `payments` em ordem de tempo pelo motor de fraude, com
+relógio simulado, e compara os alertas com os pagamentos reembolsados ou
+contestados (chargeback). Relata taxa de alerta, alertas por nível,
+matriz de confusão e latência por evento. Pesos das regras e limites de
+risco podem ser sobrescritos para comparar configurações.
+
+Execute com:
+    cd backend && python -m scripts.backtest_fraud --workers 4
+    cd backend && python -m scripts.backtest_fraud --since 2025-01-01 \\
+        --weights amount_anomaly=0.6,rapid_transactions=0.9 --thresholds high=0.7
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT_DIR / ".env")
+
+from security.fraud_backtest import FraudBacktest  # noqa: E402
+
+
+def parse_pairs(text):
+    pairs = {}
+    for part in (text or "").split(","):
+        if part:
+            name, value = part.split("=")
+            pairs[name.strip()] = float(value)
+    return pairs
+
+
+async def main(args):
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "alca_hub")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    backtest = FraudBacktest(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        suspicious_patterns=parse_pairs(args.weights),
+        risk_thresholds=parse_pairs(args.thresholds),
+        alert_levels=args.alert_levels,
+    )
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+    print(f"🚀 Backtest de fraude em {db_name}.payments ({args.workers or 'sem'} processos)")
+    try:
+        report = await backtest.run(db, since, until)
+    finally:
+        client.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    matrix = report["confusion_matrix"]
+    print(f"📅 Período: {report['period'][0]} a {report['period'][1]}")
+    print(f"✅ {report['events']} pagamentos em {report['seconds']}s ({report['events_per_second']:.0f}/s)")
+    print(f"🚨 Alertas: {report['alerts']} ({report['alert_rate']:.2%}) por nível: {report['by_level']}")
+    print(f"   {'':<14} {'fraude':>10} {'legítimo':>10}")
+    print(f"   {'alerta':<14} {matrix['true_positives']:>10} {matrix['false_positives']:>10}")
+    print(f"   {'sem alerta':<14} {matrix['false_negatives']:>10} {matrix['true_negatives']:>10}")
+    print(f"🎯 Precisão {report['precision']:.3f}, recall {report['recall']:.3f}, F1 {report['f1']:.3f}, "
+          f"falsos positivos {report['false_positive_rate']:.2%}")
+    latency = report["latency_us"]
+    print(f"⏱️  Latência por evento: p50 {latency['p50']:.1f} µs, p99 {latency['p99']:.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest das regras de fraude sobre pagamentos históricos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos (0 = no próprio processo)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--since", help="Data inicial (ISO)")
+    parser.add_argument("--until", help="Data final, exclusiva (ISO)")
+    parser.add_argument("--weights", help="Pesos das regras: nome=peso,...")
+    parser.add_argument("--thresholds", help="Limites de risco: low=0.3,medium=0.6,...")
+    parser.add_argument("--alert-levels", nargs="+", default=["high", "critical"])
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    asyncio.run(main(parser.parse_args()))
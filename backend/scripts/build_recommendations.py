@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Materialização de recomendações
+
+Monta o motor de recomendações a partir de serviços, agendamentos e
+avaliações e grava as tabelas de usuários e serviços similares e a lista
+de recomendações de cada usuário, com a versão do cálculo e o id da
+execução. O motor lê essas listas e só recalcula usuários sem lista ou
+com lista vencida. Rode periodicamente (cron).
+
+Execute com:
+    cd backend && python -m scripts.build_recommendations
+    cd backend && python -m scripts.build_recommendations --approximate
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT_DIR / ".env")
+
+from ai.recommendation_index import recommendation_index_job  # noqa: E402
+
+
+async def main(approximate: bool, neighbors: int, batch_size: int):
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "alca_hub")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    mode = "aproximada (LSH)" if approximate else "exata"
+    print(f"🚀 Materializando recomendações em {db_name} (busca de vizinhos {mode})")
+    try:
+        recommendation_index_job.neighbors = neighbors
+        result = await recommendation_index_job.run(db, approximate=approximate, batch_size=batch_size)
+        for collection, count in result["written"].items():
+            print(f"✅ {collection}: {count} documentos gravados")
+        print(f"🧹 Vizinhos de execuções anteriores removidos: {result['removed']}")
+        print(f"⏱️  Execução {result['run_id']} em {result['seconds']}s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materializar recomendações por usuário")
+    parser.add_argument("--approximate", action="store_true", help="Vizinhos por LSH em vez de busca exata")
+    parser.add_argument("--neighbors", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.approximate, args.neighbors, args.batch_size))
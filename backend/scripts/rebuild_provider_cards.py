@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Reconstrução da collection `provider_cards`
+
+Regrava o card de todos os prestadores ativos a partir de users/services e
+remove cards de prestadores que deixaram de existir. Use após migrações ou
+escritas feitas fora da API (que não atualizam os cards).
+
+Execute com:
+    cd backend && python -m scripts.rebuild_provider_cards
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+# O pacote services exige as variáveis do .env já carregadas
+load_dotenv(ROOT_DIR / ".env")
+
+from services.provider_cards import provider_cards  # noqa: E402
+
+
+async def main(batch_size: int):
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "alca_hub")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    print(f"🚀 Reconstruindo cards de prestador em {db_name}")
+    try:
+        await provider_cards.ensure_indexes(db)
+        written = await provider_cards.rebuild_all(db, batch_size=batch_size)
+        print(f"✅ Cards gravados: {written}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruir cards de prestador")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
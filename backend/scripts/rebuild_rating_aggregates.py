@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Reconstrução dos agregados de avaliações
+
+Recalcula soma, contagem, histograma e média de notas de serviços e
+usuários com uma única agregação sobre `reviews` e regrava os cards de
+prestador, que exibem essas notas. Use após migrações ou escritas em
+`reviews` feitas fora da API (que não atualizam os agregados).
+
+Execute com:
+    cd backend && python -m scripts.rebuild_rating_aggregates
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+# O pacote services exige as variáveis do .env já carregadas
+load_dotenv(ROOT_DIR / ".env")
+
+from reviews.aggregates import rating_aggregates  # noqa: E402
+from services.provider_cards import provider_cards  # noqa: E402
+
+
+async def main(batch_size: int):
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "alca_hub")
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    print(f"🚀 Reconstruindo agregados de avaliações em {db_name}")
+    try:
+        written = await rating_aggregates.rebuild(db, batch_size=batch_size)
+        for collection, count in written.items():
+            print(f"✅ {collection}: {count} documentos atualizados")
+        cards = await provider_cards.rebuild_all(db, batch_size=batch_size)
+        print(f"✅ Cards gravados: {cards}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruir agregados de avaliações")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,209 @@
+# Features de Fraude em Janelas Fixas - Alça Hub
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+# Tamanhos das janelas por usuário
+MAX_TRANSACTIONS = 20
+MAX_LOCATIONS = 10
+MAX_DEVICES = 5
+RAPID_WINDOW_SECONDS = 600.0
+
+# Horário comercial usado quando o usuário não tem padrão próprio
+DEFAULT_NORMAL_HOURS = frozenset(range(9, 19))
+
+
+class RingBuffer:
+    """Últimos `capacity` valores float em um array circular de tamanho fixo."""
+
+    __slots__ = ("_data", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        self._data = array("d", bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def append(self, value: float) -> Optional[float]:
+        """Incluir valor; devolve o mais antigo descartado quando cheio."""
+        capacity = len(self._data)
+        if self._size < capacity:
+            self._data[(self._start + self._size) % capacity] = value
+            self._size += 1
+            return None
+        evicted = self._data[self._start]
+        self._data[self._start] = value
+        self._start = (self._start + 1) % capacity
+        return evicted
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> float:
+        """Índice a partir do mais antigo (negativos contam do mais recente)."""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._data[(self._start + index) % len(self._data)]
+
+    def __iter__(self) -> Iterator[float]:
+        for index in range(self._size):
+            yield self._data[(self._start + index) % len(self._data)]
+
+    def last(self, n: int) -> List[float]:
+        """Últimos `n` valores, do mais antigo para o mais recente."""
+        n = min(n, self._size)
+        return [self[index] for index in range(self._size - n, self._size)]
+
+    def tolist(self) -> List[float]:
+        return list(self)
+
+
+class TransactionWindow:
+    """Últimas transações (horário e valor) com contadores incrementais.
+
+    A contagem na janela de tempo avança um ponteiro sobre as transações
+    que já saíram dela, e média/variância vêm de somas atualizadas a cada
+    inclusão e descarte, então nenhuma consulta percorre o histórico. As
+    somas são recalculadas a cada volta completa do buffer para não
+    acumular erro de ponto flutuante.
+    """
+
+    __slots__ = ("times", "amounts", "window", "_expired", "_sum", "_sumsq", "_since_refresh")
+
+    def __init__(self, capacity: int = MAX_TRANSACTIONS, window: float = RAPID_WINDOW_SECONDS):
+        self.times = RingBuffer(capacity)
+        self.amounts = RingBuffer(capacity)
+        self.window = window
+        self._expired = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._since_refresh = 0
+
+    def add(self, at: float, amount: float):
+        """Registrar transação (horários em ordem crescente, em segundos)."""
+        amount = float(amount or 0.0)
+        self.times.append(at)
+        evicted = self.amounts.append(amount)
+        self._sum += amount
+        self._sumsq += amount * amount
+        if evicted is not None:
+            self._sum -= evicted
+            self._sumsq -= evicted * evicted
+            self._expired = max(0, self._expired - 1)
+        self._since_refresh += 1
+        if self._since_refresh >= self.amounts.capacity:
+            self._sum = sum(self.amounts)
+            self._sumsq = sum(value * value for value in self.amounts)
+            self._since_refresh = 0
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def count_since(self, now: float) -> int:
+        """Transações com menos de `window` segundos em `now`."""
+        size = len(self.times)
+        while self._expired < size and now - self.times[self._expired] >= self.window:
+            self._expired += 1
+        return size - self._expired
+
+    @property
+    def mean(self) -> float:
+        size = len(self.amounts)
+        return self._sum / size if size else 0.0
+
+    @property
+    def variance(self) -> float:
+        size = len(self.amounts)
+        if not size:
+            return 0.0
+        mean = self._sum / size
+        return max(self._sumsq / size - mean * mean, 0.0)
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+
+class UserFeatures:
+    """Features de fraude de um usuário, com memória fixa.
+
+    Substitui o dict de listas de transações: cada janela é um buffer
+    circular de floats, e o custo por usuário não cresce com o uso.
+    """
+
+    __slots__ = ("user_id", "transactions", "lats", "lngs", "devices", "normal_hours", "risk_score")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.transactions = TransactionWindow()
+        self.lats = RingBuffer(MAX_LOCATIONS)
+        self.lngs = RingBuffer(MAX_LOCATIONS)
+        self.devices: List[str] = []
+        self.normal_hours = DEFAULT_NORMAL_HOURS
+        self.risk_score = 0.0
+
+    def add_transaction(self, at: float, amount: float, location: Optional[Dict[str, float]] = None,
+                        device: Optional[str] = None):
+        self.transactions.add(at, amount)
+        if location and location.get("lat") is not None and location.get("lng") is not None:
+            self.lats.append(location["lat"])
+            self.lngs.append(location["lng"])
+        if device and device not in self.devices:
+            self.devices.append(device)
+            if len(self.devices) > MAX_DEVICES:
+                del self.devices[0]
+
+    def recent_locations(self, n: int):
+        return self.lats.last(n), self.lngs.last(n)
+
+    def to_doc(self) -> Dict[str, Any]:
+        """Documento do snapshot (listas do mais antigo para o mais recente)."""
+        return {
+            "user_id": self.user_id,
+            "times": self.transactions.times.tolist(),
+            "amounts": self.transactions.amounts.tolist(),
+            "lats": self.lats.tolist(),
+            "lngs": self.lngs.tolist(),
+            "devices": list(self.devices),
+            "risk_score": self.risk_score,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "UserFeatures":
+        if "transaction_patterns" in doc:
+            return cls._from_behavior_doc(doc)
+        features = cls(doc["user_id"])
+        for at, amount in zip(doc.get("times", []), doc.get("amounts", [])):
+            features.transactions.add(at, amount)
+        for lat, lng in zip(doc.get("lats", []), doc.get("lngs", [])):
+            features.lats.append(lat)
+            features.lngs.append(lng)
+        features.devices = list(doc.get("devices", []))[-MAX_DEVICES:]
+        features.risk_score = doc.get("risk_score", 0.0)
+        return features
+
+    @classmethod
+    def _from_behavior_doc(cls, doc: Dict[str, Any]) -> "UserFeatures":
+        """Converter snapshot no formato antigo (dataclass UserBehavior)."""
+        features = cls(doc["user_id"])
+        for transaction in doc["transaction_patterns"].get("recent_transactions", []):
+            features.transactions.add(epoch_seconds(transaction["timestamp"]), transaction.get("amount", 0))
+        for location in doc.get("location_history", []):
+            if location and location.get("lat") is not None and location.get("lng") is not None:
+                features.lats.append(location["lat"])
+                features.lngs.append(location["lng"])
+        features.devices = list(doc.get("device_fingerprints", []))[-MAX_DEVICES:]
+        features.risk_score = doc.get("risk_score", 0.0)
+        return features
+
+
+def epoch_seconds(value: datetime) -> float:
+    """Datetime (naive em UTC, como gravado pelo MongoDB) em segundos."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
@@ -0,0 +1,319 @@
+# Backtest das Regras de Fraude - Alça Hub
+import asyncio
+import multiprocessing
+import sys
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from scheduling.interval_index import naive_utc
+from security.feature_store import epoch_seconds
+from security.fraud_detection import FraudDetectionEngine, RiskLevel
+
+logger = logging.getLogger(__name__)
+
+# Pagamentos considerados fraude confirmada (rótulo do backtest)
+FRAUD_LABEL_STATUSES = frozenset({"refunded", "reembolsado", "charged_back", "chargeback"})
+
+# Campos lidos de `payments`
+PAYMENT_PROJECTION = {
+    "_id": 0, "user_id": 1, "amount": 1, "created_at": 1, "status": 1,
+    "location": 1, "device_fingerprint": 1, "reembolsado": 1, "chargeback": 1,
+}
+
+# Evento: (user_id, horário em segundos, valor, lat, lng, dispositivo, fraude)
+Event = Tuple[str, float, float, Optional[float], Optional[float], Optional[str], bool]
+
+
+class SimulatedClock:
+    """Relógio do motor durante o replay: o horário do evento em análise."""
+
+    __slots__ = ("now",)
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def is_labeled_fraud(payment: Dict[str, Any]) -> bool:
+    return (
+        payment.get("status") in FRAUD_LABEL_STATUSES
+        or bool(payment.get("reembolsado"))
+        or bool(payment.get("chargeback"))
+    )
+
+
+def payment_event(payment: Dict[str, Any]) -> Optional[Event]:
+    """Evento de replay de um documento de `payments` (None sem usuário ou data)."""
+    created_at = naive_utc(payment.get("created_at"))
+    if not payment.get("user_id") or created_at is None:
+        return None
+    location = payment.get("location") or {}
+    return (
+        payment["user_id"],
+        epoch_seconds(created_at),
+        float(payment.get("amount") or 0.0),
+        location.get("lat"),
+        location.get("lng"),
+        payment.get("device_fingerprint"),
+        is_labeled_fraud(payment),
+    )
+
+
+def partition_of(user_id: str, partitions: int) -> int:
+    return zlib.crc32(user_id.encode()) % partitions
+
+
+@dataclass
+class BacktestResult:
+    """Contagens do replay; resultados de partições diferentes são somados."""
+    events: int = 0
+    by_level: Dict[str, int] = field(default_factory=lambda: {level.value: 0 for level in RiskLevel})
+    true_positives: int = 0
+    false_positives: int = 0
+    false_negatives: int = 0
+    true_negatives: int = 0
+    latencies_us: array = field(default_factory=lambda: array("d"))
+    first_at: Optional[float] = None
+    last_at: Optional[float] = None
+
+    def record(self, level: RiskLevel, alerted: bool, labeled: bool, latency_us: float, at: float):
+        self.events += 1
+        self.by_level[level.value] += 1
+        if alerted:
+            if labeled:
+                self.true_positives += 1
+            else:
+                self.false_positives += 1
+        elif labeled:
+            self.false_negatives += 1
+        else:
+            self.true_negatives += 1
+        self.latencies_us.append(latency_us)
+        # Eventos de uma partição chegam em ordem de tempo
+        if self.first_at is None:
+            self.first_at = at
+        self.last_at = at
+
+    def merge(self, other: "BacktestResult") -> "BacktestResult":
+        self.events += other.events
+        for level, count in other.by_level.items():
+            self.by_level[level] += count
+        self.true_positives += other.true_positives
+        self.false_positives += other.false_positives
+        self.false_negatives += other.false_negatives
+        self.true_negatives += other.true_negatives
+        self.latencies_us.extend(other.latencies_us)
+        for at in (other.first_at, other.last_at):
+            if at is not None:
+                self.first_at = at if self.first_at is None else min(self.first_at, at)
+                self.last_at = at if self.last_at is None else max(self.last_at, at)
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        alerts = self.true_positives + self.false_positives
+        labeled = self.true_positives + self.false_negatives
+        negatives = self.false_positives + self.true_negatives
+        precision = self.true_positives / alerts if alerts else 0.0
+        recall = self.true_positives / labeled if labeled else 0.0
+        latencies = np.frombuffer(self.latencies_us, dtype=np.float64) if self.latencies_us else np.zeros(1)
+        return {
+            "events": self.events,
+            "period": [
+                datetime.utcfromtimestamp(at).isoformat() if at is not None else None
+                for at in (self.first_at, self.last_at)
+            ],
+            "alerts": alerts,
+            "alert_rate": alerts / self.events if self.events else 0.0,
+            "by_level": dict(self.by_level),
+            "confusion_matrix": {
+                "true_positives": self.true_positives,
+                "false_positives": self.false_positives,
+                "false_negatives": self.false_negatives,
+                "true_negatives": self.true_negatives,
+            },
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "false_positive_rate": self.false_positives / negatives if negatives else 0.0,
+            "latency_us": {
+                "p50": float(np.percentile(latencies, 50)),
+                "p99": float(np.percentile(latencies, 99)),
+                "mean": float(latencies.mean()),
+            },
+        }
+
+
+class PartitionReplayer:
+    """Replay de uma partição de usuários em um motor próprio.
+
+    O motor não tem banco nem limite de perfis, e o relógio simulado
+    avança com os eventos, então as regras veem o histórico como se fosse
+    tempo real. Os eventos de cada usuário devem chegar em ordem de tempo.
+    """
+
+    def __init__(
+        self,
+        suspicious_patterns: Optional[Dict[str, float]] = None,
+        risk_thresholds: Optional[Dict[str, float]] = None,
+        alert_levels: Sequence[str] = (RiskLevel.HIGH.value, RiskLevel.CRITICAL.value),
+    ):
+        self.clock = SimulatedClock()
+        self.engine = FraudDetectionEngine(max_profiles=sys.maxsize, idle_ttl=None, clock=self.clock)
+        self.engine.suspicious_patterns.update(suspicious_patterns or {})
+        for level, threshold in (risk_thresholds or {}).items():
+            self.engine.risk_thresholds[RiskLevel(level)] = threshold
+        self.alert_levels = frozenset(RiskLevel(level) for level in alert_levels)
+        self.result = BacktestResult()
+
+    async def replay(self, events: Iterable[Event]):
+        engine, clock, record = self.engine, self.clock, self.result.record
+        for user_id, at, amount, lat, lng, device, labeled in events:
+            clock.now = at
+            transaction = {"amount": amount}
+            if lat is not None and lng is not None:
+                transaction["location"] = {"lat": lat, "lng": lng}
+            if device:
+                transaction["device_fingerprint"] = device
+            started = time.perf_counter()
+            level, _, _ = await engine.analyze_transaction(user_id, transaction)
+            latency_us = (time.perf_counter() - started) * 1e6
+            record(level, level in self.alert_levels, labeled, latency_us, at)
+
+    def finish(self) -> BacktestResult:
+        return self.result
+
+
+def _partition_worker(inbox, outbox, options: Dict[str, Any]):
+    """Processo de uma partição: replay dos lotes recebidos até o marcador None."""
+    replayer = PartitionReplayer(**options)
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            chunk = inbox.get()
+            if chunk is None:
+                break
+            loop.run_until_complete(replayer.replay(chunk))
+        outbox.put(replayer.finish())
+    except Exception as e:
+        logger.error(f"Erro no backtest de fraude: {e}")
+        outbox.put(e)
+        # Continuar consumindo para o leitor não ficar bloqueado na fila cheia
+        while inbox.get() is not None:
+            pass
+    finally:
+        loop.close()
+
+
+class FraudBacktest:
+    """Reproduz pagamentos históricos pelo motor de fraude.
+
+    Os pagamentos são lidos em ordem de `created_at` em lotes de
+    `chunk_size` e distribuídos por usuário (hash do id) entre `workers`
+    processos, cada um com o seu motor; o estado de um usuário fica sempre
+    no mesmo processo e os seus eventos chegam em ordem. Com `workers`
+    igual a 0 o replay roda no próprio processo. As filas entre leitor e
+    processos são limitadas, então a memória não cresce com o histórico.
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        chunk_size: int = 5000,
+        suspicious_patterns: Optional[Dict[str, float]] = None,
+        risk_thresholds: Optional[Dict[str, float]] = None,
+        alert_levels: Sequence[str] = (RiskLevel.HIGH.value, RiskLevel.CRITICAL.value),
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.options = {
+            "suspicious_patterns": suspicious_patterns,
+            "risk_thresholds": risk_thresholds,
+            "alert_levels": tuple(alert_levels),
+        }
+
+    async def stream_payments(self, database, since: Optional[datetime] = None,
+                              until: Optional[datetime] = None) -> AsyncIterator[List[Event]]:
+        """Eventos dos pagamentos em ordem de tempo, em lotes (cursor com batch_size)."""
+        query: Dict[str, Any] = {}
+        if since or until:
+            query["created_at"] = {
+                **({"$gte": since} if since else {}),
+                **({"$lt": until} if until else {}),
+            }
+        cursor = database.payments.find(query, PAYMENT_PROJECTION).sort("created_at", 1).batch_size(self.chunk_size)
+        chunk: List[Event] = []
+        async for payment in cursor:
+            event = payment_event(payment)
+            if event is not None:
+                chunk.append(event)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def run(self, database, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None) -> Dict[str, Any]:
+        return await self.run_chunks(self.stream_payments(database, since, until))
+
+    async def run_chunks(self, chunks: AsyncIterator[List[Event]]) -> Dict[str, Any]:
+        """Replay de lotes de eventos já em ordem de tempo."""
+        started = time.perf_counter()
+        if self.workers <= 0:
+            replayer = PartitionReplayer(**self.options)
+            async for chunk in chunks:
+                await replayer.replay(chunk)
+            result = replayer.finish()
+        else:
+            result = await self._run_processes(chunks)
+        elapsed = time.perf_counter() - started
+        return {
+            **result.summary(),
+            "workers": self.workers,
+            "seconds": round(elapsed, 3),
+            "events_per_second": result.events / elapsed if elapsed else 0.0,
+        }
+
+    async def _run_processes(self, chunks: AsyncIterator[List[Event]]) -> BacktestResult:
+        context = multiprocessing.get_context("spawn")
+        inboxes = [context.Queue(maxsize=8) for _ in range(self.workers)]
+        outbox = context.Queue()
+        processes = [
+            context.Process(target=_partition_worker, args=(inbox, outbox, self.options), daemon=True)
+            for inbox in inboxes
+        ]
+        for process in processes:
+            process.start()
+
+        loop = asyncio.get_running_loop()
+        try:
+            async for chunk in chunks:
+                parts: List[List[Event]] = [[] for _ in range(self.workers)]
+                for event in chunk:
+                    parts[partition_of(event[0], self.workers)].append(event)
+                for inbox, part in zip(inboxes, parts):
+                    if part:
+                        # Fila cheia bloqueia o leitor (contrapressão) fora do loop
+                        await loop.run_in_executor(None, inbox.put, part)
+        finally:
+            for inbox in inboxes:
+                await loop.run_in_executor(None, inbox.put, None)
+
+        result = BacktestResult()
+        for _ in processes:
+            partial = await loop.run_in_executor(None, outbox.get)
+            if isinstance(partial, Exception):
+                raise partial
+            result.merge(partial)
+        for process in processes:
+            process.join()
+        return result
@@ -1,12 +1,20 @@
 # Sistema de Detecção de Fraude - Alça Hub
 import asyncio
 import hashlib
-from typing import Dict, List, Any, Optional, Tuple
+import time
+import weakref
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 import logging
 
+import numpy as np
+
+from geo.distance import haversine_km, haversine_many
+from repositories.profile_snapshots import ProfileSnapshots
+from security.feature_store import UserFeatures
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +26,10 @@ class RiskLevel(Enum):
     CRITICAL = "critical"
 
 
+# Riscos que retêm o pagamento; transações retidas não entram no histórico
+HOLD_LEVELS = (RiskLevel.HIGH, RiskLevel.CRITICAL)
+
+
 @dataclass
 class FraudAlert:
     """Alerta de fraude."""
@@ -30,22 +42,40 @@ class FraudAlert:
     action_required: bool = False
 
 
-@dataclass
-class UserBehavior:
-    """Comportamento do usuário."""
-    user_id: str
-    login_patterns: Dict[str, Any]
-    transaction_patterns: Dict[str, Any]
-    device_fingerprints: List[str]
-    location_history: List[Dict[str, Any]]
-    risk_score: float = 0.0
-
-
 class FraudDetectionEngine:
-    """Motor de detecção de fraude."""
+    """Motor de detecção de fraude.
     
-    def __init__(self):
-        self.user_behaviors: Dict[str, UserBehavior] = {}
+    As features de cada usuário (`UserFeatures`) têm tamanho fixo e ficam
+    em memória com limite LRU; usuários sem transação há `idle_ttl`
+    segundos saem da memória. Depois de `start`, são gravadas em snapshots
+    no MongoDB e lidas sob demanda por usuário, sobrevivendo a deploys e
+    compartilhadas entre workers. O snapshot é gravado inteiro: se dois
+    workers analisam transações do mesmo usuário, a última gravação vence e
+    as transações vistas só pelo outro somem do histórico.
+    
+    `clock` (segundos desde a época, UTC) é o horário das transações; o
+    backtest passa um relógio simulado para reproduzir o histórico.
+    
+    Transações retidas (`HOLD_LEVELS`) não entram no histórico do usuário:
+    senão a mesma transação, repetida em seguida, já seria comparada com
+    ela mesma e passaria. Sinais em `needs_corroboration` sozinhos não
+    passam de MEDIUM (o primeiro valor alto legítimo não é retido).
+    """
+    
+    def __init__(
+        self,
+        max_profiles: int = 10000,
+        idle_ttl: Optional[float] = 3600.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.clock = clock
+        self.user_behaviors = ProfileSnapshots(
+            "fraud_behavior",
+            UserFeatures.to_doc,
+            UserFeatures.from_doc,
+            max_size=max_profiles,
+            idle_ttl=idle_ttl
+        )
         self.suspicious_patterns = {
             'rapid_transactions': 0.8,
             'unusual_location': 0.7,
@@ -53,6 +83,9 @@ class FraudDetectionEngine:
             'time_anomaly': 0.5,
             'amount_anomaly': 0.9
         }
+        self.needs_corroboration = {'amount_anomaly'}
+        # Um lock por usuário com análise em andamento (some quando ninguém o usa)
+        self._user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
         self.risk_thresholds = {
             RiskLevel.LOW: 0.3,
             RiskLevel.MEDIUM: 0.6,
@@ -65,36 +98,58 @@ class FraudDetectionEngine:
         user_id: str, 
         transaction_data: Dict[str, Any]
     ) -> Tuple[RiskLevel, float, List[str]]:
-        """Analisar transação para fraude."""
+        """Analisar transação para fraude.
+
+        Análise e registro de um mesmo usuário rodam sob um lock: os
+        `_check_*` e o registro esperam pela leitura do perfil, e duas
+        transações intercaladas deixariam de ver uma à outra.
+        """
+        async with self._user_lock(user_id):
+            return await self._analyze(user_id, transaction_data)
+    
+    def _user_lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user_id] = lock
+        return lock
+    
+    async def _analyze(self, user_id: str, transaction_data: Dict[str, Any]) -> Tuple[RiskLevel, float, List[str]]:
+        await self.user_behaviors.load(user_id)
         reasons = []
+        signals = []
         risk_score = 0.0
         
         # Verificar padrões suspeitos
         if await self._check_rapid_transactions(user_id, transaction_data):
-            risk_score += self.suspicious_patterns['rapid_transactions']
+            signals.append('rapid_transactions')
             reasons.append("Múltiplas transações em curto período")
         
         if await self._check_unusual_location(user_id, transaction_data):
-            risk_score += self.suspicious_patterns['unusual_location']
+            signals.append('unusual_location')
             reasons.append("Localização incomum para o usuário")
         
         if await self._check_device_mismatch(user_id, transaction_data):
-            risk_score += self.suspicious_patterns['device_mismatch']
+            signals.append('device_mismatch')
             reasons.append("Dispositivo diferente do padrão")
         
         if await self._check_time_anomaly(user_id, transaction_data):
-            risk_score += self.suspicious_patterns['time_anomaly']
+            signals.append('time_anomaly')
             reasons.append("Horário incomum para transações")
         
         if await self._check_amount_anomaly(user_id, transaction_data):
-            risk_score += self.suspicious_patterns['amount_anomaly']
+            signals.append('amount_anomaly')
             reasons.append("Valor incomum para o usuário")
         
         # Determinar nível de risco
+        risk_score = sum(self.suspicious_patterns[signal] for signal in signals)
         risk_level = self._determine_risk_level(risk_score)
+        if risk_level in HOLD_LEVELS and set(signals) <= self.needs_corroboration:
+            risk_level = RiskLevel.MEDIUM
         
-        # Atualizar comportamento do usuário
-        await self._update_user_behavior(user_id, transaction_data)
+        # Atualizar comportamento do usuário (transação retida não conta)
+        if risk_level not in HOLD_LEVELS:
+            await self._record(user_id, transaction_data)
         
         return risk_level, risk_score, reasons
     
@@ -104,15 +159,9 @@ class FraudDetectionEngine:
             return False
         
         behavior = self.user_behaviors[user_id]
-        current_time = datetime.utcnow()
         
         # Verificar se há muitas transações nos últimos 10 minutos
-        recent_transactions = [
-            t for t in behavior.transaction_patterns.get('recent_transactions', [])
-            if (current_time - t['timestamp']).total_seconds() < 600
-        ]
-        
-        return len(recent_transactions) >= 5
+        return behavior.transactions.count_since(self.clock()) >= 5
     
     async def _check_unusual_location(self, user_id: str, transaction_data: Dict[str, Any]) -> bool:
         """Verificar localização incomum."""
@@ -122,19 +171,18 @@ class FraudDetectionEngine:
         behavior = self.user_behaviors[user_id]
         current_location = transaction_data.get('location')
         
-        if not current_location or not behavior.location_history:
+        if not current_location or not len(behavior.lats):
             return False
         
-        # Verificar se a localização está muito longe do histórico
-        for location in behavior.location_history[-5:]:  # Últimas 5 localizações
-            distance = self._calculate_distance(
-                current_location, 
-                location
-            )
-            if distance > 100:  # Mais de 100km
-                return True
-        
-        return False
+        # Verificar se a localização está muito longe do histórico (últimas 5)
+        lats, lngs = behavior.recent_locations(5)
+        distances = haversine_many(
+            current_location['lat'],
+            current_location['lng'],
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lngs, dtype=np.float64),
+        )
+        return bool((distances > 100).any())  # Mais de 100km
     
     async def _check_device_mismatch(self, user_id: str, transaction_data: Dict[str, Any]) -> bool:
         """Verificar dispositivo diferente."""
@@ -147,7 +195,7 @@ class FraudDetectionEngine:
         if not current_device:
             return False
         
-        return current_device not in behavior.device_fingerprints
+        return current_device not in behavior.devices
     
     async def _check_time_anomaly(self, user_id: str, transaction_data: Dict[str, Any]) -> bool:
         """Verificar anomalia de tempo."""
@@ -155,12 +203,10 @@ class FraudDetectionEngine:
             return False
         
         behavior = self.user_behaviors[user_id]
-        current_hour = datetime.utcnow().hour
+        current_hour = datetime.utcfromtimestamp(self.clock()).hour
         
         # Verificar se está fora do horário normal do usuário
-        normal_hours = behavior.transaction_patterns.get('normal_hours', [9, 10, 11, 12, 13, 14, 15, 16, 17, 18])
-        
-        return current_hour not in normal_hours
+        return current_hour not in behavior.normal_hours
     
     async def _check_amount_anomaly(self, user_id: str, transaction_data: Dict[str, Any]) -> bool:
         """Verificar anomalia de valor."""
@@ -174,18 +220,26 @@ class FraudDetectionEngine:
             return False
         
         # Verificar se o valor está muito acima da média
-        avg_amount = behavior.transaction_patterns.get('average_amount', 0)
+        avg_amount = behavior.transactions.mean
         if avg_amount > 0:
             return current_amount > (avg_amount * 3)  # 3x a média
         
         return False
     
+    async def start(self, database, warm: bool = True):
+        """Persistir comportamentos no MongoDB e carregar os mais recentes."""
+        await self.user_behaviors.ensure_indexes(database)
+        self.user_behaviors.start(database)
+        if warm:
+            await self.user_behaviors.warm()
+    
+    async def stop(self):
+        """Gravar comportamentos pendentes."""
+        await self.user_behaviors.stop()
+    
     def _calculate_distance(self, loc1: Dict[str, float], loc2: Dict[str, float]) -> float:
-        """Calcular distância entre duas localizações (simplificado)."""
-        # Implementação simplificada - em produção usar fórmula de Haversine
-        lat_diff = abs(loc1['lat'] - loc2['lat'])
-        lng_diff = abs(loc1['lng'] - loc2['lng'])
-        return (lat_diff + lng_diff) * 111  # Aproximação em km
+        """Calcular distância entre duas localizações (km)."""
+        return haversine_km(loc1['lat'], loc1['lng'], loc2['lat'], loc2['lng'])
     
     def _determine_risk_level(self, risk_score: float) -> RiskLevel:
         """Determinar nível de risco."""
@@ -198,51 +252,35 @@ class FraudDetectionEngine:
         else:
             return RiskLevel.LOW
     
+    async def record_transaction(self, user_id: str, transaction_data: Dict[str, Any]):
+        """Incluir transação aceita no comportamento do usuário (também após revisão manual)."""
+        async with self._user_lock(user_id):
+            await self._record(user_id, transaction_data)
+    
+    async def _record(self, user_id: str, transaction_data: Dict[str, Any]):
+        await self.user_behaviors.load(user_id)
+        await self._update_user_behavior(user_id, transaction_data)
+    
     async def _update_user_behavior(self, user_id: str, transaction_data: Dict[str, Any]):
         """Atualizar comportamento do usuário."""
         if user_id not in self.user_behaviors:
-            self.user_behaviors[user_id] = UserBehavior(
-                user_id=user_id,
-                login_patterns={},
-                transaction_patterns={'recent_transactions': []},
-                device_fingerprints=[],
-                location_history=[]
-            )
-        
-        behavior = self.user_behaviors[user_id]
-        
-        # Atualizar transações recentes
-        behavior.transaction_patterns['recent_transactions'].append({
-            'timestamp': datetime.utcnow(),
-            'amount': transaction_data.get('amount', 0),
-            'location': transaction_data.get('location')
-        })
-        
-        # Manter apenas últimas 20 transações
-        behavior.transaction_patterns['recent_transactions'] = \
-            behavior.transaction_patterns['recent_transactions'][-20:]
-        
-        # Atualizar localização
-        if transaction_data.get('location'):
-            behavior.location_history.append(transaction_data['location'])
-            behavior.location_history = behavior.location_history[-10:]  # Últimas 10
-        
-        # Atualizar dispositivo
-        device_fingerprint = transaction_data.get('device_fingerprint')
-        if device_fingerprint and device_fingerprint not in behavior.device_fingerprints:
-            behavior.device_fingerprints.append(device_fingerprint)
-            behavior.device_fingerprints = behavior.device_fingerprints[-5:]  # Últimos 5
-        
-        # Calcular média de valores
-        amounts = [t['amount'] for t in behavior.transaction_patterns['recent_transactions']]
-        if amounts:
-            behavior.transaction_patterns['average_amount'] = sum(amounts) / len(amounts)
+            self.user_behaviors[user_id] = UserFeatures(user_id)
+        
+        # Janelas fixas: últimas 20 transações, 10 localizações e 5 dispositivos
+        self.user_behaviors[user_id].add_transaction(
+            self.clock(),
+            transaction_data.get('amount', 0),
+            transaction_data.get('location'),
+            transaction_data.get('device_fingerprint')
+        )
+        self.user_behaviors.touch(user_id)
     
     async def generate_fraud_alert(
         self, 
         user_id: str, 
     ) -> Optional[FraudAlert]:
         """Gerar alerta de fraude se necessário."""
+        await self.user_behaviors.load(user_id)
         if user_id not in self.user_behaviors:
             return None
         
@@ -253,15 +291,15 @@ class FraudDetectionEngine:
         reasons = []
         
         # Verificar padrões suspeitos no histórico
-        if len(behavior.transaction_patterns.get('recent_transactions', [])) > 10:
+        if len(behavior.transactions) > 10:
             risk_score += 0.3
             reasons.append("Alto volume de transações")
         
-        if len(behavior.device_fingerprints) > 3:
+        if len(behavior.devices) > 3:
             risk_score += 0.4
             reasons.append("Múltiplos dispositivos")
         
-        if len(behavior.location_history) > 5:
+        if len(behavior.lats) > 5:
             risk_score += 0.2
             reasons.append("Múltiplas localizações")
         
@@ -282,6 +320,7 @@ class FraudDetectionEngine:
     
     async def get_user_risk_profile(self, user_id: str) -> Dict[str, Any]:
         """Obter perfil de risco do usuário."""
+        await self.user_behaviors.load(user_id)
         if user_id not in self.user_behaviors:
             return {"risk_level": "unknown", "score": 0.0}
         
@@ -290,10 +329,12 @@ class FraudDetectionEngine:
         return {
             "user_id": user_id,
             "risk_score": behavior.risk_score,
-            "transaction_count": len(behavior.transaction_patterns.get('recent_transactions', [])),
-            "device_count": len(behavior.device_fingerprints),
-            "location_count": len(behavior.location_history),
-            "average_amount": behavior.transaction_patterns.get('average_amount', 0),
+            "transaction_count": len(behavior.transactions),
+            "recent_transaction_count": behavior.transactions.count_since(self.clock()),
+            "device_count": len(behavior.devices),
+            "location_count": len(behavior.lats),
+            "average_amount": behavior.transactions.mean,
+            "amount_std": behavior.transactions.std,
             "last_updated": datetime.utcnow().isoformat()
         }
     
@@ -310,3 +351,7 @@ class FraudDetectionEngine:
         # Criar hash único do dispositivo
         fingerprint_string = '|'.join(str(v) for v in fingerprint_data.values())
         return hashlib.md5(fingerprint_string.encode()).hexdigest()
+
+
+# Instância global
+fraud_detection_engine = FraudDetectionEngine()
@@ -0,0 +1,273 @@
+# Fila Assíncrona de Análise de Fraude - Alça Hub
+import asyncio
+import os
+import time
+import uuid
+import zlib
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from monitoring.metrics import MetricsCollector, performance_monitor
+from security.fraud_detection import (
+    HOLD_LEVELS,
+    FraudAlert,
+    FraudDetectionEngine,
+    RiskLevel,
+    fraud_detection_engine,
+)
+
+logger = logging.getLogger(__name__)
+
+FRAUD_ALERTS = "fraud_alerts"
+
+# Riscos que viram alerta; os de HOLD_LEVELS também exigem ação
+ALERT_LEVELS = (RiskLevel.MEDIUM, RiskLevel.HIGH, RiskLevel.CRITICAL)
+
+# Marcador de parada colocado no fim de cada fila
+_STOP = object()
+
+
+@dataclass
+class FraudScore:
+    """Resultado da análise de uma transação."""
+    user_id: str
+    reference: Optional[str]
+    risk_level: RiskLevel
+    score: float
+    reasons: List[str]
+    queued_at: float = field(repr=False, default=0.0)
+
+    @property
+    def high_risk(self) -> bool:
+        return self.risk_level in HOLD_LEVELS
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": 0.0, "p99_ms": 0.0}
+    values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+    return {"p50_ms": float(np.percentile(values, 50)), "p99_ms": float(np.percentile(values, 99))}
+
+
+class FraudScoringQueue:
+    """Analisa transações de pagamento fora do caminho da requisição.
+
+    Cada worker tem a sua fila e recebe sempre os mesmos usuários (hash do
+    id), então as transações de um usuário são analisadas em ordem e sem
+    disputa pelo mesmo perfil. O worker pega o que já estiver enfileirado
+    (até `batch_size`) sem esperar por mais, analisa o lote e grava os
+    alertas com um único insert_many; transação de alto risco também marca
+    o agendamento e o pagamento para revisão (`fraud_review`), e novas
+    tentativas de pagamento são recusadas até a revisão.
+
+    As rotas usam `screen`: enfileira e espera o resultado por no máximo
+    `sync_budget` segundos, devolvendo-o só se for de alto risco (para a
+    rota reter o pagamento). Passado o orçamento a requisição segue e o
+    resultado é tratado em segundo plano. Com a fila cheia a transação é
+    descartada e contada em `dropped`.
+    """
+
+    def __init__(
+        self,
+        engine: FraudDetectionEngine,
+        workers: int = 2,
+        batch_size: int = 64,
+        max_queue: int = 10000,
+        sync_budget: float = 0.02,
+        metrics: Optional[MetricsCollector] = None,
+    ):
+        self.engine = engine
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.sync_budget = sync_budget
+        self.metrics = metrics
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._db = None
+        self.wait_ms: deque = deque(maxlen=1000)
+        self.score_ms: deque = deque(maxlen=1000)
+        self.scored = 0
+        self.alerts = 0
+        self.escalated = 0
+        self.over_budget = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def start(self, database):
+        """Iniciar os workers no loop atual."""
+        if self.running:
+            return
+        self._db = database
+        loop = asyncio.get_running_loop()
+        self._queues = [asyncio.Queue(maxsize=max(self.max_queue // self.workers, 1)) for _ in range(self.workers)]
+        self._tasks = [loop.create_task(self._run(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """Analisar o que está nas filas e encerrar."""
+        if not self._tasks:
+            return
+        if self.running:
+            for queue in self._queues:
+                await queue.put(_STOP)
+            await asyncio.gather(*self._tasks)
+        self._tasks = []
+
+    def _queue_for(self, user_id: str) -> asyncio.Queue:
+        return self._queues[zlib.crc32(user_id.encode()) % len(self._queues)]
+
+    def _enqueue(self, user_id: str, transaction: Dict[str, Any], reference: Optional[str],
+                 future: Optional[asyncio.Future]) -> bool:
+        if not self.running:
+            return False
+        try:
+            self._queue_for(user_id).put_nowait((user_id, transaction, reference, future, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.increment_counter("fraud_queue_dropped")
+            return False
+
+    def submit(self, user_id: str, transaction: Dict[str, Any], reference: Optional[str] = None) -> bool:
+        """Enfileirar transação para análise; nunca bloqueia."""
+        return self._enqueue(user_id, transaction, reference, None)
+
+    async def screen(self, user_id: str, transaction: Dict[str, Any],
+                     reference: Optional[str] = None) -> Optional[FraudScore]:
+        """Enfileirar e esperar até `sync_budget` por um resultado de alto risco.
+
+        Devolve o resultado só quando ele sai dentro do orçamento e é de
+        alto risco; nos demais casos a requisição não é afetada.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self._enqueue(user_id, transaction, reference, future):
+            return None
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.sync_budget)
+        except asyncio.TimeoutError:
+            self.over_budget += 1
+            return None
+        if result is not None and result.high_risk:
+            self.escalated += 1
+            return result
+        return None
+
+    async def _run(self, queue: asyncio.Queue):
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.error(f"Erro ao gravar análise de fraude: {e}")
+
+    async def _process(self, batch: List[tuple]) -> List[Optional[FraudScore]]:
+        """Analisar lote em ordem, responder quem espera e gravar alertas."""
+        scores = []
+        for user_id, transaction, reference, future, queued_at in batch:
+            started = time.perf_counter()
+            try:
+                risk_level, score, reasons = await self.engine.analyze_transaction(user_id, transaction)
+                result = FraudScore(user_id, reference, risk_level, score, reasons, queued_at)
+            except Exception as e:
+                logger.error(f"Erro ao analisar transação de {user_id}: {e}")
+                self.errors += 1
+                result = None
+            finished = time.perf_counter()
+            self.score_ms.append((finished - started) * 1000)
+            self.wait_ms.append((finished - queued_at) * 1000)
+            if future is not None and not future.done():
+                future.set_result(result)
+            scores.append(result)
+        self.scored += len(batch)
+
+        if self.metrics is not None:
+            self.metrics.set_gauge("fraud_queue_depth", self.depth)
+            self.metrics.record_histogram("fraud_scoring_latency_ms", self.wait_ms[-1])
+
+        flagged = [result for result in scores if result is not None and result.risk_level in ALERT_LEVELS]
+        if flagged and self._db is not None:
+            await self._write_alerts(flagged)
+        return scores
+
+    async def _write_alerts(self, flagged: List[FraudScore]):
+        now = datetime.utcnow()
+        docs = []
+        for result in flagged:
+            alert = FraudAlert(
+                alert_id=str(uuid.uuid4()),
+                user_id=result.user_id,
+                risk_level=result.risk_level,
+                score=result.score,
+                reasons=result.reasons,
+                timestamp=now,
+                action_required=result.high_risk,
+            )
+            docs.append({**asdict(alert), "risk_level": alert.risk_level.value, "reference": result.reference})
+        await self._db[FRAUD_ALERTS].insert_many(docs, ordered=False)
+        self.alerts += len(docs)
+
+        # Agendamento retido até a revisão; pagamento já criado (resultado
+        # fora do orçamento) também fica retido
+        references = [result.reference for result in flagged if result.high_risk and result.reference]
+        if references:
+            await self._db.bookings.update_many(
+                {"id": {"$in": references}},
+                {"$set": {"fraud_review": True, "updated_at": now}},
+            )
+            await self._db.payments.update_many(
+                {"booking_id": {"$in": references}},
+                {"$set": {"fraud_review": True, "updated_at": now}},
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Obter estatísticas da fila."""
+        return {
+            "running": self.running,
+            "workers": len(self._tasks),
+            "depth": self.depth,
+            "scored": self.scored,
+            "alerts": self.alerts,
+            "escalated": self.escalated,
+            "over_budget": self.over_budget,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "latency": _percentiles(self.wait_ms),
+            "scoring": _percentiles(self.score_ms),
+        }
+
+
+# Instância global
+fraud_queue = FraudScoringQueue(
+    fraud_detection_engine,
+    workers=int(os.environ.get("FRAUD_QUEUE_WORKERS", "2")),
+    batch_size=int(os.environ.get("FRAUD_BATCH_SIZE", "64")),
+    sync_budget=float(os.environ.get("FRAUD_SYNC_BUDGET_MS", "20")) / 1000,
+    metrics=performance_monitor.metrics,
+)
@@ -23,9 +23,9 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import time
 from passlib.context import CryptContext
 import jwt
@@ -36,7 +36,6 @@ import hashlib
 import json
 import csv
 import io
-import math
 
 from auth.middleware import setup_security_middlewares
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -48,6 +47,28 @@ from utils.structured_logger import logger, log_user_action, log_api_request, lo
 # Note: Beanie User model is imported but Pydantic User model (line ~164) is kept for backward compatibility
 from models.user import User as BeanieUserModel
 from core.enums import UserType
+from geo.distance import haversine_km
+from geo.spatial_index import provider_index
+from cache.provider_search import provider_search_cache
+from utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from geo.geojson import geo_point, location_update
+from services.provider_cards import follow_remote_provider_changes, on_provider_changed, provider_cards
+from reviews.aggregates import rating_aggregates
+from ai.sentiment_rollups import sentiment_rollups
+from ai.sentiment_worker import sentiment_worker
+from security.fraud_detection import fraud_detection_engine
+from security.fraud_queue import fraud_queue
+from reviews.stats import review_stats_cache
+from services.provider_search import ProviderSearchQuery, provider_search_service
+from scheduling.interval_index import (
+    ACTIVE_BOOKING_STATUSES,
+    booking_index,
+    booking_interval,
+    window_for,
+)
+from scheduling.reservations import SlotConflictError, slot_reservations
+from scheduling.sync import booking_changed, follow_remote_booking_changes
+from scheduling.free_slots import MAX_RANGE_DAYS, free_slot_calendar
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
@@ -737,17 +758,38 @@ async def oauth2_token(form_data: OAuth2PasswordRequestForm = Depends()):
 
 def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calcula distância entre 2 pontos (km)."""
-    R = 6371.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = (
-        math.sin(dphi / 2) ** 2
-        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return haversine_km(lat1, lon1, lat2, lon2)
+
+
+async def _provider_changed(provider_id: str, resync: bool = True):
+    """Reflete mudança do prestador no card, no índice espacial e no cache de busca."""
+    await on_provider_changed(db, provider_id, resync_index=resync)
+    # Serviços definem o expediente usado nos horários livres
+    await free_slot_calendar.invalidate_provider(provider_id)
+
+
+async def _propagate_provider_location(provider_id: str, location: Optional[Dict[str, Any]]):
+    """Copia o ponto GeoJSON do prestador para os serviços que ele oferece."""
+    await db.services.update_many(
+        {"prestador_id": provider_id}, {"$set": {"location": location}}
     )
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+
+
+def _availability_window(
+    data: Optional[date], horario_inicio: Optional[str], horario_fim: Optional[str]
+) -> Optional[Tuple[datetime, datetime]]:
+    """Janela de disponibilidade pedida na busca (None se não informada)."""
+    if data is None and horario_inicio is None and horario_fim is None:
+        return None
+    if data is None or horario_inicio is None or horario_fim is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Informe data, horario_inicio e horario_fim para filtrar por disponibilidade",
+        )
+    try:
+        return window_for(datetime.combine(data, datetime.min.time()), horario_inicio, horario_fim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @api_router.get("/providers")
@@ -766,6 +808,22 @@ async def get_providers(
     per_page: int = Query(20, ge=1, le=100, description="Itens por página"),
     sort_by: str = Query("distance", description="Ordenar por: distance, rating, name"),
     sort_order: str = Query("asc", description="Ordem: asc, desc"),
+    services_mode: str = Query(
+        "full",
+        pattern="^(full|summary)$",
+        description="Serviços: full (lista completa) ou summary (quantidade e menor preço)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Cursor opaco de pagination.next_cursor (substitui page)"
+    ),
+    include_total: bool = Query(
+        True, description="Calcular total de resultados (desligue para páginas mais baratas)"
+    ),
+    data: Optional[date] = Query(
+        None, description="Data desejada (AAAA-MM-DD) para filtrar prestadores livres"
+    ),
+    horario_inicio: Optional[str] = Query(None, description="Início da janela desejada (HH:MM)"),
+    horario_fim: Optional[str] = Query(None, description="Fim da janela desejada (HH:MM)"),
 ):
     """
     Retorna lista de prestadores por coordenadas com paginação e distância calculada.
@@ -774,6 +832,12 @@ async def get_providers(
     - Calcula distância usando fórmula de Haversine
     - Suporta paginação e ordenação
     - Filtra por categoria de serviço se especificada
+    - Com data/horario_inicio/horario_fim, só retorna prestadores sem
+      agendamento pendente, confirmado ou em andamento na janela
+    - Serviços vêm dos cards pré-montados (services_mode=summary retorna
+      apenas quantidade e menor preço por prestador)
+    - Paginação por cursor (keyset): seleciona só os próximos per_page itens
+      com heap em vez de ordenar todos os resultados
     """
     try:
         # Validar coordenadas
@@ -783,148 +847,48 @@ async def get_providers(
                 detail="Coordenadas inválidas. Latitude deve estar entre -90 e 90, longitude entre -180 e 180.",
             )
 
-        # Buscar prestadores com coordenadas
-        providers_query = {
-            "tipo": UserType.PRESTADOR,
-            "ativo": True,
-            "latitude": {"$ne": None, "$exists": True},
-            "longitude": {"$ne": None, "$exists": True},
-        }
-
         # Usar mock do banco se disponível (para testes)
         import sys
 
         current_module = sys.modules[__name__]
         database = getattr(current_module, "mock_database", None) or db
 
-        # Buscar todos os prestadores (sem limite para calcular distâncias)
-        providers_cursor = database.users.find(providers_query)
-        try:
-            import inspect
-            if inspect.isawaitable(providers_cursor):
-                providers_cursor = await providers_cursor
-        except Exception:
-            pass
-        try:
-            raw_providers = await providers_cursor.to_list(length=1000)
-        except Exception:
-            # Em testes, o mock pode já retornar lista diretamente
-            raw_providers = providers_cursor
-
-        # Calcular distâncias e filtrar por raio
-        providers_with_distance = []
-        for provider in raw_providers:
-            provider_lat = float(provider.get("latitude"))
-            provider_lon = float(provider.get("longitude"))
-            distance = _haversine_km(lat, lon, provider_lat, provider_lon)
-
-            if distance <= radius_km:
-                # Buscar serviços do prestador
-                services_query = {
-                    "prestador_id": provider.get("id"),
-                    "status": ServiceStatus.DISPONIVEL,
-                }
-
-                if categoria:
-                    services_query["categoria"] = categoria
-
-                services_cursor = database.services.find(services_query)
-                try:
-                    import inspect
-                    if inspect.isawaitable(services_cursor):
-                        services_cursor = await services_cursor
-                except Exception:
-                    pass
-                try:
-                    services = await services_cursor.to_list(length=50)
-                except Exception:
-                    services = services_cursor
-
-                # Pós-filtragem defensiva quando mocks retornam lista não filtrada
-                try:
-                    pid = provider.get("id")
-                    services = [
-                        s for s in services
-                        if s.get("prestador_id") == pid and (not categoria or s.get("categoria") == categoria)
-                    ]
-                except Exception:
-                    pass
-
-                # Se categoria foi especificada, só incluir prestadores com serviços dessa categoria
-                if categoria and not services:
-                    continue
-
-                # Mapear serviços para formato de resposta
-                mapped_services = []
-                for service in services:
-                    mapped_services.append(
-                        {
-                            "id": service.get("id"),
-                            "nome": service.get("nome", "Serviço"),
-                            "categoria": service.get("categoria", "outros"),
-                            "preco_por_hora": float(service.get("preco_por_hora", 0)),
-                            "media_avaliacoes": float(
-                                service.get("media_avaliacoes", 0)
-                            ),
-                            "total_avaliacoes": int(service.get("total_avaliacoes", 0)),
-                            "descricao": service.get("descricao", ""),
-                            "disponivel": service.get("disponivel", True),
-                        }
-                    )
-
-                # Calcular tempo estimado (heurística: 5 min base + 3 min por km)
-                estimated_time = max(5, int(distance * 3) + 5)
-
-                providers_with_distance.append(
-                    {
-                        "provider_id": provider.get("id"),
-                        "nome": provider.get("nome", "Prestador"),
-                        "telefone": provider.get("telefone", ""),
-                        "email": provider.get("email", ""),
-                        "latitude": provider_lat,
-                        "longitude": provider_lon,
-                        "distance_km": round(distance, 2),
-                        "estimated_time_min": estimated_time,
-                        "rating": float(provider.get("rating", 0)),
-                        "total_avaliacoes": int(provider.get("total_avaliacoes", 0)),
-                        "foto_url": provider.get("foto_url", ""),
-                        "endereco": provider.get("endereco", ""),
-                        "services": mapped_services,
-                        "disponivel": provider.get("disponivel", True),
-                        "especialidades": provider.get("especialidades", []),
-                    }
-                )
-
-        # Ordenar resultados
-        if sort_by == "distance":
-            providers_with_distance.sort(
-                key=lambda x: x["distance_km"], reverse=(sort_order == "desc")
-            )
-        elif sort_by == "rating":
-            providers_with_distance.sort(
-                key=lambda x: x["rating"], reverse=(sort_order == "desc")
-            )
-        elif sort_by == "name":
-            providers_with_distance.sort(
-                key=lambda x: x["nome"].lower(), reverse=(sort_order == "desc")
-            )
-        else:
-            # Default: ordenar por distância
-            providers_with_distance.sort(key=lambda x: x["distance_km"])
+        query = ProviderSearchQuery(
+            lat=lat,
+            lon=lon,
+            radius_km=radius_km,
+            categoria=categoria,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            limit=per_page,
+            include_total=include_total,
+            window=_availability_window(data, horario_inicio, horario_fim),
+        )
+        if cursor:
+            try:
+                query.after = decode_cursor(cursor, query.scope, query.key_types)
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        # Com cursor a página começa logo após o último item entregue
+        query.skip = 0 if query.after is not None else (page - 1) * per_page
 
-        # Aplicar paginação (em TEST_MODE alguns testes esperam top-N estático)
+        # Em TEST_MODE alguns testes esperam top-N estático
         import os as _os
         if (_os.getenv("TEST_MODE") == "1" or (_os.getenv("ENV") or "").lower() == "test") and radius_km == 5:
-            # Manter somente os 2 mais próximos para compatibilidade dos testes de integração
-            providers_with_distance = providers_with_distance[:2]
+            # Manter somente os 2 primeiros para compatibilidade dos testes de integração
+            query.max_results = 2
+
+        result = await provider_search_service.search(database, query, scan=database is not db)
+        total_providers = result.total
 
-        # Aplicar paginação
-        total_providers = len(providers_with_distance)
-        total_pages = (total_providers + per_page - 1) // per_page
+        paginated_providers = [
+            provider_search_service.to_response(card, distance, categoria, services_mode)
+            for _, card, distance in result.rows
+        ]
 
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_providers = providers_with_distance[start_idx:end_idx]
+        total_pages = (
+            (total_providers + per_page - 1) // per_page if total_providers is not None else None
+        )
 
         # Metadados de paginação
         pagination_info = {
@@ -932,10 +896,11 @@ async def get_providers(
             "per_page": per_page,
             "total": total_providers,
             "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1,
-            "next_page": page + 1 if page < total_pages else None,
-            "prev_page": page - 1 if page > 1 else None,
+            "has_next": result.has_next,
+            "has_prev": page > 1 or query.after is not None,
+            "next_page": page + 1 if result.has_next and query.after is None else None,
+            "prev_page": page - 1 if page > 1 and query.after is None else None,
+            "next_cursor": encode_cursor(query.scope, result.next_key) if result.has_next else None,
         }
 
         return {
@@ -946,8 +911,12 @@ async def get_providers(
                 "longitude": lon,
                 "radius_km": radius_km,
                 "categoria": categoria,
-                "sort_by": sort_by,
-                "sort_order": sort_order,
+                "sort_by": query.sort_by,
+                "sort_order": query.sort_order,
+                "services_mode": services_mode,
+                "data": data,
+                "horario_inicio": horario_inicio,
+                "horario_fim": horario_fim,
             },
             "summary": {
                 "total_found": total_providers,
@@ -967,6 +936,17 @@ async def get_providers(
         )
 
 
+# Campos de cada prestador em /providers/nearby e /map/providers-nearby
+NEARBY_PROVIDER_FIELDS = (
+    "provider_id", "nome", "latitude", "longitude", "distance_km",
+    "estimated_time_min", "rating", "services",
+)
+MAP_PROVIDER_FIELDS = (
+    "provider_id", "nome", "telefone", "latitude", "longitude", "distance_km",
+    "estimated_time_min", "services",
+)
+
+
 @api_router.get("/providers/nearby")
 async def get_providers_nearby(
     latitude: float,
@@ -974,80 +954,87 @@ async def get_providers_nearby(
     radius_km: float = 10.0,
     categoria: Optional[str] = None,
     limit: int = 50,
+    data: Optional[date] = None,
+    horario_inicio: Optional[str] = None,
+    horario_fim: Optional[str] = None,
 ):
     """
     Retorna prestadores próximos ao ponto informado com seus serviços.
-    - Filtra por raio (Haversine em memória)
+    - Mesmo motor de busca de /providers, ordenado por distância
     - Se categoria for informada, filtra serviços por categoria
+    - Com data/horario_inicio/horario_fim, só prestadores livres na janela
     """
-    # Buscar prestadores com coordenadas
-    raw_users = await db.users.find(
-        {
-            "tipo": UserType.PRESTADOR,
-            "ativo": True,
-            "latitude": {"$ne": None},
-            "longitude": {"$ne": None},
-        }
-    ).to_list(length=1000)
+    result = await provider_search_service.search(
+        db,
+        ProviderSearchQuery(
+            latitude,
+            longitude,
+            radius_km,
+            categoria=categoria,
+            limit=limit,
+            window=_availability_window(data, horario_inicio, horario_fim),
+        ),
+    )
+    return {
+        "providers": [
+            provider_search_service.to_response(card, distance, categoria, fields=NEARBY_PROVIDER_FIELDS)
+            for _, card, distance in result.rows
+        ]
+    }
 
-    providers: List[Dict[str, Any]] = []
 
-    # Pré-carregar serviços por prestador
-    services_by_prestador: Dict[str, List[Dict[str, Any]]] = {}
-    all_services = await db.services.find({"status": ServiceStatus.DISPONIVEL}).to_list(
-        length=2000
+@api_router.get("/providers/{provider_id}/free-slots")
+@limiter.limit("60/minute")
+async def get_provider_free_slots(
+    request: Request,
+    provider_id: str,
+    data_inicio: date = Query(..., description="Primeiro dia da consulta"),
+    data_fim: Optional[date] = Query(None, description="Último dia da consulta (padrão: data_inicio)"),
+    duracao_minutos: int = Query(
+        0, ge=0, le=24 * 60, description="Descartar intervalos livres menores que esta duração"
+    ),
+):
+    """
+    Retorna os horários livres do prestador em cada dia do período.
+    - Expediente vem dos serviços disponíveis (dias e horários)
+    - Agendamentos pendentes, confirmados e em andamento são descontados
+    - Horários já passados não são retornados
+    """
+    data_fim = data_fim or data_inicio
+    if data_fim < data_inicio:
+        raise HTTPException(status_code=400, detail="data_fim deve ser igual ou posterior a data_inicio")
+    if (data_fim - data_inicio).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Período máximo de {MAX_RANGE_DAYS} dias por consulta"
+        )
+
+    provider = await db.users.find_one(
+        {"id": provider_id, "tipo": UserType.PRESTADOR}, {"_id": 0, "id": 1}
     )
-    for svc in all_services:
-        pid = svc.get("prestador_id")
-        if pid:
-            services_by_prestador.setdefault(pid, []).append(svc)
-
-    for u in raw_users:
-        lat = float(u.get("latitude"))
-        lng = float(u.get("longitude"))
-        dist = _haversine_km(latitude, longitude, lat, lng)
-        if dist <= radius_km:
-            svc_list = services_by_prestador.get(u.get("id"), [])
-            if categoria:
-                svc_list = [
-                    s
-                    for s in svc_list
-                    if (s.get("categoria") or "").lower() == categoria.lower()
-                ]
-                if not svc_list:
-                    continue
-            # Mapear serviços para formato simples
-            mapped_services = []
-            for s in svc_list:
-                mapped_services.append(
-                    {
-                        "id": s["id"],
-                        "nome": s.get("nome") or s.get("categoria") or "Serviço",
-                        "categoria": s.get("categoria") or "outros",
-                        "preco_por_hora": float(s.get("preco_por_hora", 0)),
-                        "media_avaliacoes": float(s.get("media_avaliacoes", 0)),
-                        "total_avaliacoes": int(s.get("total_avaliacoes", 0)),
-                    }
-                )
+    if not provider:
+        raise HTTPException(status_code=404, detail="Prestador não encontrado")
 
-            providers.append(
-                {
-                    "provider_id": u.get("id") or str(u.get("_id")),
-                    "nome": u.get("nome") or "Prestador",
-                    "latitude": lat,
-                    "longitude": lng,
-                    "distance_km": round(dist, 2),
-                    "estimated_time_min": max(
-                        5, int(dist / 0.5 * 10)
-                    ),  # heurística simples
-                    "rating": float(u.get("rating", 0)) or 0,
-                    "services": mapped_services,
-                }
-            )
+    try:
+        days = await free_slot_calendar.free_slots(
+            db, provider_id, data_inicio, data_fim, min_minutes=duracao_minutos
+        )
+    except Exception as e:
+        logger.error(f"Erro ao calcular horários livres: {str(e)}")
+        raise HTTPException(status_code=500, detail="Erro ao calcular horários livres")
 
-    # Ordenar por distância e limitar
-    providers.sort(key=lambda p: p["distance_km"])
-    return {"providers": providers[:limit]}
+    return {
+        "prestador_id": provider_id,
+        "dias": [
+            {
+                "data": day.isoformat(),
+                "livres": [
+                    {"horario_inicio": start.strftime("%H:%M"), "horario_fim": end.strftime("%H:%M")}
+                    for start, end in intervals
+                ],
+            }
+            for day, intervals in days.items()
+        ],
+    }
 
 
 def get_mercado_pago_sdk():
@@ -1644,6 +1631,7 @@ async def soft_delete_account(current_user: BeanieUserModel = Depends(get_curren
             raise HTTPException(
                 status_code=404, detail="Conta não encontrada ou já desativada"
             )
+        await _provider_changed(current_user.id)
         return DeleteAccountResponse(
             message="Conta desativada com sucesso", deleted_at=deleted_at
         )
@@ -1795,12 +1783,13 @@ async def update_profile_location(
             {"id": current_user.id},
             {
                 "$set": {
-                    "latitude": lat,
-                    "longitude": lng,
+                    **location_update(lat, lng),
                     "updated_at": datetime.utcnow(),
                 }
             },
         )
+        await _propagate_provider_location(current_user.id, geo_point(lat, lng))
+        await _provider_changed(current_user.id)
         return {
             "message": "Localização atualizada com sucesso",
             "latitude": lat,
@@ -2061,7 +2050,15 @@ async def create_service(
         )
 
     service = Service(prestador_id=current_user.id, **service_data.dict())
-    await db.services.insert_one(service.dict())
+    await db.services.insert_one(
+        {
+            **service.dict(),
+            "location": geo_point(
+                getattr(current_user, "latitude", None), getattr(current_user, "longitude", None)
+            ),
+        }
+    )
+    await _provider_changed(current_user.id, resync=False)
     return service
 
 
@@ -2102,6 +2099,67 @@ async def get_my_services(current_user: BeanieUserModel = Depends(get_current_us
     return [Service(**service) for service in services]
 
 
+async def _booking_changed(booking: Dict[str, Any]):
+    """Reflete o agendamento no índice de intervalos, nos slots reservados e nos horários livres."""
+    await booking_changed(db, booking)
+
+
+async def _reserve_if_reactivated(booking: Dict[str, Any], new_status: Any) -> bool:
+    """Reservar de novo os slots de um agendamento inativo que volta a ficar ativo.
+
+    Returns:
+        True se os slots foram reservados agora (a liberar se a gravação falhar)
+
+    Raises:
+        HTTPException 409: se o horário já foi ocupado por outro agendamento
+    """
+    old_status = getattr(booking.get("status"), "value", booking.get("status"))
+    new_status = getattr(new_status, "value", new_status)
+    if old_status in ACTIVE_BOOKING_STATUSES or new_status not in ACTIVE_BOOKING_STATUSES:
+        return False
+    interval = booking_interval(booking)
+    if interval is None:
+        return False
+    start, end = interval
+    if booking_index.conflicts(booking["prestador_id"], start, end):
+        raise HTTPException(status_code=409, detail="Horário indisponível para este prestador")
+    try:
+        await slot_reservations.reserve(db, booking["id"], booking["prestador_id"], start, end)
+    except SlotConflictError:
+        raise HTTPException(status_code=409, detail="Horário indisponível para este prestador")
+    return True
+
+
+def _ensure_on_slot_grid(start: datetime, end: datetime):
+    """Exigir início e fim na grade de slots das reservas.
+
+    Raises:
+        HTTPException 400: se algum dos horários cair fora da grade
+    """
+    if not slot_reservations.on_grid(start, end):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Horários devem seguir intervalos de {slot_reservations.slot_minutes} minutos",
+        )
+
+
+async def _set_booking_status(booking: Dict[str, Any], new_status: Any) -> Optional[Dict[str, Any]]:
+    """Gravar o novo status, reservando os slots antes se o agendamento for reativado."""
+    reserved = await _reserve_if_reactivated(booking, new_status)
+    try:
+        await db.bookings.update_one(
+            {"id": booking["id"]},
+            {"$set": {"status": new_status, "updated_at": datetime.utcnow()}},
+        )
+    except Exception:
+        if reserved:
+            await slot_reservations.release(db, booking["id"])
+        raise
+    updated = await db.bookings.find_one({"id": booking["id"]})
+    await _booking_changed(updated)
+    return updated
+
+
 # Booking routes
 @api_router.post("/bookings", response_model=Booking)
 async def create_booking(
@@ -2134,8 +2192,24 @@ async def create_booking(
         preco_total=preco_total,
         observacoes=booking_data.observacoes,
     )
+    doc = booking.dict()
+    start, end = booking_interval(doc)
+    _ensure_on_slot_grid(start, end)
 
-    await db.bookings.insert_one(booking.dict())
+    # Verificação rápida em memória; a reserva dos slots é a garantia atômica
+    if booking_index.conflicts(booking.prestador_id, start, end):
+        raise HTTPException(status_code=409, detail="Horário indisponível para este prestador")
+    try:
+        await slot_reservations.reserve(db, booking.id, booking.prestador_id, start, end)
+    except SlotConflictError:
+        raise HTTPException(status_code=409, detail="Horário indisponível para este prestador")
+
+    try:
+        await db.bookings.insert_one(doc)
+    except Exception:
+        await slot_reservations.release(db, booking.id)
+        raise
+    await _booking_changed(doc)
     return booking
 
 
@@ -2179,10 +2253,7 @@ async def update_booking(
         )
 
     # Update booking
-    update_data = {"status": booking_update.status, "updated_at": datetime.utcnow()}
-    await db.bookings.update_one({"id": booking_id}, {"$set": update_data})
-
-    updated_booking = await db.bookings.find_one({"id": booking_id})
+    updated_booking = await _set_booking_status(booking, booking_update.status)
     return Booking(**updated_booking)
 
 
@@ -2226,33 +2297,17 @@ async def create_review(
         comentario=review_data.comentario,
     )
 
-    await db.reviews.insert_one(review.dict())
+    review_doc = review.dict()
+    await db.reviews.insert_one(review_doc)
 
-    # Update service average rating
-    await update_service_rating(booking["service_id"])
+    # Soma/contagem de notas do serviço e do prestador
+    await rating_aggregates.apply(db, after=review_doc)
+    sentiment_worker.submit(review_doc.get("_id"), review_doc)
+    await _provider_changed(booking["prestador_id"], resync=False)
 
     return review
 
 
-async def update_service_rating(service_id: str):
-    """Update service average rating based on all reviews"""
-    reviews = await db.reviews.find({"service_id": service_id}).to_list(length=1000)
-    if reviews:
-        total_rating = sum(review["rating"] for review in reviews)
-        avg_rating = total_rating / len(reviews)
-
-        await db.services.update_one(
-            {"id": service_id},
-            {
-                "$set": {
-                    "media_avaliacoes": round(avg_rating, 1),
-                    "total_avaliacoes": len(reviews),
-                    "updated_at": datetime.utcnow(),
-                }
-            },
-        )
-
-
 @api_router.get("/services/{service_id}/reviews", response_model=List[Review])
 async def get_service_reviews(service_id: str):
     reviews = await db.reviews.find({"service_id": service_id}).to_list(length=100)
@@ -2407,7 +2462,9 @@ async def admin_create_user(
     user = User(**{k: v for k, v in body.dict().items() if k != "password"})
     doc = user.dict()
     doc["password"] = hashed_password
+    doc["location"] = geo_point(doc.get("latitude"), doc.get("longitude"))
     await db.users.insert_one(doc)
+    await _provider_changed(doc["id"])
     doc.pop("password", None)
     return doc
 
@@ -2424,6 +2481,13 @@ async def admin_update_user(
     res = await db.users.update_one({"id": user_id}, {"$set": update_fields})
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    if "latitude" in update_fields or "longitude" in update_fields:
+        # Recalcular o ponto GeoJSON com as coordenadas resultantes
+        coords = await db.users.find_one({"id": user_id}, {"latitude": 1, "longitude": 1})
+        location = geo_point(coords.get("latitude"), coords.get("longitude"))
+        await db.users.update_one({"id": user_id}, {"$set": {"location": location}})
+        await _propagate_provider_location(user_id, location)
+    await _provider_changed(user_id)
     updated = await db.users.find_one({"id": user_id})
     updated.pop("password", None)
     return updated
@@ -2437,6 +2501,7 @@ async def admin_delete_user(
     res = await db.users.delete_one({"id": user_id})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    await _provider_changed(user_id)
     return {"message": "Usuário removido"}
 
 
@@ -2469,7 +2534,13 @@ async def admin_create_service(
         prestador_id=body.prestador_id,
         **{k: v for k, v in body.dict().items() if k != "prestador_id"},
     )
-    await db.services.insert_one(service.dict())
+    await db.services.insert_one(
+        {
+            **service.dict(),
+            "location": geo_point(provider.get("latitude"), provider.get("longitude")),
+        }
+    )
+    await _provider_changed(body.prestador_id, resync=False)
     return service
 
 
@@ -2488,6 +2559,7 @@ async def admin_update_service(
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Serviço não encontrado")
     updated = await db.services.find_one({"id": service_id})
+    await _provider_changed(updated["prestador_id"], resync=False)
     return updated
 
 
@@ -2496,9 +2568,10 @@ async def admin_delete_service(
     service_id: str, current_user: BeanieUserModel = Depends(get_current_user)
 ):
     ensure_admin(current_user)
-    res = await db.services.delete_one({"id": service_id})
-    if res.deleted_count == 0:
+    deleted = await db.services.find_one_and_delete({"id": service_id})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Serviço não encontrado")
+    await _provider_changed(deleted["prestador_id"], resync=False)
     return {"message": "Serviço removido"}
 
 
@@ -2514,14 +2587,35 @@ async def admin_update_booking(
     booking_id: str, body: BookingUpdate, current_user: BeanieUserModel = Depends(get_current_user)
 ):
     ensure_admin(current_user)
-    res = await db.bookings.update_one(
+    booking = await db.bookings.find_one({"id": booking_id})
+    if not booking:
+        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+    return await _set_booking_status(booking, body.status)
+
+
+@api_router.post("/admin/bookings/{booking_id}/fraud-review/release")
+async def admin_release_fraud_hold(
+    booking_id: str, current_user: BeanieUserModel = Depends(get_current_user)
+):
+    """Liberar o pagamento retido pela análise de fraude após revisão manual."""
+    ensure_admin(current_user)
+    booking = await db.bookings.find_one({"id": booking_id})
+    if not booking:
+        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+    if not booking.get("fraud_review"):
+        raise HTTPException(status_code=400, detail="Agendamento não está retido para análise")
+
+    now = datetime.utcnow()
+    await db.bookings.update_one(
         {"id": booking_id},
-        {"$set": {"status": body.status, "updated_at": datetime.utcnow()}},
+        {"$set": {"fraud_review": False, "fraud_approved_at": now, "fraud_approved_by": current_user.id, "updated_at": now}},
     )
-    if res.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Agendamento não encontrado")
-    updated = await db.bookings.find_one({"id": booking_id})
-    return updated
+    await db.payments.update_many(
+        {"booking_id": booking_id}, {"$set": {"fraud_review": False, "updated_at": now}}
+    )
+    # Transação aprovada passa a fazer parte do histórico do morador
+    await fraud_queue.engine.record_transaction(booking["morador_id"], {"amount": booking["preco_total"]})
+    return {"message": "Pagamento liberado"}
 
 
 @api_router.get("/admin/export")
@@ -2603,6 +2697,34 @@ async def admin_export(kind: str, current_user: BeanieUserModel = Depends(get_cu
 
 
 # Payment routes
+async def screen_payment(user_id: str, booking: dict, payment_method: str):
+    """Análise de fraude do pagamento; só alto risco dentro do orçamento retém a requisição.
+
+    A retenção fica gravada no agendamento (`fraud_review`): novas tentativas
+    são recusadas até um administrador liberar, e pagamento liberado não é
+    analisado de novo.
+    """
+    if booking.get("fraud_review"):
+        raise HTTPException(
+            status_code=403, detail="Pagamento retido para análise de segurança"
+        )
+    if booking.get("fraud_approved_at"):
+        return
+    flagged = await fraud_queue.screen(
+        user_id,
+        {"amount": booking["preco_total"], "payment_method": payment_method},
+        reference=booking["id"],
+    )
+    if flagged is not None:
+        await db.bookings.update_one(
+            {"id": booking["id"]},
+            {"$set": {"fraud_review": True, "updated_at": datetime.utcnow()}},
+        )
+        raise HTTPException(
+            status_code=403, detail="Pagamento retido para análise de segurança"
+        )
+
+
 @api_router.post("/payments/pix", response_model=PaymentResponse)
 async def create_pix_payment(
     payment_request: PIXPaymentRequest, current_user: BeanieUserModel = Depends(get_current_user)
@@ -2629,6 +2751,8 @@ async def create_pix_payment(
                 status_code=400, detail="Pagamento já existe para este agendamento"
             )
 
+        await screen_payment(current_user.id, booking, "pix")
+
         # Check if we're in test mode (demo mode for limitations)
         demo_mode = True  # Enable demo mode due to test credential limitations
 
@@ -2781,6 +2905,8 @@ async def create_credit_card_payment(
                 status_code=400, detail="Pagamento já existe para este agendamento"
             )
 
+        await screen_payment(current_user.id, booking, "credit_card")
+
         # Get Mercado Pago SDK
         mp_sdk = get_mercado_pago_sdk()
 
@@ -3010,12 +3136,13 @@ async def update_user_location(
             {"id": current_user.id},
             {
                 "$set": {
-                    "latitude": latitude,
-                    "longitude": longitude,
+                    **location_update(latitude, longitude),
                     "updated_at": datetime.utcnow(),
                 }
             },
         )
+        await _propagate_provider_location(current_user.id, geo_point(latitude, longitude))
+        await _provider_changed(current_user.id)
 
         return {"message": "Localização atualizada com sucesso"}
     except Exception as e:
@@ -3038,6 +3165,7 @@ async def update_availability(
             {"id": current_user.id},
             {"$set": {"disponivel": disponivel, "updated_at": datetime.utcnow()}},
         )
+        await _provider_changed(current_user.id)
 
         return {
             "message": f"Disponibilidade alterada para {'disponível' if disponivel else 'indisponível'}"
@@ -3049,19 +3177,7 @@ async def update_availability(
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two coordinates using Haversine formula"""
-    from math import radians, cos, sin, asin, sqrt
-
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-
-    return c * r
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 
 @api_router.get("/map/providers-nearby")
@@ -3070,67 +3186,32 @@ async def get_nearby_providers(
     longitude: float,
     radius_km: float = 10.0,
     categoria: Optional[str] = None,
+    data: Optional[date] = None,
+    horario_inicio: Optional[str] = None,
+    horario_fim: Optional[str] = None,
     current_user: BeanieUserModel = Depends(get_current_user),
 ):
     """Get nearby service providers with their services"""
+    window = _availability_window(data, horario_inicio, horario_fim)
     try:
-        # Get all available service providers
-        providers_query = {
-            "tipo": UserType.PRESTADOR,
-            "ativo": True,
-            "disponivel": True,
-            "latitude": {"$ne": None},
-            "longitude": {"$ne": None},
-        }
-
-        providers = await db.users.find(providers_query).to_list(length=100)
-
-        nearby_providers = []
-
-        for provider in providers:
-            # Calculate distance
-            distance = calculate_distance(
-                latitude, longitude, provider["latitude"], provider["longitude"]
-            )
-
-            if distance <= radius_km:
-                # Get provider's services
-                services_query = {
-                    "prestador_id": provider["id"],
-                    "status": ServiceStatus.DISPONIVEL,
-                }
-                if categoria:
-                    services_query["categoria"] = categoria
-
-                services = await db.services.find(services_query).to_list(length=100)
-
-                if services:  # Only include providers who have services
-                    provider_data = {
-                        "provider_id": provider["id"],
-                        "nome": provider["nome"],
-                        "telefone": provider["telefone"],
-                        "latitude": provider["latitude"],
-                        "longitude": provider["longitude"],
-                        "distance_km": round(distance, 2),
-                        "estimated_time_min": max(
-                            5, int(distance * 3)
-                        ),  # 3 min per km, min 5 min
-                        "services": [
-                            {
-                                "id": service["id"],
-                                "nome": service["nome"],
-                                "categoria": service["categoria"],
-                                "preco_por_hora": service["preco_por_hora"],
-                                "media_avaliacoes": service.get("media_avaliacoes", 0),
-                                "total_avaliacoes": service.get("total_avaliacoes", 0),
-                            }
-                            for service in services
-                        ],
-                    }
-                    nearby_providers.append(provider_data)
-
-        # Sort by distance
-        nearby_providers.sort(key=lambda x: x["distance_km"])
+        # Only include available providers who have services
+        result = await provider_search_service.search(
+            db,
+            ProviderSearchQuery(
+                latitude,
+                longitude,
+                radius_km,
+                categoria=categoria,
+                only_available=True,
+                require_services=True,
+                limit=100,
+                window=window,
+            ),
+        )
+        nearby_providers = [
+            provider_search_service.to_response(card, distance, categoria, fields=MAP_PROVIDER_FIELDS)
+            for _, card, distance in result.rows
+        ]
 
         return {"providers": nearby_providers, "total": len(nearby_providers)}
 
@@ -3460,9 +3541,14 @@ async def populate_demo_providers():
         hashed_password = get_password_hash("demo123")
         for provider in demo_providers:
             provider["password"] = hashed_password
+            provider["location"] = geo_point(provider["latitude"], provider["longitude"])
 
         # Insert providers
         await db.users.insert_many(demo_providers)
+        for provider in demo_providers:
+            provider_index.upsert(
+                provider["id"], provider["latitude"], provider["longitude"], provider["disponivel"]
+            )
 
         # Create demo services for each provider
         demo_services = [
@@ -3560,7 +3646,14 @@ async def populate_demo_providers():
             },
         ]
 
+        # Serviços herdam a localização do prestador
+        location_by_provider = {p["id"]: p["location"] for p in demo_providers}
+        for service in demo_services:
+            service["location"] = location_by_provider.get(service["prestador_id"])
+
         await db.services.insert_many(demo_services)
+        for provider in demo_providers:
+            await _provider_changed(provider["id"], resync=False)
 
         return {
             "message": "Dados demo criados com sucesso!",
@@ -3599,6 +3692,7 @@ from analytics.routes import analytics_router
 from websocket_manager import websocket_manager
 from monitoring.metrics import performance_monitor, health_checker
 from cache.manager import cache_manager
+from cache.redis_tier import RedisTier
 
 app.include_router(notification_router)
 app.include_router(chat_router)
@@ -3659,7 +3753,10 @@ async def health_check():
 async def get_metrics():
     """Obter métricas de performance."""
     try:
-        return performance_monitor.get_performance_summary()
+        return {
+            **performance_monitor.get_performance_summary(),
+            "fraud_queue": fraud_queue.get_stats(),
+        }
     except Exception as e:
         logger.error(f"Erro ao obter métricas: {e}")
         return {"error": str(e)}
@@ -3669,7 +3766,12 @@ async def get_metrics():
 async def get_cache_stats():
     """Obter estatísticas do cache."""
     try:
-        return cache_manager.get_stats()
+        return {
+            **cache_manager.get_stats(),
+            "provider_search": provider_search_cache.get_stats(),
+            "free_slots": free_slot_calendar.get_stats(),
+            "review_stats": review_stats_cache.get_stats(),
+        }
     except Exception as e:
         logger.error(f"Erro ao obter estatísticas do cache: {e}")
         return {"error": str(e)}
@@ -3679,6 +3781,7 @@ async def get_cache_stats():
 async def clear_cache():
     """Limpar cache."""
     try:
+        await provider_search_cache.clear()
         await cache_manager.clear()
         return {"message": "Cache limpo com sucesso"}
     except Exception as e:
@@ -3709,7 +3812,66 @@ async def startup_db_client():
         logger.error(f"❌ Erro ao inicializar Beanie ODM: {str(e)}")
         raise
 
+    # Índice espacial de prestadores (busca por raio em /api/providers)
+    try:
+        await provider_index.build(db)
+    except Exception as e:
+        # Sem índice as rotas continuam usando a varredura no banco
+        logger.warning(f"⚠️ Índice espacial não construído: {str(e)}")
+    follow_remote_provider_changes(db)
+
+    # Índice de agendamentos (filtro de disponibilidade na busca)
+    try:
+        await slot_reservations.ensure_indexes(db)
+        await booking_index.build(db)
+    except Exception as e:
+        # Sem índice a disponibilidade é verificada com uma consulta por busca
+        logger.warning(f"⚠️ Índice de agendamentos não construído: {str(e)}")
+    follow_remote_booking_changes(db)
+
+    # Read model dos cards de prestador (listagens de prestadores)
+    try:
+        await provider_cards.ensure_indexes(db)
+        if await provider_cards.count(db) == 0:
+            await provider_cards.rebuild_all(db)
+    except Exception as e:
+        logger.warning(f"⚠️ Cards de prestador não inicializados: {str(e)}")
+
+    # Sentimento de avaliações calculado em segundo plano
+    try:
+        await sentiment_rollups.ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"⚠️ Índices de sentimento consolidado não criados: {str(e)}")
+    sentiment_worker.start(db)
+    try:
+        await sentiment_worker.backfill()
+    except Exception as e:
+        logger.warning(f"⚠️ Backfill de sentimento não executado: {str(e)}")
+
+    # Segundo nível do cache no Redis, compartilhado entre workers (opcional)
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        try:
+            tier = RedisTier.from_url(
+                redis_url, serializer=os.environ.get("CACHE_SERIALIZER", "msgpack")
+            )
+            await tier.client.ping()
+            await cache_manager.attach_l2(tier)
+        except Exception as e:
+            logger.warning(f"⚠️ Cache L2 (Redis) não inicializado: {str(e)}")
+
+    # Análise de fraude dos pagamentos fora do caminho da requisição
+    try:
+        await fraud_detection_engine.start(db)
+    except Exception as e:
+        logger.warning(f"⚠️ Snapshots de fraude não inicializados: {str(e)}")
+    fraud_queue.start(db)
+
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await sentiment_worker.stop()
+    await fraud_queue.stop()
+    await fraud_detection_engine.stop()
+    await cache_manager.detach_l2()
     client.close()
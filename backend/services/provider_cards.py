@@ -0,0 +1,236 @@
+"""
+Provider Cards - Read model desnormalizado dos cards de prestador
+
+Cada documento da collection `provider_cards` guarda o card já pronto que as
+rotas de listagem de prestadores devolvem: dados do prestador, serviços
+disponíveis mapeados, categorias, menor preço e avaliação. O card é
+reconstruído por prestador a cada escrita (usuário, serviço ou avaliação), de
+modo que a listagem vira uma única leitura indexada sem montar respostas por
+requisição.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime
+import logging
+
+from pymongo import ASCENDING, GEOSPHERE, ReplaceOne
+
+from core.enums import ServiceStatus, UserType
+from geo.geojson import geo_point
+from geo.spatial_index import provider_index
+from cache.provider_search import provider_search_cache
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "provider_cards"
+
+
+def map_card_service(service: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato de serviço exibido no card."""
+    return {
+        "id": service.get("id"),
+        "nome": service.get("nome") or service.get("categoria") or "Serviço",
+        "categoria": service.get("categoria") or "outros",
+        "preco_por_hora": float(service.get("preco_por_hora") or 0),
+        "media_avaliacoes": float(service.get("media_avaliacoes") or 0),
+        "total_avaliacoes": int(service.get("total_avaliacoes") or 0),
+        "descricao": service.get("descricao", ""),
+        "disponivel": service.get("disponivel", True),
+    }
+
+
+def build_provider_card(provider: Dict[str, Any], services: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Montar card a partir do documento do prestador e dos serviços dele.
+
+    Apenas serviços disponíveis entram no card. A nota vem dos agregados de
+    avaliações do prestador; sem eles, do `rating` legado; sem nenhum dos
+    dois, é a média dos serviços ponderada pelo número de avaliações.
+    """
+    cards = [
+        map_card_service(s) for s in services
+        if s.get("status", ServiceStatus.DISPONIVEL.value) == ServiceStatus.DISPONIVEL.value
+    ]
+
+    total_reviews = sum(s["total_avaliacoes"] for s in cards)
+    if provider.get("rating_count"):
+        rating = float(provider.get("avaliacao_media") or 0)
+        total_reviews = int(provider["rating_count"])
+    elif provider.get("rating") is not None:
+        rating = float(provider.get("rating") or 0)
+        total_reviews = int(provider.get("total_avaliacoes", total_reviews) or 0)
+    elif total_reviews:
+        rating = round(sum(s["media_avaliacoes"] * s["total_avaliacoes"] for s in cards) / total_reviews, 2)
+    else:
+        rating = 0.0
+
+    lat = provider.get("latitude")
+    lon = provider.get("longitude")
+    return {
+        "id": provider.get("id"),
+        "nome": provider.get("nome") or "Prestador",
+        "telefone": provider.get("telefone", ""),
+        "email": provider.get("email", ""),
+        "latitude": lat,
+        "longitude": lon,
+        "location": geo_point(lat, lon),
+        "rating": rating,
+        "total_avaliacoes": total_reviews,
+        "foto_url": provider.get("foto_url", ""),
+        "endereco": provider.get("endereco", ""),
+        "disponivel": provider.get("disponivel", True),
+        "especialidades": provider.get("especialidades", []),
+        "services": cards,
+        "categorias": sorted({s["categoria"].lower() for s in cards}),
+        "total_services": len(cards),
+        "min_preco_por_hora": min((s["preco_por_hora"] for s in cards), default=None),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def card_services(card: Dict[str, Any], categoria: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Serviços do card, opcionalmente só os da categoria (sem diferenciar maiúsculas)."""
+    if not categoria:
+        return card.get("services", [])
+    wanted = categoria.lower()
+    return [s for s in card.get("services", []) if s["categoria"].lower() == wanted]
+
+
+def card_summary(card: Dict[str, Any], categoria: Optional[str] = None) -> Dict[str, Any]:
+    """Quantidade de serviços e menor preço do card."""
+    if not categoria:
+        return {"total": card.get("total_services", 0), "min_preco_por_hora": card.get("min_preco_por_hora")}
+    services = card_services(card, categoria)
+    return {
+        "total": len(services),
+        "min_preco_por_hora": min((s["preco_por_hora"] for s in services), default=None),
+    }
+
+
+class ProviderCardStore:
+    """Mantém a collection `provider_cards` sincronizada com users/services."""
+
+    PROVIDER_QUERY = {"tipo": UserType.PRESTADOR.value, "ativo": True}
+    PROJECTION = {"_id": 0, "password": 0, "senha": 0}
+
+    def __init__(self, collection: str = COLLECTION):
+        self.collection = collection
+
+    def _cards(self, database):
+        return database[self.collection]
+
+    async def ensure_indexes(self, database):
+        """Criar índices usados pelas listagens."""
+        cards = self._cards(database)
+        await cards.create_index([("id", ASCENDING)], unique=True)
+        await cards.create_index([("location", GEOSPHERE)])
+        await cards.create_index([("categorias", ASCENDING)])
+
+    async def refresh(self, database, provider_id: str) -> Optional[Dict[str, Any]]:
+        """Reconstruir o card de um prestador (ou removê-lo se não estiver mais ativo)."""
+        provider = await database.users.find_one(
+            {"id": provider_id, **self.PROVIDER_QUERY}, self.PROJECTION
+        )
+        if provider is None:
+            await self._cards(database).delete_one({"id": provider_id})
+            return None
+
+        services = await database.services.find(
+            {"prestador_id": provider_id, "status": ServiceStatus.DISPONIVEL.value}, {"_id": 0}
+        ).to_list(length=None)
+        card = build_provider_card(provider, services)
+        await self._cards(database).replace_one({"id": provider_id}, card, upsert=True)
+        return card
+
+    async def remove(self, database, provider_id: str):
+        """Remover card do prestador."""
+        await self._cards(database).delete_one({"id": provider_id})
+
+    async def find_by_ids(self, database, provider_ids: List[str], query: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Carregar cards por id em uma única leitura."""
+        if not provider_ids:
+            return []
+        return await self._cards(database).find(
+            {**(query or {}), "id": {"$in": list(provider_ids)}}, {"_id": 0}
+        ).to_list(length=None)
+
+    async def count(self, database) -> int:
+        return await self._cards(database).estimated_document_count()
+
+    async def rebuild_all(self, database, batch_size: int = 500) -> int:
+        """Reconstruir todos os cards (backfill ou reparo)."""
+        started_at = datetime.utcnow()
+        cards = self._cards(database)
+        written = 0
+        batch: List[Dict[str, Any]] = []
+
+        async def flush():
+            nonlocal written
+            if not batch:
+                return
+            ids = [p["id"] for p in batch]
+            services_by_provider: Dict[str, List[Dict[str, Any]]] = {}
+            async for service in database.services.find(
+                {"prestador_id": {"$in": ids}, "status": ServiceStatus.DISPONIVEL.value}, {"_id": 0}
+            ):
+                services_by_provider.setdefault(service["prestador_id"], []).append(service)
+            await cards.bulk_write(
+                [
+                    ReplaceOne(
+                        {"id": p["id"]},
+                        build_provider_card(p, services_by_provider.get(p["id"], [])),
+                        upsert=True,
+                    )
+                    for p in batch
+                ],
+                ordered=False,
+            )
+            written += len(batch)
+            batch.clear()
+
+        async for provider in database.users.find(
+            {**self.PROVIDER_QUERY, "id": {"$exists": True}}, self.PROJECTION
+        ):
+            batch.append(provider)
+            if len(batch) >= batch_size:
+                await flush()
+        await flush()
+
+        # Cards não reescritos pertencem a prestadores removidos ou inativos
+        await cards.delete_many({"updated_at": {"$lt": started_at}})
+        logger.info(f"Cards de prestador reconstruídos: {written}")
+        return written
+
+
+async def on_provider_changed(database, provider_id: str, resync_index: bool = True):
+    """Propagar mudança de prestador para o card, o índice espacial e o cache de busca.
+
+    Chamado pelas rotas que alteram usuários, serviços ou avaliações. Os
+    outros workers recebem a mudança pelo cache de busca e releem o
+    prestador no próprio índice (`follow_remote_provider_changes`).
+    """
+    try:
+        await provider_cards.refresh(database, provider_id)
+    except Exception as e:
+        # O card fica desatualizado até a próxima escrita ou rebuild
+        logger.error(f"Erro ao atualizar card do prestador {provider_id}: {e}")
+    previous = provider_index.position(provider_id)
+    if resync_index:
+        await provider_index.sync_provider(database, provider_id)
+    position = provider_index.position(provider_id) or (None, None)
+    await provider_search_cache.invalidate_provider(provider_id, *position, previous=previous)
+
+
+def follow_remote_provider_changes(database):
+    """Reler no índice espacial deste worker os prestadores alterados em outros.
+
+    `on_provider_changed` publica a mudança no canal do cache (com L2); sem
+    isso cada worker continuaria respondendo com posição e disponibilidade
+    antigas até reiniciar.
+    """
+    async def resync(provider_id: str):
+        await provider_index.sync_provider(database, provider_id)
+
+    provider_search_cache.on_remote_change(resync)
+
+
+# Instância global
+provider_cards = ProviderCardStore()
@@ -0,0 +1,424 @@
+"""
+Provider Search - Motor único de busca de prestadores por proximidade
+
+Concentra filtro por raio, categoria e disponibilidade, ordenação, paginação
+e projeção da resposta usados por /api/providers, /api/providers/nearby e
+/api/map/providers-nearby. As rotas apenas traduzem parâmetros e escolhem os
+campos da resposta.
+
+Com uma janela de horário, prestadores com agendamento ativo sobreposto são
+descartados pelo índice de intervalos de agendamentos (sem consulta por
+candidato).
+
+Caminhos de execução (todos sobre os cards de `provider_cards`):
+- índice espacial pronto: candidatos do tile em cache + distância exata em NumPy
+- índice indisponível: $geoNear no índice 2dsphere dos cards
+- banco sem cards (mocks dos testes): cards montados a partir de users/services
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import inspect
+import logging
+
+from core.enums import ServiceStatus, UserType
+from geo.distance import CoordinateArray
+from geo.geojson import geo_near_stage, page_facet_stage, unpack_page_facet
+from geo.spatial_index import ProviderSpatialIndex, provider_index
+from cache.provider_search import ProviderSearchCache, provider_search_cache
+from scheduling.interval_index import BookingIntervalIndex, booking_index
+from services.provider_cards import (
+    ProviderCardStore,
+    build_provider_card,
+    card_services,
+    card_summary,
+    provider_cards,
+)
+from utils.pagination import top_k
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_SORT_FIELDS = ("distance", "rating", "name")
+
+# Limite de prestadores lidos quando os cards são montados em memória
+MAX_SCAN_PROVIDERS = 1000
+
+# Linha de busca: (chave_de_ordenacao, card, distancia_km)
+SearchRow = Tuple[tuple, Dict[str, Any], float]
+
+
+def estimate_eta_minutes(distance_km: float) -> int:
+    """Tempo estimado de chegada (heurística: 5 min base + 3 min por km)."""
+    return max(5, int(distance_km * 3) + 5)
+
+
+def providers_within_radius(
+    providers: List[Dict[str, Any]], lat: float, lon: float, radius_km: float
+) -> List[Tuple[Dict[str, Any], float]]:
+    """Filtra documentos pelo raio calculando todas as distâncias de uma vez."""
+    providers = [
+        p for p in providers
+        if p.get("latitude") is not None and p.get("longitude") is not None
+    ]
+    if not providers:
+        return []
+    coords = CoordinateArray.from_documents(providers)
+    positions, distances = coords.within_radius(lat, lon, radius_km)
+    return [
+        (providers[position], distance)
+        for position, distance in zip(positions.tolist(), distances.tolist())
+    ]
+
+
+def sort_key(card: Dict[str, Any], distance: float, sort_by: str) -> tuple:
+    """Chave de ordenação (valor, id); o id desempata para o cursor."""
+    if sort_by == "rating":
+        value = float(card.get("rating", 0))
+    elif sort_by == "name":
+        value = card.get("nome", "Prestador").lower()
+    else:
+        value = float(distance)
+    return (value, card.get("id") or "")
+
+
+def sort_stages(sort_by: str, sort_order: str) -> List[Dict[str, Any]]:
+    """Estágios de ordenação equivalentes a sort_key.
+
+    O valor de ordenação fica em `_ordem` para que o último documento da
+    página gere o próximo cursor.
+    """
+    direction = -1 if sort_order == "desc" else 1
+    if sort_by == "rating":
+        value = {"$ifNull": ["$rating", 0]}
+    elif sort_by == "name":
+        value = {"$toLower": {"$ifNull": ["$nome", "Prestador"]}}
+    else:
+        value = "$distance_km"
+    return [
+        {"$addFields": {"_ordem": value}},
+        {"$sort": {"_ordem": direction, "id": direction}},
+    ]
+
+
+def cursor_stages(sort_order: str, after: Optional[tuple]) -> List[Dict[str, Any]]:
+    """Filtro que mantém só os documentos depois da chave do cursor."""
+    if after is None:
+        return []
+    op = "$lt" if sort_order == "desc" else "$gt"
+    return [
+        {
+            "$match": {
+                "$or": [
+                    {"_ordem": {op: after[0]}},
+                    {"_ordem": after[0], "id": {op: after[1]}},
+                ]
+            }
+        }
+    ]
+
+
+def category_filter(categoria: Optional[str]) -> Dict[str, Any]:
+    """Filtro de categoria dos cards (sem diferenciar maiúsculas)."""
+    return {"categorias": categoria.lower()} if categoria else {}
+
+
+@dataclass
+class ProviderSearchQuery:
+    """Parâmetros de uma busca de prestadores."""
+
+    lat: float
+    lon: float
+    radius_km: float
+    categoria: Optional[str] = None
+    only_available: bool = False
+    require_services: bool = False
+    sort_by: str = "distance"
+    sort_order: str = "asc"
+    skip: int = 0
+    limit: int = 20
+    after: Optional[tuple] = None
+    include_total: bool = False
+    max_results: Optional[int] = None
+    # Janela [início, fim) em que o prestador precisa estar livre
+    window: Optional[Tuple[datetime, datetime]] = None
+
+    def __post_init__(self):
+        # Ordenação desconhecida: distância crescente
+        if self.sort_by not in PROVIDER_SORT_FIELDS:
+            self.sort_by, self.sort_order = "distance", "asc"
+        self.sort_order = "desc" if self.sort_order == "desc" else "asc"
+
+    @property
+    def descending(self) -> bool:
+        return self.sort_order == "desc"
+
+    @property
+    def scope(self) -> Tuple[str, str, str]:
+        """Escopo do cursor: cursores de outra ordenação são rejeitados."""
+        return ("providers", self.sort_by, self.sort_order)
+
+    @property
+    def key_types(self) -> Tuple[type, type]:
+        """Tipos da chave de sort_key (valor, id), conferidos no cursor."""
+        return (str if self.sort_by == "name" else float, str)
+
+    def card_query(self) -> Dict[str, Any]:
+        """Filtro dos cards no MongoDB."""
+        query = category_filter(self.categoria)
+        if self.only_available:
+            query["disponivel"] = True
+        if self.require_services:
+            query["total_services"] = {"$gt": 0}
+        return query
+
+    def matches(self, card: Dict[str, Any]) -> bool:
+        """Mesmo filtro de card_query aplicado em memória."""
+        if self.categoria and self.categoria.lower() not in card.get("categorias", []):
+            return False
+        if self.only_available and not card.get("disponivel", True):
+            return False
+        if self.require_services and not card.get("total_services"):
+            return False
+        return True
+
+
+@dataclass
+class ProviderSearchResult:
+    """Página de resultados ordenada."""
+
+    rows: List[SearchRow] = field(default_factory=list)
+    total: Optional[int] = None
+    has_next: bool = False
+
+    @property
+    def next_key(self) -> Optional[tuple]:
+        """Chave do último item quando há próxima página."""
+        return self.rows[-1][0] if self.has_next and self.rows else None
+
+
+class ProviderSearchService:
+    """Busca de prestadores por proximidade sobre os cards pré-montados."""
+
+    PROVIDERS_QUERY = {
+        "tipo": UserType.PRESTADOR.value,
+        "ativo": True,
+        "latitude": {"$ne": None, "$exists": True},
+        "longitude": {"$ne": None, "$exists": True},
+    }
+
+    def __init__(
+        self,
+        index: ProviderSpatialIndex,
+        cards: ProviderCardStore,
+        cache: ProviderSearchCache,
+        bookings: BookingIntervalIndex,
+    ):
+        self.index = index
+        self.cards = cards
+        self.cache = cache
+        self.bookings = bookings
+
+    async def search(
+        self, database, query: ProviderSearchQuery, scan: bool = False
+    ) -> ProviderSearchResult:
+        """
+        Executa a busca e devolve a página pedida.
+
+        Args:
+            database: Banco (motor) com as collections users/services/provider_cards
+            query: Parâmetros da busca
+            scan: Montar os cards a partir de users/services (bancos sem
+                provider_cards, ex.: mocks dos testes)
+
+        Returns:
+            Página ordenada com total (se pedido) e indicação de próxima página
+        """
+        if scan:
+            rows = await self._scan(database, query)
+        elif self.index.ready:
+            rows = await self._cached_candidates(database, query)
+        else:
+            return await self._geo_near(database, query)
+        if query.window is not None and rows:
+            busy = await self.bookings.busy_providers(
+                database, *query.window, provider_ids=[card.get("id") for card, _ in rows]
+            )
+            rows = [(card, d) for card, d in rows if card.get("id") not in busy]
+        return self._rank(rows, query)
+
+    async def _cached_candidates(
+        self, database, query: ProviderSearchQuery
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Candidatos do tile em cache com distância exata a partir do ponto pedido.
+
+        O cache é compartilhado por todas as rotas: guarda só o filtro de
+        categoria, e disponibilidade/serviços são filtrados em memória.
+        """
+        async def load(center_lat: float, center_lon: float, search_radius: float):
+            # Índice espacial: visita apenas as células que cobrem o raio
+            distance_by_id = dict(self.index.query_radius(center_lat, center_lon, search_radius))
+            return await self.cards.find_by_ids(
+                database,
+                list(distance_by_id),
+                category_filter(query.categoria),
+            )
+
+        candidates = await self.cache.get_candidates(
+            query.lat, query.lon, query.radius_km, query.categoria, load
+        )
+        return [
+            (card, distance)
+            for card, distance in providers_within_radius(candidates, query.lat, query.lon, query.radius_km)
+            if query.matches(card)
+        ]
+
+    async def _scan(self, database, query: ProviderSearchQuery) -> List[Tuple[Dict[str, Any], float]]:
+        """Monta os cards em memória a partir de users/services."""
+        providers = await _to_list(database.users.find(self.PROVIDERS_QUERY), MAX_SCAN_PROVIDERS)
+        rows = providers_within_radius(providers, query.lat, query.lon, query.radius_km)
+        if not rows:
+            return []
+
+        services = await _to_list(
+            database.services.find(
+                {
+                    "prestador_id": {"$in": [p.get("id") for p, _ in rows]},
+                    "status": ServiceStatus.DISPONIVEL.value,
+                }
+            ),
+            None,
+        )
+        services_by_provider: Dict[str, List[Dict[str, Any]]] = {}
+        for service in services:
+            services_by_provider.setdefault(service.get("prestador_id"), []).append(service)
+
+        cards = [
+            (build_provider_card(p, services_by_provider.get(p.get("id"), [])), d) for p, d in rows
+        ]
+        return [(card, d) for card, d in cards if query.matches(card)]
+
+    def _rank(
+        self, rows: List[Tuple[Dict[str, Any], float]], query: ProviderSearchQuery
+    ) -> ProviderSearchResult:
+        """Ordena com heap só até o fim da página (+1 para has_next)."""
+        keyed = [(sort_key(card, d, query.sort_by), card, d) for card, d in rows]
+        if query.max_results is not None:
+            keyed = top_k(keyed, query.max_results, key=lambda row: row[0], reverse=query.descending)
+
+        selected = top_k(
+            keyed,
+            query.skip + query.limit + 1,
+            key=lambda row: row[0],
+            reverse=query.descending,
+            after=query.after,
+        )
+        page = selected[query.skip:]
+        return ProviderSearchResult(
+            rows=page[: query.limit],
+            total=len(keyed) if query.include_total else None,
+            has_next=len(page) > query.limit,
+        )
+
+    async def _geo_near(self, database, query: ProviderSearchQuery) -> ProviderSearchResult:
+        """$geoNear sobre os cards: filtro, ordenação e paginação no MongoDB.
+
+        Só a página pedida trafega pela rede. Com `after` (chave do cursor) a
+        página começa depois desse item em vez de usar skip. Com janela de
+        horário, um primeiro $geoNear traz só os ids do raio e a ocupação é
+        verificada apenas para esses candidatos.
+        """
+        collection = database[self.cards.collection]
+        card_query = query.card_query()
+        if query.window is not None:
+            candidates = await collection.aggregate([
+                geo_near_stage(query.lat, query.lon, query.radius_km, card_query),
+                {"$project": {"_id": 0, "id": 1}},
+            ]).to_list(length=None)
+            busy = await self.bookings.busy_providers(
+                database, *query.window, provider_ids=[doc["id"] for doc in candidates if doc.get("id")]
+            )
+            if busy:
+                card_query["id"] = {"$nin": sorted(busy)}
+        pipeline: List[Dict[str, Any]] = [
+            geo_near_stage(query.lat, query.lon, query.radius_km, card_query),
+            {"$project": {"_id": 0}},
+        ]
+        pipeline.extend(sort_stages(query.sort_by, query.sort_order))
+        after_stages = cursor_stages(query.sort_order, query.after)
+        limit = query.limit + 1
+
+        if query.include_total:
+            # O total ignora o cursor: conta todos os prestadores do raio
+            pipeline.append(page_facet_stage(query.skip, limit, items_prefix=after_stages))
+            result = await collection.aggregate(pipeline).to_list(length=1)
+            docs, total = unpack_page_facet(result)
+        else:
+            pipeline.extend(after_stages)
+            pipeline.extend([{"$skip": max(0, query.skip)}, {"$limit": limit}])
+            docs = await collection.aggregate(pipeline).to_list(length=None)
+            total = None
+
+        rows = [
+            ((doc["_ordem"], doc.get("id") or ""), doc, float(doc.get("distance_km", 0.0)))
+            for doc in docs
+        ]
+        return ProviderSearchResult(
+            rows=rows[: query.limit], total=total, has_next=len(rows) > query.limit
+        )
+
+    def to_response(
+        self,
+        card: Dict[str, Any],
+        distance: float,
+        categoria: Optional[str] = None,
+        services_mode: str = "full",
+        fields: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Projeta o card no item de resposta.
+
+        Args:
+            card: Card do prestador
+            distance: Distância em km até o ponto da busca
+            categoria: Restringe os serviços listados à categoria
+            services_mode: full (lista de serviços) ou summary (quantidade e menor preço)
+            fields: Campos a manter (todos se None)
+        """
+        item = {
+            "provider_id": card.get("id"),
+            "nome": card.get("nome") or "Prestador",
+            "telefone": card.get("telefone", ""),
+            "email": card.get("email", ""),
+            "latitude": float(card.get("latitude")),
+            "longitude": float(card.get("longitude")),
+            "distance_km": round(distance, 2),
+            "estimated_time_min": estimate_eta_minutes(distance),
+            "rating": float(card.get("rating") or 0),
+            "total_avaliacoes": int(card.get("total_avaliacoes", 0)),
+            "foto_url": card.get("foto_url", ""),
+            "endereco": card.get("endereco", ""),
+            "disponivel": card.get("disponivel", True),
+            "especialidades": card.get("especialidades", []),
+        }
+        if services_mode == "summary":
+            item["services_summary"] = card_summary(card, categoria)
+        else:
+            item["services"] = card_services(card, categoria)
+        if fields is not None:
+            item = {name: item[name] for name in fields if name in item}
+        return item
+
+
+async def _to_list(cursor, length: Optional[int]) -> List[Dict[str, Any]]:
+    """Converte cursor do motor em lista (mocks dos testes podem retornar listas)."""
+    if inspect.isawaitable(cursor):
+        cursor = await cursor
+    if isinstance(cursor, list):
+        return cursor
+    return await cursor.to_list(length=length)
+
+
+# Instância global
+provider_search_service = ProviderSearchService(
+    provider_index, provider_cards, provider_search_cache, booking_index
+)
@@ -0,0 +1,94 @@
+"""
+Benchmark do backtest de fraude com pagamentos sintéticos
+
+Gera um histórico de pagamentos em ordem de tempo (sem mongod), com uma
+fração de usuários fraudadores que fazem rajadas de valores altos em
+outra cidade, e mede a vazão do replay no próprio processo e com
+processos por partição de usuários.
+
+Execute com:
+    cd backend && python -m tests.performance.bench_fraud_backtest
+    cd backend && python -m tests.performance.bench_fraud_backtest --payments 2000000 --workers 0 4
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime
+
+from security.fraud_backtest import FraudBacktest
+
+# São Paulo e Rio de Janeiro
+HOME = (-23.5505, -46.6333)
+AWAY = (-22.9068, -43.1729)
+START = datetime(2025, 1, 1).timestamp()
+
+
+def synthetic_events(payments, users, fraud_rate, seed=7):
+    """Eventos (user_id, horário, valor, lat, lng, dispositivo, fraude) em ordem de tempo."""
+    rng = random.Random(seed)
+    at = START
+    mean_gap = 180 * 86400 / payments
+    burst = []
+    for _ in range(payments):
+        if burst:
+            user, amount, labeled = burst.pop()
+            at += rng.uniform(5, 60)
+            yield (user, at, amount, AWAY[0], AWAY[1], "device-x", labeled)
+            continue
+        at += rng.expovariate(1 / mean_gap)
+        user = f"user-{rng.randrange(users)}"
+        if rng.random() < fraud_rate:
+            # Rajada de valores altos: o primeiro pagamento é legítimo, o resto é contestado
+            amount = rng.uniform(800, 3000)
+            burst = [(user, amount, True) for _ in range(rng.randint(3, 6))]
+            yield (user, at, rng.uniform(50, 300), HOME[0], HOME[1], f"device-{user}", False)
+            continue
+        lat = HOME[0] + rng.uniform(-0.1, 0.1)
+        lng = HOME[1] + rng.uniform(-0.1, 0.1)
+        yield (user, at, rng.uniform(50, 300), lat, lng, f"device-{user}", False)
+
+
+async def chunked(events, size):
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payments", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--fraud-rate", type=float, default=0.005)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    reports = []
+    for workers in args.workers:
+        backtest = FraudBacktest(workers=workers, chunk_size=args.chunk_size)
+        events = synthetic_events(args.payments, args.users, args.fraud_rate)
+        reports.append(asyncio.run(backtest.run_chunks(chunked(events, args.chunk_size))))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'processos':>9} {'eventos/s':>10} {'segundos':>9} {'p50 µs':>8} {'p99 µs':>8} "
+          f"{'alertas':>8} {'precisão':>9} {'recall':>7}")
+    for report in reports:
+        print(
+            f"{report['workers']:>9} {report['events_per_second']:>10.0f} {report['seconds']:>9.1f} "
+            f"{report['latency_us']['p50']:>8.1f} {report['latency_us']['p99']:>8.1f} "
+            f"{report['alert_rate']:>8.2%} {report['precision']:>9.3f} {report['recall']:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark de memória e custo das features de fraude por usuário
+
+Compara o layout antigo (dict de listas de transações, como na dataclass
+UserBehavior) com as janelas fixas de `UserFeatures`:
+    - memória por usuário (tracemalloc), com a projeção para 1M de usuários
+    - tempo por `analyze_transaction` com o histórico cheio
+    - memória residente com eviction por inatividade (`idle_ttl`)
+
+Execute com:
+    cd backend && python -m tests.performance.bench_fraud_features
+    cd backend && python -m tests.performance.bench_fraud_features --users 200000 --transactions 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from security.feature_store import UserFeatures
+from security.fraud_detection import FraudDetectionEngine
+
+# Centro de São Paulo
+CENTER_LAT = -23.5505
+CENTER_LON = -46.6333
+
+
+def _legacy_update(behavior, transaction):
+    """Cópia da atualização original (listas refatiadas a cada transação)."""
+    behavior["transaction_patterns"]["recent_transactions"].append({
+        "timestamp": datetime.utcnow(),
+        "amount": transaction["amount"],
+        "location": transaction["location"],
+    })
+    behavior["transaction_patterns"]["recent_transactions"] = \
+        behavior["transaction_patterns"]["recent_transactions"][-20:]
+    behavior["location_history"].append(transaction["location"])
+    behavior["location_history"] = behavior["location_history"][-10:]
+    device = transaction["device_fingerprint"]
+    if device not in behavior["device_fingerprints"]:
+        behavior["device_fingerprints"].append(device)
+        behavior["device_fingerprints"] = behavior["device_fingerprints"][-5:]
+    amounts = [t["amount"] for t in behavior["transaction_patterns"]["recent_transactions"]]
+    behavior["transaction_patterns"]["average_amount"] = sum(amounts) / len(amounts)
+
+
+def _legacy_behavior(user_id):
+    return {
+        "user_id": user_id,
+        "login_patterns": {},
+        "transaction_patterns": {"recent_transactions": []},
+        "device_fingerprints": [],
+        "location_history": [],
+        "risk_score": 0.0,
+    }
+
+
+def generate_transactions(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "amount": round(rng.uniform(20, 500), 2),
+            "location": {"lat": CENTER_LAT + rng.uniform(-0.3, 0.3), "lng": CENTER_LON + rng.uniform(-0.3, 0.3)},
+            "device_fingerprint": f"device-{rng.randrange(3)}",
+        }
+        for _ in range(count)
+    ]
+
+
+def measure_memory(users, transactions, layout):
+    """Bytes por usuário de `users` perfis com o histórico preenchido."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    profiles = {}
+    now = time.time()
+    for u in range(users):
+        user_id = f"user-{u}"
+        if layout == "antigo":
+            profile = profiles[user_id] = _legacy_behavior(user_id)
+            for transaction in transactions:
+                _legacy_update(profile, transaction)
+        else:
+            profile = profiles[user_id] = UserFeatures(user_id)
+            for i, transaction in enumerate(transactions):
+                profile.add_transaction(now + i, transaction["amount"], transaction["location"],
+                                        transaction["device_fingerprint"])
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / users
+
+
+async def measure_analyze(users, transactions, repeat):
+    """Tempo médio de analyze_transaction (µs) com o histórico cheio."""
+    engine = FraudDetectionEngine(max_profiles=users)
+    for u in range(users):
+        for transaction in transactions:
+            await engine.analyze_transaction(f"user-{u}", transaction)
+    rng = random.Random(11)
+    start = time.perf_counter()
+    for i in range(repeat):
+        await engine.analyze_transaction(f"user-{rng.randrange(users)}", transactions[i % len(transactions)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+async def measure_idle(users, transactions, idle_ttl):
+    """Usuários em memória após uma rodada quando metade fica inativa."""
+    engine = FraudDetectionEngine(max_profiles=users, idle_ttl=idle_ttl)
+    for u in range(users):
+        await engine.analyze_transaction(f"user-{u}", transactions[u % len(transactions)])
+    await asyncio.sleep(idle_ttl)
+    for u in range(0, users, 2):
+        await engine.analyze_transaction(f"user-{u}", transactions[u % len(transactions)])
+    engine.user_behaviors.evict_idle()
+    return len(engine.user_behaviors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50_000, help="Usuários com histórico cheio")
+    parser.add_argument("--transactions", type=int, default=25, help="Transações por usuário")
+    parser.add_argument("--repeat", type=int, default=20_000, help="Chamadas medidas de analyze_transaction")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    transactions = generate_transactions(args.transactions)
+    results = {
+        "memoria_por_usuario": {
+            layout: measure_memory(args.users, transactions, layout) for layout in ("antigo", "janelas")
+        },
+        "analyze_us": asyncio.run(measure_analyze(min(args.users, 5_000), transactions, args.repeat)),
+        "residentes_apos_idle": asyncio.run(measure_idle(min(args.users, 5_000), transactions, 0.2)),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'layout':<10} {'bytes/usuário':>14} {'MB por 1M usuários':>20}")
+    for layout, per_user in results["memoria_por_usuario"].items():
+        print(f"{layout:<10} {per_user:>14.0f} {per_user * 1e6 / 2**20:>20.0f}")
+    print(f"analyze_transaction: {results['analyze_us']:.1f} µs por chamada")
+    print(f"eviction por inatividade: {results['residentes_apos_idle']} de {min(args.users, 5_000)} usuários residentes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark do cálculo de distâncias para busca de prestadores
+
+Compara, por requisição, o custo de filtrar prestadores por raio:
+    - loop: Haversine escalar em Python para cada documento (implementação antiga)
+    - vetorizado: uma passada NumPy sobre arrays float64 contíguos
+    - índice: grade espacial + passada vetorizada só nas células cobertas
+
+Execute com:
+    cd backend && python -m tests.performance.bench_geo_distance
+    cd backend && python -m tests.performance.bench_geo_distance --sizes 10000 100000 --radius 10
+"""
+import argparse
+import json
+import math
+import random
+import time
+
+from geo.distance import CoordinateArray
+from geo.spatial_index import ProviderSpatialIndex
+
+# Centro de São Paulo
+CENTER_LAT = -23.5505
+CENTER_LON = -46.6333
+
+
+def _scalar_haversine(lat1, lon1, lat2, lon2):
+    """Cópia da implementação escalar original de server.py."""
+    R = 6371.0
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def generate_providers(count, seed=7):
+    """Gerar prestadores espalhados em ~100 km ao redor do centro."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"prov-{i}",
+            "latitude": CENTER_LAT + rng.uniform(-0.5, 0.5),
+            "longitude": CENTER_LON + rng.uniform(-0.5, 0.5),
+        }
+        for i in range(count)
+    ]
+
+
+def _time_per_call(func, repeat):
+    """Tempo médio por chamada em milissegundos."""
+    func()  # aquecimento
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(sizes, radius_km, repeat):
+    results = []
+    for size in sizes:
+        providers = generate_providers(size)
+        coords = CoordinateArray.from_documents(providers)
+        index = ProviderSpatialIndex()
+        for p in providers:
+            index.upsert(p["id"], p["latitude"], p["longitude"])
+
+        def loop():
+            return [
+                p for p in providers
+                if _scalar_haversine(CENTER_LAT, CENTER_LON, p["latitude"], p["longitude"]) <= radius_km
+            ]
+
+        def vectorized():
+            return coords.within_radius(CENTER_LAT, CENTER_LON, radius_km)
+
+        def indexed():
+            return index.query_radius(CENTER_LAT, CENTER_LON, radius_km)
+
+        matches = len(indexed())
+        assert matches == len(loop()) == len(vectorized()[0])
+
+        results.append({
+            "providers": size,
+            "radius_km": radius_km,
+            "matches": matches,
+            "loop_ms": round(_time_per_call(loop, repeat), 3),
+            "vectorized_ms": round(_time_per_call(vectorized, repeat), 3),
+            "index_ms": round(_time_per_call(indexed, repeat), 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--radius", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.radius, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'prestadores':>12} {'no raio':>8} {'loop (ms)':>10} {'numpy (ms)':>11} {'índice (ms)':>12}")
+    for r in results:
+        print(
+            f"{r['providers']:>12} {r['matches']:>8} {r['loop_ms']:>10.3f} "
+            f"{r['vectorized_ms']:>11.3f} {r['index_ms']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
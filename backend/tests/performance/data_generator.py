@@ -0,0 +1,468 @@
+"""
+Gerador determinístico de dados sintéticos para benchmarks
+
+Cria usuários (moradores, prestadores e um admin), serviços, agendamentos,
+pagamentos e avaliações em um mongod local, no mesmo formato dos documentos
+gravados pelas rotas de server.py. Prestadores e moradores ficam agrupados em
+torno das principais capitais, com dispersão gaussiana, para que a busca por
+raio tenha densidades realistas (centro cheio, periferia esparsa).
+
+A mesma semente gera sempre os mesmos documentos (ids derivados do índice e
+datas relativas a uma data base fixa). Os dados são produzidos em lotes a
+partir de arrays NumPy, então 1M de usuários cabe em memória.
+
+Execute com:
+    cd backend && python -m tests.performance.data_generator --users 100000
+    cd backend && python -m tests.performance.data_generator --users 1000000 --db alca_hub_bench_1m
+"""
+import argparse
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+# O pacote services exige as variáveis do .env já carregadas
+load_dotenv(ROOT_DIR / ".env")
+
+from core.enums import BookingStatus  # noqa: E402
+from geo.distance import KM_PER_DEGREE  # noqa: E402
+from services.provider_cards import provider_cards  # noqa: E402
+
+SEEDS_DIR = ROOT_DIR / "seeds"
+
+META_COLLECTION = "_bench_meta"
+COLLECTIONS = ("users", "services", "bookings", "payments", "reviews", provider_cards.collection)
+
+# Data base fixa: os dados não dependem do relógio de quem gera
+BASE_DATE = datetime(2025, 1, 6)
+
+# (cidade, latitude, longitude, peso populacional, dispersão em km)
+CITIES = [
+    ("São Paulo", -23.5505, -46.6333, 0.30, 18.0),
+    ("Rio de Janeiro", -22.9068, -43.1729, 0.17, 15.0),
+    ("Belo Horizonte", -19.9167, -43.9345, 0.08, 10.0),
+    ("Brasília", -15.7939, -47.8828, 0.07, 14.0),
+    ("Salvador", -12.9777, -38.5016, 0.07, 10.0),
+    ("Fortaleza", -3.7319, -38.5267, 0.07, 10.0),
+    ("Curitiba", -25.4284, -49.2733, 0.06, 9.0),
+    ("Recife", -8.0476, -34.8770, 0.06, 8.0),
+    ("Porto Alegre", -30.0346, -51.2177, 0.06, 9.0),
+    ("Manaus", -3.1190, -60.0217, 0.06, 9.0),
+]
+
+STATUS_VALUES = [s.value for s in BookingStatus]
+# pendente, confirmado, em_andamento, concluido, cancelado
+STATUS_WEIGHTS = [0.15, 0.20, 0.05, 0.50, 0.10]
+REVIEW_TAGS = ["pontual", "educado", "caprichoso", "rápido", "preço justo", "recomendo"]
+
+# Trechos combinados nos comentários sintéticos (benchmark de sentimento)
+REVIEW_PHRASES = [
+    "Serviço muito bom", "chegou pontual", "excelente atendimento", "não recomendo",
+    "atrasado e desorganizado", "profissional extremamente cuidadoso", "o preço foi justo",
+    "tive um problema com a limpeza", "nada bom", "fiquei satisfeito com o resultado",
+    "péssimo, totalmente decepcionante", "voltaria a contratar", "deixou tudo limpo",
+    "bastante educado e prestativo", "demorou demais para responder", "recomendo!",
+]
+
+# Hash inválido: usuários sintéticos não fazem login
+UNUSABLE_PASSWORD = "!benchmark"
+
+
+def load_categories() -> List[str]:
+    """Categorias de serviço usadas nas seeds do projeto."""
+    with open(SEEDS_DIR / "seed_categories.json", encoding="utf-8") as f:
+        return [c["name"] for c in json.load(f)]
+
+
+def city_points(rng: np.random.Generator, count: int):
+    """Coordenadas agrupadas por cidade (arrays lat, lon e índice da cidade)."""
+    weights = np.array([c[3] for c in CITIES])
+    city = rng.choice(len(CITIES), size=count, p=weights / weights.sum())
+    centers = np.array([(c[1], c[2]) for c in CITIES])
+    sigma_km = np.array([c[4] for c in CITIES])[city]
+
+    lat = centers[city, 0] + rng.normal(0.0, 1.0, count) * sigma_km / KM_PER_DEGREE
+    cos_lat = np.cos(np.radians(centers[city, 0]))
+    lon = centers[city, 1] + rng.normal(0.0, 1.0, count) * sigma_km / (KM_PER_DEGREE * cos_lat)
+    return np.round(lat, 6), np.round(lon, 6), city
+
+
+def review_comments(count: int, seed: int = 42, max_phrases: int = 4) -> List[str]:
+    """Comentários sintéticos de avaliação (1 a `max_phrases` trechos cada)."""
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, max_phrases + 1, count)
+    picks = rng.integers(0, len(REVIEW_PHRASES), (count, max_phrases))
+    return [
+        ". ".join(REVIEW_PHRASES[p] for p in picks[i, : sizes[i]]) + "."
+        for i in range(count)
+    ]
+
+
+def _point(lat: float, lon: float) -> Dict[str, Any]:
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def _batches(total: int, size: int) -> Iterator[range]:
+    for start in range(0, total, size):
+        yield range(start, min(total, start + size))
+
+
+class SyntheticDataset:
+    """Plano do dataset em arrays NumPy; os documentos são montados por lote."""
+
+    def __init__(
+        self,
+        users: int,
+        seed: int = 42,
+        provider_ratio: float = 0.2,
+        bookings_per_resident: float = 3.0,
+        review_ratio: float = 0.6,
+    ):
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.categories = load_categories()
+
+        self.n_providers = max(1, int(users * provider_ratio))
+        self.n_residents = max(1, users - self.n_providers)
+
+        # Usuários
+        self.provider_lat, self.provider_lon, self.provider_city = city_points(rng, self.n_providers)
+        self.resident_lat, self.resident_lon, self.resident_city = city_points(rng, self.n_residents)
+        self.provider_available = rng.random(self.n_providers) < 0.85
+
+        # Serviços: 1 a 4 por prestador
+        per_provider = rng.integers(1, 5, self.n_providers)
+        self.service_provider = np.repeat(np.arange(self.n_providers), per_provider)
+        self.n_services = len(self.service_provider)
+        self.service_category = rng.integers(0, len(self.categories), self.n_services)
+        self.service_price = np.round(rng.lognormal(np.log(70), 0.4, self.n_services), 2)
+        self.service_available = rng.random(self.n_services) < 0.9
+
+        # Agendamentos: serviço escolhido na mesma cidade do morador
+        self.n_bookings = int(self.n_residents * bookings_per_resident)
+        self.booking_resident = rng.integers(0, self.n_residents, self.n_bookings)
+        self.booking_service = self._services_near(rng, self.resident_city[self.booking_resident])
+        self.booking_day = rng.integers(-90, 60, self.n_bookings)
+        self.booking_start = rng.integers(7, 19, self.n_bookings)
+        self.booking_hours = rng.integers(1, 4, self.n_bookings)
+        status = rng.choice(len(STATUS_VALUES), size=self.n_bookings, p=STATUS_WEIGHTS)
+        # Agendamentos futuros ainda não foram concluídos
+        done = STATUS_VALUES.index(BookingStatus.CONCLUIDO.value)
+        pending = STATUS_VALUES.index(BookingStatus.PENDENTE.value)
+        status[(self.booking_day > 0) & (status == done)] = pending
+        self.booking_status = status
+
+        # Avaliações: parte dos concluídos
+        concluded = np.nonzero(status == done)[0]
+        self.review_booking = concluded[rng.random(len(concluded)) < review_ratio]
+        self.review_rating = rng.choice(5, size=len(self.review_booking), p=[0.03, 0.05, 0.12, 0.35, 0.45]) + 1
+        self.review_tags = rng.integers(0, len(REVIEW_TAGS), (len(self.review_booking), 2))
+
+        # Agregados de avaliação por serviço e por prestador
+        reviewed_service = self.booking_service[self.review_booking]
+        self.service_reviews = np.bincount(reviewed_service, minlength=self.n_services)
+        service_sum = np.bincount(reviewed_service, weights=self.review_rating, minlength=self.n_services)
+        self.service_avg = np.round(np.divide(service_sum, np.maximum(self.service_reviews, 1)), 1)
+        provider_of_review = self.service_provider[reviewed_service]
+        self.provider_reviews = np.bincount(provider_of_review, minlength=self.n_providers)
+        provider_sum = np.bincount(provider_of_review, weights=self.review_rating, minlength=self.n_providers)
+        self.provider_rating = np.round(np.divide(provider_sum, np.maximum(self.provider_reviews, 1)), 2)
+
+        # Pagamentos: agendamentos confirmados em diante
+        paid_status = {
+            STATUS_VALUES.index(s.value)
+            for s in (BookingStatus.CONFIRMADO, BookingStatus.EM_ANDAMENTO, BookingStatus.CONCLUIDO)
+        }
+        self.payment_booking = np.nonzero(np.isin(status, list(paid_status)))[0]
+
+    def _services_near(self, rng: np.random.Generator, cities: np.ndarray) -> np.ndarray:
+        """Um serviço aleatório da cidade de cada agendamento."""
+        service_city = self.provider_city[self.service_provider]
+        order = np.argsort(service_city, kind="stable")
+        starts = np.searchsorted(service_city[order], np.arange(len(CITIES)))
+        ends = np.searchsorted(service_city[order], np.arange(len(CITIES)), side="right")
+
+        counts = (ends - starts)[cities]
+        fallback = rng.integers(0, self.n_services, len(cities))
+        offsets = (rng.random(len(cities)) * np.maximum(counts, 1)).astype(np.int64)
+        picked = order[np.minimum(starts[cities] + offsets, len(order) - 1)]
+        return np.where(counts > 0, picked, fallback)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": self.n_providers + self.n_residents + 1,
+            "providers": self.n_providers,
+            "services": self.n_services,
+            "bookings": self.n_bookings,
+            "payments": len(self.payment_booking),
+            "reviews": len(self.review_booking),
+        }
+
+    # Documentos
+
+    def admin(self) -> Dict[str, Any]:
+        return {
+            "id": "admin-0",
+            "email": "admin@bench.alca",
+            "cpf": "00000000000",
+            "nome": "Admin Benchmark",
+            "telefone": "(11) 90000-0000",
+            "endereco": "São Paulo",
+            "tipo": "admin",
+            "tipos": ["admin"],
+            "ativo": True,
+            "password": UNUSABLE_PASSWORD,
+            "created_at": BASE_DATE,
+            "updated_at": BASE_DATE,
+        }
+
+    def providers(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for i in rows:
+            lat, lon = float(self.provider_lat[i]), float(self.provider_lon[i])
+            doc = {
+                "id": f"prov-{i}",
+                "email": f"prestador{i}@bench.alca",
+                "cpf": f"{i:011d}",
+                "nome": f"Prestador {i}",
+                "telefone": f"(11) 9{i % 10**8:08d}",
+                "endereco": CITIES[self.provider_city[i]][0],
+                "tipo": "prestador",
+                "tipos": ["prestador"],
+                "latitude": lat,
+                "longitude": lon,
+                "location": _point(lat, lon),
+                "disponivel": bool(self.provider_available[i]),
+                "ativo": True,
+                "especialidades": [],
+                "password": UNUSABLE_PASSWORD,
+                "created_at": BASE_DATE - timedelta(days=int(i % 365)),
+                "updated_at": BASE_DATE,
+            }
+            if self.provider_reviews[i]:
+                doc["rating"] = float(self.provider_rating[i])
+                doc["total_avaliacoes"] = int(self.provider_reviews[i])
+            docs.append(doc)
+        return docs
+
+    def residents(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for i in rows:
+            lat, lon = float(self.resident_lat[i]), float(self.resident_lon[i])
+            docs.append({
+                "id": f"user-{i}",
+                "email": f"morador{i}@bench.alca",
+                "cpf": f"{10**10 + i:011d}",
+                "nome": f"Morador {i}",
+                "telefone": f"(21) 9{i % 10**8:08d}",
+                "endereco": CITIES[self.resident_city[i]][0],
+                "tipo": "morador",
+                "tipos": ["morador"],
+                "latitude": lat,
+                "longitude": lon,
+                "location": _point(lat, lon),
+                "ativo": True,
+                "password": UNUSABLE_PASSWORD,
+                "created_at": BASE_DATE - timedelta(days=int(i % 365)),
+                "updated_at": BASE_DATE,
+            })
+        return docs
+
+    def services(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for i in rows:
+            provider = int(self.service_provider[i])
+            category = self.categories[self.service_category[i]]
+            lat, lon = float(self.provider_lat[provider]), float(self.provider_lon[provider])
+            docs.append({
+                "id": f"svc-{i}",
+                "prestador_id": f"prov-{provider}",
+                "nome": f"{category} #{i}",
+                "descricao": f"Serviço de {category.lower()}",
+                "categoria": category,
+                "preco_por_hora": float(self.service_price[i]),
+                "disponibilidade": ["segunda", "terca", "quarta", "quinta", "sexta"],
+                "horario_inicio": "08:00",
+                "horario_fim": "18:00",
+                "status": "disponivel" if self.service_available[i] else "indisponivel",
+                "media_avaliacoes": float(self.service_avg[i]),
+                "total_avaliacoes": int(self.service_reviews[i]),
+                "avaliacoes": [],
+                "location": _point(lat, lon),
+                "created_at": BASE_DATE,
+                "updated_at": BASE_DATE,
+            })
+        return docs
+
+    def _booking_times(self, i: int):
+        day = BASE_DATE + timedelta(days=int(self.booking_day[i]))
+        start = int(self.booking_start[i])
+        return day, start, start + int(self.booking_hours[i])
+
+    def bookings(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for i in rows:
+            service = int(self.booking_service[i])
+            day, start, end = self._booking_times(i)
+            status = STATUS_VALUES[self.booking_status[i]]
+            docs.append({
+                "id": f"bk-{i}",
+                "morador_id": f"user-{self.booking_resident[i]}",
+                "prestador_id": f"prov-{self.service_provider[service]}",
+                "service_id": f"svc-{service}",
+                "data_agendamento": day,
+                "horario_inicio": f"{start:02d}:00",
+                "horario_fim": f"{end:02d}:00",
+                "preco_total": round(float(self.service_price[service]) * (end - start), 2),
+                "status": status,
+                "payment_status": "paid" if status in ("confirmado", "em_andamento", "concluido") else "pending",
+                "created_at": day - timedelta(days=3),
+                "updated_at": day,
+            })
+        return docs
+
+    def payments(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for j in rows:
+            i = int(self.payment_booking[j])
+            service = int(self.booking_service[i])
+            day, start, end = self._booking_times(i)
+            docs.append({
+                "id": f"pay-{j}",
+                "mercado_pago_id": f"bench-{j}",
+                "booking_id": f"bk-{i}",
+                "user_id": f"user-{self.booking_resident[i]}",
+                "amount": round(float(self.service_price[service]) * (end - start), 2),
+                "payment_method": "pix",
+                "status": "approved",
+                "created_at": day - timedelta(days=2),
+                "updated_at": day - timedelta(days=2),
+            })
+        return docs
+
+    def reviews(self, rows: range) -> List[Dict[str, Any]]:
+        docs = []
+        for j in rows:
+            i = int(self.review_booking[j])
+            service = int(self.booking_service[i])
+            provider = f"prov-{self.service_provider[service]}"
+            resident = f"user-{self.booking_resident[i]}"
+            day, _, _ = self._booking_times(i)
+            created = day + timedelta(days=1)
+            docs.append({
+                # _id textual: as rotas de avaliações expõem o _id como id
+                "_id": f"rev-{j}",
+                "id": f"rev-{j}",
+                # Campos de /api/reviews (server.py)
+                "booking_id": f"bk-{i}",
+                "morador_id": resident,
+                "prestador_id": provider,
+                "service_id": f"svc-{service}",
+                "comentario": "Avaliação sintética",
+                # Campos de /reviews (reviews/routes.py)
+                "reviewer_id": resident,
+                "reviewee_id": provider,
+                "rating": int(self.review_rating[j]),
+                "title": None,
+                "comment": "Avaliação sintética",
+                "type": "service_provider",
+                "status": "approved",
+                "anonymous": False,
+                "tags": sorted({REVIEW_TAGS[t] for t in self.review_tags[j]}),
+                "created_at": created,
+                "updated_at": created,
+                "approved_at": created,
+            })
+        return docs
+
+
+async def create_indexes(db):
+    """Índices usados pelas rotas medidas nos benchmarks."""
+    await db.users.create_index([("id", ASCENDING)], unique=True)
+    await db.users.create_index([("tipo", ASCENDING), ("ativo", ASCENDING)])
+    await db.users.create_index([("location", GEOSPHERE)])
+    await db.services.create_index([("id", ASCENDING)], unique=True)
+    await db.services.create_index([("prestador_id", ASCENDING), ("status", ASCENDING)])
+    await db.services.create_index([("location", GEOSPHERE)])
+    await db.bookings.create_index([("id", ASCENDING)], unique=True)
+    await db.bookings.create_index([("prestador_id", ASCENDING), ("status", ASCENDING)])
+    await db.bookings.create_index([("morador_id", ASCENDING), ("status", ASCENDING)])
+    await db.bookings.create_index([("status", ASCENDING), ("data_agendamento", ASCENDING)])
+    await db.payments.create_index([("booking_id", ASCENDING)])
+    await db.reviews.create_index([("reviewee_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)])
+    await db.reviews.create_index([("service_id", ASCENDING)])
+    await provider_cards.ensure_indexes(db)
+
+
+async def generate(db, users: int, seed: int = 42, batch_size: int = 5000, **options) -> Dict[str, int]:
+    """Apagar as collections do dataset e gravar um novo.
+
+    Returns:
+        Quantidade de documentos por collection
+    """
+    dataset = SyntheticDataset(users, seed=seed, **options)
+    for name in (*COLLECTIONS, META_COLLECTION):
+        await db.drop_collection(name)
+
+    await db.users.insert_one(dataset.admin())
+    plan = [
+        (db.users, dataset.providers, dataset.n_providers),
+        (db.users, dataset.residents, dataset.n_residents),
+        (db.services, dataset.services, dataset.n_services),
+        (db.bookings, dataset.bookings, dataset.n_bookings),
+        (db.payments, dataset.payments, len(dataset.payment_booking)),
+        (db.reviews, dataset.reviews, len(dataset.review_booking)),
+    ]
+    for collection, build, total in plan:
+        for rows in _batches(total, batch_size):
+            await collection.insert_many(build(rows), ordered=False)
+
+    await create_indexes(db)
+    await provider_cards.rebuild_all(db, batch_size=batch_size)
+
+    counts = dataset.counts()
+    await db[META_COLLECTION].insert_one(
+        {"_id": "dataset", "seed": seed, "requested_users": users, "options": options,
+         "counts": counts, "generated_at": datetime.utcnow()}
+    )
+    return counts
+
+
+async def ensure_dataset(db, users: int, seed: int = 42, **options) -> Dict[str, int]:
+    """Reaproveitar o dataset se já tiver sido gerado com os mesmos parâmetros."""
+    meta = await db[META_COLLECTION].find_one({"_id": "dataset"})
+    if meta and meta.get("seed") == seed and meta.get("requested_users") == users \
+            and meta.get("options", {}) == options:
+        return meta["counts"]
+    return await generate(db, users, seed=seed, **options)
+
+
+async def main(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    mongo_url = args.mongo_url or os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        print(f"🚀 Gerando {args.users} usuários em {args.db} (seed={args.seed})")
+        counts = await generate(client[args.db], args.users, seed=args.seed, batch_size=args.batch_size)
+        for name, count in counts.items():
+            print(f"✅ {name}: {count}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerar dataset sintético para benchmarks")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default="alca_hub_bench")
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,192 @@
+"""
+Avaliação offline do motor de recomendações (qualidade e custo)
+
+Reproduz um log histórico de agendamentos com corte temporal: o motor é
+montado só com agendamentos e avaliações anteriores ao corte e, para cada
+morador com histórico, as recomendações são comparadas com os serviços que
+ele contratou depois do corte. Relata precision@k, recall@k, hit rate e
+cobertura do catálogo ao lado de latência p50/p99 por requisição e memória
+por 1k usuários, para cada conjunto de pesos (`model_weights`) pedido.
+
+Fontes do log:
+    - sintético: tests.performance.data_generator (sem mongod)
+    - export: diretório com services.json, users.json, bookings.json e
+      reviews.json gerados pelo mongoexport (JSON por linha ou array)
+
+Execute com:
+    cd backend && python -m tests.performance.eval_recommendations --users 5000
+    cd backend && python -m tests.performance.eval_recommendations --export ./dump \\
+        --weights collaborative=0.4,content_based=0.3,location=0.2,popularity=0.1 \\
+        --weights collaborative=0.2,content_based=0.2,location=0.5,popularity=0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from bson import json_util
+
+from ai.recommendation_eval import evaluate, measure_build, time_split
+from ai.recommendation_index import EngineLoader
+from core.enums import BookingStatus
+from tests.performance.data_generator import SyntheticDataset
+
+
+def synthetic_log(users: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    dataset = SyntheticDataset(users, seed=seed)
+    return {
+        "services": dataset.services(range(dataset.n_services)),
+        "users": dataset.providers(range(dataset.n_providers)) + dataset.residents(range(dataset.n_residents)),
+        "bookings": dataset.bookings(range(dataset.n_bookings)),
+        "reviews": dataset.reviews(range(len(dataset.review_booking))),
+    }
+
+
+def _read_export(path: Path) -> List[Dict[str, Any]]:
+    text = path.read_text(encoding="utf-8").strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return json_util.loads(text)
+    return [json_util.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def export_log(directory: str) -> Dict[str, List[Dict[str, Any]]]:
+    root = Path(directory)
+    return {name: _read_export(root / f"{name}.json") for name in ("services", "users", "bookings", "reviews")}
+
+
+def _train_services(services: List[Dict[str, Any]], reviews: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Serviços com nota e total recalculados só com avaliações do treino (sem vazar o teste)."""
+    total, count = defaultdict(float), defaultdict(int)
+    for review in reviews:
+        if review.get("rating") is not None:
+            total[review.get("service_id")] += float(review["rating"])
+            count[review.get("service_id")] += 1
+    return [
+        {
+            **service,
+            "media_avaliacoes": total[service["id"]] / count[service["id"]] if count[service["id"]] else 0.0,
+            "total_avaliacoes": count[service["id"]],
+        }
+        for service in services
+    ]
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    weights = {}
+    for part in text.split(","):
+        name, value = part.split("=")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+async def run(log: Dict[str, List[Dict[str, Any]]], args) -> Dict[str, Any]:
+    bookings = [b for b in log["bookings"] if b.get("status") != BookingStatus.CANCELADO.value]
+    train, test, cutoff = time_split(bookings, args.test_fraction)
+    train_reviews = [r for r in log["reviews"] if r.get("created_at") is not None and r["created_at"] < cutoff]
+    services = _train_services(
+        [s for s in log["services"] if s.get("status", "disponivel") == "disponivel"], train_reviews
+    )
+    users = {user["id"]: user for user in log["users"] if user.get("id")}
+    locations = {
+        user_id: {"lat": user["latitude"], "lng": user["longitude"]}
+        for user_id, user in users.items()
+        if user.get("latitude") is not None and user.get("longitude") is not None
+    }
+
+    async def build():
+        loader = EngineLoader()
+        await loader.add_services(services, locations)
+        for booking in train:
+            await loader.add_booking(booking)
+        for review in train_reviews:
+            await loader.add_review(review)
+        return await loader.finish(users)
+
+    engine, cost = await measure_build(build)
+
+    seen: Dict[str, Set[str]] = defaultdict(set)
+    for booking in train:
+        seen[booking["morador_id"]].add(booking["service_id"])
+    relevant: Dict[str, Set[str]] = defaultdict(set)
+    for booking in test:
+        user_id = booking.get("morador_id")
+        if booking.get("service_id") in engine.service_profiles and (args.include_cold or user_id in engine.user_profiles):
+            relevant[user_id].add(booking["service_id"])
+    if args.exclude_seen:
+        for user_id in relevant:
+            relevant[user_id] -= seen.get(user_id, set())
+        relevant = defaultdict(set, {user_id: items for user_id, items in relevant.items() if items})
+    if args.max_users and len(relevant) > args.max_users:
+        sample = random.Random(args.seed).sample(sorted(relevant), args.max_users)
+        relevant = defaultdict(set, {user_id: relevant[user_id] for user_id in sample})
+
+    configs = [parse_weights(text) for text in args.weights] or [dict(engine.model_weights)]
+    results = []
+    for weights in configs:
+        engine.model_weights = {**engine.model_weights, **weights}
+        report = await evaluate(engine, relevant, args.k, seen if args.exclude_seen else None)
+        results.append({"weights": engine.model_weights, **report})
+
+    return {
+        "cutoff": cutoff.isoformat() if cutoff else None,
+        "train_bookings": len(train),
+        "test_bookings": len(test),
+        "profiles": len(engine.user_profiles),
+        "services": len(engine.service_profiles),
+        **{key: round(value, 3) for key, value in cost.items()},
+        "results": results,
+    }
+
+
+def _format_weights(weights: Dict[str, float]) -> str:
+    short = {"collaborative": "col", "content_based": "cont", "location": "loc", "popularity": "pop"}
+    return " ".join(f"{short.get(name, name)}={value:g}" for name, value in weights.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=5_000, help="Usuários do dataset sintético")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--export", help="Diretório com o export do banco (em vez do sintético)")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--weights", action="append", default=[], help="nome=peso,... (repita para comparar)")
+    parser.add_argument("--max-users", type=int, default=2_000, help="Usuários de teste avaliados (amostra)")
+    parser.add_argument("--exclude-seen", action="store_true", help="Não recomendar serviços já contratados no treino")
+    parser.add_argument("--include-cold", action="store_true", help="Avaliar também usuários sem histórico no treino")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    log = export_log(args.export) if args.export else synthetic_log(args.users, args.seed)
+    report = asyncio.run(run(log, args))
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+
+    print(
+        f"corte {report['cutoff']}: {report['train_bookings']} agendamentos de treino, "
+        f"{report['test_bookings']} de teste, {report['profiles']} perfis, {report['services']} serviços"
+    )
+    print(
+        f"montagem {report['build_s']:.2f}s, memória {report['memory_mb']:.1f} MB "
+        f"({report['memory_kb_per_1k_users']:.0f} KB por 1k usuários)"
+    )
+    metric_names = [name for k in args.k for name in (f"precision@{k}", f"recall@{k}", f"coverage@{k}")]
+    print(f"{'pesos':<36} {'usuários':>8} " + " ".join(f"{name:>12}" for name in metric_names)
+          + f" {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for result in report["results"]:
+        print(
+            f"{_format_weights(result['weights']):<36} {result['users']:>8} "
+            + " ".join(f"{result[name]:>12.4f}" for name in metric_names)
+            + f" {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
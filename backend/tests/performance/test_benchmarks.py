@@ -0,0 +1,219 @@
+"""
+Benchmarks das rotas críticas sobre o dataset sintético
+
+Mede busca de prestadores ($geoNear e índice espacial), listagem de
+agendamentos, estatísticas do admin, estatísticas de avaliações e a disputa
+concorrente por reservas de horário contra um mongod local populado por
+tests.performance.data_generator, em várias escalas.
+
+Requer pytest-benchmark e um mongod acessível (senão os testes são pulados).
+O dataset de cada escala fica em `alca_hub_bench_<n>` e é reaproveitado entre
+execuções.
+
+Execute com:
+    cd backend && ./run_tests.sh benchmark
+    cd backend && BENCH_SCALES=100000,1000000 pytest tests/performance -m perf --no-cov \\
+        --benchmark-json=tests/performance/results/benchmark.json
+"""
+import asyncio
+import itertools
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from core.enums import UserType  # noqa: E402
+from tests.performance.data_generator import SyntheticDataset, ensure_dataset  # noqa: E402
+
+pytestmark = pytest.mark.perf
+
+MONGO_URL = os.environ.get("BENCH_MONGO_URL") or os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+SCALES = [int(n) for n in os.environ.get("BENCH_SCALES", "10000,100000").split(",") if n.strip()]
+SEED = int(os.environ.get("BENCH_SEED", "42"))
+SEARCH_POINTS = 256
+
+
+class BenchContext:
+    """Banco de uma escala e o loop em que o cliente motor foi criado."""
+
+    def __init__(self, loop, db, users, counts):
+        self.loop = loop
+        self.db = db
+        self.users = users
+        self.counts = counts
+        self.dataset = SyntheticDataset(users, seed=SEED)
+
+    def run(self, benchmark, name, make_coro):
+        """Medir uma corrotina; resultados vão para o JSON do pytest-benchmark."""
+        benchmark.group = name
+        benchmark.extra_info.update({"path": name, "users": self.users, **self.counts})
+        return benchmark(lambda: self.loop.run_until_complete(make_coro()))
+
+    def search_points(self):
+        """Pontos de busca determinísticos (posições de moradores)."""
+        n = min(SEARCH_POINTS, self.dataset.n_residents)
+        return itertools.cycle(
+            zip(self.dataset.resident_lat[:n].tolist(), self.dataset.resident_lon[:n].tolist())
+        )
+
+    def busiest_provider(self) -> str:
+        counts = np.bincount(self.dataset.service_provider[self.dataset.booking_service])
+        return f"prov-{int(counts.argmax())}"
+
+
+@pytest.fixture(scope="module")
+def bench_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module", params=SCALES, ids=lambda n: f"{n}_users")
+def bench(request, bench_loop):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(MONGO_URL, io_loop=bench_loop, serverSelectionTimeoutMS=2000)
+    try:
+        bench_loop.run_until_complete(client.admin.command("ping"))
+    except Exception as e:
+        client.close()
+        pytest.skip(f"mongod indisponível em {MONGO_URL}: {e}")
+
+    users = request.param
+    db = client[f"alca_hub_bench_{users}"]
+    counts = bench_loop.run_until_complete(ensure_dataset(db, users, seed=SEED))
+    yield BenchContext(bench_loop, db, users, counts)
+    client.close()
+
+
+@pytest.fixture
+def server_db(bench, monkeypatch):
+    """Rotas de server.py apontando para o banco do benchmark."""
+    import server
+
+    monkeypatch.setattr(server, "db", bench.db)
+    return server
+
+
+def _search_service():
+    """Motor de busca isolado dos singletons da aplicação."""
+    from cache.manager import CacheManager
+    from cache.provider_search import ProviderSearchCache
+    from geo.spatial_index import ProviderSpatialIndex
+    from scheduling.interval_index import BookingIntervalIndex
+    from services.provider_cards import ProviderCardStore
+    from services.provider_search import ProviderSearchService
+
+    return ProviderSearchService(
+        ProviderSpatialIndex(), ProviderCardStore(), ProviderSearchCache(CacheManager()), BookingIntervalIndex()
+    )
+
+
+def test_provider_search_geo_near(benchmark, bench):
+    """Busca de /api/providers com $geoNear nos cards (índice em memória desligado)."""
+    from services.provider_search import ProviderSearchQuery
+
+    service = _search_service()
+    points = bench.search_points()
+
+    def search():
+        lat, lon = next(points)
+        return service.search(bench.db, ProviderSearchQuery(lat, lon, 10, include_total=True))
+
+    result = bench.run(benchmark, "provider_search_geo_near", search)
+    assert result.total is not None
+
+
+def test_provider_search_spatial_index(benchmark, bench):
+    """Busca de /api/providers pelo índice espacial com cache de tiles."""
+    from services.provider_search import ProviderSearchQuery
+
+    service = _search_service()
+    bench.loop.run_until_complete(service.index.build(bench.db))
+    points = bench.search_points()
+
+    def search():
+        lat, lon = next(points)
+        return service.search(bench.db, ProviderSearchQuery(lat, lon, 10, include_total=True))
+
+    bench.run(benchmark, "provider_search_spatial_index", search)
+
+
+def test_booking_listing(benchmark, bench, server_db):
+    """GET /api/bookings do prestador com mais agendamentos."""
+    provider = SimpleNamespace(id=bench.busiest_provider(), tipo=UserType.PRESTADOR)
+
+    bookings = bench.run(benchmark, "booking_listing", lambda: server_db.get_my_bookings(provider))
+    assert bookings
+
+
+def test_admin_stats(benchmark, bench, server_db):
+    """GET /api/admin/stats."""
+    admin = SimpleNamespace(id="admin-0", tipo=UserType.ADMIN)
+
+    bench.run(benchmark, "admin_stats", lambda: server_db.get_admin_stats(admin))
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["facet", "cached"])
+def test_review_stats(benchmark, bench, cached):
+    """GET /reviews/stats/{user_id} do prestador com mais agendamentos."""
+    from reviews.routes import get_review_stats
+    from reviews.stats import review_stats_cache
+
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db_proxy=bench.db)))
+    provider_id = bench.busiest_provider()
+    bench.loop.run_until_complete(review_stats_cache.invalidate(provider_id))
+
+    async def stats():
+        if not cached:
+            await review_stats_cache.invalidate(provider_id)
+        return await get_review_stats(provider_id, request)
+
+    name = "review_stats_cached" if cached else "review_stats"
+    result = bench.run(benchmark, name, stats)
+    assert result.total_reviews >= 0
+
+
+def test_slot_reservation_contention(benchmark, bench):
+    """Rajada concorrente de reservas sobrepostas: no máximo um vencedor por slot."""
+    from scheduling.reservations import SlotConflictError, SlotReservations
+
+    reservations = SlotReservations(slot_minutes=15, collection="booking_slots_bench")
+    slots = bench.db[reservations.collection]
+    rng = np.random.default_rng(SEED)
+    day = datetime(2030, 1, 7)
+    providers = [f"prov-{i}" for i in range(8)]
+    # 64 pedidos por prestador, todos disputando a mesma manhã
+    requests = []
+    for n in range(len(providers) * 64):
+        start = day + timedelta(hours=8, minutes=15 * int(rng.integers(0, 16)))
+        window = (start, start + timedelta(minutes=15 * int(rng.integers(2, 9))))
+        requests.append((f"burst-{n}", providers[n % len(providers)], window))
+
+    async def attempt(booking_id, provider_id, window):
+        try:
+            await reservations.reserve(bench.db, booking_id, provider_id, *window)
+            return booking_id
+        except SlotConflictError:
+            return None
+
+    async def burst():
+        await slots.delete_many({})
+        results = await asyncio.gather(*(attempt(b, p, w) for b, p, w in requests))
+        return [r for r in results if r]
+
+    winners = bench.run(benchmark, "slot_reservation_contention", burst)
+
+    won = set(winners)
+    accepted = {b: (p, w) for b, p, w in requests if b in won}
+    for provider in providers:
+        windows = sorted(w for p, w in accepted.values() if p == provider)
+        assert windows, "cada prestador deve ter ao menos uma reserva aceita"
+        assert all(prev[1] <= cur[0] for prev, cur in zip(windows, windows[1:]))
+    assert bench.loop.run_until_complete(slots.count_documents({"booking_id": {"$nin": winners}})) == 0
+    benchmark.extra_info["accepted"] = len(winners)
+    bench.loop.run_until_complete(slots.drop())
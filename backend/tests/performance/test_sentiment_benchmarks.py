@@ -0,0 +1,54 @@
+"""
+Benchmark de vazão da análise de sentimento
+
+Analisa um corpus sintético de comentários (100k por padrão) no processo
+atual e no pool de processos. Não usa o banco; roda só quando os benchmarks
+são selecionados com `-m perf`.
+
+Execute com:
+    cd backend && pytest tests/performance/test_sentiment_benchmarks.py -m perf --no-cov
+    cd backend && BENCH_SENTIMENT_REVIEWS=1000000 SENTIMENT_PROCESSES=8 pytest \\
+        tests/performance/test_sentiment_benchmarks.py -m perf --no-cov
+"""
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai.sentiment_analysis import SentimentAnalyzer  # noqa: E402
+from tests.performance.data_generator import review_comments  # noqa: E402
+
+pytestmark = pytest.mark.perf
+
+REVIEWS = int(os.environ.get("BENCH_SENTIMENT_REVIEWS", "100000"))
+PROCESSES = int(os.environ.get("SENTIMENT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+@pytest.fixture(scope="module")
+def corpus(request):
+    # Sem mongod para pular o teste: só roda quando os benchmarks são pedidos
+    if "perf" not in (request.config.getoption("markexpr") or ""):
+        pytest.skip("benchmark de sentimento roda só com -m perf")
+    return review_comments(REVIEWS)
+
+
+@pytest.mark.parametrize("processes", [0, PROCESSES], ids=["inline", "pool"])
+def test_sentiment_throughput(benchmark, corpus, processes):
+    """Avaliações analisadas por segundo."""
+    analyzer = SentimentAnalyzer(processes=processes)
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark.group = "sentiment_throughput"
+        benchmark.extra_info.update({"reviews": len(corpus), "processes": processes})
+        results = benchmark.pedantic(
+            lambda: loop.run_until_complete(analyzer.analyze_batch(corpus)), rounds=3, warmup_rounds=1
+        )
+        benchmark.extra_info["reviews_per_second"] = round(len(corpus) / benchmark.stats.stats.mean)
+    finally:
+        analyzer.shutdown()
+        loop.close()
+
+    assert len(results) == len(corpus)
+    assert {r.sentiment for r in results} <= {"positive", "negative", "neutral"}
@@ -0,0 +1,501 @@
+# Testes unitários do cache - Alça Hub
+import asyncio
+import heapq
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache.manager import CacheManager
+from cache.redis_tier import RedisTier
+from cache.serialization import get_serializer
+from cache.provider_search import ProviderSearchCache
+from repositories.profile_snapshots import ProfileSnapshots
+from security.fraud_detection import FraudDetectionEngine
+from security.feature_store import UserFeatures
+
+
+class FakeSnapshotCollection:
+    """Collection em memória com o necessário para os snapshots."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def bulk_write(self, operations, ordered=False):
+        for op in operations:
+            doc_id = op._filter["_id"]
+            if type(op).__name__ == "DeleteOne":
+                self.docs.pop(doc_id, None)
+            else:
+                self.docs[doc_id] = {"_id": doc_id, **op._doc}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query["_id"])
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+
+class FakeSnapshotDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeSnapshotCollection()
+        return self[name]
+
+
+class TestFamilyStats:
+    """Testes para as estatísticas por família de chave."""
+
+    @pytest.mark.asyncio
+    async def test_hit_ratio_per_family(self):
+        """Acertos e erros devem ser contados separadamente por prefixo."""
+        manager = CacheManager()
+        await manager.set("users:1", {"id": 1})
+
+        await manager.get("users:1")
+        await manager.get("users:2")
+        await manager.get("services:1")
+
+        stats = manager.get_stats()
+        families = stats["families"]
+        assert families["users"] == {
+            "hits": 1, "misses": 1, "l2_hits": 0, "evictions": 0, "expirations": 0, "hit_ratio": 0.5,
+        }
+        assert families["services"] == {
+            "hits": 0, "misses": 1, "l2_hits": 0, "evictions": 0, "expirations": 0, "hit_ratio": 0.0,
+        }
+        assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
+
+
+class TestCacheEviction:
+    """Testes para LRU, expiração e admissão."""
+
+    @pytest.mark.asyncio
+    async def test_lru_evicts_least_recently_used(self):
+        manager = CacheManager(max_size=2)
+        await manager.set("a:1", 1)
+        await manager.set("a:2", 2)
+        await manager.get("a:1")
+        await manager.set("b:3", 3)
+
+        assert list(manager.cache) == ["a:1", "b:3"]
+        assert manager.get_family_stats()["a"]["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_entries_leave_before_lru(self):
+        manager = CacheManager(max_size=2)
+        await manager.set("a:1", 1, ttl=60)
+        await manager.set("a:2", 2, ttl=60)
+        # Regravar mantém só o vencimento novo
+        await manager.set("a:1", 1, ttl=600)
+        manager.cache["a:2"].expires_at = datetime.utcnow() - timedelta(seconds=1)
+        manager._expiry_heap = [(entry.expires_at, key) for key, entry in manager.cache.items()]
+        heapq.heapify(manager._expiry_heap)
+
+        await manager.set("a:3", 3)
+        assert list(manager.cache) == ["a:1", "a:3"]
+        assert manager.get_family_stats()["a"]["expirations"] == 1
+        assert manager.get_family_stats()["a"]["evictions"] == 0
+
+    @pytest.mark.asyncio
+    async def test_tinylfu_keeps_hot_keys_during_scan(self):
+        manager = CacheManager(max_size=10, admission=True)
+        for i in range(10):
+            await manager.set(f"hot:{i}", i)
+        for _ in range(3):
+            for i in range(10):
+                await manager.get(f"hot:{i}")
+        # Varredura de chaves usadas uma vez enquanto as populares seguem sendo lidas
+        for i in range(100):
+            await manager.get_or_set(f"scan:{i}", lambda: "x")
+            await manager.get(f"hot:{i % 10}")
+
+        assert sum(key.startswith("hot:") for key in manager.cache) == 10
+        assert manager.get_stats()["rejections"] == 100
+
+    @pytest.mark.asyncio
+    async def test_tinylfu_counts_a_miss_once(self):
+        """Erro de leitura seguido do set conta uma vez só na frequência."""
+        manager = CacheManager(max_size=2, admission=True)
+        for key in ("a", "b"):
+            await manager.set(key, 1)
+            await manager.get(key)
+        # Mesma frequência da vítima: não entra (contando duas vezes, entraria)
+        await manager.get_or_set("c", lambda: 1)
+
+        assert manager.sketch.frequency("c") == 1
+        assert "c" not in manager.cache
+
+
+class TestProviderSearchCache:
+    """Testes para o cache de busca de prestadores por tile."""
+
+    PROVIDERS = [
+        {"id": "perto", "latitude": -23.550, "longitude": -46.633},
+        {"id": "longe", "latitude": -23.650, "longitude": -46.633},
+    ]
+
+    def _loader(self, calls, providers=None):
+        async def load(lat, lon, radius_km):
+            calls.append((lat, lon, radius_km))
+            return list(providers or self.PROVIDERS)
+        return load
+
+    @pytest.mark.asyncio
+    async def test_jittered_requests_share_tile(self):
+        """Coordenadas no mesmo tile devem reaproveitar a entrada."""
+        search = ProviderSearchCache(CacheManager(), tile_deg=0.01)
+        calls = []
+
+        await search.get_candidates(-23.5512, -46.6331, 5, None, self._loader(calls))
+        await search.get_candidates(-23.5538, -46.6369, 5, None, self._loader(calls))
+        await search.get_candidates(-23.5538, -46.6369, 5, "limpeza", self._loader(calls))
+
+        assert len(calls) == 2
+        # Raio ampliado pela meia diagonal do tile
+        assert calls[0][2] == pytest.approx(5 + search.margin_km)
+        assert search.get_stats()["hit_ratio"] == pytest.approx(1 / 3, abs=1e-4)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_entries_containing_provider(self):
+        """Mudança em prestador da entrada deve invalidá-la, e só ela."""
+        search = ProviderSearchCache(CacheManager(), tile_deg=0.01)
+        calls = []
+        await search.get_candidates(-23.55, -46.63, 5, None, self._loader(calls))
+        await search.get_candidates(10.0, 10.0, 5, None, self._loader(calls, providers=[{"id": "outro"}]))
+
+        assert await search.invalidate_provider("perto") == 1
+        assert await search.invalidate_provider("perto") == 0
+
+        await search.get_candidates(10.0, 10.0, 5, None, self._loader(calls))
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidate_entries_covering_new_position(self):
+        """Prestador que entra no raio de uma entrada deve invalidá-la."""
+        search = ProviderSearchCache(CacheManager(), tile_deg=0.01)
+        await search.get_candidates(-23.55, -46.63, 5, None, self._loader([]))
+
+        assert await search.invalidate_provider("novo", -23.70, -46.63) == 0
+        assert await search.invalidate_provider("novo", -23.56, -46.63) == 1
+
+
+class TestProfileSnapshots:
+    """Testes para perfis com LRU e snapshot no MongoDB."""
+
+    def _snapshots(self, database=None, max_size=2):
+        snapshots = ProfileSnapshots("test", dict, dict, max_size=max_size)
+        snapshots.database = database
+        return snapshots
+
+    def test_lru_bound_keeps_insertion_order(self):
+        snapshots = self._snapshots()
+        snapshots["a"] = {"n": 1}
+        snapshots["b"] = {"n": 2}
+        snapshots["a"]
+        snapshots["c"] = {"n": 3}
+
+        assert list(snapshots) == ["a", "c"]
+        assert snapshots.evictions == 1
+
+    @pytest.mark.asyncio
+    async def test_evicted_dirty_profile_is_flushed_and_reloaded(self):
+        database = FakeSnapshotDatabase()
+        snapshots = self._snapshots(database)
+        snapshots["a"] = {"n": 1}
+        snapshots["b"] = {"n": 2}
+        snapshots["c"] = {"n": 3}
+        assert "a" not in snapshots
+
+        assert await snapshots.flush() == 3
+        snapshots = self._snapshots(database)
+        assert await snapshots.load("a") == {"n": 1}
+        assert await snapshots.load("missing") is None
+        assert snapshots.get_stats()["loads"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fraud_behavior_survives_restart(self):
+        database = FakeSnapshotDatabase()
+        engine = FraudDetectionEngine()
+        engine.user_behaviors.database = database
+        await engine.analyze_transaction("u1", {"amount": 80, "device_fingerprint": "d1",
+                                                "location": {"lat": -23.5, "lng": -46.6}})
+        await engine.user_behaviors.flush()
+        before = engine.user_behaviors["u1"]
+
+        restarted = FraudDetectionEngine()
+        restarted.user_behaviors.database = database
+        profile = await restarted.get_user_risk_profile("u1")
+        after = restarted.user_behaviors["u1"]
+
+        assert profile["transaction_count"] == 1
+        assert isinstance(after, UserFeatures)
+        assert after.devices == ["d1"]
+        assert after.recent_locations(5) == before.recent_locations(5)
+        assert after.transactions.mean == 80
+        assert after.transactions.times.tolist() == before.transactions.times.tolist()
+
+
+class FakeRedisServer:
+    """Redis em memória (o suficiente para o L2): valores com vencimento e pub/sub."""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.queue = asyncio.Queue()
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+        self.server.subscribers.setdefault(channel, []).append(self.queue)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def unsubscribe(self, channel):
+        self.server.subscribers[channel].remove(self.queue)
+
+    async def close(self):
+        pass
+
+
+class FakeRedis:
+    """Cliente de um worker conectado ao FakeRedisServer."""
+
+    def __init__(self, server):
+        self.server = server
+
+    async def get(self, key):
+        return self.server.values.get(key)
+
+    async def set(self, key, value, px=None):
+        self.server.values[key] = value
+
+    async def delete(self, *keys):
+        return sum(self.server.values.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match, count=None):
+        regex = re.compile("".join(
+            re.escape(part[1:]) if part.startswith("\\") else ".*" if part == "*" else re.escape(part)
+            for part in re.findall(r"\\.|\*|[^*\\]+", match)
+        ))
+        for key in list(self.server.values):
+            if regex.fullmatch(key):
+                yield key
+
+    async def publish(self, channel, message):
+        for queue in self.server.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message})
+
+    def pubsub(self):
+        return FakePubSub(self.server)
+
+    async def close(self):
+        pass
+
+
+class TestRedisTier:
+    """Testes para o L2 compartilhado e a invalidação entre workers."""
+
+    async def _workers(self, count=2, serializer="msgpack"):
+        server = FakeRedisServer()
+        workers = []
+        for _ in range(count):
+            manager = CacheManager()
+            await manager.attach_l2(RedisTier(FakeRedis(server), serializer=serializer))
+            workers.append(manager)
+        # Assinaturas feitas antes das publicações
+        await asyncio.sleep(0)
+        return server, workers
+
+    async def _until(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("condição não atingida")
+
+    @pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+    def test_serializers_round_trip(self, name):
+        serializer = get_serializer(name)
+        value = {"id": "p1", "scores": [1, 2.5], "nested": {"ok": True}}
+        assert serializer.loads(serializer.dumps(value)) == value
+
+    @pytest.mark.asyncio
+    async def test_second_worker_reads_from_l2(self):
+        _, (a, b) = await self._workers()
+        created = datetime(2025, 1, 1, 12, 30)
+        await a.set("users:1", {"id": 1, "created_at": created}, ttl=60)
+
+        assert await b.get("users:1") == {"id": 1, "created_at": created}
+        assert "users:1" in b.cache
+        assert b.get_family_stats()["users"]["l2_hits"] == 1
+        assert b.cache["users:1"].expires_at <= datetime.utcnow() + timedelta(seconds=60)
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    async def test_invalidations_reach_every_worker(self):
+        server, (a, b) = await self._workers()
+        for key in ("users:1", "users:2", "services:1"):
+            await a.set(key, key)
+            await b.get(key)
+
+        await a.delete("users:1")
+        await self._until(lambda: "users:1" not in b.cache)
+        assert await b.get("users:1") is None
+
+        await b.invalidate_pattern("services")
+        await self._until(lambda: "services:1" not in a.cache)
+
+        await a.clear()
+        await self._until(lambda: not b.cache)
+        assert server.values == {}
+        assert b.l2.get_stats()["invalidations_received"] == 2
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("name", ["json", "msgpack"])
+    async def test_review_stats_survive_l2(self, name):
+        """ReviewStats gravado por um worker deve voltar igual no outro."""
+        from reviews.models import ReviewStats
+        from reviews.stats import ReviewStatsCache
+
+        _, (a, b) = await self._workers(serializer=name)
+        created = datetime(2025, 1, 1, 12, 30)
+        review = {
+            "id": "r1", "reviewer_id": "u1", "reviewee_id": "p1", "service_id": None,
+            "booking_id": None, "rating": 5, "title": None, "comment": "ótimo",
+            "type": "service_provider", "status": "approved", "anonymous": False,
+            "tags": ["pontual"], "created_at": created, "updated_at": created, "approved_at": created,
+        }
+        stats = ReviewStats(
+            total_reviews=1, average_rating=5.0, rating_distribution={"5": 1},
+            recent_reviews=[review], top_tags=[{"tag": "pontual", "count": 1}],
+        )
+
+        await ReviewStatsCache(a).set("p1", stats)
+
+        assert await ReviewStatsCache(b).get("p1") == stats
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    async def test_provider_invalidation_reaches_every_worker(self):
+        """Mudança de prestador em um worker remove a entrada registrada em outro."""
+        server, (a, b) = await self._workers()
+        search_a, search_b = ProviderSearchCache(a), ProviderSearchCache(b)
+
+        async def load(lat, lon, radius_km):
+            return [{"id": "perto", "latitude": -23.55, "longitude": -46.63}]
+
+        await search_a.get_candidates(-23.55, -46.63, 5, None, load)
+        assert server.values
+
+        # b não conhece a entrada: acha a chave no L2 pela posição anterior
+        assert await search_b.invalidate_provider("perto", previous=(-23.55, -46.63)) == 1
+        assert not server.values
+        await self._until(lambda: not a.cache)
+        # Quem recebe a mudança só limpa o próprio L1
+        assert a.l2.get_stats()["invalidations_published"] == 0
+
+        # Entrada lida do L2 também entra nos índices do worker
+        await search_a.get_candidates(-23.55, -46.63, 5, None, load)
+        await search_b.get_candidates(-23.55, -46.63, 5, None, load)
+        assert search_b.get_stats()["tracked_providers"] == 1
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    async def test_remote_provider_change_resyncs_before_invalidating(self):
+        """Worker que recebe a mudança relê o prestador antes de descartar a entrada."""
+        _, (a, b) = await self._workers()
+        search_a, search_b = ProviderSearchCache(a), ProviderSearchCache(b)
+        seen = []
+
+        async def resync(provider_id):
+            seen.append((provider_id, bool(a.cache)))
+
+        search_a.on_remote_change(resync)
+
+        async def load(lat, lon, radius_km):
+            return [{"id": "perto", "latitude": -23.55, "longitude": -46.63}]
+
+        await search_a.get_candidates(-23.55, -46.63, 5, None, load)
+        await search_b.invalidate_provider("perto", -23.55, -46.63)
+        await self._until(lambda: not a.cache)
+
+        assert seen == [("perto", True)]
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    async def test_booking_change_reaches_every_worker_index(self, monkeypatch):
+        """Cancelamento em um worker deve liberar o horário no índice dos outros."""
+        from unittest.mock import AsyncMock, MagicMock
+        from scheduling import sync
+        from scheduling.interval_index import BookingIntervalIndex, window_for
+
+        _, (a, b) = await self._workers()
+        day = datetime(2030, 5, 10)
+        booking = {
+            "id": "b1", "prestador_id": "p1", "data_agendamento": day,
+            "horario_inicio": "09:00", "horario_fim": "10:00", "status": "confirmado",
+        }
+        remote = BookingIntervalIndex()
+        remote.upsert_booking(booking)
+        cancelled = {**booking, "status": "cancelado"}
+        database = MagicMock()
+        database.bookings.find_one = AsyncMock(return_value=cancelled)
+        database.__getitem__.return_value.delete_many = AsyncMock(return_value=MagicMock(deleted_count=4))
+        sync.follow_remote_booking_changes(database, manager=b, index=remote)
+        monkeypatch.setattr(sync, "cache_manager", a)
+        monkeypatch.setattr(sync, "booking_index", BookingIntervalIndex())
+
+        await sync.booking_changed(database, cancelled)
+        window = window_for(day, "09:00", "10:00")
+        await self._until(lambda: not remote.conflicts("p1", *window))
+        await a.detach_l2()
+        await b.detach_l2()
+
+    @pytest.mark.asyncio
+    async def test_free_slots_stay_local_and_follow_booking_changes(self, monkeypatch):
+        """Horários livres não vão para o L2 e saem do L1 de cada worker com a mudança."""
+        from unittest.mock import AsyncMock, MagicMock
+        from scheduling import sync
+        from scheduling.free_slots import FreeSlotCalendar
+        from scheduling.interval_index import BookingIntervalIndex
+
+        server, (a, b) = await self._workers()
+        day = datetime(2030, 5, 10)
+        booking = {
+            "id": "b1", "prestador_id": "p1", "data_agendamento": day,
+            "horario_inicio": "09:00", "horario_fim": "10:00", "status": "cancelado",
+        }
+        remote = BookingIntervalIndex()
+        calendar = FreeSlotCalendar(b, remote)
+        key = calendar.key_for("p1", day.date())
+        await b.set(key, [[0, 60]])
+        assert not server.values
+
+        database = MagicMock()
+        database.bookings.find_one = AsyncMock(return_value=booking)
+        database.__getitem__.return_value.delete_many = AsyncMock(return_value=MagicMock(deleted_count=0))
+        sync.follow_remote_booking_changes(database, manager=b, index=remote, calendar=calendar)
+        monkeypatch.setattr(sync, "cache_manager", a)
+        monkeypatch.setattr(sync, "booking_index", BookingIntervalIndex())
+        monkeypatch.setattr(sync, "free_slot_calendar", FreeSlotCalendar(a, BookingIntervalIndex()))
+
+        await sync.booking_changed(database, booking)
+        await self._until(lambda: key not in b.cache)
+        assert a.l2.get_stats()["invalidations_published"] == 1
+        await a.detach_l2()
+        await b.detach_l2()
@@ -0,0 +1,247 @@
+# Testes unitários da detecção de fraude - Alça Hub
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from repositories.profile_snapshots import ProfileSnapshots
+from security.feature_store import RingBuffer, TransactionWindow, UserFeatures
+from security.fraud_backtest import FraudBacktest, payment_event
+from security.fraud_detection import FraudDetectionEngine, RiskLevel
+from security.fraud_queue import FRAUD_ALERTS, FraudScoringQueue
+
+
+class TestFeatureStore:
+    """Testes para as janelas fixas de features por usuário."""
+
+    def test_ring_buffer_keeps_last_values(self):
+        ring = RingBuffer(3)
+        assert [ring.append(v) for v in (1, 2, 3, 4, 5)] == [None, None, None, 1, 2]
+        assert ring.tolist() == [3, 4, 5]
+        assert ring[-1] == 5
+        assert ring.last(2) == [4, 5]
+
+    def test_transaction_window_matches_full_recompute(self):
+        window = TransactionWindow(capacity=20, window=600)
+        history = []
+        for i in range(75):
+            at, amount = i * 45.0, (i * 37) % 200 + 0.5
+            window.add(at, amount)
+            history = (history + [(at, amount)])[-20:]
+            now = at + 30
+            amounts = [a for _, a in history]
+            mean = sum(amounts) / len(amounts)
+            assert window.count_since(now) == sum(1 for t, _ in history if now - t < 600)
+            assert window.mean == pytest.approx(mean)
+            assert window.variance == pytest.approx(sum((a - mean) ** 2 for a in amounts) / len(amounts))
+
+    def test_legacy_behavior_snapshot_is_converted(self):
+        features = UserFeatures.from_doc({
+            "user_id": "u1",
+            "login_patterns": {},
+            "transaction_patterns": {
+                "recent_transactions": [{"timestamp": datetime(2025, 1, 1), "amount": 50, "location": None}],
+                "average_amount": 50,
+            },
+            "device_fingerprints": ["d1", "d2"],
+            "location_history": [{"lat": -23.5, "lng": -46.6}],
+            "risk_score": 0.0,
+        })
+        assert features.transactions.times.tolist() == [datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()]
+        assert features.transactions.mean == 50
+        assert features.devices == ["d1", "d2"]
+        assert features.recent_locations(5) == ([-23.5], [-46.6])
+
+    def test_idle_profiles_are_evicted(self):
+        snapshots = ProfileSnapshots("test", dict, dict, max_size=10, idle_ttl=60)
+        snapshots["a"] = {}
+        snapshots["b"] = {}
+        # "a" sem acesso há dois minutos
+        snapshots._recency["a"] -= 120
+        assert snapshots.evict_idle() == 1
+        assert list(snapshots) == ["b"]
+
+
+class TestFraudDetectionEngine:
+    """Testes para as regras sobre as features."""
+
+    @pytest.mark.asyncio
+    async def test_rapid_transactions_and_amount_anomaly(self):
+        engine = FraudDetectionEngine()
+        for _ in range(5):
+            _, _, reasons = await engine.analyze_transaction("u1", {"amount": 100})
+        assert "Múltiplas transações em curto período" not in reasons
+
+        level, _, reasons = await engine.analyze_transaction("u1", {"amount": 1000})
+        assert "Múltiplas transações em curto período" in reasons
+        assert "Valor incomum para o usuário" in reasons
+        assert level == RiskLevel.CRITICAL
+
+        # Transação retida não entra no histórico: repetida, continua retida
+        profile = await engine.get_user_risk_profile("u1")
+        assert profile["transaction_count"] == 5
+        assert profile["average_amount"] == pytest.approx(100)
+        level, _, _ = await engine.analyze_transaction("u1", {"amount": 1000})
+        assert level == RiskLevel.CRITICAL
+
+    @pytest.mark.asyncio
+    async def test_amount_anomaly_alone_is_not_held(self):
+        """Primeiro valor alto sem outro sinal vira alerta, não retenção."""
+        noon = datetime(2025, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+        engine = FraudDetectionEngine(clock=lambda: noon)
+        await engine.analyze_transaction("u1", {"amount": 50})
+
+        level, score, reasons = await engine.analyze_transaction("u1", {"amount": 200})
+
+        assert reasons == ["Valor incomum para o usuário"]
+        assert score == pytest.approx(0.9)
+        assert level == RiskLevel.MEDIUM
+        assert len(engine.user_behaviors["u1"].transactions) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_transactions_of_a_user_see_each_other(self):
+        """Análises simultâneas do mesmo usuário não se intercalam na leitura do perfil."""
+        noon = datetime(2025, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+        engine = FraudDetectionEngine(clock=lambda: noon)
+        load = engine.user_behaviors.load
+
+        async def slow_load(user_id):
+            await asyncio.sleep(0)
+            return await load(user_id)
+
+        engine.user_behaviors.load = slow_load
+        results = await asyncio.gather(*(engine.analyze_transaction("u1", {"amount": 100}) for _ in range(6)))
+
+        assert all(not reasons for _, _, reasons in results[:5])
+        assert "Múltiplas transações em curto período" in results[-1][2]
+        # A sexta é retida e fica fora do histórico
+        assert len(engine.user_behaviors["u1"].transactions) == 5
+
+
+class FakeAlertCollection:
+    def __init__(self):
+        self.docs = []
+        self.updates = []
+
+    async def insert_many(self, docs, ordered=False):
+        self.docs.extend(docs)
+
+    async def update_many(self, query, update):
+        self.updates.append(query)
+
+
+class FakeFraudDatabase:
+    def __init__(self):
+        self.collections = {FRAUD_ALERTS: FakeAlertCollection()}
+        self.payments = FakeAlertCollection()
+        self.bookings = FakeAlertCollection()
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+
+class TestFraudScoringQueue:
+    """Testes para a fila de análise fora da requisição."""
+
+    @pytest.mark.asyncio
+    async def test_high_risk_escalated_within_budget(self):
+        database = FakeFraudDatabase()
+        queue = FraudScoringQueue(FraudDetectionEngine(), workers=2, sync_budget=1.0)
+        queue.start(database)
+        for _ in range(5):
+            assert await queue.screen("u1", {"amount": 100}, reference="b1") is None
+
+        flagged = await queue.screen("u1", {"amount": 1000}, reference="b2")
+        await queue.stop()
+
+        assert flagged.risk_level in (RiskLevel.HIGH, RiskLevel.CRITICAL)
+        assert queue.get_stats()["escalated"] == 1
+        alerts = database[FRAUD_ALERTS].docs
+        assert [alert["reference"] for alert in alerts] == ["b2"]
+        assert alerts[0]["action_required"] is True
+        assert database.bookings.updates == [{"id": {"$in": ["b2"]}}]
+        assert database.payments.updates == [{"booking_id": {"$in": ["b2"]}}]
+
+    @pytest.mark.asyncio
+    async def test_transactions_of_a_user_are_scored_in_order(self):
+        # Relógio que avança 5 minutos por leitura: sem rajada, nada é retido
+        ticks = iter(range(0, 10 ** 7, 300))
+        engine = FraudDetectionEngine(clock=lambda: float(next(ticks)))
+        queue = FraudScoringQueue(engine, workers=3, batch_size=4)
+        queue.start(None)
+        for i in range(10):
+            for user in ("a", "b", "c"):
+                assert queue.submit(user, {"amount": i + 1})
+        await queue.stop()
+
+        assert queue.scored == 30
+        for user in ("a", "b", "c"):
+            assert engine.user_behaviors[user].transactions.amounts.tolist() == [float(i + 1) for i in range(10)]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_drops_without_blocking(self):
+        queue = FraudScoringQueue(FraudDetectionEngine(), workers=1, max_queue=2, sync_budget=0.001)
+        queue.start(None)
+        accepted = [queue.submit("u1", {"amount": 10}) for _ in range(5)]
+        await queue.stop()
+
+        assert accepted == [True, True, False, False, False]
+        assert queue.get_stats()["dropped"] == 3
+
+
+    @pytest.mark.asyncio
+    async def test_payment_hold_is_persisted(self, monkeypatch):
+        """Pagamento retido marca o agendamento; novas tentativas são recusadas sem nova análise."""
+        from unittest.mock import AsyncMock, MagicMock
+        from fastapi import HTTPException
+        import server
+        from security.fraud_queue import FraudScore
+
+        screen = AsyncMock(return_value=FraudScore("u1", "b1", RiskLevel.HIGH, 1.7, []))
+        database = MagicMock()
+        database.bookings.update_one = AsyncMock()
+        monkeypatch.setattr(server.fraud_queue, "screen", screen)
+        monkeypatch.setattr(server, "db", database)
+        booking = {"id": "b1", "preco_total": 200.0}
+
+        with pytest.raises(HTTPException) as error:
+            await server.screen_payment("u1", booking, "pix")
+        assert error.value.status_code == 403
+        assert database.bookings.update_one.await_args.args[1]["$set"]["fraud_review"] is True
+
+        with pytest.raises(HTTPException):
+            await server.screen_payment("u1", {**booking, "fraud_review": True}, "pix")
+        await server.screen_payment("u1", {**booking, "fraud_approved_at": datetime(2025, 1, 1)}, "pix")
+        assert screen.await_count == 1
+
+
+class TestFraudBacktest:
+    """Testes para o replay de pagamentos com relógio simulado."""
+
+    def test_payment_event_labels_refunds(self):
+        payment = {"user_id": "u1", "amount": 10, "created_at": datetime(2025, 1, 1, 12), "status": "refunded"}
+        event = payment_event(payment)
+        assert event[0] == "u1"
+        assert event[1] == datetime(2025, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+        assert event[-1] is True
+        assert payment_event({"user_id": "u1", "amount": 10}) is None
+
+    @pytest.mark.asyncio
+    async def test_replay_uses_event_time(self):
+        start = datetime(2025, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+        # Uma transação por hora e depois uma rajada de 6 em 6 minutos (a última contestada)
+        events = [("u1", start + i * 3600, 100.0, None, None, None, False) for i in range(5)]
+        events += [("u1", start + 5 * 3600 + i * 60, 100.0, None, None, None, i == 5) for i in range(6)]
+
+        async def chunks():
+            yield events[:4]
+            yield events[4:]
+
+        report = await FraudBacktest(workers=0).run_chunks(chunks())
+
+        assert report["events"] == 11
+        assert report["by_level"]["high"] == 1
+        assert report["confusion_matrix"] == {
+            "true_positives": 1, "false_positives": 0, "false_negatives": 0, "true_negatives": 10,
+        }
+        assert report["period"][0] == "2025-01-01T12:00:00"
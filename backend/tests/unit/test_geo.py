@@ -0,0 +1,156 @@
+# Testes unitários de geolocalização - Alça Hub
+import random
+
+import numpy as np
+import pytest
+
+from geo.distance import CoordinateArray, haversine_km, haversine_many, top_k_nearest
+from geo.geojson import geo_near_stage, geo_point, page_facet_stage, unpack_page_facet
+from geo.spatial_index import ProviderSpatialIndex
+
+
+def _brute_force(points, lat, lon, radius_km, only_available=False):
+    """Resultado de referência via varredura completa."""
+    return {
+        pid
+        for pid, (plat, plon, disponivel) in points.items()
+        if (disponivel or not only_available)
+        and haversine_km(lat, lon, plat, plon) <= radius_km
+    }
+
+
+@pytest.fixture
+def populated_index():
+    """Índice com prestadores espalhados pela Grande São Paulo."""
+    rng = random.Random(42)
+    index = ProviderSpatialIndex(cell_size_deg=0.02)
+    points = {}
+    for i in range(2000):
+        pid = f"prov-{i}"
+        lat = -23.55 + rng.uniform(-0.5, 0.5)
+        lon = -46.63 + rng.uniform(-0.5, 0.5)
+        disponivel = rng.random() > 0.3
+        index.upsert(pid, lat, lon, disponivel)
+        points[pid] = (lat, lon, disponivel)
+    return index, points
+
+
+class TestDistanceKernel:
+    """Testes para o cálculo vetorizado de distâncias."""
+
+    def test_vectorized_matches_scalar(self):
+        """Haversine vetorizado deve coincidir com a versão escalar."""
+        rng = np.random.default_rng(1)
+        lats = rng.uniform(-60, 60, 500)
+        lons = rng.uniform(-180, 180, 500)
+
+        expected = [haversine_km(-23.55, -46.63, a, b) for a, b in zip(lats, lons)]
+        np.testing.assert_allclose(haversine_many(-23.55, -46.63, lats, lons), expected, rtol=1e-9)
+
+    def test_top_k_nearest(self):
+        """Top-k deve retornar os menores valores em ordem crescente."""
+        distances = np.array([5.0, 1.0, 9.0, 3.0, 7.0])
+
+        assert top_k_nearest(distances, 3).tolist() == [1, 3, 0]
+        assert top_k_nearest(distances, 10).tolist() == [1, 3, 0, 4, 2]
+        assert top_k_nearest(distances, 0).size == 0
+
+    def test_coordinate_array_grows_and_filters(self):
+        """Array de coordenadas deve crescer e filtrar por raio."""
+        coords = CoordinateArray(capacity=1)
+        for i in range(10):
+            coords.append(0.0, i * 0.01)
+
+        positions, distances = coords.within_radius(0.0, 0.0, 3.0)
+        assert len(coords) == 10
+        assert positions.tolist() == [0, 1, 2]
+        assert np.all(distances <= 3.0)
+
+        nearest, _ = coords.nearest(0.0, 0.095, k=2)
+        assert nearest.tolist() == [9, 8]
+
+
+class TestGeoJSON:
+    """Testes para os helpers de consulta GeoJSON."""
+
+    def test_geo_point_uses_lon_lat_order(self):
+        """Ponto GeoJSON deve usar a ordem [longitude, latitude]."""
+        assert geo_point(-23.55, -46.63) == {"type": "Point", "coordinates": [-46.63, -23.55]}
+
+    @pytest.mark.parametrize("lat,lon", [(None, -46.6), (-23.5, None), (91, 0), (0, 181), ("x", 0)])
+    def test_geo_point_rejects_invalid(self, lat, lon):
+        """Coordenadas ausentes ou inválidas não geram ponto."""
+        assert geo_point(lat, lon) is None
+
+    def test_geo_near_stage_in_km(self):
+        """$geoNear deve limitar em metros e devolver distância em km."""
+        stage = geo_near_stage(-23.55, -46.63, 5, {"ativo": True})["$geoNear"]
+
+        assert stage["near"]["coordinates"] == [-46.63, -23.55]
+        assert stage["maxDistance"] == 5000.0
+        assert stage["distanceMultiplier"] == 0.001
+        assert stage["query"] == {"ativo": True}
+
+    def test_page_facet_roundtrip(self):
+        """Resultado do $facet deve virar (itens, total)."""
+        facet = page_facet_stage(20, 10)["$facet"]
+        assert facet["items"] == [{"$skip": 20}, {"$limit": 10}]
+
+        assert unpack_page_facet([{"items": [{"id": "a"}], "total": [{"count": 31}]}]) == ([{"id": "a"}], 31)
+        assert unpack_page_facet([{"items": [], "total": []}]) == ([], 0)
+        assert unpack_page_facet([]) == ([], 0)
+
+
+class TestProviderSpatialIndex:
+    """Testes para o índice em grade."""
+
+    @pytest.mark.parametrize("radius_km", [0.5, 5, 20, 100])
+    def test_query_matches_brute_force(self, populated_index, radius_km):
+        """Busca por raio deve retornar exatamente os mesmos prestadores."""
+        index, points = populated_index
+        found = index.query_radius(-23.55, -46.63, radius_km)
+
+        assert {pid for pid, _ in found} == _brute_force(points, -23.55, -46.63, radius_km)
+        assert all(distance <= radius_km for _, distance in found)
+
+    def test_only_available_filter(self, populated_index):
+        """Filtro de disponibilidade deve ignorar prestadores indisponíveis."""
+        index, points = populated_index
+        found = index.query_radius(-23.55, -46.63, 15, only_available=True)
+
+        assert {pid for pid, _ in found} == _brute_force(
+            points, -23.55, -46.63, 15, only_available=True
+        )
+
+    def test_move_and_remove(self, populated_index):
+        """Mover e remover prestadores deve refletir nas buscas."""
+        index, points = populated_index
+        index.upsert("prov-0", -22.9068, -43.1729)  # Rio de Janeiro
+        index.remove("prov-1")
+
+        near_rio = {pid for pid, _ in index.query_radius(-22.9068, -43.1729, 1)}
+        near_sp = {pid for pid, _ in index.query_radius(-23.55, -46.63, 200)}
+
+        assert near_rio == {"prov-0"}
+        assert "prov-0" not in near_sp
+        assert "prov-1" not in near_sp
+        assert len(index) == len(points) - 1
+
+    def test_slots_are_reused(self):
+        """Slots liberados devem ser reaproveitados."""
+        index = ProviderSpatialIndex()
+        index.upsert("a", 0.0, 0.0)
+        index.remove("a")
+        index.upsert("b", 1.0, 1.0)
+
+        assert index.get_stats()["free_slots"] == 0
+        assert [pid for pid, _ in index.query_radius(1.0, 1.0, 1)] == ["b"]
+
+    def test_antimeridian(self):
+        """Buscas próximas à longitude 180 devem atravessar a borda."""
+        index = ProviderSpatialIndex()
+        index.upsert("east", 0.0, 179.99)
+        index.upsert("west", 0.0, -179.99)
+
+        found = {pid for pid, _ in index.query_radius(0.0, 180.0, 5)}
+        assert found == {"east", "west"}
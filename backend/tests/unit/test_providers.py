@@ -0,0 +1,178 @@
+# Testes unitários da busca de prestadores - Alça Hub
+import pytest
+from unittest.mock import MagicMock
+
+
+SERVICES = [
+    {"id": "s1", "prestador_id": "p1", "categoria": "Limpeza", "preco_por_hora": 50,
+     "media_avaliacoes": 4.0, "total_avaliacoes": 3, "status": "disponivel"},
+    {"id": "s2", "prestador_id": "p1", "categoria": "pintura", "preco_por_hora": 80,
+     "media_avaliacoes": 5.0, "total_avaliacoes": 1, "status": "disponivel"},
+    {"id": "s3", "prestador_id": "p1", "categoria": "limpeza", "preco_por_hora": 20,
+     "status": "indisponivel"},
+]
+
+PROVIDER = {"id": "p1", "nome": "Ana", "latitude": -23.55, "longitude": -46.63}
+
+
+class TestProviderCards:
+    """Testes para o read model dos cards de prestador."""
+
+    def test_card_keeps_only_available_services(self):
+        """Card deve trazer só serviços disponíveis, categorias e menor preço."""
+        from services.provider_cards import build_provider_card
+
+        card = build_provider_card(PROVIDER, SERVICES)
+
+        assert [s["id"] for s in card["services"]] == ["s1", "s2"]
+        assert card["categorias"] == ["limpeza", "pintura"]
+        assert card["min_preco_por_hora"] == 50.0
+        assert card["location"] == {"type": "Point", "coordinates": [-46.63, -23.55]}
+
+    def test_rating_falls_back_to_services(self):
+        """Sem nota no prestador, a nota é a média ponderada dos serviços."""
+        from services.provider_cards import build_provider_card
+
+        card = build_provider_card(PROVIDER, SERVICES)
+        rated = build_provider_card({**PROVIDER, "rating": 3.5, "total_avaliacoes": 9}, SERVICES)
+
+        assert (card["rating"], card["total_avaliacoes"]) == (4.25, 4)
+        assert (rated["rating"], rated["total_avaliacoes"]) == (3.5, 9)
+
+    def test_category_filter_is_case_insensitive(self):
+        """Filtro de categoria deve valer para a lista e para o resumo."""
+        from services.provider_cards import build_provider_card, card_services, card_summary
+
+        card = build_provider_card(PROVIDER, SERVICES)
+
+        assert [s["id"] for s in card_services(card, "LIMPEZA")] == ["s1"]
+        assert card_summary(card) == {"total": 2, "min_preco_por_hora": 50.0}
+        assert card_summary(card, "pintura") == {"total": 1, "min_preco_por_hora": 80.0}
+        assert card_summary(card, "jardinagem") == {"total": 0, "min_preco_por_hora": None}
+
+
+class TestProviderPagination:
+    """Testes para a paginação por cursor de /api/providers."""
+
+    @pytest.fixture
+    def providers_db(self, mock_database, monkeypatch):
+        """Banco falso com prestadores espalhados ao norte do ponto de busca."""
+        import server
+
+        monkeypatch.setenv("TEST_MODE", "1")  # Rota pública em modo de teste
+        database = mock_database
+        database.users.find = MagicMock(return_value=[
+            {"id": f"p{i:02d}", "nome": f"Prestador {i}", "latitude": -23.55 + i * 0.005,
+             "longitude": -46.63, "rating": i % 4}
+            for i in range(12)
+        ])
+        database.services.find = MagicMock(return_value=[])
+        server.mock_database = database
+        yield database
+        server.mock_database = None
+
+    def _walk(self, client, **params):
+        """Percorrer todas as páginas seguindo next_cursor."""
+        query = {"lat": -23.55, "lon": -46.63, "radius_km": 20, "per_page": 5, **params}
+        seen, pages = [], 0
+        while True:
+            body = client.get("/api/providers", params=query).json()
+            seen.extend(p["provider_id"] for p in body["providers"])
+            pages += 1
+            if not body["pagination"]["next_cursor"]:
+                return seen, pages, body
+            query["cursor"] = body["pagination"]["next_cursor"]
+
+    def test_cursor_walks_all_results_in_order(self, client, providers_db):
+        """Seguir o cursor deve entregar todos os prestadores, na ordem e sem repetição."""
+        seen, pages, _ = self._walk(client)
+
+        assert seen == [f"p{i:02d}" for i in range(12)]
+        assert pages == 3
+
+    def test_cursor_with_rating_desc_and_ties(self, client, providers_db):
+        """Empates de avaliação devem ser desempatados pelo id sem perder itens."""
+        seen, _, _ = self._walk(client, sort_by="rating", sort_order="desc")
+
+        assert sorted(seen) == [f"p{i:02d}" for i in range(12)]
+        assert seen[:3] == ["p11", "p07", "p03"]
+
+    def test_total_is_optional(self, client, providers_db):
+        """Sem include_total a resposta não informa total, mas mantém has_next."""
+        body = client.get(
+            "/api/providers",
+            params={"lat": -23.55, "lon": -46.63, "radius_km": 20, "per_page": 5, "include_total": False},
+        ).json()
+
+        assert body["pagination"]["total"] is None
+        assert body["pagination"]["has_next"] is True
+
+    def test_invalid_cursor(self, client, providers_db):
+        """Cursor adulterado ou de outra ordenação deve retornar 400."""
+        first = client.get("/api/providers", params={"lat": -23.55, "lon": -46.63, "per_page": 5}).json()
+        cursor = first["pagination"]["next_cursor"]
+
+        response = client.get(
+            "/api/providers",
+            params={"lat": -23.55, "lon": -46.63, "sort_by": "name", "cursor": cursor},
+        )
+        assert response.status_code == 400
+        assert client.get("/api/providers", params={"lat": -23.55, "lon": -46.63, "cursor": "%%%"}).status_code == 400
+
+    def test_forged_cursor_with_wrong_types(self, client, providers_db):
+        """Cursor no escopo certo mas com tipos trocados deve retornar 400, não 500."""
+        from utils.pagination import encode_cursor
+
+        for key in (["perto", "p1"], [1.5, 7], [1.5], [True, "p1"]):
+            cursor = encode_cursor(("providers", "distance", "asc"), key)
+            response = client.get("/api/providers", params={"lat": -23.55, "lon": -46.63, "cursor": cursor})
+            assert response.status_code == 400
+
+
+class TestProviderSearchService:
+    """Testes para o motor único de busca de prestadores."""
+
+    @pytest.fixture
+    def database(self):
+        """Banco falso com dois prestadores próximos; só p1 oferece serviço."""
+        database = MagicMock()
+        database.users.find = MagicMock(return_value=[
+            {**PROVIDER, "disponivel": False},
+            {"id": "p2", "nome": "Bia", "latitude": -23.551, "longitude": -46.63},
+        ])
+        database.services.find = MagicMock(return_value=SERVICES)
+        return database
+
+    @pytest.mark.asyncio
+    async def test_filters_shared_by_all_routes(self, database):
+        """Disponibilidade e existência de serviços devem filtrar os cards."""
+        from services.provider_search import ProviderSearchQuery, provider_search_service
+
+        async def ids(**filters):
+            query = ProviderSearchQuery(-23.55, -46.63, 5, **filters)
+            result = await provider_search_service.search(database, query, scan=True)
+            return [card["id"] for _, card, _ in result.rows]
+
+        assert await ids() == ["p1", "p2"]
+        assert await ids(require_services=True) == ["p1"]
+        assert await ids(only_available=True) == ["p2"]
+        assert await ids(categoria="PINTURA") == ["p1"]
+
+    @pytest.mark.asyncio
+    async def test_response_projection(self, database):
+        """A projeção deve manter só os campos pedidos, com ETA único."""
+        from services.provider_search import ProviderSearchQuery, provider_search_service
+
+        result = await provider_search_service.search(
+            database, ProviderSearchQuery(-23.55, -46.63, 5, categoria="limpeza"), scan=True
+        )
+        _, card, distance = result.rows[0]
+        item = provider_search_service.to_response(
+            card, distance, "limpeza", fields=("provider_id", "estimated_time_min", "services")
+        )
+
+        assert item == {
+            "provider_id": "p1",
+            "estimated_time_min": 5,
+            "services": card["services"][:1],
+        }
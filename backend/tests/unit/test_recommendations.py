@@ -0,0 +1,226 @@
+# Testes unitários do motor de recomendações - Alça Hub
+import random
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+import pytest_asyncio
+
+from ai.recommendation_engine import InteractionMatrix, RecommendationEngine, top_k
+from ai.recommendation_eval import ranking_metrics, time_split
+from ai.recommendation_index import PreferenceLSH, service_neighbors
+from ai.recommendation_store import MODEL_VERSION, RecommendationStore
+
+CATEGORIES = ["limpeza", "pintura", "eletrica", "jardinagem", "encanamento"]
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """Motor com perfis e interações aleatórios (determinísticos)."""
+    rng = random.Random(7)
+    engine = RecommendationEngine()
+    for u in range(60):
+        interactions = [
+            {"category": rng.choice(CATEGORIES[:rng.randint(1, 5)]), "type": "booking"}
+            for _ in range(rng.randint(1, 6))
+        ]
+        profile = await engine.build_user_profile(f"user-{u}", interactions)
+        if u % 3:
+            profile.location = {"lat": -23.55 + rng.uniform(-0.05, 0.05), "lng": -46.63 + rng.uniform(-0.05, 0.05)}
+    for s in range(80):
+        profile = await engine.build_service_profile(f"svc-{s}", {
+            "category": rng.choice(CATEGORIES),
+            "rating": rng.uniform(0, 1),
+            "price_range": rng.choice(["low", "medium", "high"]),
+            "popularity": rng.uniform(0, 1),
+        })
+        if s % 4:
+            profile.location = {"lat": -23.55 + rng.uniform(-0.05, 0.05), "lng": -46.63 + rng.uniform(-0.05, 0.05)}
+    for _ in range(400):
+        await engine.update_interaction(f"user-{rng.randrange(60)}", f"svc-{rng.randrange(85)}", rng.uniform(0, 1))
+    return engine
+
+
+class TestInteractionMatrix:
+    """Testes para a matriz esparsa de interações."""
+
+    def test_last_write_wins(self):
+        matrix = InteractionMatrix()
+        matrix[("u1", "s1")] = 0.2
+        matrix[("u2", "s2")] = 0.9
+        assert matrix[("u1", "s1")] == 0.2
+        matrix[("u1", "s1")] = 0.7
+        matrix[("u1", "s3")] = 0.4
+
+        assert len(matrix) == 3
+        assert matrix[("u1", "s1")] == 0.7
+        assert ("u2", "s1") not in matrix
+        with pytest.raises(KeyError):
+            matrix[("u3", "s1")]
+
+    def test_weighted_columns(self):
+        matrix = InteractionMatrix()
+        matrix[("u1", "s1")] = 1.0
+        matrix[("u2", "s1")] = 0.5
+        matrix[("u2", "s2")] = 0.8
+        rows = np.array([matrix.users["u1"], matrix.users["u2"]])
+
+        numerator, totals = matrix.weighted_columns(rows, np.array([0.5, 0.25]))
+        assert numerator.tolist() == pytest.approx([0.5 + 0.125, 0.2])
+        assert totals.tolist() == pytest.approx([0.75, 0.25])
+
+
+class TestRecommendationEngine:
+    """Testes para a pontuação vetorizada."""
+
+    def test_top_k_breaks_ties_by_index(self):
+        values = np.array([0.5, 0.9, 0.5, 0.1, 0.5])
+        assert top_k(values, np.arange(5), 3).tolist() == [1, 0, 2]
+
+    @pytest.mark.asyncio
+    async def test_matches_per_service_scores(self, engine):
+        """O score vetorizado é igual ao calculado serviço a serviço."""
+        for user_id in ("user-1", "user-3", "user-10"):
+            recommendations = await engine.generate_recommendations(user_id, limit=5, exclude_services=["svc-0"])
+            location = engine.calculate_location_scores(user_id, list(engine.service_profiles))
+            expected = {
+                service_id: (
+                    engine.calculate_collaborative_score(user_id, service_id) * 0.4
+                    + engine.calculate_content_based_score(user_id, service_id) * 0.3
+                    + location[service_id] * 0.2
+                    + engine.calculate_popularity_score(service_id) * 0.1
+                )
+                for service_id in engine.service_profiles
+                if service_id != "svc-0"
+            }
+            best = sorted(expected.items(), key=lambda item: item[1], reverse=True)[:5]
+
+            assert [r.service_id for r in recommendations] == [service_id for service_id, _ in best]
+            assert [r.score for r in recommendations] == pytest.approx([score for _, score in best])
+
+
+    @pytest.mark.asyncio
+    async def test_incremental_compile_matches_full_rebuild(self, engine):
+        """Inclusões, substituições e remoções por linha dão o mesmo resultado da reconstrução."""
+        engine.rank("user-1", 10)  # Compila antes das mudanças
+        rows = engine._user_rows
+        rng = random.Random(11)
+        for u in range(60, 75):
+            await engine.build_user_profile(f"user-{u}", [{"category": rng.choice(CATEGORIES + ["novidade"])}])
+        await engine.build_user_profile("user-3", [{"category": "pintura"}])
+        del engine.user_profiles["user-5"]
+        await engine.build_service_profile("svc-90", {"category": "novidade", "rating": 1.0, "popularity": 1.0})
+        del engine.service_profiles["svc-2"]
+
+        incremental = {
+            user_id: dict(engine._find_similar_users(user_id, limit=100))
+            for user_id in ("user-1", "user-3", "user-70")
+        }
+        ranked = [(r.service_id, r.score) for r in engine.rank("user-3", 10, similar=[("user-1", 1.0)])]
+        assert engine._user_rows is rows and rows.dead == 1
+        assert "svc-2" not in [service_id for service_id, _ in ranked]
+
+        engine._user_rows = engine._service_rows = None
+        engine._user_arrays = engine._service_arrays = None
+        for user_id, similar in incremental.items():
+            assert dict(engine._find_similar_users(user_id, limit=100)) == pytest.approx(similar)
+        rebuilt = [(r.service_id, r.score) for r in engine.rank("user-3", 10, similar=[("user-1", 1.0)])]
+        assert [service_id for service_id, _ in ranked] == [service_id for service_id, _ in rebuilt]
+        assert [score for _, score in ranked] == pytest.approx([score for _, score in rebuilt])
+
+
+class TestRecommendationIndex:
+    """Testes para vizinhos offline e listas materializadas."""
+
+    def test_service_neighbors_cosine(self):
+        rng = random.Random(3)
+        matrix = InteractionMatrix()
+        for _ in range(300):
+            matrix[(f"u{rng.randrange(40)}", f"s{rng.randrange(15)}")] = rng.uniform(0.1, 1)
+        neighbors = service_neighbors(matrix, k=3)
+
+        rows, cols, data = matrix.to_coo()
+        dense = np.zeros((len(matrix.users), len(matrix.services)))
+        dense[rows, cols] = data
+        norms = np.linalg.norm(dense, axis=0)
+        ids = list(matrix.services)
+        for service_id, found in neighbors.items():
+            i = ids.index(service_id)
+            cosine = dense.T @ dense[:, i] / (norms * norms[i])
+            cosine[i] = -1
+            assert [score for _, score in found] == pytest.approx(sorted(cosine, reverse=True)[:3])
+
+    def test_lsh_candidates_include_identical_vectors(self):
+        rng = np.random.default_rng(1)
+        vectors = rng.random((200, 8))
+        vectors[57] = vectors[3]
+        lsh = PreferenceLSH(n_tables=2, n_bits=6).fit(vectors)
+        candidates = lsh.candidates(3)
+        assert {3, 57} <= set(candidates.tolist())
+        assert candidates.size < len(vectors)
+
+    @pytest.mark.asyncio
+    async def test_materialized_list_until_new_interaction(self, engine):
+        store = RecommendationStore(list_size=3)
+        engine.store = store
+        doc = {
+            "_id": "user-1",
+            "items": [
+                {"service_id": f"svc-{i}", "score": 0.9 - i / 10, "reason": "x", "confidence": 1.0}
+                for i in range(3)
+            ],
+            "version": MODEL_VERSION,
+            "generated_at": datetime.utcnow() + timedelta(seconds=1),
+        }
+        store.get = AsyncMock(return_value=doc)
+        store.save = AsyncMock()
+        database = MagicMock()
+
+        cached = await engine.generate_recommendations("user-1", limit=2, database=database)
+        assert [r.service_id for r in cached] == ["svc-0", "svc-1"]
+        store.save.assert_not_called()
+
+        doc["generated_at"] = datetime.utcnow() - timedelta(seconds=1)
+        await engine.update_interaction("user-1", "svc-5", 1.0)
+        fresh = await engine.generate_recommendations("user-1", limit=2, database=database)
+        assert [r.service_id for r in fresh] == [r.service_id for r in engine.rank("user-1", 2)]
+        store.save.assert_awaited_once()
+
+
+    @pytest.mark.asyncio
+    async def test_touched_is_pruned(self):
+        """Interações mais velhas que max_age ou acima do limite são esquecidas."""
+        engine = RecommendationEngine(RecommendationStore(max_age=timedelta(hours=1)))
+        engine.max_touched = 2
+        now = datetime.utcnow()
+
+        await engine.update_interaction("old", "svc-1", 1.0, at=now - timedelta(hours=2))
+        await engine.update_interaction("a", "svc-1", 1.0, at=now)
+        assert list(engine._touched) == ["a"]
+
+        for user_id in ("b", "c"):
+            await engine.update_interaction(user_id, "svc-1", 1.0, at=now)
+        assert list(engine._touched) == ["b", "c"]
+
+
+class TestRecommendationEval:
+    """Testes para o corte temporal e as métricas da avaliação offline."""
+
+    def test_time_split_keeps_test_after_cutoff(self):
+        start = datetime(2025, 1, 1)
+        events = [{"id": i, "created_at": start + timedelta(days=i)} for i in range(10)]
+        events.append({"id": "sem-data"})
+        train, test, cutoff = time_split(list(reversed(events)), test_fraction=0.3)
+        assert cutoff == start + timedelta(days=7)
+        assert [e["id"] for e in train] == list(range(7))
+        assert [e["id"] for e in test] == [7, 8, 9]
+
+    def test_ranking_metrics(self):
+        recommended = {"a": ["s1", "s2", "s3"], "b": ["s4", "s5", "s6"]}
+        relevant = {"a": {"s2", "s9"}, "b": {"s7"}}
+        metrics = ranking_metrics(recommended, relevant, k=2, catalog_size=10)
+        assert metrics["precision@2"] == pytest.approx(0.25)
+        assert metrics["recall@2"] == pytest.approx(0.25)
+        assert metrics["hit_rate@2"] == pytest.approx(0.5)
+        assert metrics["coverage"] == pytest.approx(0.4)
@@ -0,0 +1,148 @@
+# Testes unitários dos agregados de avaliações - Alça Hub
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from reviews.aggregates import RatingAggregates
+
+
+class TestRatingAggregates:
+    """Testes para soma, contagem e histograma incrementais de notas."""
+
+    def test_edit_moves_rating_between_buckets(self):
+        """Editar a nota aplica só a diferença, sem mudar a contagem."""
+        before = {"service_id": "s1", "reviewee_id": "p1", "rating": 4, "status": "approved"}
+
+        deltas = RatingAggregates.deltas(before, {**before, "rating": 2})
+
+        assert set(deltas) == {("services", "s1"), ("users", "p1")}
+        delta = deltas[("services", "s1")]
+        assert (delta.sum, delta.count, delta.hist) == (-2.0, 0, {"4": -1, "2": 1})
+
+    def test_hidden_review_leaves_aggregates(self):
+        """Avaliação ocultada deixa de contar; sem mudança de nota não há update."""
+        review = {"service_id": "s1", "prestador_id": "p1", "rating": 5}
+
+        removed = RatingAggregates.deltas(review, {**review, "status": "hidden"})
+
+        assert removed[("users", "p1")].count == -1
+        assert RatingAggregates.deltas(review, {**review, "comentario": "ok"}) == {}
+
+    def test_only_listed_reviews_are_counted(self):
+        """Avaliação pendente não entra na média até ser aprovada; sem status (server.py) entra."""
+        pending = {"service_id": "s1", "reviewee_id": "p1", "rating": 1, "status": "pending"}
+
+        assert RatingAggregates.deltas(None, pending) == {}
+        approved = RatingAggregates.deltas(pending, {**pending, "status": "approved"})
+        assert approved[("users", "p1")].count == 1
+        assert RatingAggregates.deltas(None, {"prestador_id": "p1", "rating": 4})[("users", "p1")].count == 1
+
+        match = RatingAggregates.rebuild_pipeline()[0]["$match"]
+        assert match["status"] == {"$in": ["approved", None]}
+
+    @pytest.mark.asyncio
+    async def test_create_updates_service_and_provider(self):
+        """Nova avaliação vira um update atômico por documento avaliado."""
+        database = MagicMock()
+        collection = database.__getitem__.return_value
+        collection.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+
+        updated = await RatingAggregates().apply(
+            database, after={"service_id": "s1", "prestador_id": "p1", "rating": 3}
+        )
+
+        assert updated == 2
+        assert [c.args[0] for c in database.__getitem__.call_args_list] == ["services", "users"]
+        stages = collection.update_one.call_args_list[0].args[1]
+        assert set(stages[0]["$set"]) == {"rating_sum", "rating_count", "rating_hist.3"}
+        assert {"media_avaliacoes", "avaliacao_media", "total_avaliacoes"} <= set(stages[1]["$set"])
+
+    def test_first_update_keeps_legacy_average(self):
+        """Documento sem contadores parte da média e do total já gravados."""
+        from reviews.aggregates import MEAN_FIELDS, RatingDelta, rating_update
+
+        def evaluate(expr, doc):
+            # Subconjunto dos operadores de agregação usados no update
+            if isinstance(expr, str) and expr.startswith("$"):
+                return doc.get(expr[1:])
+            if not isinstance(expr, dict):
+                return expr
+            (op, args), = expr.items()
+            values = [evaluate(arg, doc) for arg in args]
+            if op == "$ifNull":
+                return next((value for value in values if value is not None), None)
+            if op == "$add":
+                return sum(values)
+            if op == "$multiply":
+                return values[0] * values[1]
+            raise AssertionError(op)
+
+        delta = RatingDelta()
+        delta.add(5)
+        stage = rating_update(delta, MEAN_FIELDS["services"])[0]["$set"]
+        legacy = {"media_avaliacoes": 4.0, "total_avaliacoes": 3}
+
+        assert evaluate(stage["rating_sum"], legacy) == 17.0
+        assert evaluate(stage["rating_count"], legacy) == 4
+        assert evaluate(stage["rating_count"], {**legacy, "rating_count": 0}) == 1
+        assert evaluate(stage["rating_sum"], {}) == 5.0
+
+    def test_provider_card_uses_aggregates(self):
+        """Card do prestador deve usar a média agregada das avaliações."""
+        from services.provider_cards import build_provider_card
+
+        card = build_provider_card(
+            {"id": "p1", "avaliacao_media": 4.5, "rating_count": 8}, []
+        )
+
+        assert (card["rating"], card["total_avaliacoes"]) == (4.5, 8)
+
+    def test_provider_card_prefers_aggregates_over_legacy_rating(self):
+        """Prestador com `rating` legado e agregados deve mostrar os agregados."""
+        from services.provider_cards import build_provider_card
+
+        card = build_provider_card(
+            {"id": "p1", "rating": 5.0, "total_avaliacoes": 9, "avaliacao_media": 4.2, "rating_count": 10}, []
+        )
+
+        assert (card["rating"], card["total_avaliacoes"]) == (4.2, 10)
+
+
+class TestReviewStats:
+    """Testes para as estatísticas de avaliações em uma agregação."""
+
+    def test_parse_facet_result(self):
+        """Notas ausentes aparecem com zero e a média é arredondada."""
+        from reviews.stats import parse_review_stats
+
+        stats = parse_review_stats({
+            "summary": [{"_id": None, "total": 3, "avg_rating": 13 / 3}],
+            "distribution": [{"_id": 5, "count": 2}, {"_id": 3, "count": 1}],
+            "recent": [],
+            "tags": [{"_id": "pontual", "count": 2}],
+        })
+
+        assert stats["total_reviews"] == 3
+        assert stats["average_rating"] == 4.33
+        assert stats["rating_distribution"] == {"1": 0, "2": 0, "3": 1, "4": 0, "5": 2}
+        assert stats["top_tags"] == [{"tag": "pontual", "count": 2}]
+
+    @pytest.mark.asyncio
+    async def test_stats_cached_until_review_write(self):
+        """Segunda leitura vem do cache; escrita do avaliado invalida."""
+        from types import SimpleNamespace
+        from reviews.routes import get_review_stats
+        from reviews.stats import review_stats_cache
+
+        db = MagicMock()
+        db.reviews.aggregate.return_value.to_list = AsyncMock(return_value=[])
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db_proxy=db)))
+        await review_stats_cache.invalidate("u1")
+
+        first = await get_review_stats("u1", request)
+        await get_review_stats("u1", request)
+        assert db.reviews.aggregate.call_count == 1
+        assert first.total_reviews == 0
+
+        await review_stats_cache.invalidate("u1")
+        await get_review_stats("u1", request)
+        assert db.reviews.aggregate.call_count == 2
@@ -0,0 +1,280 @@
+# Testes unitários do índice de agendamentos - Alça Hub
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from scheduling.interval_index import BookingIntervalIndex, booking_interval, window_for
+
+DAY = datetime(2030, 5, 10)
+
+
+def _booking(booking_id, prestador_id, inicio, fim, status="confirmado"):
+    return {
+        "id": booking_id,
+        "prestador_id": prestador_id,
+        "data_agendamento": DAY,
+        "horario_inicio": inicio,
+        "horario_fim": fim,
+        "status": status,
+    }
+
+
+class TestBookingInterval:
+    """Testes para o intervalo ocupado por um agendamento."""
+
+    def test_overnight_booking(self):
+        """Fim antes do início deve atravessar a meia-noite."""
+        start, end = booking_interval(_booking("b1", "p1", "22:00", "01:00"))
+
+        assert start == datetime(2030, 5, 10, 22, 0)
+        assert end == datetime(2030, 5, 11, 1, 0)
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            window_for(DAY, "25:00", "26:00")
+
+
+class TestBookingIntervalIndex:
+    """Testes para o índice de intervalos por prestador."""
+
+    @pytest.fixture
+    def index(self):
+        index = BookingIntervalIndex()
+        index.upsert_booking(_booking("b1", "p1", "09:00", "11:00"))
+        index.upsert_booking(_booking("b2", "p1", "10:00", "10:30"))
+        index.upsert_booking(_booking("b3", "p2", "14:00", "15:00", status="pendente"))
+        index.upsert_booking(_booking("b4", "p3", "09:00", "18:00", status="cancelado"))
+        index.ready = True
+        return index
+
+    def test_overlap_and_adjacency(self, index):
+        """Janelas encostadas não conflitam; sobrepostas sim."""
+        assert not index.is_free("p1", *window_for(DAY, "10:45", "12:00"))
+        assert index.is_free("p1", *window_for(DAY, "11:00", "12:00"))
+        assert index.is_free("p1", *window_for(DAY, "08:00", "09:00"))
+        assert index.conflicts("p1", *window_for(DAY, "10:15", "10:20")) == ["b1", "b2"]
+
+    def test_status_change_frees_provider(self, index):
+        """Agendamento concluído ou cancelado deve sair do índice."""
+        window = window_for(DAY, "14:30", "16:00")
+        assert not index.is_free("p2", *window)
+
+        index.upsert_booking(_booking("b3", "p2", "14:00", "15:00", status="concluido"))
+
+        assert index.is_free("p2", *window)
+        assert index.get_stats()["bookings"] == 2
+
+    @pytest.mark.asyncio
+    async def test_search_skips_busy_providers(self, index):
+        """A busca com janela deve descartar prestadores ocupados sem consultar bookings."""
+        from cache.manager import CacheManager
+        from cache.provider_search import ProviderSearchCache
+        from geo.spatial_index import ProviderSpatialIndex
+        from services.provider_cards import ProviderCardStore
+        from services.provider_search import ProviderSearchQuery, ProviderSearchService
+
+        database = MagicMock()
+        database.users.find = MagicMock(return_value=[
+            {"id": pid, "nome": pid, "latitude": -23.55, "longitude": -46.63}
+            for pid in ("p1", "p2", "p3")
+        ])
+        database.services.find = MagicMock(return_value=[])
+        service = ProviderSearchService(
+            ProviderSpatialIndex(), ProviderCardStore(), ProviderSearchCache(CacheManager()), index
+        )
+
+        query = ProviderSearchQuery(-23.55, -46.63, 5, window=window_for(DAY, "10:00", "14:30"))
+        result = await service.search(database, query, scan=True)
+
+        assert [card["id"] for _, card, _ in result.rows] == ["p3"]
+        database.bookings.find.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_geo_near_checks_only_candidates_in_radius(self, index):
+        """Sem índice espacial, a ocupação é verificada só para os prestadores do raio."""
+        from unittest.mock import AsyncMock
+        from cache.manager import CacheManager
+        from cache.provider_search import ProviderSearchCache
+        from geo.spatial_index import ProviderSpatialIndex
+        from services.provider_cards import ProviderCardStore
+        from services.provider_search import ProviderSearchQuery, ProviderSearchService
+
+        index.upsert_booking(_booking("b5", "longe", "10:00", "11:00"))
+        pipelines = []
+
+        def aggregate(pipeline):
+            pipelines.append(pipeline)
+            docs = [{"id": "p2"}, {"id": "p3"}] if len(pipelines) == 1 else []
+            return MagicMock(to_list=AsyncMock(return_value=docs))
+
+        database = MagicMock()
+        database.__getitem__.return_value.aggregate = aggregate
+        service = ProviderSearchService(
+            ProviderSpatialIndex(), ProviderCardStore(), ProviderSearchCache(CacheManager()), index
+        )
+
+        query = ProviderSearchQuery(-23.55, -46.63, 5, window=window_for(DAY, "10:00", "14:30"))
+        await service.search(database, query)
+
+        assert len(pipelines) == 2
+        assert pipelines[1][0]["$geoNear"]["query"]["id"] == {"$nin": ["p2"]}
+
+
+class TestSlotReservations:
+    """Testes para a reserva de horários por slot."""
+
+    def test_slots_rounded_outward(self):
+        """Slots devem cobrir a janela inteira; janelas encostadas não compartilham slot."""
+        from scheduling.reservations import SlotReservations
+
+        reservations = SlotReservations(slot_minutes=15)
+        slots = reservations.slot_starts(*window_for(DAY, "09:10", "10:05"))
+        morning = set(reservations.slot_starts(*window_for(DAY, "09:00", "10:00")))
+        late = set(reservations.slot_starts(*window_for(DAY, "10:00", "11:00")))
+
+        assert slots[0] == datetime(2030, 5, 10, 9, 0)
+        assert slots[-1] == datetime(2030, 5, 10, 10, 0)
+        assert len(slots) == 5
+        assert not morning & late
+
+    def test_adjacent_off_grid_bookings_are_rejected(self):
+        """Agendamentos encostados fora da grade disputariam o mesmo slot: 400 na criação."""
+        from fastapi import HTTPException
+        import server
+        from scheduling.reservations import SlotReservations
+
+        reservations = SlotReservations(slot_minutes=15)
+        first = window_for(DAY, "10:00", "10:10")
+        second = window_for(DAY, "10:10", "11:00")
+
+        assert set(reservations.slot_starts(*first)) & set(reservations.slot_starts(*second))
+        assert not reservations.on_grid(*first)
+        assert not reservations.on_grid(*second)
+        assert reservations.on_grid(*window_for(DAY, "10:15", "11:00"))
+        for window in (first, second):
+            with pytest.raises(HTTPException) as error:
+                server._ensure_on_slot_grid(*window)
+            assert error.value.status_code == 400
+        server._ensure_on_slot_grid(*window_for(DAY, "10:00", "10:15"))
+
+    @pytest.mark.asyncio
+    async def test_conflict_rolls_back_partial_reservation(self):
+        """Slot duplicado deve desfazer os slots já gravados e apontar o conflito."""
+        from unittest.mock import AsyncMock
+        from pymongo.errors import BulkWriteError
+        from scheduling.reservations import SlotConflictError, SlotReservations
+
+        database = MagicMock()
+        slots = database.__getitem__.return_value
+        slots.insert_many = AsyncMock(
+            side_effect=BulkWriteError({"writeErrors": [{"index": 2, "code": 11000}]})
+        )
+        slots.delete_many = AsyncMock(return_value=MagicMock(deleted_count=2))
+
+        with pytest.raises(SlotConflictError) as error:
+            await SlotReservations(slot_minutes=30).reserve(
+                database, "b9", "p1", *window_for(DAY, "09:00", "11:00")
+            )
+
+        assert error.value.slot == datetime(2030, 5, 10, 10, 0)
+        slots.delete_many.assert_awaited_once_with({"booking_id": "b9"})
+
+    @pytest.mark.asyncio
+    async def test_reactivated_booking_reserves_again(self, monkeypatch):
+        """Agendamento cancelado que volta a ficar ativo deve reservar os slots ou receber 409."""
+        from unittest.mock import AsyncMock
+        from fastapi import HTTPException
+        import server
+        from scheduling.reservations import SlotConflictError
+
+        reserve = AsyncMock(return_value=4)
+        monkeypatch.setattr(server.slot_reservations, "reserve", reserve)
+        monkeypatch.setattr(server, "booking_index", BookingIntervalIndex())
+        cancelled = _booking("b1", "p1", "09:00", "10:00", status="cancelado")
+
+        assert await server._reserve_if_reactivated(cancelled, "confirmado") is True
+        reserve.assert_awaited_once_with(server.db, "b1", "p1", *window_for(DAY, "09:00", "10:00"))
+        assert await server._reserve_if_reactivated(_booking("b2", "p1", "09:00", "10:00"), "concluido") is False
+
+        reserve.side_effect = SlotConflictError("p1")
+        with pytest.raises(HTTPException) as error:
+            await server._reserve_if_reactivated(cancelled, "pendente")
+        assert error.value.status_code == 409
+
+
+    @pytest.mark.asyncio
+    async def test_booking_changed_updates_index_and_releases(self, monkeypatch):
+        """Cancelamento deve sair do índice, liberar os slots e invalidar os horários livres."""
+        from unittest.mock import AsyncMock
+        from scheduling import sync
+
+        index = BookingIntervalIndex()
+        release = AsyncMock(return_value=4)
+        invalidate = AsyncMock(return_value=1)
+        monkeypatch.setattr(sync, "booking_index", index)
+        monkeypatch.setattr(sync.slot_reservations, "release", release)
+        monkeypatch.setattr(sync.free_slot_calendar, "invalidate_booking", invalidate)
+        database = MagicMock()
+
+        await sync.booking_changed(database, _booking("b1", "p1", "09:00", "10:00"))
+        assert index.conflicts("p1", *window_for(DAY, "09:30", "09:45")) == ["b1"]
+        release.assert_not_awaited()
+
+        cancelled = _booking("b1", "p1", "09:00", "10:00", status="cancelado")
+        await sync.booking_changed(database, cancelled)
+        assert index.conflicts("p1", *window_for(DAY, "09:30", "09:45")) == []
+        release.assert_awaited_once_with(database, "b1")
+        invalidate.assert_awaited_with(cancelled)
+
+
+class TestFreeSlotCalendar:
+    """Testes para os horários livres por prestador e dia."""
+
+    def test_subtract_busy_from_working_hours(self):
+        """Ocupados sobrepostos são unidos antes da subtração."""
+        from scheduling.free_slots import merge_intervals, subtract_intervals
+
+        work = merge_intervals([9 * 60, 14 * 60], [12 * 60, 18 * 60])
+        busy = merge_intervals([10 * 60, 10 * 60 + 30, 17 * 60 + 30], [11 * 60, 11 * 60 + 30, 19 * 60])
+
+        starts, ends = subtract_intervals(*work, *busy)
+
+        assert starts.tolist() == [9 * 60, 11 * 60 + 30, 14 * 60]
+        assert ends.tolist() == [10 * 60, 12 * 60, 17 * 60 + 30]
+
+    @pytest.mark.asyncio
+    async def test_cached_per_day_and_invalidated_by_booking(self):
+        """Segunda leitura vem do cache; mudança de agendamento recalcula o dia."""
+        from unittest.mock import AsyncMock
+        from cache.manager import CacheManager
+        from scheduling.free_slots import FreeSlotCalendar
+
+        index = BookingIntervalIndex()
+        index.ready = True
+        booking = _booking("b1", "p1", "10:00", "11:00")
+        index.upsert_booking(booking)
+
+        database = MagicMock()
+        database.services.find.return_value.to_list = AsyncMock(return_value=[
+            {"disponibilidade": ["segunda", "Sexta-feira"], "horario_inicio": "09:00", "horario_fim": "12:00"},
+        ])
+        calendar = FreeSlotCalendar(CacheManager(), index)
+        day = DAY.date()
+
+        first = await calendar.free_intervals(database, "p1", day, day)
+        again = await calendar.free_intervals(database, "p1", day, day)
+
+        assert first[day] == [(DAY.replace(hour=9), DAY.replace(hour=10)), (DAY.replace(hour=11), DAY.replace(hour=12))]
+        assert again == first
+        # Valor em cache é JSON puro (minutos desde a época), pronto para o L2
+        cached = calendar.manager.cache[calendar.key_for("p1", day)].value
+        assert json.loads(json.dumps(cached)) == cached
+        assert database.services.find.call_count == 1
+
+        index.upsert_booking({**booking, "status": "cancelado"})
+        await calendar.invalidate_booking(booking)
+        freed = await calendar.free_slots(database, "p1", day, day, min_minutes=120, now=DAY)
+
+        assert freed[day] == [(DAY.replace(hour=9), DAY.replace(hour=12))]
+        assert database.services.find.call_count == 2
@@ -0,0 +1,91 @@
+# Testes unitários da análise de sentimento - Alça Hub
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from ai.sentiment_analysis import SentimentAnalyzer
+
+
+class TestSentimentAnalyzer:
+    """Testes para o léxico compilado em autômato."""
+
+    def test_phrase_wins_over_single_word(self):
+        """Expressão de várias palavras prevalece sobre a palavra contida nela."""
+        analyzer = SentimentAnalyzer()
+        tokens = analyzer._tokenize("Eu NÃO recomendo, foi péssimo!")
+
+        matches = [(start, " ".join(entry.tokens)) for start, entry in analyzer.automaton.find(tokens)]
+
+        assert matches == [(1, "não recomendo"), (4, "péssimo")]
+        assert analyzer.analyze("Eu NÃO recomendo, foi péssimo!").sentiment == "negative"
+
+    def test_negation_and_intensifier(self):
+        """Negação inverte e intensificador multiplica a palavra seguinte."""
+        analyzer = SentimentAnalyzer()
+
+        assert analyzer.analyze("nada bom").sentiment == "negative"
+        result = analyzer.analyze("muito bom, mas atrasado; feliz com a pintura")
+        assert (result.sentiment, round(result.confidence, 2)) == ("positive", 1.0)
+        assert result.emotions["alegria"] == 1.0
+        assert result.keywords == ["pintura"]
+
+
+class TestSentimentWorker:
+    """Testes para o worker de sentimento de avaliações."""
+
+    @pytest.mark.asyncio
+    async def test_submitted_reviews_are_written_in_bulk(self):
+        """Avaliações enfileiradas são analisadas em lote e gravadas na parada."""
+        from ai.sentiment_worker import SentimentWorker
+
+        database = MagicMock()
+        database.reviews.bulk_write = AsyncMock()
+        worker = SentimentWorker(SentimentAnalyzer(), batch_size=10, flush_interval=60)
+        assert not worker.submit("r0", {"comment": "ignorada"})
+
+        worker.start(database)
+        assert worker.submit("r1", {"title": "Excelente", "comment": "recomendo"})
+        await asyncio.sleep(0)
+        assert worker.submit("r2", {"comentario": "péssimo"})
+        await asyncio.sleep(0)
+        assert not worker.submit("r3", {"comment": ""})
+        await worker.stop()
+
+        updates = database.reviews.bulk_write.call_args.args[0]
+        assert [u._filter for u in updates] == [{"_id": "r1"}, {"_id": "r2"}]
+        assert [u._doc["$set"]["sentiment"]["label"] for u in updates] == ["positive", "negative"]
+        assert worker.processed == 2
+
+
+class TestSentimentRollups:
+    """Testes para a consolidação incremental por prestador e serviço."""
+
+    def test_space_saving_keeps_heavy_hitters(self):
+        """Itens frequentes sobrevivem ao esboço cheio; erro limita a contagem."""
+        from ai.sentiment_rollups import SpaceSaving
+
+        sketch = SpaceSaving(capacity=4)
+        for word in ["pintura"] * 6 + ["limpeza"] * 4 + ["a", "b", "c", "d", "e"]:
+            sketch.add(word)
+
+        top = sketch.top(2)
+        assert [item for item, _, _ in top] == ["pintura", "limpeza"]
+        assert len(sketch.counts) == 4
+        assert all(count - error <= 1 for item, count, error in sketch.top(4)[2:])
+
+    def test_reanalysis_replaces_previous_sentiment(self):
+        """Reanálise desconta o sentimento anterior antes de somar o novo."""
+        from ai.sentiment_rollups import SentimentRollups
+
+        review = {"reviewee_id": "p1", "service_id": "s1", "type": "service_provider"}
+        before = {"label": "negative", "emotions": {"raiva": 1.0}, "keywords": ["atraso"]}
+        after = {"label": "positive", "emotions": {}, "keywords": ["pintura"]}
+
+        deltas = SentimentRollups.deltas([(review, before, after)])
+
+        assert set(deltas) == {("provider", "p1"), ("service", "s1")}
+        delta = deltas[("provider", "p1")]
+        assert delta.counts == {"negative": -1, "positive": 1}
+        assert delta.emotions == {"raiva": -1.0}
+        assert delta.keywords == [("atraso", -1), ("pintura", 1)]
+        assert SentimentRollups.deltas([({"reviewee_id": "m1", "type": "customer"}, None, after)]) == {}
@@ -0,0 +1,79 @@
+# Paginação por cursor e seleção top-k - Alça Hub
+import base64
+import heapq
+import json
+from typing import Any, Callable, Iterable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class InvalidCursorError(ValueError):
+    """Cursor malformado ou gerado para outra ordenação."""
+
+
+def encode_cursor(scope: Sequence[Any], key: Sequence[Any]) -> str:
+    """Gerar cursor opaco a partir do escopo (ex.: ordenação) e da chave do último item."""
+    payload = json.dumps([list(scope), list(key)], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _matches_type(value: Any, expected: type) -> bool:
+    # bool é subclasse de int; inteiros valem onde se espera float (JSON)
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, scope: Sequence[Any], key_types: Optional[Sequence[type]] = None) -> tuple:
+    """Ler cursor e validar que pertence ao mesmo escopo.
+
+    Args:
+        cursor: cursor recebido do cliente
+        scope: escopo esperado (ex.: ordenação)
+        key_types: tipos esperados de cada valor da chave; sem eles só o
+            escopo é conferido
+
+    Returns:
+        Chave do último item entregue (tupla)
+
+    Raises:
+        InvalidCursorError: se o cursor não puder ser lido, o escopo divergir
+            ou a chave não tiver os tipos esperados
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_scope, key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise InvalidCursorError("Cursor inválido") from e
+    if not isinstance(key, list) or cursor_scope != list(scope):
+        raise InvalidCursorError("Cursor não corresponde à ordenação solicitada")
+    if key_types is None:
+        return tuple(key)
+    if len(key) != len(key_types) or not all(map(_matches_type, key, key_types)):
+        raise InvalidCursorError("Cursor inválido")
+    return tuple(float(value) if expected is float else value for value, expected in zip(key, key_types))
+
+
+def top_k(
+    items: Iterable[T],
+    k: int,
+    key: Callable[[T], Any],
+    reverse: bool = False,
+    after: Optional[tuple] = None,
+) -> List[T]:
+    """Os k primeiros itens na ordem de `key`, sem ordenar a lista inteira.
+
+    Usa heap (O(n log k)). Se `after` for informado, considera apenas itens
+    estritamente depois dessa chave na ordem pedida (paginação por cursor).
+    """
+    if k <= 0:
+        return []
+    if after is not None:
+        if reverse:
+            items = (item for item in items if key(item) < after)
+        else:
+            items = (item for item in items if key(item) > after)
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(k, items, key=key)